@@ -166,15 +166,165 @@ LOGOUT_REDIRECT_URL = '/blog/'
 # Channels settings
 ASGI_APPLICATION = 'RuDjangoProject.asgi.application'
 
-# Channel Layers - use InMemoryChannelLayer for both dev and production
-# Note: InMemoryChannelLayer works fine for single-server deployments
-# For multi-server deployments, consider using Redis
+# Channel Layers
+# Single process (development, one Daphne): InMemoryChannelLayer
+# Multiple Daphne processes: the database layer shares groups between processes without Redis
+#   (PostgreSQL delivers messages via LISTEN/NOTIFY; other databases fall back to polling)
+# The database layer is used by default when DATABASE_URL points to PostgreSQL or
+# CHANNEL_LAYER_MULTI_PROCESS=true; set CHANNEL_LAYER_BACKEND=memory|database to override
+# The layer is wrapped by InstrumentedChannelLayer to record metrics for the admin dashboard
+CHANNEL_LAYER_BACKEND = os.getenv('CHANNEL_LAYER_BACKEND') or (
+    'database'
+    if os.getenv('DATABASE_URL', '').startswith(('postgres://', 'postgresql://'))
+    or os.getenv('CHANNEL_LAYER_MULTI_PROCESS', 'false').lower() == 'true'
+    else 'memory'
+)
+if CHANNEL_LAYER_BACKEND == 'memory':
+    CHANNEL_LAYER_INNER = {
+        'backend': 'channels.layers.InMemoryChannelLayer',
+        'config': {},
+    }
+else:
+    CHANNEL_LAYER_INNER = {
+        'backend': 'blog.channel_layers.DatabaseChannelLayer',
+        'config': {
+            'expiry': 60,  # 訊息未被接收的保留秒數
+            'group_expiry': 300,  # 群組成員未延長時的保留秒數（行程結束後其成員在此秒數內過期）
+            'heartbeat_interval': 60,  # 延長本行程群組成員到期時間的間隔秒數
+            'capacity': 100,  # 每個 channel 的佇列上限
+            'poll_interval': 0.05,  # SQLite 輪詢間隔（秒）
+        },
+    }
+
 CHANNEL_LAYERS = {
     'default': {
-        'BACKEND': 'channels.layers.InMemoryChannelLayer'
+        'BACKEND': 'blog.channel_layers.InstrumentedChannelLayer',
+        'CONFIG': CHANNEL_LAYER_INNER,
     }
 }
 
+# 快取
+# 多個 Daphne 行程必須共用的快取使用資料庫快取（需執行 `python manage.py createcachetable`）；
+# 單一行程（CHANNEL_LAYER_BACKEND 為 memory）時使用行程內快取即可
+#   presence：在線狀態
+#   notification_snapshots：NotificationConsumer 連線時送出的通知快照
+#   follow_graph：每位用戶的追蹤中／追蹤者 ID
+SHARED_CACHE_BACKEND = (
+    'django.core.cache.backends.locmem.LocMemCache'
+    if CHANNEL_LAYER_BACKEND == 'memory'
+    else 'django.core.cache.backends.db.DatabaseCache'
+)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'presence': {
+        'BACKEND': SHARED_CACHE_BACKEND,
+        'LOCATION': 'presence_cache',
+        'OPTIONS': {'MAX_ENTRIES': 100000},  # 每位在線用戶一筆，預設的 300 筆會被提早清除
+    },
+    'notification_snapshots': {
+        'BACKEND': SHARED_CACHE_BACKEND,
+        'LOCATION': 'notification_snapshot_cache',
+        'OPTIONS': {'MAX_ENTRIES': 100000},  # 每位用戶兩筆（快照與版本）
+    },
+    'follow_graph': {
+        'BACKEND': SHARED_CACHE_BACKEND,
+        'LOCATION': 'follow_graph_cache',
+        'OPTIONS': {'MAX_ENTRIES': 100000},  # 每位用戶兩筆（追蹤中與追蹤者）
+    },
+}
+
+# 在線狀態：NotificationConsumer 的連線、斷線與 ping 只更新行程內記錄，
+# 每 PRESENCE_SYNC_INTERVAL 秒批次寫入共用快取；行程停止更新超過 PRESENCE_TTL 秒後其記錄失效
+PRESENCE_CACHE_ALIAS = 'presence'
+PRESENCE_TTL = 90
+PRESENCE_REFRESH_INTERVAL = 25  # 仍在線用戶重新寫入共用快取的間隔（秒）
+PRESENCE_SYNC_INTERVAL = 1
+PRESENCE_LOOKUP_LIMIT = 200  # /api/presence/ 一次最多查詢的用戶數
+
+# 通知快照：NotificationConsumer 連線時送出的未讀數與最近通知（已序列化的 JSON）
+# 通知或私人訊息新增、已讀時失效；NOTIFICATION_SNAPSHOT_TTL 為最長保留秒數
+NOTIFICATION_SNAPSHOT_CACHE_ALIAS = 'notification_snapshots'
+NOTIFICATION_SNAPSHOT_TTL = 300
+NOTIFICATION_RESUME_LIMIT = 50  # 重新連線時（since_id）最多補送的通知數
+
+# 追蹤關係快取：追蹤、取消追蹤時失效，FOLLOW_GRAPH_CACHE_TTL 為最長保留秒數
+FOLLOW_GRAPH_CACHE_ALIAS = 'follow_graph'
+FOLLOW_GRAPH_CACHE_TTL = 3600
+
+# 推薦追蹤：由 `python manage.py build_follow_suggestions` 定期批次計算
+FOLLOW_SUGGESTION_LIMIT = 20  # 每位用戶保留的推薦數
+FOLLOW_SUGGESTION_MAX_FANOUT = 200  # 每位用戶最多展開的追蹤中用戶數（限制計算量）
+FOLLOW_SUGGESTION_CHUNK_SIZE = 500  # 每批計算與寫入的用戶數
+
+# 追蹤時間軸：作者發文時寫入追蹤者的時間軸（fan-out on write）
+# 追蹤者超過 TIMELINE_FANOUT_MAX_FOLLOWERS 的作者改為讀取時查詢；
+# 超過保留筆數的項目由 `python manage.py rebuild_timelines --trim-only` 定期修剪
+TIMELINE_MAX_ENTRIES = 800  # 每位用戶保留的筆數
+TIMELINE_FANOUT_MAX_FOLLOWERS = 5000
+TIMELINE_FANOUT_BATCH_SIZE = 1000  # 每次 bulk_create 的筆數
+TIMELINE_BACKFILL_SIZE = 50  # 新追蹤作者時補入的文章數
+TIMELINE_PULL_AUTHORS_TTL = 600  # 讀取時查詢的作者清單快取秒數
+
+# 個人資料統計計數：由 signals 維護，`python manage.py reconcile_profile_counters` 定期校正
+PROFILE_COUNTER_CHUNK_SIZE = 1000  # 每批校正的個人資料數
+
+# 成就檢查：成就定義快取在各行程的預設快取，新增、修改、刪除成就時失效
+ACHIEVEMENT_DEFINITIONS_TTL = 300
+
+# 成就事件：寫入時只新增事件，由行程內的背景執行緒批次處理（同一位使用者合併檢查一次）；
+# 行程中斷而未完成的事件由佇列定期掃描或 `python manage.py process_achievement_events --once` 接手
+ACHIEVEMENT_QUEUE_BATCH_DELAY_MS = 500  # 收到第一個事件後等待多久才處理
+ACHIEVEMENT_QUEUE_BATCH_SIZE = 500  # 每批最多處理的事件數
+ACHIEVEMENT_EVENT_LEASE_SECONDS = 300  # 超過此秒數仍未完成的事件視為中斷，可被重新取出
+ACHIEVEMENT_EVENT_SWEEP_INTERVAL = 60  # 行程內佇列掃描中斷事件的間隔（秒）
+ACHIEVEMENT_QUEUE_SHUTDOWN_TIMEOUT = 10  # 行程結束前最多等待佇列處理完成的秒數（逾時的事件留給 cron 的 --stale-only 接手）
+
+# Keyset（游標）分頁：列表頁只計算到此筆數的概略總數，超過時顯示為「1000+」
+KEYSET_COUNT_LIMIT = 1000
+
+# 即時聊天：連線時送出的最新訊息數，以及每次載入更早訊息的筆數
+CHAT_HISTORY_PAGE_SIZE = 50
+
+# 即時聊天批次寫入：訊息先廣播，累積數毫秒或達到批次上限後以一次 bulk_create 寫入
+CHAT_WRITE_BATCH_DELAY_MS = 5
+CHAT_WRITE_BATCH_SIZE = 200
+CHAT_WRITE_MAX_ATTEMPTS = 3  # 寫入失敗時在佇列中重試的次數，超過後寫入暫存檔
+CHAT_WRITE_RETRY_DELAY_MS = 500  # 第一次重試的延遲，之後每次加倍
+CHAT_WRITE_SPOOL_DIR = BASE_DIR / 'chat_spool'  # 無法寫入資料庫的訊息暫存目錄，資料庫恢復後自動補寫
+CHAT_WRITE_SHUTDOWN_TIMEOUT = 10  # 行程結束前最多花多少秒寫入佇列中剩餘的訊息（逾時的訊息寫入暫存檔）
+CHAT_WRITE_ID_BLOCK_SIZE = 100  # PostgreSQL 每次預先保留的訊息 ID 數量
+
+# 即時聊天打字狀態：超過此秒數沒有收到打字 frame 即自動視為停止打字
+CHAT_TYPING_TIMEOUT = 6
+
+# 通知合併設定
+# 在時間窗內，同一接收者、同一類型、同一物件的通知會合併為一則
+# （例如「A 和其他 12 人讚了您的文章」），減少熱門文章產生的通知列與 WebSocket 推送
+NOTIFICATION_AGGREGATION_WINDOW = int(os.getenv('NOTIFICATION_AGGREGATION_WINDOW', 3600))  # 秒
+NOTIFICATION_AGGREGATION_TYPES = ['like', 'share', 'comment']
+NOTIFICATION_AGGREGATION_MAX_ACTORS = 5  # 每則通知保留的最近觸發者數量
+
+# 通知保留政策：已讀通知依類型保留的天數（'default' 套用於其他類型）
+# 由 `python manage.py purge_notifications` 依主鍵分批清理
+NOTIFICATION_RETENTION_DAYS = {
+    'default': 90,
+    'like': 30,
+    'share': 30,
+}
+NOTIFICATION_UNREAD_RETENTION_DAYS = None  # 未讀通知保留天數（None 表示不清理）
+NOTIFICATION_PURGE_BATCH_SIZE = 500  # 每批刪除筆數
+NOTIFICATION_PURGE_SLEEP_SECONDS = 0.1  # 批次之間的暫停秒數
+NOTIFICATION_PURGE_LEASE_SECONDS = 300  # 背景清理超過此秒數未完成一批視為中斷，由 purge_notifications 接手
+NOTIFICATION_ARCHIVE_DIR = BASE_DIR / 'archives' / 'notifications'  # 封存檔案目錄
+
+# 私人訊息刪除：批次刪除時每個 UPDATE / DELETE 處理的訊息數；
+# 雙方都已刪除但仍留下的訊息由 `python manage.py purge_deleted_messages` 分批清理
+MESSAGE_DELETE_CHUNK_SIZE = 500
+MESSAGE_PURGE_BATCH_SIZE = 500
+MESSAGE_PURGE_SLEEP_SECONDS = 0.1
+
 # Web Push (PWA) 推播通知設定
 # 從環境變數讀取 VAPID keys（不要將私鑰提交到版本控制）
 VAPID_PRIVATE_KEY = os.getenv('VAPID_PRIVATE_KEY', '')
@@ -186,6 +336,25 @@ VAPID_CLAIMS = {
     "sub": os.getenv('VAPID_MAILTO', 'mailto:admin@rudjango.com')
 }
 
+# VAPID 簽章快取：依推播服務快取簽好的 JWT，到期前 REFRESH_MARGIN 秒重新簽署
+VAPID_TOKEN_TTL = 12 * 60 * 60  # 秒（RFC 8292 上限為 24 小時）
+VAPID_TOKEN_REFRESH_MARGIN = 10 * 60  # 秒
+
+# 推播發送設定（並行發送的執行緒數、每個推播服務主機的連線上限、逾時秒數）
+WEB_PUSH_MAX_WORKERS = 8
+WEB_PUSH_POOL_SIZE_PER_HOST = 4
+WEB_PUSH_TIMEOUT = 10
+
+# 推播佇列設定
+# 網頁請求只寫入 PushOutbox，由 `python manage.py process_push_outbox` worker 發送
+# （Procfile 的 worker 行程；沒有執行 worker 時推播只會留在佇列中，不會送出）
+PUSH_OUTBOX_BATCH_SIZE = 100  # 每批取出的筆數
+PUSH_OUTBOX_MAX_ATTEMPTS = 5  # 最多嘗試次數
+PUSH_OUTBOX_BACKOFF_BASE = 30  # 第一次重試的延遲秒數，之後每次加倍
+PUSH_OUTBOX_BACKOFF_MAX = 3600  # 重試延遲上限（秒）
+PUSH_OUTBOX_LEASE_SECONDS = 300  # 取出後超過此秒數未完成，視為 worker 中斷並重新發送
+PUSH_OUTBOX_RETENTION_DAYS = 7  # 已完成推播的保留天數
+
 # WhiteNoise configuration for serving static files in production
 # Use basic storage without compression to avoid potential issues
 if not DEBUG:
@@ -5,7 +5,7 @@ from .models import (
     LearningCourse, UserCourseProgress, Activity, Follow, Tag,
     Mention, ArticleCollaborator, ArticleEditHistory,
     UserGroup, GroupMembership, GroupPost,
-    Event, EventParticipant, Announcement
+    Event, EventParticipant, Announcement, NotificationPurgeLog, PushOutbox
 )
 
 
@@ -136,6 +136,13 @@ class UserProfileAdmin(admin.ModelAdmin):
         }),
     )
 
+    def save_model(self, request, obj, form, change):
+        """UserProfile.save() 預設不寫入積分與等級，後台修改時明確寫入修改過的欄位"""
+        if change:
+            obj.save(update_fields=obj.editable_fields() + obj.changed_protected_fields())
+        else:
+            super().save_model(request, obj, form, change)
+
 
 # 技能標籤管理
 @admin.register(Skill)
@@ -347,4 +354,23 @@ class AnnouncementAdmin(admin.ModelAdmin):
             'fields': ('views_count', 'created_at', 'updated_at'),
             'classes': ('collapse',)
         }),
-    )
\ No newline at end of file
+    )
+
+
+# 通知清理記錄
+@admin.register(NotificationPurgeLog)
+class NotificationPurgeLogAdmin(admin.ModelAdmin):
+    list_display = ['trigger', 'notification_type', 'rows_purged', 'rows_archived', 'batches', 'started_at', 'finished_at']
+    list_filter = ['trigger', 'notification_type', 'started_at']
+    date_hierarchy = 'started_at'
+    readonly_fields = ['trigger', 'notification_type', 'user', 'notification_ids', 'rows_purged', 'rows_archived', 'batches', 'archive_file', 'locked_at', 'started_at', 'finished_at']
+
+
+# 推播佇列
+@admin.register(PushOutbox)
+class PushOutboxAdmin(admin.ModelAdmin):
+    list_display = ['subscription', 'status', 'attempts', 'last_status_code', 'send_latency_ms', 'next_attempt_at', 'created_at', 'sent_at']
+    list_filter = ['status', 'last_status_code', 'created_at']
+    date_hierarchy = 'created_at'
+    raw_id_fields = ['subscription']
+    readonly_fields = ['locked_at', 'locked_by', 'last_status_code', 'last_error', 'created_at', 'sent_at', 'send_latency_ms']
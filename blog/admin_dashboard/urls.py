@@ -53,6 +53,8 @@ urlpatterns = [
     # 系統設定
     path('system/settings/', views.system_settings, name='system_settings'),
     path('system/logs/', views.system_logs, name='system_logs'),
+    path('system/channel-layer/', views.channel_layer_metrics, name='channel_layer_metrics'),
+    path('system/channel-layer/metrics.json', views.channel_layer_metrics_api, name='channel_layer_metrics_api'),
 
     # 安全管理
     path('security/login-attempts/', views.security_login_attempts, name='security_login_attempts'),
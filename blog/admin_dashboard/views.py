@@ -1,13 +1,13 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.models import User
-from blog.models import Article, Comment, Tag, Like, Bookmark, ChatMessage, Notification, UserGroup, GroupMembership, GroupPost, SearchHistory, Message
+from blog.models import Article, Comment, Tag, Like, Bookmark, ChatMessage, Notification, UserGroup, GroupMembership, GroupPost, SearchHistory, Message, MessageThread
 from django.db.models import Count, Q
 from django.utils import timezone
 from datetime import timedelta
-from django.core.paginator import Paginator
 from django.contrib import messages
 from django.http import JsonResponse
+from blog.utils.keyset_pagination import KeysetPaginator
 
 
 def is_staff(user):
@@ -142,6 +142,16 @@ def dashboard(request):
     return render(request, 'admin_dashboard/pages/dashboard.html', context)
 
 
+# 用戶列表可用的排序方式（keyset 分頁的排序欄位）
+USER_SORT_OPTIONS = {
+    '-date_joined': ('-date_joined', '-id'),
+    'date_joined': ('date_joined', 'id'),
+    'username': ('username', 'id'),
+    '-username': ('-username', '-id'),
+    'articles': ('-profile__published_article_count', '-id'),
+}
+
+
 @login_required
 @user_passes_test(is_staff, login_url='/blog/')
 def user_list(request):
@@ -152,12 +162,8 @@ def user_list(request):
     filter_status = request.GET.get('status', 'all')  # all, active, staff, superuser
     sort_by = request.GET.get('sort', '-date_joined')  # date_joined, username, articles
 
-    # 基本查詢
-    users = User.objects.select_related('profile').annotate(
-        article_count=Count('articles', filter=Q(articles__status='published')),
-        comment_count=Count('comments'),
-        like_count=Count('likes')
-    )
+    # 基本查詢（已發布文章數、留言數讀取個人資料上的計數，不逐頁 JOIN 文章與留言）
+    users = User.objects.select_related('profile')
 
     # 搜尋功能
     if search_query:
@@ -177,28 +183,19 @@ def user_list(request):
         users = users.filter(is_superuser=True)
 
     # 排序
-    if sort_by == 'username':
-        users = users.order_by('username')
-    elif sort_by == '-username':
-        users = users.order_by('-username')
-    elif sort_by == 'articles':
-        users = users.order_by('-article_count')
-    elif sort_by == 'date_joined':
-        users = users.order_by('date_joined')
-    else:
-        users = users.order_by(sort_by)
+    if sort_by not in USER_SORT_OPTIONS:
+        sort_by = '-date_joined'
 
-    # 分頁
-    paginator = Paginator(users, 20)  # 每頁顯示 20 個用戶
-    page_number = request.GET.get('page', 1)
-    page_obj = paginator.get_page(page_number)
+    # 分頁（keyset 游標）
+    paginator = KeysetPaginator(users, 20, ordering=USER_SORT_OPTIONS[sort_by])  # 每頁顯示 20 個用戶
+    page_obj = paginator.get_page(request.GET.get('cursor'))
 
     context = {
         'page_obj': page_obj,
         'search_query': search_query,
         'filter_status': filter_status,
         'sort_by': sort_by,
-        'total_users': users.count(),
+        'total_users': page_obj.total_display,
     }
 
     return render(request, 'admin_dashboard/pages/users/list.html', context)
@@ -320,6 +317,16 @@ def user_toggle_staff(request, user_id):
     return JsonResponse({'success': False, 'message': '無效的請求'})
 
 
+# 文章列表可用的排序方式
+ARTICLE_SORT_OPTIONS = {
+    '-created_at': ('-created_at', '-id'),
+    'created_at': ('created_at', 'id'),
+    '-likes': ('-like_count', '-id'),
+    '-views': ('-views', '-id'),
+    'title': ('title', 'id'),
+}
+
+
 @login_required
 @user_passes_test(is_staff, login_url='/blog/')
 def article_list(request):
@@ -351,28 +358,19 @@ def article_list(request):
         articles = articles.filter(status='draft')
 
     # 排序
-    if sort_by == '-likes':
-        articles = articles.order_by('-like_count')
-    elif sort_by == '-views':
-        articles = articles.order_by('-views')
-    elif sort_by == 'title':
-        articles = articles.order_by('title')
-    elif sort_by == 'created_at':
-        articles = articles.order_by('created_at')
-    else:
-        articles = articles.order_by(sort_by)
+    if sort_by not in ARTICLE_SORT_OPTIONS:
+        sort_by = '-created_at'
 
-    # 分頁
-    paginator = Paginator(articles, 20)  # 每頁顯示 20 篇文章
-    page_number = request.GET.get('page', 1)
-    page_obj = paginator.get_page(page_number)
+    # 分頁（keyset 游標）
+    paginator = KeysetPaginator(articles, 20, ordering=ARTICLE_SORT_OPTIONS[sort_by])  # 每頁顯示 20 篇文章
+    page_obj = paginator.get_page(request.GET.get('cursor'))
 
     context = {
         'page_obj': page_obj,
         'search_query': search_query,
         'filter_status': filter_status,
         'sort_by': sort_by,
-        'total_articles': articles.count(),
+        'total_articles': page_obj.total_display,
     }
 
     return render(request, 'admin_dashboard/pages/articles/list.html', context)
@@ -423,6 +421,14 @@ def article_delete(request, article_id):
     return JsonResponse({'success': False, 'message': '無效的請求'})
 
 
+# 留言列表可用的排序方式
+COMMENT_SORT_OPTIONS = {
+    '-created_at': ('-created_at', '-id'),
+    'created_at': ('created_at', 'id'),
+    'author': ('author__username', 'id'),
+}
+
+
 @login_required
 @user_passes_test(is_staff, login_url='/blog/')
 def comment_list(request):
@@ -449,17 +455,12 @@ def comment_list(request):
         comments = comments.filter(article_id=filter_article)
 
     # 排序
-    if sort_by == 'created_at':
-        comments = comments.order_by('created_at')
-    elif sort_by == 'author':
-        comments = comments.order_by('author__username')
-    else:
-        comments = comments.order_by(sort_by)
+    if sort_by not in COMMENT_SORT_OPTIONS:
+        sort_by = '-created_at'
 
-    # 分頁
-    paginator = Paginator(comments, 20)  # 每頁顯示 20 條留言
-    page_number = request.GET.get('page', 1)
-    page_obj = paginator.get_page(page_number)
+    # 分頁（keyset 游標）
+    paginator = KeysetPaginator(comments, 20, ordering=COMMENT_SORT_OPTIONS[sort_by])  # 每頁顯示 20 條留言
+    page_obj = paginator.get_page(request.GET.get('cursor'))
 
     # 取得所有文章列表供篩選使用
     all_articles = Article.objects.filter(status='published').order_by('-created_at')[:50]
@@ -469,7 +470,7 @@ def comment_list(request):
         'search_query': search_query,
         'filter_article': filter_article,
         'sort_by': sort_by,
-        'total_comments': comments.count(),
+        'total_comments': page_obj.total_display,
         'all_articles': all_articles,
     }
 
@@ -494,6 +495,15 @@ def comment_delete(request, comment_id):
     return JsonResponse({'success': False, 'message': '無效的請求'})
 
 
+# 標籤列表可用的排序方式
+TAG_SORT_OPTIONS = {
+    '-published_article_count': ('-published_article_count', 'name', 'id'),
+    'name': ('name', 'id'),
+    '-created_at': ('-created_at', '-id'),
+    'created_at': ('created_at', 'id'),
+}
+
+
 @login_required
 @user_passes_test(is_staff, login_url='/blog/')
 def tag_list(request):
@@ -516,25 +526,18 @@ def tag_list(request):
         )
 
     # 排序
-    if sort_by == 'name':
-        tags = tags.order_by('name')
-    elif sort_by == '-created_at':
-        tags = tags.order_by('-created_at')
-    elif sort_by == 'created_at':
-        tags = tags.order_by('created_at')
-    else:
-        tags = tags.order_by('-published_article_count', 'name')
+    if sort_by not in TAG_SORT_OPTIONS:
+        sort_by = '-published_article_count'
 
-    # 分頁
-    paginator = Paginator(tags, 20)  # 每頁顯示 20 個標籤
-    page_number = request.GET.get('page', 1)
-    page_obj = paginator.get_page(page_number)
+    # 分頁（keyset 游標）
+    paginator = KeysetPaginator(tags, 20, ordering=TAG_SORT_OPTIONS[sort_by])  # 每頁顯示 20 個標籤
+    page_obj = paginator.get_page(request.GET.get('cursor'))
 
     context = {
         'page_obj': page_obj,
         'search_query': search_query,
         'sort_by': sort_by,
-        'total_tags': tags.count(),
+        'total_tags': page_obj.total_display,
     }
 
     return render(request, 'admin_dashboard/pages/tags/list.html', context)
@@ -551,17 +554,16 @@ def tag_detail(request, tag_id):
     articles = Article.objects.filter(tags=tag, status='published').select_related('author').annotate(
         like_count=Count('likes'),
         comment_count=Count('comments')
-    ).order_by('-created_at')
+    )
 
-    # 分頁
-    paginator = Paginator(articles, 10)  # 每頁顯示 10 篇文章
-    page_number = request.GET.get('page', 1)
-    page_obj = paginator.get_page(page_number)
+    # 分頁（keyset 游標）
+    paginator = KeysetPaginator(articles, 10, ordering=('-created_at', '-id'))  # 每頁顯示 10 篇文章
+    page_obj = paginator.get_page(request.GET.get('cursor'))
 
     context = {
         'tag': tag,
         'page_obj': page_obj,
-        'total_articles': articles.count(),
+        'total_articles': page_obj.total_display,
     }
 
     return render(request, 'admin_dashboard/pages/tags/detail.html', context)
@@ -588,85 +590,79 @@ def tag_delete(request, tag_id):
 
 # ==================== 聊天管理 ====================
 
+# 聊天室列表可用的排序方式
+CHAT_ROOM_SORT_OPTIONS = {
+    '-last_message_at': ('-last_message_at', '-id'),
+    'last_message_at': ('last_message_at', 'id'),
+    '-created_at': ('-created_at', '-id'),
+    'created_at': ('created_at', 'id'),
+}
+
+
+def _get_chat_room_or_404(room_id):
+    """依 room_id（格式: "user1_id-user2_id"）取得聊天室（對話摘要）"""
+    from blog.models.chat import ChatRoom
+    from django.http import Http404
+
+    try:
+        user1_id, user2_id = (int(part) for part in room_id.split('-'))
+    except (ValueError, AttributeError):
+        raise Http404("聊天室不存在")
+
+    room = ChatRoom.for_users(user1_id, user2_id).select_related('user1', 'user2').first()
+    if room is None:
+        raise Http404("聊天室不存在")
+    return room
+
+
 @login_required
 @user_passes_test(is_staff, login_url='/blog/')
 def chat_list(request):
-    """聊天室列表 - 直接從 ChatMessage 聚合"""
-    from blog.models.chat import ChatMessage
-    from django.db.models import Q
-    from django.contrib.auth.models import User
+    """聊天室列表 - 由對話摘要（ChatRoom）查詢，搜尋、排序與分頁皆在資料庫完成"""
+    from blog.models.chat import ChatMessage, ChatRoom
+    from django.db.models import Q, Count
 
     search_query = request.GET.get('search', '')
     sort_by = request.GET.get('sort', '-last_message_at')
+    if sort_by not in CHAT_ROOM_SORT_OPTIONS:
+        sort_by = '-last_message_at'
 
-    # 從 ChatMessage 中找出所有聊天對話（去重）
-    messages = ChatMessage.objects.select_related('sender', 'recipient').all()
+    rooms = ChatRoom.objects.filter(
+        last_message_at__isnull=False
+    ).select_related('user1', 'user2', 'last_message_sender')
 
-    # 建立聊天室字典
-    chat_rooms_dict = {}
-
-    for msg in messages:
-        # 確保 user1_id < user2_id，避免重複
-        user1_id = min(msg.sender.id, msg.recipient.id)
-        user2_id = max(msg.sender.id, msg.recipient.id)
-        key = (user1_id, user2_id)
-
-        if key not in chat_rooms_dict:
-            user1 = User.objects.get(id=user1_id)
-            user2 = User.objects.get(id=user2_id)
-
-            chat_rooms_dict[key] = {
-                'user1': user1,
-                'user2': user2,
-                'messages': [],
-            }
-
-        chat_rooms_dict[key]['messages'].append(msg)
-
-    # 轉換為列表並添加統計資訊
-    chat_rooms = []
-    for (user1_id, user2_id), data in chat_rooms_dict.items():
-        room_messages = data['messages']
-        last_message = max(room_messages, key=lambda m: m.created_at)
-
-        # 創建虛擬聊天室物件
-        class VirtualChatRoom:
-            def __init__(self, user1, user2, messages, last_msg):
-                self.id = f"{user1.id}-{user2.id}"
-                self.user1 = user1
-                self.user2 = user2
-                self.total_messages = len(messages)
-                self.last_message = last_msg
-                self.last_message_at = last_msg.created_at
-                self.created_at = min(messages, key=lambda m: m.created_at).created_at
-
-        room = VirtualChatRoom(data['user1'], data['user2'], room_messages, last_message)
-
-        # 搜尋過濾
-        if search_query:
-            if (search_query.lower() in room.user1.username.lower() or
-                search_query.lower() in room.user2.username.lower()):
-                chat_rooms.append(room)
-        else:
-            chat_rooms.append(room)
+    # 搜尋過濾
+    if search_query:
+        rooms = rooms.filter(
+            Q(user1__username__icontains=search_query) |
+            Q(user2__username__icontains=search_query)
+        )
 
-    # 排序
-    if sort_by == '-last_message_at':
-        chat_rooms.sort(key=lambda r: r.last_message_at, reverse=True)
-    elif sort_by == 'last_message_at':
-        chat_rooms.sort(key=lambda r: r.last_message_at)
-    elif sort_by == '-created_at':
-        chat_rooms.sort(key=lambda r: r.created_at, reverse=True)
-    elif sort_by == 'created_at':
-        chat_rooms.sort(key=lambda r: r.created_at)
-
-    # 分頁
-    paginator = Paginator(chat_rooms, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # 排序與分頁（keyset 游標）
+    paginator = KeysetPaginator(rooms, 20, ordering=CHAT_ROOM_SORT_OPTIONS[sort_by])
+    page_obj = paginator.get_page(request.GET.get('cursor'))
+
+    # 只為目前這一頁的聊天室以一次分組查詢計算訊息數
+    page_rooms = list(page_obj.object_list)
+    if page_rooms:
+        pair_filter = Q()
+        for room in page_rooms:
+            pair_filter |= Q(sender_id=room.user1_id, recipient_id=room.user2_id)
+            pair_filter |= Q(sender_id=room.user2_id, recipient_id=room.user1_id)
+
+        message_counts = {}
+        for row in ChatMessage.objects.filter(pair_filter).values(
+            'sender_id', 'recipient_id'
+        ).annotate(total=Count('id')).order_by():
+            key = (min(row['sender_id'], row['recipient_id']), max(row['sender_id'], row['recipient_id']))
+            message_counts[key] = message_counts.get(key, 0) + row['total']
+
+        for room in page_rooms:
+            room.total_messages = message_counts.get((room.user1_id, room.user2_id), 0)
+    page_obj.object_list = page_rooms
 
     # 統計資訊
-    total_rooms = len(chat_rooms)
+    total_rooms = page_obj.total_display
     total_messages = ChatMessage.objects.count()
 
     context = {
@@ -686,46 +682,22 @@ def chat_detail(request, room_id):
     """聊天室詳情 - 查看完整對話"""
     from blog.models.chat import ChatMessage
     from django.db.models import Q
-    from django.contrib.auth.models import User
 
-    # 解析虛擬 room_id (格式: "user1_id-user2_id")
-    try:
-        user1_id, user2_id = room_id.split('-')
-        user1_id, user2_id = int(user1_id), int(user2_id)
-    except (ValueError, AttributeError):
-        from django.http import Http404
-        raise Http404("聊天室不存在")
-
-    user1 = get_object_or_404(User, id=user1_id)
-    user2 = get_object_or_404(User, id=user2_id)
-
-    # 創建虛擬聊天室物件
-    class VirtualRoom:
-        def __init__(self, u1, u2):
-            self.id = f"{u1.id}-{u2.id}"
-            self.user1 = u1
-            self.user2 = u2
-
-    room = VirtualRoom(user1, user2)
+    room = _get_chat_room_or_404(room_id)
 
     # 獲取該聊天室的所有訊息
     messages = ChatMessage.objects.filter(
-        Q(sender=user1, recipient=user2) |
-        Q(sender=user2, recipient=user1)
-    ).select_related('sender', 'recipient').order_by('created_at')
-
-    # 分頁
-    paginator = Paginator(messages, 50)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+        Q(sender_id=room.user1_id, recipient_id=room.user2_id) |
+        Q(sender_id=room.user2_id, recipient_id=room.user1_id)
+    ).select_related('sender', 'recipient')
 
-    # 統計資訊
-    total_messages = messages.count()
-    unread_count = messages.filter(is_read=False).count()
+    # 分頁（keyset 游標）
+    paginator = KeysetPaginator(messages, 50, ordering=('created_at', 'id'))
+    page_obj = paginator.get_page(request.GET.get('cursor'))
 
-    # 計算最後活躍時間
-    last_message = messages.order_by('-created_at').first()
-    room.last_message_at = last_message.created_at if last_message else None
+    # 統計資訊（未讀數與最後活躍時間直接取自對話摘要）
+    total_messages = page_obj.total_display
+    unread_count = room.user1_unread_count + room.user2_unread_count
 
     context = {
         'room': room,
@@ -742,7 +714,7 @@ def chat_detail(request, room_id):
 def chat_delete(request, room_id):
     """刪除聊天室及其所有訊息"""
     if request.method == 'POST':
-        from blog.models.chat import ChatMessage
+        from blog.models.chat import ChatMessage, ChatRoom
         from django.db.models import Q
         from django.contrib.auth.models import User
 
@@ -761,6 +733,7 @@ def chat_delete(request, room_id):
             Q(sender=user1, recipient=user2) |
             Q(sender=user2, recipient=user1)
         ).delete()[0]
+        ChatRoom.for_users(user1.id, user2.id).delete()
 
         room_name = f'{user1.username} ↔ {user2.username}'
 
@@ -808,14 +781,13 @@ def notification_list(request):
 
     # 排序
     if sort_by == 'created_at':
-        notifications = notifications.order_by('created_at')
+        ordering = ('created_at', 'id')
     else:
-        notifications = notifications.order_by('-created_at')
+        ordering = ('-created_at', '-id')
 
-    # 分頁
-    paginator = Paginator(notifications, 20)  # 每頁顯示 20 條通知
-    page_number = request.GET.get('page', 1)
-    page_obj = paginator.get_page(page_number)
+    # 分頁（keyset 游標）
+    paginator = KeysetPaginator(notifications, 20, ordering=ordering)  # 每頁顯示 20 條通知
+    page_obj = paginator.get_page(request.GET.get('cursor'))
 
     # 統計資訊
     total_notifications = Notification.objects.count()
@@ -901,11 +873,18 @@ def notification_batch_delete(request):
                 'message': '未選擇任何通知'
             })
 
-        deleted_count = Notification.objects.filter(id__in=notification_ids).delete()[0]
+        from blog.utils.notification_retention import purge_in_background
+
+        # 依主鍵分批刪除，避免單一大型 DELETE 鎖住大範圍資料
+        stats = purge_in_background('admin', notification_ids=notification_ids)
+
+        message = f'已刪除 {stats["purged"]} 條通知'
+        if stats['has_more']:
+            message += '，其餘通知將在背景陸續刪除'
 
         return JsonResponse({
             'success': True,
-            'message': f'已刪除 {deleted_count} 條通知'
+            'message': message
         })
 
     return JsonResponse({'success': False, 'message': '無效的請求'})
@@ -962,6 +941,16 @@ def notification_batch_mark_read(request):
 
 # ==================== 群組管理 ====================
 
+# 群組列表可用的排序方式
+GROUP_SORT_OPTIONS = {
+    '-created_at': ('-created_at', '-id'),
+    'created_at': ('created_at', 'id'),
+    '-member_count': ('-total_members', '-id'),
+    '-post_count': ('-total_posts', '-id'),
+    'name': ('name', 'id'),
+}
+
+
 @login_required
 @user_passes_test(is_staff, login_url='/blog/')
 def group_list(request):
@@ -992,21 +981,12 @@ def group_list(request):
         groups = groups.filter(group_type=filter_type)
 
     # 排序
-    if sort_by == 'created_at':
-        groups = groups.order_by('created_at')
-    elif sort_by == '-member_count':
-        groups = groups.order_by('-total_members')
-    elif sort_by == '-post_count':
-        groups = groups.order_by('-total_posts')
-    elif sort_by == 'name':
-        groups = groups.order_by('name')
-    else:
-        groups = groups.order_by('-created_at')
+    if sort_by not in GROUP_SORT_OPTIONS:
+        sort_by = '-created_at'
 
-    # 分頁
-    paginator = Paginator(groups, 20)  # 每頁顯示 20 個群組
-    page_number = request.GET.get('page', 1)
-    page_obj = paginator.get_page(page_number)
+    # 分頁（keyset 游標）
+    paginator = KeysetPaginator(groups, 20, ordering=GROUP_SORT_OPTIONS[sort_by])  # 每頁顯示 20 個群組
+    page_obj = paginator.get_page(request.GET.get('cursor'))
 
     # 統計資訊
     total_groups = UserGroup.objects.count()
@@ -1499,8 +1479,51 @@ def system_logs(request):
     return render(request, 'admin_dashboard/pages/system/logs.html', context)
 
 
+def _channel_layer_metrics_data():
+    """Channel Layer 指標（目前行程 + 資料庫中所有行程的群組成員數）"""
+    from blog.utils.channel_layer_metrics import get_channel_layer_metrics, get_database_group_stats
+
+    metrics = get_channel_layer_metrics()
+    if metrics is None:
+        return None
+
+    if metrics['backend'] == 'DatabaseChannelLayer':
+        metrics['cluster_groups'] = get_database_group_stats()
+    return metrics
+
+
+@login_required
+@user_passes_test(is_staff, login_url='/blog/')
+def channel_layer_metrics(request):
+    """Channel Layer 監控頁面"""
+    metrics = _channel_layer_metrics_data()
+
+    context = {
+        'metrics': metrics,
+    }
+
+    return render(request, 'admin_dashboard/pages/system/channel_layer.html', context)
+
+
+@login_required
+@user_passes_test(is_staff, login_url='/blog/')
+def channel_layer_metrics_api(request):
+    """Channel Layer 指標（JSON）"""
+    metrics = _channel_layer_metrics_data()
+    if metrics is None:
+        return JsonResponse({'error': '未使用 InstrumentedChannelLayer'}, status=404)
+    return JsonResponse(metrics)
+
+
 # ==================== 安全管理 ====================
 
+# 登入記錄可用的排序方式
+LOGIN_ATTEMPT_SORT_OPTIONS = {
+    '-attempted_at': ('-attempted_at', '-id'),
+    'attempted_at': ('attempted_at', 'id'),
+}
+
+
 @login_required
 @user_passes_test(is_staff, login_url='/blog/')
 def security_login_attempts(request):
@@ -1531,12 +1554,12 @@ def security_login_attempts(request):
         attempts = attempts.filter(username__icontains=filter_username)
 
     # 排序
-    attempts = attempts.order_by(sort_by)
+    if sort_by not in LOGIN_ATTEMPT_SORT_OPTIONS:
+        sort_by = '-attempted_at'
 
-    # 分頁
-    paginator = Paginator(attempts, 50)
-    page_number = request.GET.get('page', 1)
-    page_obj = paginator.get_page(page_number)
+    # 分頁（keyset 游標）
+    paginator = KeysetPaginator(attempts, 50, ordering=LOGIN_ATTEMPT_SORT_OPTIONS[sort_by])
+    page_obj = paginator.get_page(request.GET.get('cursor'))
 
     # 統計資訊
     total_attempts = LoginAttempt.objects.count()
@@ -1586,6 +1609,14 @@ def security_login_attempts(request):
     return render(request, 'admin_dashboard/pages/security/login_attempts.html', context)
 
 
+# IP 黑名單可用的排序方式（解鎖時間為空的永久封鎖排在最後）
+IP_BLACKLIST_SORT_OPTIONS = {
+    '-blocked_at': ('-blocked_at', '-id'),
+    'blocked_at': ('blocked_at', 'id'),
+    '-unblock_at': ('-unblock_at', '-id'),
+}
+
+
 @login_required
 @user_passes_test(is_staff, login_url='/blog/')
 def security_ip_blacklist(request):
@@ -1606,12 +1637,12 @@ def security_ip_blacklist(request):
         blacklist = blacklist.filter(is_active=False)
 
     # 排序
-    blacklist = blacklist.order_by(sort_by)
+    if sort_by not in IP_BLACKLIST_SORT_OPTIONS:
+        sort_by = '-blocked_at'
 
-    # 分頁
-    paginator = Paginator(blacklist, 20)
-    page_number = request.GET.get('page', 1)
-    page_obj = paginator.get_page(page_number)
+    # 分頁（keyset 游標）
+    paginator = KeysetPaginator(blacklist, 20, ordering=IP_BLACKLIST_SORT_OPTIONS[sort_by])
+    page_obj = paginator.get_page(request.GET.get('cursor'))
 
     # 統計
     total_blocked = IPBlacklist.objects.filter(is_active=True).count()
@@ -1690,6 +1721,13 @@ def security_ip_unblock(request, blacklist_id):
 
 # ==================== 訊息管理 ====================
 
+# 私人訊息管理列表可用的排序方式
+MESSAGE_SORT_OPTIONS = {
+    '-created_at': ('-created_at', '-id'),
+    'created_at': ('created_at', 'id'),
+}
+
+
 @login_required
 @user_passes_test(is_staff, login_url='/blog/')
 def message_list(request):
@@ -1723,12 +1761,12 @@ def message_list(request):
         )
 
     # 排序
-    messages = messages.order_by(sort_by)
+    if sort_by not in MESSAGE_SORT_OPTIONS:
+        sort_by = '-created_at'
 
-    # 分頁
-    paginator = Paginator(messages, 30)
-    page_number = request.GET.get('page', 1)
-    page_obj = paginator.get_page(page_number)
+    # 分頁（keyset 游標）
+    paginator = KeysetPaginator(messages, 30, ordering=MESSAGE_SORT_OPTIONS[sort_by])
+    page_obj = paginator.get_page(request.GET.get('cursor'))
 
     # 統計資訊
     total_messages = Message.objects.filter(
@@ -1764,19 +1802,16 @@ def message_detail(request, message_id):
     """訊息詳情"""
 
     message = get_object_or_404(
-        Message.objects.select_related('sender', 'sender__profile', 'recipient', 'recipient__profile', 'parent_message'),
+        Message.objects.select_related('sender', 'sender__profile', 'recipient', 'recipient__profile', 'parent_message', 'thread'),
         id=message_id
     )
 
-    # 獲取對話串（如果有的話）
-    if message.parent_message:
-        # 這是回覆訊息，獲取整個對話
-        root_message = message.parent_message
-        conversation = Message.objects.filter(
-            Q(id=root_message.id) | Q(parent_message=root_message)
-        ).select_related('sender', 'sender__profile', 'recipient', 'recipient__profile').order_by('created_at')
+    # 獲取對話串
+    if message.thread_id:
+        conversation = message.thread.messages.select_related(
+            'sender', 'sender__profile', 'recipient', 'recipient__profile'
+        ).order_by('created_at', 'id')
     else:
-        # 這是原始訊息，獲取所有回覆
         conversation = Message.objects.filter(
             Q(id=message.id) | Q(parent_message=message)
         ).select_related('sender', 'sender__profile', 'recipient', 'recipient__profile').order_by('created_at')
@@ -1801,8 +1836,10 @@ def message_delete(request, message_id):
         sender = message.sender.username
         recipient = message.recipient.username
 
-        # 硬刪除
+        # 硬刪除，並更新對話串摘要
+        thread_id = message.thread_id
         message.delete()
+        MessageThread.refresh([thread_id])
 
         return JsonResponse({
             'success': True,
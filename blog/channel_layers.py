@@ -0,0 +1,691 @@
+"""
+資料庫 Channel Layer
+使用現有的資料庫讓多個 Daphne 行程共用群組，不需要 Redis：
+- 群組成員存放在 ChannelGroupMembership（含到期時間），行程定期延長自己 channel 的到期時間，
+  行程結束後其成員在 group_expiry 秒內過期並被清理
+- PostgreSQL：以 LISTEN/NOTIFY 將訊息投遞到目標行程
+- 其他資料庫（SQLite 開發環境）：各行程輪詢 ChannelLayerMessage 中自己的收件匣
+
+每個行程有一個收件匣（client_id），new_channel() 建立的 channel 名稱都帶有該 client_id，
+group_send 依收件匣分組，每個行程只需要一則 NOTIFY / 一筆資料列，再由該行程分送給本地 channel。
+
+InstrumentedChannelLayer 可包裝任一 Channel Layer，記錄群組、佇列與延遲等監控指標。
+"""
+import asyncio
+import json
+import logging
+import random
+import string
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
+from datetime import timedelta
+
+from channels.db import database_sync_to_async
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, connections
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from blog.utils.channel_layer_metrics import ChannelLayerMetrics
+
+logger = logging.getLogger(__name__)
+
+# PostgreSQL NOTIFY 的 payload 上限為 8000 bytes，超過時改寫入資料表再通知編號
+NOTIFY_PAYLOAD_LIMIT = 7900
+
+# 輪詢時每次最多取出的訊息數
+POLL_BATCH_SIZE = 500
+
+
+class ChannelQueue:
+    """
+    本地 channel 的訊息佇列
+
+    以 deque 保存 (到期時間, 訊息)，依放入順序排列，因此過期訊息一定在開頭；
+    receive() 透過 asyncio.Event 等待新訊息
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.items = deque()
+        self.waiting = 0
+        self._ready = asyncio.Event()
+
+    def qsize(self):
+        return len(self.items)
+
+    def empty(self):
+        return not self.items
+
+    def full(self):
+        return len(self.items) >= self.capacity
+
+    def put(self, item):
+        """
+        放入訊息
+
+        Returns:
+            bool: False 表示佇列已滿，訊息未放入
+        """
+        if self.full():
+            return False
+        self.items.append(item)
+        self._ready.set()
+        return True
+
+    async def get(self):
+        """取出下一則訊息，佇列為空時等待"""
+        self.waiting += 1
+        try:
+            while not self.items:
+                self._ready.clear()
+                await self._ready.wait()
+            return self.items.popleft()
+        finally:
+            self.waiting -= 1
+
+    def pop_expired(self, now):
+        """
+        移除開頭已過期的訊息
+
+        Returns:
+            int: 移除的訊息數
+        """
+        expired = 0
+        while self.items and self.items[0][0] < now:
+            self.items.popleft()
+            expired += 1
+        return expired
+
+
+
+class DatabaseChannelLayer(BaseChannelLayer):
+    """
+    以資料庫實作的 Channel Layer
+
+    只支援 new_channel() 建立的行程專屬 channel（WebSocket consumer 使用的就是這種 channel），
+    不支援給 runworker 使用的一般 channel。
+
+    CONFIG:
+        expiry: 訊息未被接收的保留秒數
+        group_expiry: 群組成員未延長時的保留秒數
+        heartbeat_interval: 延長本行程群組成員到期時間的間隔秒數（預設為 group_expiry 的三分之一）
+        capacity: 每個 channel 的佇列上限
+        database: 使用的資料庫別名
+        poll_interval: 輪詢模式下收件匣為空時的等待秒數
+        cleanup_interval: 清理過期群組成員與訊息的間隔秒數
+    """
+
+    extensions = ['groups', 'flush']
+
+    def __init__(
+        self,
+        expiry=60,
+        group_expiry=300,
+        heartbeat_interval=None,
+        capacity=100,
+        channel_capacity=None,
+        database='default',
+        poll_interval=0.05,
+        cleanup_interval=60,
+        **kwargs
+    ):
+        super().__init__(expiry=expiry, capacity=capacity, **kwargs)
+        self.channel_capacity = self.compile_capacities(channel_capacity or {})
+        self.group_expiry = group_expiry
+        self.heartbeat_interval = heartbeat_interval or group_expiry / 3
+        self.database = database
+        self.poll_interval = poll_interval
+        self.cleanup_interval = cleanup_interval
+
+        # 本行程的收件匣
+        self.client_id = uuid.uuid4().hex[:12]
+        self.channels = {}
+
+        self._loop = None
+        self._listener = None
+        self._wakeup = None
+        self._pg_connection = None
+        # 訊息被丟棄時的回呼 on_drop(channel, reason, count)，由 InstrumentedChannelLayer 設定
+        self.on_drop = None
+        # 監聽與輪詢使用獨立的資料庫連線，不佔用處理請求的執行緒
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='channel-layer')
+
+    @property
+    def use_notify(self):
+        """是否使用 PostgreSQL LISTEN/NOTIFY"""
+        return connections[self.database].vendor == 'postgresql'
+
+    # Channel 名稱與收件匣
+
+    def _client_of(self, channel):
+        """取得 channel 所屬行程的收件匣"""
+        return self.non_local_name(channel)[:-1].rsplit('.', 1)[-1]
+
+    @staticmethod
+    def _notify_channel(client_id):
+        """收件匣對應的 PostgreSQL NOTIFY channel"""
+        return f'channel_layer_{client_id}'
+
+    def _require_specific_channel(self, channel):
+        if '!' not in channel:
+            raise NotImplementedError('DatabaseChannelLayer 只支援 new_channel() 建立的 channel')
+
+    # Channel layer API
+
+    async def new_channel(self, prefix='specific'):
+        """建立屬於本行程的 channel"""
+        suffix = ''.join(random.choice(string.ascii_letters) for _ in range(12))
+        return f'{prefix}.{self.client_id}!{suffix}'
+
+    async def send(self, channel, message):
+        """發送訊息到單一 channel（可能在其他行程）"""
+        assert isinstance(message, dict), 'message is not a dict'
+        self.require_valid_channel_name(channel)
+        self._require_specific_channel(channel)
+
+        client_id = self._client_of(channel)
+        if client_id == self.client_id:
+            self._deliver_local(channel, message, raise_full=True)
+        else:
+            await database_sync_to_async(self._publish)({client_id: [channel]}, message)
+
+    async def receive(self, channel):
+        """接收本行程 channel 的下一則訊息"""
+        self.require_valid_channel_name(channel)
+        self._require_specific_channel(channel)
+        if self._client_of(channel) != self.client_id:
+            raise ValueError(f'Channel {channel} 不屬於此行程')
+
+        self._ensure_listener()
+        self._clean_expired()
+
+        queue = self._queue_for(channel)
+        try:
+            while True:
+                expires, message = await queue.get()
+                if expires >= time.time():
+                    return message
+                self._record_drop(channel, 'expired')
+        finally:
+            if queue.empty() and not queue.waiting:
+                self.channels.pop(channel, None)
+
+    # Groups extension
+
+    async def group_add(self, group, channel):
+        """將 channel 加入群組（重複加入會延長到期時間）"""
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        self._ensure_listener()
+        await database_sync_to_async(self._group_add)(group, channel)
+
+    async def group_discard(self, group, channel):
+        """將 channel 移出群組"""
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        await database_sync_to_async(self._group_discard)(group, channel)
+
+    async def group_send(self, group, message):
+        """
+        發送訊息給群組中所有 channel
+
+        本行程的 channel 直接放入佇列，其他行程依收件匣合併為一則投遞
+        """
+        assert isinstance(message, dict), 'message is not a dict'
+        self.require_valid_group_name(group)
+
+        remote = {}
+        for channel in await database_sync_to_async(self._group_channels)(group):
+            client_id = self._client_of(channel)
+            if client_id == self.client_id:
+                self._deliver_local(channel, message)
+            else:
+                remote.setdefault(client_id, []).append(channel)
+
+        if remote:
+            await database_sync_to_async(self._publish)(remote, message)
+
+    # Flush extension
+
+    async def flush(self):
+        """清除所有群組成員、待投遞訊息與本地佇列"""
+        await database_sync_to_async(self._flush)()
+        self.channels = {}
+
+    async def close(self):
+        """停止監聽並關閉監聽連線"""
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        self._close_notify()
+
+    # 本地投遞
+
+    def _deliver_local(self, channel, message, raise_full=False):
+        """
+        放入本行程的 channel 佇列
+
+        從其他 event loop 呼叫時（例如同步 view 中的 async_to_sync），
+        改由監聽的 event loop 執行，避免跨執行緒操作佇列
+        """
+        item = (time.time() + self.expiry, deepcopy(message))
+
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+
+        if self._loop is not None and running_loop is not self._loop and self._loop.is_running():
+            self._loop.call_soon_threadsafe(self._put_local, channel, item)
+        else:
+            self._put_local(channel, item, raise_full=raise_full)
+
+    def _queue_for(self, channel):
+        queue = self.channels.get(channel)
+        if queue is None:
+            queue = self.channels[channel] = ChannelQueue(self.get_capacity(channel))
+        return queue
+
+    def _put_local(self, channel, item, raise_full=False):
+        if not self._queue_for(channel).put(item):
+            if raise_full:
+                raise ChannelFull(channel)
+            self._record_drop(channel, 'full')
+            logger.debug(f'Channel {channel} is full, message dropped')
+
+    def _record_drop(self, channel, reason, count=1):
+        if self.on_drop is not None:
+            self.on_drop(channel, reason, count)
+
+    def _dispatch(self, payload):
+        """將其他行程投遞的訊息分送給本地 channel"""
+        data = json.loads(payload)
+        if data['expires'] < time.time():
+            for channel in data['channels']:
+                self._record_drop(channel, 'expired')
+            return
+        for channel in data['channels']:
+            self._put_local(channel, (data['expires'], deepcopy(data['message'])))
+
+    def _clean_expired(self):
+        """移除本地佇列中已過期的訊息"""
+        now = time.time()
+        for channel, queue in list(self.channels.items()):
+            expired = queue.pop_expired(now)
+            if expired:
+                self._record_drop(channel, 'expired', expired)
+            # 仍有 receive() 等待中的佇列必須保留，否則之後的訊息會放進新的佇列
+            if queue.empty() and not queue.waiting:
+                self.channels.pop(channel, None)
+
+    # 監聽
+
+    def _ensure_listener(self):
+        """在目前的 event loop 啟動監聽工作"""
+        if self._listener is None or self._listener.done():
+            self._loop = asyncio.get_running_loop()
+            self._wakeup = asyncio.Event()
+            self._listener = self._loop.create_task(self._listen())
+
+    async def _listen(self):
+        """
+        監聽本行程的收件匣
+
+        PostgreSQL 由 add_reader 在收到 NOTIFY 時立即分送，此迴圈只負責重新連線與定期清理；
+        其他資料庫則以 poll_interval 輪詢收件匣
+        """
+        loop = asyncio.get_running_loop()
+        notify = self.use_notify
+        last_cleanup = 0
+        last_heartbeat = time.monotonic()
+
+        while True:
+            try:
+                if notify and self._pg_connection is None:
+                    notify = await self._start_notify(loop)
+
+                payloads = []
+                if not notify:
+                    payloads = await loop.run_in_executor(self._executor, self._take_messages)
+                    for payload in payloads:
+                        self._dispatch(payload)
+
+                if time.monotonic() - last_heartbeat >= self.heartbeat_interval:
+                    await loop.run_in_executor(self._executor, self._heartbeat)
+                    last_heartbeat = time.monotonic()
+
+                if time.monotonic() - last_cleanup >= self.cleanup_interval:
+                    await loop.run_in_executor(self._executor, self._cleanup)
+                    self._clean_expired()
+                    last_cleanup = time.monotonic()
+
+                if notify:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(
+                            self._wakeup.wait(),
+                            timeout=min(self.cleanup_interval, self.heartbeat_interval)
+                        )
+                    except asyncio.TimeoutError:
+                        pass
+                elif len(payloads) < POLL_BATCH_SIZE:
+                    # 收件匣已取完才等待，否則立即取下一批
+                    await asyncio.sleep(self.poll_interval)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f'Channel layer listener error: {e}')
+                self._close_notify()
+                await asyncio.sleep(1)
+
+    async def _start_notify(self, loop):
+        """
+        建立 LISTEN 連線並註冊到 event loop
+
+        Returns:
+            bool: False 表示資料庫驅動不支援非同步通知，改用輪詢
+        """
+        conn = await loop.run_in_executor(self._executor, self._connect_listener)
+        if conn is None:
+            return False
+
+        loop.add_reader(conn.fileno(), self._on_notify, conn)
+        self._pg_connection = conn
+        # 監聽建立前寫入資料表的大型訊息
+        for payload in await loop.run_in_executor(self._executor, self._take_messages):
+            self._dispatch(payload)
+        return True
+
+    def _connect_listener(self):
+        """建立專用的 PostgreSQL 連線並 LISTEN 本行程的收件匣"""
+        wrapper = connections[self.database]
+        conn = wrapper.get_new_connection(wrapper.get_connection_params())
+
+        # 非同步通知使用 psycopg2 的 poll() / notifies API
+        if not isinstance(getattr(conn, 'notifies', None), list):
+            logger.warning('Database driver does not support psycopg2-style notifies, falling back to polling')
+            conn.close()
+            return None
+
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute(f'LISTEN {self._notify_channel(self.client_id)}')
+        return conn
+
+    def _on_notify(self, conn):
+        """LISTEN 連線可讀時由 event loop 呼叫"""
+        try:
+            conn.poll()
+        except Exception as e:
+            logger.warning(f'Channel layer LISTEN connection lost: {e}')
+            self._close_notify()
+            self._wakeup.set()
+            return
+
+        while conn.notifies:
+            notify = conn.notifies.pop(0)
+            data = json.loads(notify.payload)
+            if 'ref' in data:
+                self._loop.create_task(self._fetch_stored(data['ref']))
+            else:
+                self._dispatch(notify.payload)
+
+    async def _fetch_stored(self, message_id):
+        """取出超過 NOTIFY 長度上限、改存於資料表的訊息"""
+        loop = asyncio.get_running_loop()
+        for payload in await loop.run_in_executor(self._executor, self._take_messages, [message_id]):
+            self._dispatch(payload)
+
+    def _close_notify(self):
+        conn, self._pg_connection = self._pg_connection, None
+        if conn is None:
+            return
+        try:
+            if self._loop is not None:
+                self._loop.remove_reader(conn.fileno())
+            conn.close()
+        except Exception:
+            pass
+
+    # 資料庫操作（同步，於執行緒中執行）
+
+    def _group_add(self, group, channel):
+        from blog.models import ChannelGroupMembership
+
+        ChannelGroupMembership.objects.using(self.database).bulk_create(
+            [ChannelGroupMembership(
+                group=group,
+                channel=channel,
+                expires_at=timezone.now() + timedelta(seconds=self.group_expiry),
+            )],
+            update_conflicts=True,
+            unique_fields=['group', 'channel'],
+            update_fields=['expires_at'],
+        )
+
+    def _heartbeat(self):
+        """延長本行程所有 channel 的群組成員到期時間（一個 UPDATE）"""
+        from blog.models import ChannelGroupMembership
+
+        ChannelGroupMembership.objects.using(self.database).filter(
+            channel__contains=f'.{self.client_id}!'
+        ).update(expires_at=timezone.now() + timedelta(seconds=self.group_expiry))
+
+    def _group_discard(self, group, channel):
+        from blog.models import ChannelGroupMembership
+
+        ChannelGroupMembership.objects.using(self.database).filter(group=group, channel=channel).delete()
+
+    def _group_channels(self, group):
+        from blog.models import ChannelGroupMembership
+
+        return list(ChannelGroupMembership.objects.using(self.database).filter(
+            group=group,
+            expires_at__gt=timezone.now(),
+        ).values_list('channel', flat=True))
+
+    def _publish(self, targets, message):
+        """
+        投遞訊息到其他行程
+
+        Args:
+            targets: {收件匣: [channel, ...]}
+            message: 訊息內容
+        """
+        from blog.models import ChannelLayerMessage
+
+        expires = time.time() + self.expiry
+        expires_at = timezone.now() + timedelta(seconds=self.expiry)
+        use_notify = self.use_notify
+
+        notifies = []
+        rows = []
+        for client_id, channels in targets.items():
+            payload = json.dumps(
+                {'channels': channels, 'message': message, 'expires': expires},
+                cls=DjangoJSONEncoder,
+            )
+            if use_notify and len(payload.encode('utf-8')) <= NOTIFY_PAYLOAD_LIMIT:
+                notifies.append((self._notify_channel(client_id), payload))
+            else:
+                rows.append(ChannelLayerMessage(inbox=client_id, payload=payload, expires_at=expires_at))
+
+        if rows:
+            created = ChannelLayerMessage.objects.using(self.database).bulk_create(rows)
+            if use_notify:
+                notifies.extend(
+                    (self._notify_channel(row.inbox), json.dumps({'ref': row.id}))
+                    for row in created
+                )
+
+        if notifies:
+            # 一次往返送出所有 NOTIFY
+            with connections[self.database].cursor() as cursor:
+                cursor.execute(
+                    'SELECT pg_notify(c, p) FROM unnest(%s::text[], %s::text[]) AS t(c, p)',
+                    [[channel for channel, _ in notifies], [payload for _, payload in notifies]],
+                )
+
+    def _take_messages(self, ids=None):
+        """取出並刪除本行程收件匣中的訊息"""
+        from blog.models import ChannelLayerMessage
+
+        queryset = ChannelLayerMessage.objects.using(self.database).filter(inbox=self.client_id)
+        if ids is not None:
+            queryset = queryset.filter(id__in=ids)
+
+        rows = list(queryset.order_by('id').values_list('id', 'payload')[:POLL_BATCH_SIZE])
+        if rows:
+            ChannelLayerMessage.objects.using(self.database).filter(id__in=[row[0] for row in rows]).delete()
+        return [payload for _, payload in rows]
+
+    def _cleanup(self):
+        """刪除過期的群組成員與訊息（例如已結束行程留下的資料）"""
+        from blog.models import ChannelGroupMembership, ChannelLayerMessage
+
+        now = timezone.now()
+        ChannelGroupMembership.objects.using(self.database).filter(expires_at__lt=now).delete()
+        ChannelLayerMessage.objects.using(self.database).filter(expires_at__lt=now).delete()
+        close_old_connections()
+
+    def _flush(self):
+        from blog.models import ChannelGroupMembership, ChannelLayerMessage
+
+        ChannelGroupMembership.objects.using(self.database).all().delete()
+        ChannelLayerMessage.objects.using(self.database).all().delete()
+
+
+class InstrumentedChannelLayer:
+    """
+    記錄監控指標的 Channel Layer 包裝
+
+    包裝任一 Channel Layer（DatabaseChannelLayer、InMemoryChannelLayer 等），記錄：
+    群組成員數、各類群組的 group_send 速率、send / group_send 延遲直方圖、
+    各 channel 的佇列長度，以及因佇列已滿或過期而被丟棄的訊息數
+
+    CONFIG:
+        backend: 實際使用的 Channel Layer 類別路徑
+        config: 傳給實際 Channel Layer 的 CONFIG
+    """
+
+    def __init__(self, backend='blog.channel_layers.DatabaseChannelLayer', config=None):
+        self.layer = import_string(backend)(**(config or {}))
+        self.metrics = ChannelLayerMetrics(backend.rsplit('.', 1)[-1])
+
+        # DatabaseChannelLayer 會在丟棄訊息時回呼；其他 layer 由本類別在呼叫前估計
+        self._reports_drops = hasattr(self.layer, 'on_drop')
+        if self._reports_drops:
+            self.layer.on_drop = self.metrics.record_drop
+        # 其他 layer 由本類別記錄每個本地 channel 中訊息的到期時間（依放入順序），用來估計過期數
+        self._expires = {}
+
+    def __getattr__(self, name):
+        return getattr(self.layer, name)
+
+    @property
+    def extensions(self):
+        return self.layer.extensions
+
+    async def new_channel(self, *args, **kwargs):
+        return await self.layer.new_channel(*args, **kwargs)
+
+    async def send(self, channel, message):
+        started = time.perf_counter()
+        try:
+            await self.layer.send(channel, message)
+            self._track(channel)
+        except ChannelFull:
+            if not self._reports_drops:
+                self.metrics.record_drop(channel, 'full')
+            raise
+        finally:
+            self.metrics.record_send(time.perf_counter() - started)
+
+    async def receive(self, channel):
+        self._count_expired()
+        message = await self.layer.receive(channel)
+        self._untrack(channel)
+        self.metrics.record_receive()
+        return message
+
+    async def group_add(self, group, channel):
+        await self.layer.group_add(group, channel)
+        self.metrics.record_group_add(group, channel)
+
+    async def group_discard(self, group, channel):
+        await self.layer.group_discard(group, channel)
+        self.metrics.record_group_discard(group, channel)
+
+    async def group_send(self, group, message):
+        self._count_expired()
+        delivered = []
+        if not self._reports_drops:
+            # InMemoryChannelLayer 會直接略過已滿的 channel，先統計本行程中將被略過的數量
+            for channel in self.metrics.group_channels(group):
+                queue = self._local_queues().get(channel)
+                if queue is not None and queue.full():
+                    self.metrics.record_drop(channel, 'full')
+                else:
+                    delivered.append(channel)
+
+        started = time.perf_counter()
+        try:
+            await self.layer.group_send(group, message)
+            for channel in delivered:
+                self._track(channel)
+        finally:
+            self.metrics.record_group_send(group, time.perf_counter() - started)
+
+    async def flush(self):
+        await self.layer.flush()
+        self._expires = {}
+
+    async def close(self):
+        if hasattr(self.layer, 'close'):
+            await self.layer.close()
+
+    def _local_queues(self):
+        return getattr(self.layer, 'channels', None) or {}
+
+    def _track(self, channel):
+        """記錄剛放入本地 channel 的訊息到期時間（僅不支援 on_drop 的 layer）"""
+        if not self._reports_drops:
+            self._expires.setdefault(channel, deque()).append(time.time() + self.layer.expiry)
+
+    def _untrack(self, channel):
+        """receive() 取出一則訊息後移除對應的到期時間"""
+        expires = self._expires.get(channel)
+        if expires:
+            expires.popleft()
+        if not expires:
+            self._expires.pop(channel, None)
+
+    def _count_expired(self):
+        """
+        統計即將被清除的過期訊息（僅不支援 on_drop 的 layer）
+
+        到期時間依放入順序排列，只需檢查每個 channel 的開頭
+        """
+        if self._reports_drops:
+            return
+        now = time.time()
+        for channel, expires in list(self._expires.items()):
+            expired = 0
+            while expires and expires[0] < now:
+                expires.popleft()
+                expired += 1
+            if not expires:
+                self._expires.pop(channel, None)
+            if expired:
+                self.metrics.record_drop(channel, 'expired', expired)
+
+    def get_metrics(self):
+        """目前行程的指標快照"""
+        queues = {channel: queue.qsize() for channel, queue in list(self._local_queues().items())}
+        return self.metrics.snapshot(queues=queues)
@@ -2,14 +2,24 @@
 WebSocket consumers for real-time notifications and chat
 """
 
+import asyncio
 import json
+from urllib.parse import parse_qs
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db.models import Q
 
+from .utils.chat_write_queue import get_chat_write_queue
+from .utils.notification_snapshot import get_missed_notifications, get_snapshot_json
+from .utils.presence import get_presence_registry
+
 User = get_user_model()
 
+# 每頁聊天記錄的上限（避免客戶端要求過大的頁面）
+MAX_CHAT_HISTORY_PAGE_SIZE = 100
+
 
 class NotificationConsumer(AsyncWebsocketConsumer):
     """
@@ -38,9 +48,19 @@ class NotificationConsumer(AsyncWebsocketConsumer):
 
         await self.accept()
 
-        # Send initial notification count
-        initial_data = await self.get_initial_data()
-        await self.send(text_data=json.dumps(initial_data))
+        # Mark the user as online (written to the shared cache in batches)
+        registry = get_presence_registry()
+        registry.connect(self.user.id)
+        registry.schedule_sync()
+
+        # Send initial notification count (cached, pre-serialized snapshot)
+        await self.send(text_data=await self.get_initial_data())
+
+        # Resume: send notifications missed since the client's last seen id
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        since_id = self.parse_since_id(query.get('since_id', [None])[0])
+        if since_id is not None:
+            await self.send_missed_notifications(since_id)
 
     async def disconnect(self, close_code):
         """
@@ -52,6 +72,9 @@ class NotificationConsumer(AsyncWebsocketConsumer):
                 self.group_name,
                 self.channel_name
             )
+            registry = get_presence_registry()
+            registry.disconnect(self.user.id)
+            registry.schedule_sync()
 
     async def receive(self, text_data):
         """
@@ -62,14 +85,22 @@ class NotificationConsumer(AsyncWebsocketConsumer):
             action = data.get('action')
 
             if action == 'ping':
+                # Heartbeat keeps the user's presence alive
+                registry = get_presence_registry()
+                registry.heartbeat(self.user.id)
+                registry.schedule_sync()
+
                 # Respond to ping to keep connection alive
                 await self.send(text_data=json.dumps({
                     'type': 'pong'
                 }))
             elif action == 'refresh':
                 # Send updated notification count
-                initial_data = await self.get_initial_data()
-                await self.send(text_data=json.dumps(initial_data))
+                await self.send(text_data=await self.get_initial_data())
+
+                since_id = self.parse_since_id(data.get('since_id'))
+                if since_id is not None:
+                    await self.send_missed_notifications(since_id)
         except json.JSONDecodeError:
             pass
 
@@ -94,42 +125,28 @@ class NotificationConsumer(AsyncWebsocketConsumer):
             'unread_messages_count': event.get('unread_messages_count', 0)
         }))
 
+    @staticmethod
+    def parse_since_id(value):
+        """解析 since_id（無效時回傳 None）"""
+        try:
+            since_id = int(value)
+        except (TypeError, ValueError):
+            return None
+        return since_id if since_id > 0 else None
+
+    async def send_missed_notifications(self, since_id):
+        """補送 since_id 之後錯過的通知"""
+        missed = await database_sync_to_async(get_missed_notifications)(self.user.id, since_id)
+        if missed['notifications']:
+            await self.send(text_data=json.dumps(missed))
+
     @database_sync_to_async
     def get_initial_data(self):
         """
         Get initial notification and message counts
+        回傳快取的通知快照（已序列化的 JSON 字串）
         """
-        from .models import Notification, Message
-
-        unread_notifications = Notification.objects.filter(
-            user=self.user,
-            is_read=False
-        ).count()
-
-        unread_messages = Message.objects.filter(
-            recipient=self.user,
-            is_read=False
-        ).count()
-
-        # Get recent notifications
-        recent_notifications = list(
-            Notification.objects.filter(
-                user=self.user
-            ).order_by('-created_at')[:5].values(
-                'id', 'message', 'notification_type', 'is_read', 'created_at'
-            )
-        )
-
-        # Convert datetime to string
-        for notif in recent_notifications:
-            notif['created_at'] = notif['created_at'].isoformat()
-
-        return {
-            'type': 'initial',
-            'unread_count': unread_notifications,
-            'unread_messages_count': unread_messages,
-            'recent_notifications': recent_notifications
-        }
+        return get_snapshot_json(self.user.id)
 
 
 class ChatConsumer(AsyncWebsocketConsumer):
@@ -166,16 +183,21 @@ class ChatConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
 
+        # 打字狀態：只在狀態改變時廣播，逾時未更新自動視為停止
+        self.is_typing = False
+        self.typing_expiry = None
+        self.typing_tasks = set()
+
         await self.accept()
 
         # Mark all unread messages from other user as read
         await self.mark_messages_as_read()
 
-        # Send chat history
+        # Send the newest page of chat history
         history = await self.get_chat_history()
         await self.send(text_data=json.dumps({
             'type': 'chat_history',
-            'messages': history
+            **history
         }))
 
     async def disconnect(self, close_code):
@@ -183,6 +205,10 @@ class ChatConsumer(AsyncWebsocketConsumer):
         Leave chat room
         """
         if hasattr(self, 'room_group_name'):
+            # 斷線時若仍顯示為打字中，通知對方停止
+            if getattr(self, 'is_typing', False):
+                await self.set_typing(False)
+
             await self.channel_layer.group_discard(
                 self.room_group_name,
                 self.channel_name
@@ -197,8 +223,14 @@ class ChatConsumer(AsyncWebsocketConsumer):
             message_type = data.get('type')
 
             if message_type == 'chat_message':
-                # Save message to database
-                message_obj = await self.save_message(data.get('message'))
+                content = data.get('message')
+                if not isinstance(content, str) or not content.strip():
+                    return
+
+                # Queue the message for a batched write; id and timestamp are assigned immediately
+                message_obj = await get_chat_write_queue().submit(
+                    self.user, self.other_user, content, reply_group=self.room_group_name
+                )
 
                 # Broadcast to room group
                 await self.channel_layer.group_send(
@@ -214,23 +246,64 @@ class ChatConsumer(AsyncWebsocketConsumer):
                     }
                 )
 
-                # Send notification to other user
-                await self.send_chat_notification(message_obj)
+                # 送出訊息即結束打字狀態
+                await self.set_typing(False)
+
+            elif message_type == 'load_history':
+                # Load an older page of history before the given message id
+                try:
+                    before_id = int(data.get('before_id'))
+                except (TypeError, ValueError):
+                    return
+
+                history = await self.get_chat_history(before_id=before_id)
+                await self.send(text_data=json.dumps({
+                    'type': 'chat_history_page',
+                    **history
+                }))
 
             elif message_type == 'typing':
-                # Broadcast typing indicator
-                await self.channel_layer.group_send(
-                    self.room_group_name,
-                    {
-                        'type': 'typing_indicator',
-                        'username': self.user.username,
-                        'is_typing': data.get('is_typing', False)
-                    }
-                )
+                # Broadcast typing indicator (only on state changes)
+                await self.set_typing(bool(data.get('is_typing', False)))
 
         except json.JSONDecodeError:
             pass
 
+    async def set_typing(self, is_typing):
+        """
+        更新打字狀態，只在狀態改變時 group_send
+
+        打字中的重複 frame 只延長自動逾時（CHAT_TYPING_TIMEOUT 秒），不會送到 channel layer；
+        客戶端沒有送出停止（例如直接關閉分頁）時，逾時後自動廣播停止
+        """
+        if self.typing_expiry is not None:
+            self.typing_expiry.cancel()
+            self.typing_expiry = None
+
+        if is_typing:
+            timeout = getattr(settings, 'CHAT_TYPING_TIMEOUT', 6)
+            self.typing_expiry = asyncio.get_running_loop().call_later(timeout, self._expire_typing)
+
+        if is_typing == self.is_typing:
+            return
+
+        self.is_typing = is_typing
+        await self.channel_layer.group_send(
+            self.room_group_name,
+            {
+                'type': 'typing_indicator',
+                'username': self.user.username,
+                'is_typing': is_typing
+            }
+        )
+
+    def _expire_typing(self):
+        """打字狀態逾時"""
+        self.typing_expiry = None
+        task = asyncio.ensure_future(self.set_typing(False))
+        self.typing_tasks.add(task)
+        task.add_done_callback(self.typing_tasks.discard)
+
     async def chat_message(self, event):
         """
         Receive message from room group and send to WebSocket
@@ -248,6 +321,16 @@ class ChatConsumer(AsyncWebsocketConsumer):
             'message': message
         }))
 
+    async def chat_message_failed(self, event):
+        """
+        訊息最終未能儲存時只通知發送者
+        """
+        if event['sender_id'] == self.user.id:
+            await self.send(text_data=json.dumps({
+                'type': 'message_failed',
+                'message': event['message']
+            }))
+
     async def typing_indicator(self, event):
         """
         Receive typing indicator from room group
@@ -274,73 +357,75 @@ class ChatConsumer(AsyncWebsocketConsumer):
         """
         Mark all unread messages from other user as read
         """
-        from .models import ChatMessage
-        from django.utils import timezone
+        from .models import ChatRoom
 
-        ChatMessage.objects.filter(
-            sender=self.other_user,
-            recipient=self.user,
-            is_read=False
-        ).update(is_read=True, read_at=timezone.now())
+        # 同時歸零對話摘要中自己這一側的未讀數
+        ChatRoom.mark_read(self.user, self.other_user)
 
     @database_sync_to_async
-    def get_chat_history(self):
+    def get_chat_history(self, before_id=None):
         """
-        Get recent chat history between two users
+        Get a page of chat history between two users (newest page first)
         使用 ChatMessage 模型（即時聊天專用，與 Message 私人訊息分離）
-        """
-        from .models import ChatMessage
-
-        messages = ChatMessage.objects.filter(
-            Q(sender=self.user, recipient=self.other_user) |
-            Q(sender=self.other_user, recipient=self.user)
-        ).order_by('created_at')[:50]
 
-        history = []
-        for msg in messages:
-            history.append({
-                'id': msg.id,
-                'sender': 'me' if msg.sender == self.user else 'other',
-                'content': msg.content,
-                'timestamp': msg.created_at.isoformat()
-            })
+        以 keyset 分頁：兩個方向（我→對方、對方→我）分別查詢，
+        各自走 (sender, recipient, -created_at) 索引只讀取一頁的資料列，再於記憶體合併
 
-        return history
+        Args:
+            before_id: 只取此訊息之前的記錄（None 表示最新一頁）
 
-    @database_sync_to_async
-    def save_message(self, content):
-        """
-        Save chat message to database
-        使用 ChatMessage 模型（即時聊天專用，與 Message 私人訊息分離）
+        Returns:
+            dict: {'messages': 由舊到新的訊息, 'has_more': 是否有更早的訊息, 'next_before_id': 下一頁游標}
         """
         from .models import ChatMessage
 
-        message = ChatMessage.objects.create(
-            sender=self.user,
-            recipient=self.other_user,
-            content=content
-        )
+        page_size = min(getattr(settings, 'CHAT_HISTORY_PAGE_SIZE', 50), MAX_CHAT_HISTORY_PAGE_SIZE)
+        empty_page = {'messages': [], 'has_more': False, 'next_before_id': None}
+
+        directions = [(self.user.id, self.other_user.id)]
+        if self.other_user.id != self.user.id:
+            directions.append((self.other_user.id, self.user.id))
+
+        keyset = Q()
+        if before_id is not None:
+            # 游標必須屬於這段對話
+            cursor = ChatMessage.objects.filter(
+                Q(sender=self.user, recipient=self.other_user) |
+                Q(sender=self.other_user, recipient=self.user),
+                pk=before_id
+            ).values('id', 'created_at').first()
+            if cursor is None:
+                return empty_page
+            keyset = Q(created_at__lt=cursor['created_at']) | Q(created_at=cursor['created_at'], id__lt=cursor['id'])
+
+        rows = []
+        for sender_id, recipient_id in directions:
+            rows.extend(ChatMessage.objects.filter(
+                keyset,
+                sender_id=sender_id,
+                recipient_id=recipient_id
+            ).order_by('-created_at', '-id').values('id', 'sender_id', 'content', 'created_at')[:page_size + 1])
+
+        if not rows:
+            return empty_page
+
+        rows.sort(key=lambda row: (row['created_at'], row['id']), reverse=True)
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        rows.reverse()
+
+        messages = [
+            {
+                'id': row['id'],
+                'sender': 'me' if row['sender_id'] == self.user.id else 'other',
+                'content': row['content'],
+                'timestamp': row['created_at'].isoformat()
+            }
+            for row in rows
+        ]
 
         return {
-            'id': message.id,
-            'content': message.content,
-            'timestamp': message.created_at.isoformat()
+            'messages': messages,
+            'has_more': has_more,
+            'next_before_id': messages[0]['id'] if has_more else None,
         }
-
-    @database_sync_to_async
-    def send_chat_notification(self, message_obj):
-        """
-        Send notification to other user about new chat message
-        使用特殊的 link 格式讓前端知道這是即時聊天通知
-        """
-        from .utils.notifications import create_notification
-
-        # Get display name (first_name or username)
-        display_name = self.user.first_name if self.user.first_name else self.user.username
-
-        create_notification(
-            user=self.other_user,
-            notification_type='message',
-            message=f'{display_name} 向您發送了即時訊息',
-            link=f'/blog/member/{self.user.username}/'  # 連結到發送者的個人頁面
-        )
@@ -4,7 +4,7 @@
 """
 from django.conf import settings
 from .version import get_version_info
-from .models import Message
+from .models import MessageThread
 
 
 def user_display_name(request):
@@ -36,11 +36,8 @@ def unread_messages(request):
     提供未讀訊息數量
     """
     if request.user.is_authenticated:
-        unread_count = Message.objects.filter(
-            recipient=request.user,
-            is_read=False,
-            recipient_deleted=False
-        ).count()
+        # 加總對話串上的未讀計數，不掃描訊息
+        unread_count = MessageThread.unread_total(request.user)
     else:
         unread_count = 0
 
@@ -5,7 +5,7 @@ from django import forms
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib.auth.models import User
 from django.core.validators import RegexValidator
-from ..models import UserProfile, Skill
+from ..models import AchievementEvent, UserProfile, Skill
 
 
 class CustomAuthenticationForm(AuthenticationForm):
@@ -185,10 +185,15 @@ class UserProfileForm(forms.ModelForm):
             if commit:
                 self.user.save()
         if commit:
+            # 個人資料欄位改變時由 post_save signal 加入成就事件，只修改姓名、Email 或技能時在這裡加入
+            profile_changed = bool(profile.changed_completeness_fields())
             profile.save()
             # 處理技能標籤
             if self.user:
                 self._save_skills()
+                if not profile_changed and {'first_name', 'email', 'skills'} & set(self.changed_data):
+                    from ..utils.achievement_events import emit_achievement_event
+                    emit_achievement_event(self.user.id, AchievementEvent.EVENT_PROFILE)
         return profile
 
     def _save_skills(self):
@@ -0,0 +1,43 @@
+"""
+管理命令：將既有的已發布文章補寫到追蹤者的時間軸
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from blog.models import Article
+from blog.utils.timeline import fan_out_article, get_pull_author_ids
+
+
+class Command(BaseCommand):
+    help = '將最近發布的文章寫入作者追蹤者的時間軸（首次部署或時間軸遺漏時使用，已存在的項目會略過）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=30,
+            help='補寫最近幾天發布的文章',
+        )
+
+    def handle(self, *args, **options):
+        """執行命令"""
+        since = timezone.now() - timedelta(days=options['days'])
+        articles = Article.objects.filter(
+            status='published',
+            author__isnull=False,
+            created_at__gte=since
+        ).order_by('created_at', 'id')
+
+        # 重新計算改為讀取時查詢的作者
+        get_pull_author_ids(refresh=True)
+
+        self.stdout.write(f'開始補寫最近 {options["days"]} 天發布的文章...')
+        count = 0
+        deliveries = 0
+        for article in articles.iterator(chunk_size=500):
+            deliveries += fan_out_article(article)
+            count += 1
+
+        self.stdout.write(self.style.SUCCESS(f'完成！共 {count} 篇文章，寫入 {deliveries} 筆時間軸'))
@@ -0,0 +1,125 @@
+"""
+管理命令：Channel Layer 多行程吞吐量測試
+啟動多個接收行程（模擬多個 Daphne 行程）加入同一群組，
+由主行程 group_send，量測所有行程都收到全部訊息所需的時間
+"""
+import asyncio
+import multiprocessing
+import os
+import time
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.management.base import BaseCommand, CommandError
+
+BENCHMARK_GROUP = 'channel_layer_benchmark'
+
+
+def _receiver_main(channels_per_process, message_count, ready, results):
+    """接收行程：建立 channel、加入群組並接收全部訊息"""
+    import django
+    django.setup()
+
+    async def run():
+        layer = get_channel_layer()
+        # 測試時接收端可能一次收到大量訊息，放寬佇列上限避免被丟棄
+        inner = getattr(layer, 'layer', layer)  # InstrumentedChannelLayer 包裝的實際 layer
+        inner.capacity = max(inner.capacity, message_count)
+        channels = [await layer.new_channel() for _ in range(channels_per_process)]
+        for channel in channels:
+            await layer.group_add(BENCHMARK_GROUP, channel)
+        ready.put(os.getpid())
+
+        async def consume(channel):
+            first = None
+            for _ in range(message_count):
+                await layer.receive(channel)
+                first = first or time.time()
+            return first, time.time()
+
+        try:
+            timings = await asyncio.wait_for(
+                asyncio.gather(*(consume(channel) for channel in channels)),
+                timeout=120,
+            )
+        finally:
+            for channel in channels:
+                await layer.group_discard(BENCHMARK_GROUP, channel)
+            await layer.close()
+        results.put((os.getpid(), min(t[0] for t in timings), max(t[1] for t in timings)))
+
+    try:
+        asyncio.run(run())
+    except Exception as e:
+        results.put((os.getpid(), None, str(e)))
+
+
+class Command(BaseCommand):
+    help = '測試 Channel Layer 跨行程 group_send 的吞吐量'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=4, help='接收行程數')
+        parser.add_argument('--channels', type=int, default=5, help='每個行程的 channel（WebSocket 連線）數')
+        parser.add_argument('--messages', type=int, default=500, help='group_send 的訊息數')
+
+    def handle(self, *args, **options):
+        """執行命令"""
+        layer = get_channel_layer()
+        if layer is None:
+            raise CommandError('未設定 CHANNEL_LAYERS')
+
+        processes = options['processes']
+        message_count = options['messages']
+        channels_per_process = options['channels']
+
+        self.stdout.write(
+            f'{type(getattr(layer, "layer", layer)).__name__}：{processes} 個接收行程 × {channels_per_process} 個 channel，'
+            f'{message_count} 則訊息'
+        )
+
+        context = multiprocessing.get_context('spawn')
+        ready = context.Queue()
+        results = context.Queue()
+        workers = [
+            context.Process(
+                target=_receiver_main,
+                args=(channels_per_process, message_count, ready, results),
+            )
+            for _ in range(processes)
+        ]
+        for worker in workers:
+            worker.start()
+
+        try:
+            for _ in workers:
+                ready.get(timeout=60)
+
+            started = time.time()
+            for i in range(message_count):
+                async_to_sync(layer.group_send)(BENCHMARK_GROUP, {
+                    'type': 'benchmark.message',
+                    'index': i,
+                })
+            send_elapsed = time.time() - started
+
+            finished = []
+            for _ in workers:
+                pid, first, last = results.get(timeout=180)
+                if first is None:
+                    raise CommandError(f'接收行程 {pid} 失敗：{last}')
+                finished.append(last)
+        finally:
+            for worker in workers:
+                worker.join(timeout=10)
+                if worker.is_alive():
+                    worker.terminate()
+
+        total_elapsed = max(finished) - started
+        delivered = message_count * processes * channels_per_process
+
+        self.stdout.write(self.style.SUCCESS('完成'))
+        self.stdout.write(f'  group_send 耗時: {send_elapsed:.2f} s（{message_count / send_elapsed:.0f} 次/秒）')
+        self.stdout.write(
+            f'  全部送達耗時: {total_elapsed:.2f} s，'
+            f'投遞 {delivered} 則（{delivered / total_elapsed:.0f} 則/秒）'
+        )
@@ -0,0 +1,95 @@
+"""
+管理命令：OFFSET 分頁與 keyset 分頁的比較測試
+為測試用戶建立大量通知，分別以 Django Paginator（COUNT(*) + OFFSET）與 KeysetPaginator
+讀取第 N 頁，比較不同深度的每頁延遲與查詢數（與通知中心相同的查詢與排序）
+"""
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from blog.models import Notification
+from blog.utils.keyset_pagination import NEXT, KeysetPaginator
+
+BENCHMARK_USERNAME = '__pagination_benchmark__'
+
+
+class Command(BaseCommand):
+    help = '比較 OFFSET 分頁與 keyset 分頁在不同頁數的延遲'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000, help='建立的通知數')
+        parser.add_argument('--per-page', type=int, default=20, help='每頁筆數')
+        parser.add_argument('--repeat', type=int, default=5, help='每個頁數重複量測的次數（取中位數）')
+        parser.add_argument(
+            '--pages', type=str, default='1,10,100,1000,5000',
+            help='量測的頁數（逗號分隔，超過總頁數的會略過）'
+        )
+
+    def handle(self, *args, **options):
+        """執行命令"""
+        per_page = options['per_page']
+        user, _ = User.objects.get_or_create(username=BENCHMARK_USERNAME)
+
+        try:
+            self._seed(user, options['rows'])
+            queryset = Notification.objects.filter(user=user).select_related('sender')
+            last_page = (options['rows'] + per_page - 1) // per_page
+            pages = [page for page in (int(value) for value in options['pages'].split(',')) if 1 <= page <= last_page]
+
+            self.stdout.write(f'{options["rows"]} 則通知，每頁 {per_page} 筆')
+            self.stdout.write(f'{"頁數":>8} {"OFFSET (ms)":>12} {"查詢數":>6} {"keyset (ms)":>12} {"查詢數":>6}')
+            for page in pages:
+                offset_ms, offset_queries = self._measure(
+                    lambda: list(Paginator(queryset.order_by('-created_at', '-id'), per_page).page(page)),
+                    options['repeat']
+                )
+                cursor = self._cursor_for_page(queryset, per_page, page)
+                keyset_ms, keyset_queries = self._measure(
+                    lambda: list(KeysetPaginator(queryset, per_page, ordering=('-created_at', '-id')).get_page(cursor)),
+                    options['repeat']
+                )
+                self.stdout.write(
+                    f'{page:>8} {offset_ms:>12.2f} {offset_queries:>6} {keyset_ms:>12.2f} {keyset_queries:>6}'
+                )
+        finally:
+            Notification.objects.filter(user=user).delete()
+            user.delete()
+
+    def _seed(self, user, rows):
+        """建立測試通知（bulk_create 不觸發 post_save，不會推送）"""
+        Notification.objects.filter(user=user).delete()
+        batch = []
+        for index in range(rows):
+            batch.append(Notification(
+                user=user,
+                notification_type='message',
+                message=f'分頁測試通知 {index}',
+            ))
+            if len(batch) >= 5000:
+                Notification.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            Notification.objects.bulk_create(batch)
+
+    def _cursor_for_page(self, queryset, per_page, page):
+        """取得第 page 頁的游標（前一頁最後一筆之後），第 1 頁沒有游標"""
+        if page == 1:
+            return None
+        paginator = KeysetPaginator(queryset, per_page, ordering=('-created_at', '-id'))
+        last_row = queryset.order_by('-created_at', '-id')[(page - 1) * per_page - 1]
+        return paginator.encode_cursor(last_row, NEXT)
+
+    def _measure(self, fetch, repeat):
+        """回傳 (延遲中位數 ms, 查詢數)"""
+        durations = []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                fetch()
+                durations.append((time.perf_counter() - started) * 1000)
+        return statistics.median(durations), len(queries)
@@ -0,0 +1,123 @@
+"""
+管理命令：Web Push 推播吞吐量測試
+使用本機假推播服務比較逐一發送與並行發送的效能
+"""
+import base64
+import os
+import statistics
+import time
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from blog.models import PushSubscription
+from blog.utils.fake_push_server import FakePushServer
+from blog.utils.push_notifications import PushDispatcher, apply_push_results, build_notification_data
+
+BENCHMARK_USERNAME = '__push_benchmark__'
+
+
+def _b64url(data):
+    return base64.urlsafe_b64encode(data).decode('utf-8').rstrip('=')
+
+
+def _generate_subscription_keys():
+    """產生瀏覽器訂閱用的 p256dh 與 auth 金鑰"""
+    private_key = ec.generate_private_key(ec.SECP256R1())
+    public_bytes = private_key.public_key().public_bytes(
+        encoding=serialization.Encoding.X962,
+        format=serialization.PublicFormat.UncompressedPoint
+    )
+    return _b64url(public_bytes), _b64url(os.urandom(16))
+
+
+def _generate_vapid_private_key():
+    """產生測試用的 VAPID 私鑰（raw 格式，base64url 編碼）"""
+    private_key = ec.generate_private_key(ec.SECP256R1())
+    return _b64url(private_key.private_numbers().private_value.to_bytes(32, 'big'))
+
+
+class Command(BaseCommand):
+    help = '使用本機假推播服務測試 Web Push 發送吞吐量（逐一發送 vs 並行發送）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscriptions', type=int, default=200, help='訂閱數量')
+        parser.add_argument('--latency-ms', type=float, default=50, help='假推播服務的回應延遲（毫秒）')
+        parser.add_argument('--workers', type=int, default=16, help='並行發送的執行緒數')
+        parser.add_argument('--pool-size', type=int, default=8, help='每個推播服務主機的連線上限')
+        parser.add_argument('--gone', type=int, default=0, help='模擬已失效（410）的訂閱數量')
+
+    def handle(self, *args, **options):
+        """執行命令"""
+        vapid_private_key = settings.VAPID_PRIVATE_KEY or _generate_vapid_private_key()
+
+        with FakePushServer(latency=options['latency_ms'] / 1000) as server, \
+                override_settings(VAPID_PRIVATE_KEY=vapid_private_key):
+            user = self._create_subscriptions(server, options['subscriptions'], options['gone'])
+            try:
+                self.stdout.write(
+                    f'假推播服務: {server.base_url}，{options["subscriptions"]} 個訂閱，'
+                    f'延遲 {options["latency_ms"]:.0f} ms\n'
+                )
+                self._run('逐一發送', user, PushDispatcher(max_workers=1, pool_size_per_host=1))
+                self._run(
+                    f'並行發送（{options["workers"]} workers）',
+                    user,
+                    PushDispatcher(max_workers=options['workers'], pool_size_per_host=options['pool_size'])
+                )
+                self.stdout.write(
+                    f'推播服務共收到 {server.request_count} 個請求，'
+                    f'{len(server.authorization_headers)} 種 VAPID 簽章'
+                )
+            finally:
+                user.delete()
+
+    def _create_subscriptions(self, server, count, gone_count):
+        """建立指向假推播服務的測試訂閱"""
+        User.objects.filter(username=BENCHMARK_USERNAME).delete()
+        user = User.objects.create(username=BENCHMARK_USERNAME, is_active=False)
+
+        p256dh, auth = _generate_subscription_keys()
+        PushSubscription.objects.bulk_create([
+            PushSubscription(
+                user=user,
+                endpoint=server.endpoint(i, gone=i < gone_count),
+                p256dh=p256dh,
+                auth=auth,
+            )
+            for i in range(count)
+        ])
+        return user
+
+    def _run(self, label, user, dispatcher):
+        """執行一輪發送並輸出統計"""
+        # 每輪都從相同狀態開始
+        PushSubscription.objects.filter(user=user).update(is_active=True, failure_count=0)
+        subscriptions = list(PushSubscription.objects.filter(user=user))
+        notification_data = build_notification_data('效能測試', '推播吞吐量測試')
+
+        started = time.perf_counter()
+        results = dispatcher.send(subscriptions, notification_data)
+        send_elapsed = time.perf_counter() - started
+
+        with CaptureQueriesContext(connection) as queries:
+            apply_push_results(results)
+        total_elapsed = time.perf_counter() - started
+        dispatcher.shutdown()
+
+        latencies = sorted(result.latency * 1000 for result in results)
+        success = sum(1 for result in results if result.success)
+
+        self.stdout.write(self.style.SUCCESS(label))
+        self.stdout.write(f'  成功 / 失敗: {success} / {len(results) - success}')
+        self.stdout.write(f'  發送耗時: {send_elapsed:.2f} s，吞吐量 {len(results) / send_elapsed:.1f} 則/秒')
+        self.stdout.write(
+            f'  單則延遲: p50 {statistics.median(latencies):.1f} ms，'
+            f'p95 {latencies[int(len(latencies) * 0.95) - 1]:.1f} ms'
+        )
+        self.stdout.write(f'  寫回訂閱狀態: {len(queries)} 次查詢，總耗時 {total_elapsed:.2f} s\n')
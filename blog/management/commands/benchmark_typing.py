@@ -0,0 +1,123 @@
+"""
+管理命令：打字狀態的 channel layer 訊息量測試
+模擬使用者在聊天視窗中持續打字（每個按鍵都送出一個 typing frame，與舊版前端相同），
+比較客戶端送出的 frame 數（舊版伺服器每個 frame 都會 group_send）與實際送到對方的打字事件數
+"""
+import asyncio
+import random
+import time
+
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from blog.consumers import ChatConsumer
+from blog.utils.chat_write_queue import get_chat_write_queue
+
+BENCHMARK_USERNAMES = ('__typing_benchmark_a__', '__typing_benchmark_b__')
+
+# 前端停止打字的閒置時間（秒，與 instant-chat.js 相同）
+CLIENT_IDLE_TIMEOUT = 3
+
+
+class Command(BaseCommand):
+    help = '模擬一段時間的打字，量測每分鐘送到 channel layer 的打字訊息數'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--minutes', type=float, default=1, help='模擬的打字時間（分鐘）')
+        parser.add_argument('--speed', type=float, default=10, help='時間加速倍數（10 表示 1 分鐘以 6 秒模擬）')
+        parser.add_argument('--seed', type=int, default=42, help='亂數種子')
+
+    def handle(self, *args, **options):
+        """執行命令"""
+        typist, listener = [
+            User.objects.get_or_create(username=username)[0]
+            for username in BENCHMARK_USERNAMES
+        ]
+        speed = options['speed']
+
+        try:
+            # 伺服器端打字逾時也依相同倍數縮短
+            with override_settings(CHAT_TYPING_TIMEOUT=6 / speed):
+                stats = asyncio.run(self._simulate(typist, listener, options['minutes'], speed, options['seed']))
+        finally:
+            typist.delete()
+            listener.delete()
+
+        minutes = options['minutes']
+        self.stdout.write(self.style.SUCCESS('完成'))
+        self.stdout.write(
+            f'  模擬 {minutes:g} 分鐘：{stats["keystrokes"]} 次按鍵、送出 {stats["messages"]} 則訊息'
+        )
+        self.stdout.write(
+            f'  客戶端 typing frame: {stats["frames"]}（{stats["frames"] / minutes:.0f} 則/分鐘，'
+            f'即舊版每分鐘的 group_send 數）'
+        )
+        self.stdout.write(
+            f'  實際送出的打字事件: {stats["delivered"]}（{stats["delivered"] / minutes:.0f} 則/分鐘）'
+        )
+        if stats['frames']:
+            self.stdout.write(f'  減少 {(1 - stats["delivered"] / stats["frames"]) * 100:.1f}%')
+
+    async def _connect(self, user, other_username):
+        communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), f'/ws/chat/{other_username}/')
+        communicator.scope['user'] = user
+        communicator.scope['url_route'] = {'kwargs': {'username': other_username}}
+        connected, _ = await communicator.connect()
+        if not connected:
+            raise RuntimeError('WebSocket 連線失敗')
+        await communicator.receive_json_from()  # chat_history
+        return communicator
+
+    async def _simulate(self, typist, listener, minutes, speed, seed):
+        rng = random.Random(seed)
+        stats = {'keystrokes': 0, 'messages': 0, 'frames': 0, 'delivered': 0}
+
+        typing_side = await self._connect(typist, listener.username)
+        listening_side = await self._connect(listener, typist.username)
+
+        async def count_delivered():
+            while True:
+                event = await listening_side.receive_json_from(timeout=3600)
+                if event['type'] == 'typing':
+                    stats['delivered'] += 1
+
+        async def send_typing(is_typing):
+            stats['frames'] += 1
+            await typing_side.send_json_to({'type': 'typing', 'is_typing': is_typing})
+
+        counter = asyncio.ensure_future(count_delivered())
+        deadline = time.monotonic() + minutes * 60 / speed
+
+        try:
+            while time.monotonic() < deadline:
+                # 一段連續打字：每個按鍵都送出打字中
+                for _ in range(rng.randint(10, 60)):
+                    stats['keystrokes'] += 1
+                    await send_typing(True)
+                    await asyncio.sleep(rng.uniform(0.08, 0.25) / speed)
+
+                if rng.random() < 0.6:
+                    # 送出訊息（前端同時送出停止打字）
+                    stats['messages'] += 1
+                    await typing_side.send_json_to({'type': 'chat_message', 'message': 'benchmark'})
+                    await send_typing(False)
+                    await asyncio.sleep(rng.uniform(0.5, 2) / speed)
+                else:
+                    # 停下來思考：超過前端閒置時間才會送出停止打字
+                    pause = rng.uniform(1, 8)
+                    if pause > CLIENT_IDLE_TIMEOUT:
+                        await asyncio.sleep(CLIENT_IDLE_TIMEOUT / speed)
+                        await send_typing(False)
+                        pause -= CLIENT_IDLE_TIMEOUT
+                    await asyncio.sleep(pause / speed)
+
+            await asyncio.sleep(0.2)
+        finally:
+            counter.cancel()
+            await typing_side.disconnect()
+            await listening_side.disconnect()
+            await get_chat_write_queue().drain()
+
+        return stats
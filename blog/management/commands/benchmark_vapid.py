@@ -0,0 +1,104 @@
+"""
+管理命令：VAPID 簽章效能測試
+比較每則推播重新解析私鑰並簽署 JWT，與依推播服務快取簽章的每則額外耗時
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from py_vapid import Vapid
+from pywebpush import webpush
+
+from blog.management.commands.benchmark_push import (
+    _generate_subscription_keys,
+    _generate_vapid_private_key,
+)
+from blog.utils.vapid_signer import VapidSigner
+
+
+class _StubResponse:
+    status_code = 201
+    text = ''
+    headers = {}
+
+
+class _StubSession:
+    """取代 requests.Session，只建構請求不實際連線"""
+
+    def post(self, *args, **kwargs):
+        return _StubResponse()
+
+
+# 模擬常見的推播服務來源
+AUDIENCES = [
+    'https://fcm.googleapis.com',
+    'https://updates.push.services.mozilla.com',
+    'https://web.push.apple.com',
+]
+
+
+class Command(BaseCommand):
+    help = '測試 VAPID 簽章快取前後每則推播的額外耗時（不實際連線）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=2000, help='模擬的推播數量')
+
+    def handle(self, *args, **options):
+        """執行命令"""
+        count = options['messages']
+        private_key = settings.VAPID_PRIVATE_KEY or _generate_vapid_private_key()
+        subject = settings.VAPID_CLAIMS.get('sub', 'mailto:admin@example.com')
+        p256dh, auth = _generate_subscription_keys()
+
+        endpoints = [f'{AUDIENCES[i % len(AUDIENCES)]}/push/{i}' for i in range(count)]
+
+        self.stdout.write(f'{count} 則推播，{len(AUDIENCES)} 個推播服務來源\n')
+
+        # 只計算簽章
+        def sign_per_message(endpoint):
+            vapid = Vapid.from_string(private_key=private_key)
+            vapid.sign({
+                'sub': subject,
+                'aud': VapidSigner.get_audience(endpoint),
+                'exp': int(time.time()) + 12 * 60 * 60,
+            })
+
+        signer = VapidSigner(private_key, subject)
+        self._report('簽章：每則重新解析私鑰並簽署', endpoints, sign_per_message)
+        self._report('簽章：依推播服務快取', endpoints, signer.get_headers)
+
+        # 含加密的完整請求建構（使用不連線的 session）
+        session = _StubSession()
+
+        def build_uncached(endpoint):
+            webpush(
+                subscription_info={'endpoint': endpoint, 'keys': {'p256dh': p256dh, 'auth': auth}},
+                data='{"title": "benchmark"}',
+                vapid_private_key=private_key,
+                vapid_claims={'sub': subject},
+                requests_session=session,
+            )
+
+        cached_signer = VapidSigner(private_key, subject)
+
+        def build_cached(endpoint):
+            webpush(
+                subscription_info={'endpoint': endpoint, 'keys': {'p256dh': p256dh, 'auth': auth}},
+                data='{"title": "benchmark"}',
+                headers=cached_signer.get_headers(endpoint),
+                requests_session=session,
+            )
+
+        self._report('完整請求：每則重新簽署', endpoints, build_uncached)
+        self._report('完整請求：快取簽章', endpoints, build_cached)
+
+    def _report(self, label, endpoints, func):
+        """執行並輸出每則平均耗時"""
+        started = time.perf_counter()
+        for endpoint in endpoints:
+            func(endpoint)
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f'{label}: 總耗時 {elapsed:.2f} s，每則 {elapsed / len(endpoints) * 1_000_000:.0f} µs'
+        )
@@ -0,0 +1,238 @@
+"""
+管理命令：WebSocket 併發負載測試
+在單一行程內以 WebsocketCommunicator 開啟 N 位用戶的 NotificationConsumer 與 ChatConsumer 連線
+（兩兩配對聊天），依設定的速率送出訊息與打字狀態，量測：
+連線延遲、端到端訊息延遲百分位數、每個連線的記憶體用量，以及每則訊息的資料庫查詢數
+"""
+import asyncio
+import random
+import statistics
+import time
+import tracemalloc
+
+from channels.layers import channel_layers, get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+
+from blog.consumers import ChatConsumer, NotificationConsumer
+from blog.utils.chat_write_queue import get_chat_write_queue
+
+BENCHMARK_USERNAME_PREFIX = '__ws_benchmark_'
+MESSAGE_PREFIX = 'bench:'
+
+
+class QueryCounter:
+    """計算所有執行緒的資料庫查詢數（包含 database_sync_to_async 與 channel layer 的執行緒）"""
+
+    def __init__(self):
+        self.count = 0
+        self.enabled = False
+
+    def __call__(self, execute, sql, params, many, context):
+        if self.enabled:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def install(self, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+
+def _percentile(values, ratio):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * ratio))]
+
+
+class Command(BaseCommand):
+    help = '以 WebsocketCommunicator 測試單一行程可承載的通知與聊天 WebSocket 連線'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100, help='用戶數（每位用戶一條通知連線與一條聊天連線）')
+        parser.add_argument('--duration', type=float, default=10, help='送出訊息的時間（秒）')
+        parser.add_argument('--message-rate', type=float, default=0.5, help='每位用戶每秒送出的聊天訊息數')
+        parser.add_argument('--typing-rate', type=float, default=2, help='每位用戶每秒送出的打字 frame 數')
+        parser.add_argument('--memory-layer', action='store_true', help='改用 InMemoryChannelLayer（排除 channel layer 的資料庫查詢）')
+        parser.add_argument('--seed', type=int, default=42, help='亂數種子')
+
+    def handle(self, *args, **options):
+        """執行命令"""
+        if options['users'] < 2:
+            raise CommandError('--users 至少需要 2')
+
+        users = self._create_users(options['users'] - options['users'] % 2)
+        layer_settings = {}
+        if options['memory_layer']:
+            layer_settings['CHANNEL_LAYERS'] = {
+                'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer', 'CONFIG': {'capacity': 1000}},
+            }
+
+        counter = QueryCounter()
+        for connection in connections.all():
+            counter.install(connection)
+        connection_created.connect(counter.install)
+
+        try:
+            with override_settings(**layer_settings):
+                channel_layers.backends.clear()  # 依目前設定重新建立 channel layer
+                stats = asyncio.run(self._run(users, counter, options))
+        finally:
+            channel_layers.backends.clear()
+            connection_created.disconnect(counter.install)
+            for connection in connections.all():
+                if counter in connection.execute_wrappers:
+                    connection.execute_wrappers.remove(counter)
+            User.objects.filter(id__in=[user.id for user in users]).delete()
+
+        self._report(stats, options)
+
+    def _create_users(self, count):
+        User.objects.filter(username__startswith=BENCHMARK_USERNAME_PREFIX).delete()
+        User.objects.bulk_create([
+            User(username=f'{BENCHMARK_USERNAME_PREFIX}{i}__') for i in range(count)
+        ])
+        return list(User.objects.filter(username__startswith=BENCHMARK_USERNAME_PREFIX).order_by('id'))
+
+    async def _connect(self, application, path, user, url_kwargs=None):
+        communicator = WebsocketCommunicator(application, path)
+        communicator.scope['user'] = user
+        if url_kwargs is not None:
+            communicator.scope['url_route'] = {'kwargs': url_kwargs}
+
+        started = time.perf_counter()
+        connected, _ = await communicator.connect(timeout=30)
+        if not connected:
+            raise CommandError(f'{path} 連線失敗')
+        await communicator.receive_output(timeout=30)  # initial / chat_history
+        return communicator, time.perf_counter() - started
+
+    async def _run(self, users, counter, options):
+        rng = random.Random(options['seed'])
+        notification_app = NotificationConsumer.as_asgi()
+        chat_app = ChatConsumer.as_asgi()
+        stats = {
+            'connect_latency': [],
+            'message_latency': [],
+            'sent': 0,
+            'typing_frames': 0,
+            'received': 0,
+            'notifications': 0,
+        }
+        layer = get_channel_layer()
+        stats['layer'] = type(getattr(layer, 'layer', layer)).__name__
+
+        # 開啟連線並量測記憶體
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        notification_sockets = []
+        chat_sockets = []
+        for index, user in enumerate(users):
+            partner = users[index ^ 1]
+            for sockets, application, path, url_kwargs in (
+                (notification_sockets, notification_app, '/ws/notifications/', None),
+                (chat_sockets, chat_app, f'/ws/chat/{partner.username}/', {'username': partner.username}),
+            ):
+                communicator, latency = await self._connect(application, path, user, url_kwargs)
+                sockets.append(communicator)
+                stats['connect_latency'].append(latency)
+        stats['memory_per_connection'] = (tracemalloc.get_traced_memory()[0] - baseline) / (len(users) * 2)
+        tracemalloc.stop()
+
+        async def read_chat(communicator):
+            while True:
+                event = await communicator.receive_json_from(timeout=3600)
+                if event['type'] != 'chat_message' or event['message']['sender'] != 'other':
+                    continue
+                content = event['message']['content']
+                if content.startswith(MESSAGE_PREFIX):
+                    stats['received'] += 1
+                    stats['message_latency'].append(time.perf_counter() - float(content[len(MESSAGE_PREFIX):]))
+
+        async def read_notifications(communicator):
+            while True:
+                event = await communicator.receive_json_from(timeout=3600)
+                if event['type'] == 'notification':
+                    stats['notifications'] += 1
+
+        async def drive(communicator, deadline):
+            message_rate = options['message_rate']
+            typing_rate = options['typing_rate']
+            total_rate = message_rate + typing_rate
+            if total_rate <= 0:
+                return
+            while True:
+                await asyncio.sleep(rng.expovariate(total_rate))
+                if time.perf_counter() >= deadline:
+                    return
+                if rng.random() < message_rate / total_rate:
+                    stats['sent'] += 1
+                    await communicator.send_json_to({
+                        'type': 'chat_message',
+                        'message': f'{MESSAGE_PREFIX}{time.perf_counter()}',
+                    })
+                else:
+                    stats['typing_frames'] += 1
+                    await communicator.send_json_to({'type': 'typing', 'is_typing': True})
+
+        readers = [asyncio.ensure_future(read_chat(communicator)) for communicator in chat_sockets]
+        readers += [asyncio.ensure_future(read_notifications(communicator)) for communicator in notification_sockets]
+
+        counter.count = 0
+        counter.enabled = True
+        started = time.perf_counter()
+        deadline = started + options['duration']
+        try:
+            await asyncio.gather(*(drive(communicator, deadline) for communicator in chat_sockets))
+
+            # 等待在途的訊息送達與寫入
+            for _ in range(50):
+                if stats['received'] >= stats['sent']:
+                    break
+                await asyncio.sleep(0.1)
+            await get_chat_write_queue().drain()
+            stats['elapsed'] = time.perf_counter() - started
+            counter.enabled = False
+            stats['queries'] = counter.count
+        finally:
+            counter.enabled = False
+            for reader in readers:
+                reader.cancel()
+            for communicator in notification_sockets + chat_sockets:
+                await communicator.disconnect()
+
+        return stats
+
+    def _report(self, stats, options):
+        connections_count = len(stats['connect_latency'])
+        connect_ms = [value * 1000 for value in stats['connect_latency']]
+        message_ms = [value * 1000 for value in stats['message_latency']]
+
+        self.stdout.write(self.style.SUCCESS('完成'))
+        self.stdout.write(
+            f'  {options["users"]} 位用戶、{connections_count} 條連線，channel layer: {stats["layer"]}'
+        )
+        self.stdout.write(
+            f'  連線延遲 (ms): p50 {_percentile(connect_ms, 0.5):.1f}・p95 {_percentile(connect_ms, 0.95):.1f}・'
+            f'p99 {_percentile(connect_ms, 0.99):.1f}・最大 {max(connect_ms):.1f}'
+        )
+        self.stdout.write(f'  每條連線記憶體: {stats["memory_per_connection"] / 1024:.1f} KiB（tracemalloc）')
+        self.stdout.write(
+            f'  {stats["elapsed"]:.1f} 秒內送出 {stats["sent"]} 則訊息、{stats["typing_frames"]} 個打字 frame，'
+            f'對方收到 {stats["received"]} 則，通知 {stats["notifications"]} 則'
+        )
+        if message_ms:
+            self.stdout.write(
+                f'  訊息延遲 (ms): 平均 {statistics.mean(message_ms):.1f}・p50 {_percentile(message_ms, 0.5):.1f}・'
+                f'p95 {_percentile(message_ms, 0.95):.1f}・p99 {_percentile(message_ms, 0.99):.1f}・'
+                f'最大 {max(message_ms):.1f}'
+            )
+        if stats['sent']:
+            self.stdout.write(
+                f'  資料庫查詢: {stats["queries"]} 次，每則訊息 {stats["queries"] / stats["sent"]:.2f} 次'
+                '（含打字、通知、在線狀態與 channel layer 的查詢）'
+            )
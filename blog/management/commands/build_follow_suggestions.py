@@ -0,0 +1,45 @@
+"""
+管理命令：批次計算推薦追蹤
+"""
+from django.core.management.base import BaseCommand
+from blog.utils.follow_suggestions import build_follow_suggestions
+
+
+class Command(BaseCommand):
+    help = '依共同追蹤與共同興趣標籤重新計算所有用戶的推薦追蹤（建議以 cron 定期執行）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=None,
+            help='每批計算與寫入的用戶數（預設為 FOLLOW_SUGGESTION_CHUNK_SIZE）',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=None,
+            help='每位用戶保留的推薦數（預設為 FOLLOW_SUGGESTION_LIMIT）',
+        )
+        parser.add_argument(
+            '--max-fanout',
+            type=int,
+            default=None,
+            help='每位用戶最多展開的追蹤中用戶數（預設為 FOLLOW_SUGGESTION_MAX_FANOUT）',
+        )
+
+    def handle(self, *args, **options):
+        """執行命令"""
+        self.stdout.write('開始計算推薦追蹤...')
+
+        stats = build_follow_suggestions(
+            chunk_size=options['chunk_size'],
+            limit=options['limit'],
+            max_fanout=options['max_fanout'],
+        )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'完成！共 {stats["users"]} 位用戶、{stats["suggestions"]} 筆推薦，共 {stats["chunks"]} 批'
+            )
+        )
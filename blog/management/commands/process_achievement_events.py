@@ -0,0 +1,84 @@
+"""
+管理命令：成就事件 worker
+處理行程中斷而留在資料庫的成就事件（AchievementEvent），同一位使用者的事件合併檢查一次成就
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from blog.utils.achievement_events import claim_events, default_worker_id, process_events
+
+
+class Command(BaseCommand):
+    help = '處理未完成的成就事件（AchievementEvent），網頁行程中斷時接手；可同時執行多個 worker'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='每批取出的事件數（預設為 ACHIEVEMENT_QUEUE_BATCH_SIZE）',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=5.0,
+            help='沒有事件時等待的秒數',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='處理完目前的事件後結束（適合以 cron 定期執行）',
+        )
+        parser.add_argument(
+            '--stale-only',
+            action='store_true',
+            help='只處理超過 ACHIEVEMENT_EVENT_LEASE_SECONDS 秒仍未完成的事件，不與網頁行程的佇列搶事件',
+        )
+        parser.add_argument(
+            '--worker-id',
+            default=None,
+            help='worker 識別碼（預設為 主機名稱-PID-亂數）',
+        )
+
+    def handle(self, *args, **options):
+        """執行命令"""
+        worker_id = options['worker_id'] or default_worker_id()
+        totals = {'events': 0, 'users': 0, 'unlocked': 0, 'failed': 0}
+
+        self.stdout.write(f'成就事件 worker 啟動：{worker_id}')
+
+        try:
+            while True:
+                close_old_connections()
+
+                events = claim_events(
+                    worker_id,
+                    batch_size=options['batch_size'],
+                    stale_only=options['stale_only'],
+                )
+                if not events:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                stats = process_events(events)
+                for key, value in stats.items():
+                    totals[key] += value
+
+                if options['verbosity'] > 1:
+                    self.stdout.write(
+                        f'處理 {stats["events"]} 個事件（{stats["users"]} 位使用者），'
+                        f'解鎖 {stats["unlocked"]} 個成就，失敗 {stats["failed"]} 位'
+                    )
+        except KeyboardInterrupt:
+            self.stdout.write('\n收到中斷訊號，停止 worker')
+        finally:
+            close_old_connections()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'完成！處理 {totals["events"]} 個事件（{totals["users"]} 位使用者），'
+            f'解鎖 {totals["unlocked"]} 個成就，失敗 {totals["failed"]} 位'
+        ))
@@ -0,0 +1,97 @@
+"""
+管理命令：推播佇列 worker
+從 PushOutbox 分批取出待發送的推播並行發送，失敗時以指數退避重試
+"""
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from blog.utils.push_notifications import get_push_dispatcher
+from blog.utils.push_outbox import claim_batch, default_worker_id, process_batch, purge_finished_outbox
+
+# 清理已完成推播的間隔（秒）
+PURGE_INTERVAL = 3600
+
+
+class Command(BaseCommand):
+    help = '處理推播佇列（PushOutbox），可同時執行多個 worker'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='每批取出的筆數（預設為 PUSH_OUTBOX_BATCH_SIZE）',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=2.0,
+            help='佇列為空時等待的秒數',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='處理完目前可發送的推播後結束',
+        )
+        parser.add_argument(
+            '--worker-id',
+            default=None,
+            help='worker 識別碼（預設為 主機名稱-PID-亂數）',
+        )
+
+    def handle(self, *args, **options):
+        """執行命令"""
+        worker_id = options['worker_id'] or default_worker_id()
+        dispatcher = get_push_dispatcher()
+        totals = {'sent': 0, 'retried': 0, 'failed': 0, 'gone': 0}
+        latencies = []
+        last_purge = 0
+
+        self.stdout.write(f'推播佇列 worker 啟動：{worker_id}')
+
+        try:
+            while True:
+                close_old_connections()
+
+                if time.monotonic() - last_purge >= PURGE_INTERVAL:
+                    purged = purge_finished_outbox()
+                    if purged:
+                        self.stdout.write(f'已清理 {purged} 筆已完成的推播')
+                    last_purge = time.monotonic()
+
+                items = claim_batch(worker_id, batch_size=options['batch_size'])
+                if not items:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                stats = process_batch(items, dispatcher=dispatcher)
+                latencies.extend(stats.pop('latencies'))
+                for key, value in stats.items():
+                    totals[key] += value
+
+                if options['verbosity'] > 1:
+                    self.stdout.write(
+                        f'已發送 {stats["sent"]}，重試 {stats["retried"]}，'
+                        f'失敗 {stats["failed"]}，訂閱失效 {stats["gone"]}'
+                    )
+        except KeyboardInterrupt:
+            self.stdout.write('\n收到中斷訊號，停止 worker')
+        finally:
+            dispatcher.shutdown()
+            close_old_connections()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'完成！已發送 {totals["sent"]}，重試 {totals["retried"]}，'
+            f'失敗 {totals["failed"]}，訂閱失效 {totals["gone"]}'
+        ))
+        if latencies:
+            latencies.sort()
+            self.stdout.write(
+                f'推播服務回應時間: p50 {statistics.median(latencies) * 1000:.1f} ms，'
+                f'p95 {latencies[max(int(len(latencies) * 0.95) - 1, 0)] * 1000:.1f} ms'
+            )
@@ -0,0 +1,36 @@
+"""
+管理命令：分批清理雙方都已刪除的私人訊息
+"""
+from django.core.management.base import BaseCommand
+from blog.utils.message_deletion import purge_deleted_messages
+
+
+class Command(BaseCommand):
+    help = '分批刪除寄件者與收件者都已刪除的私人訊息（建議以 cron 定期執行）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='每批刪除的筆數（預設為 MESSAGE_PURGE_BATCH_SIZE）',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=None,
+            help='批次之間暫停的秒數（預設為 MESSAGE_PURGE_SLEEP_SECONDS）',
+        )
+
+    def handle(self, *args, **options):
+        """執行命令"""
+        self.stdout.write('開始清理雙方都已刪除的私人訊息...')
+
+        stats = purge_deleted_messages(
+            batch_size=options['batch_size'],
+            sleep_seconds=options['sleep'],
+        )
+
+        self.stdout.write(
+            self.style.SUCCESS(f'完成！共刪除 {stats["purged"]} 則訊息，共 {stats["batches"]} 批')
+        )
@@ -0,0 +1,71 @@
+"""
+管理命令：依保留政策分批清理過期通知
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from blog.utils.notification_retention import process_pending_purges, purge_expired_notifications
+
+
+class Command(BaseCommand):
+    help = '繼續處理未完成的用戶、後台通知清理，並依保留政策分批清理過期通知（可選擇封存為壓縮的 NDJSON 檔）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='每批刪除的筆數（預設為 NOTIFICATION_PURGE_BATCH_SIZE）',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=None,
+            help='批次之間暫停的秒數（預設為 NOTIFICATION_PURGE_SLEEP_SECONDS）',
+        )
+        parser.add_argument(
+            '--archive',
+            action='store_true',
+            help='刪除前將通知封存到 NOTIFICATION_ARCHIVE_DIR',
+        )
+        parser.add_argument(
+            '--archive-dir',
+            default=None,
+            help='封存目錄（指定時自動啟用封存）',
+        )
+
+    def handle(self, *args, **options):
+        """執行命令"""
+        archive_dir = options['archive_dir']
+        if options['archive'] and not archive_dir:
+            archive_dir = settings.NOTIFICATION_ARCHIVE_DIR
+
+        pending = process_pending_purges(
+            batch_size=options['batch_size'],
+            sleep_seconds=options['sleep'],
+        )
+        if pending:
+            self.stdout.write(
+                f'未完成的清理：繼續處理 {len(pending)} 筆，刪除 {sum(stats["purged"] for stats in pending)} 則通知'
+            )
+
+        self.stdout.write('開始依保留政策清理通知...')
+
+        results = purge_expired_notifications(
+            batch_size=options['batch_size'],
+            sleep_seconds=options['sleep'],
+            archive_dir=archive_dir,
+        )
+
+        total_purged = 0
+        total_archived = 0
+        for notification_type, stats in results.items():
+            total_purged += stats['purged']
+            total_archived += stats['archived']
+            self.stdout.write(
+                f'{notification_type}: 刪除 {stats["purged"]} 筆，'
+                f'封存 {stats["archived"]} 筆，共 {stats["batches"]} 批'
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(f'\n完成！共刪除 {total_purged} 則通知，封存 {total_archived} 則')
+        )
@@ -0,0 +1,62 @@
+"""
+管理命令：重建或修剪追蹤時間軸
+"""
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.utils.timeline import get_pull_author_ids, rebuild_timeline, trim_timeline
+
+
+class Command(BaseCommand):
+    help = '從追蹤關係重建用戶的追蹤時間軸，或只修剪超過保留筆數的項目（建議以 cron 定期執行 --trim-only）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            action='append',
+            dest='usernames',
+            default=[],
+            help='只處理指定的用戶（可重複指定）',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='每批讀取的用戶數',
+        )
+        parser.add_argument(
+            '--trim-only',
+            action='store_true',
+            help='只刪除超過 TIMELINE_MAX_ENTRIES 筆的較舊項目，不重建',
+        )
+
+    def handle(self, *args, **options):
+        """執行命令"""
+        users = User.objects.filter(is_active=True)
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+            missing = set(options['usernames']) - set(users.values_list('username', flat=True))
+            if missing:
+                raise CommandError(f'找不到用戶：{", ".join(sorted(missing))}')
+
+        # 重新計算改為讀取時查詢的作者
+        get_pull_author_ids(refresh=True)
+
+        action = trim_timeline if options['trim_only'] else rebuild_timeline
+        self.stdout.write('開始修剪追蹤時間軸...' if options['trim_only'] else '開始重建追蹤時間軸...')
+
+        processed = 0
+        rows = 0
+        last_id = 0
+        chunk_size = options['chunk_size']
+        while True:
+            user_ids = list(users.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:chunk_size])
+            if not user_ids:
+                break
+            for user_id in user_ids:
+                rows += action(user_id)
+            processed += len(user_ids)
+            last_id = user_ids[-1]
+
+        verb = '刪除' if options['trim_only'] else '寫入'
+        self.stdout.write(self.style.SUCCESS(f'完成！共處理 {processed} 位用戶，{verb} {rows} 筆'))
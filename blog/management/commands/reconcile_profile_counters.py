@@ -0,0 +1,49 @@
+"""
+管理命令：校正個人資料的統計計數
+"""
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from blog.utils.profile_counters import reconcile_profile_counters
+
+
+class Command(BaseCommand):
+    help = '依實際資料重新計算個人資料的文章、已發布文章、留言、獲讚、追蹤者與追蹤中數及作者閱讀進度，並校正不符的計數（建議以 cron 定期執行）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=None,
+            help='每批校正的個人資料數（預設為 PROFILE_COUNTER_CHUNK_SIZE）',
+        )
+        parser.add_argument(
+            '--user',
+            action='append',
+            dest='usernames',
+            default=[],
+            help='只校正指定的用戶（可重複指定）',
+        )
+
+    def handle(self, *args, **options):
+        """執行命令"""
+        user_ids = None
+        if options['usernames']:
+            users = User.objects.filter(username__in=options['usernames'])
+            missing = set(options['usernames']) - set(users.values_list('username', flat=True))
+            if missing:
+                raise CommandError(f'找不到用戶：{", ".join(sorted(missing))}')
+            user_ids = list(users.values_list('id', flat=True))
+
+        self.stdout.write('開始校正個人資料統計計數...')
+
+        stats = reconcile_profile_counters(
+            chunk_size=options['chunk_size'],
+            user_ids=user_ids,
+        )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'完成！共檢查 {stats["profiles"]} 份個人資料，校正 {stats["updated"]} 份、'
+                f'作者閱讀進度 {stats["read_progress"]} 筆，共 {stats["chunks"]} 批'
+            )
+        )
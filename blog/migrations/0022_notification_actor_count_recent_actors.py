@@ -0,0 +1,30 @@
+# Generated by Django 6.0 on 2026-10-19 09:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0021_ipblacklist_ipwhitelist_loginattempt'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='actor_count',
+            field=models.PositiveIntegerField(default=1, verbose_name='觸發人數'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='recent_actors',
+            field=models.JSONField(blank=True, default=list, verbose_name='最近觸發者'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'notification_type', 'content_type', 'object_id'], name='blog_notifi_user_id_8a7a46_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 6.0 on 2026-10-19 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0022_notification_actor_count_recent_actors'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationPurgeLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigger', models.CharField(choices=[('retention', '保留政策'), ('user', '用戶刪除已讀'), ('admin', '後台批量刪除')], max_length=20, verbose_name='觸發來源')),
+                ('notification_type', models.CharField(blank=True, max_length=20, verbose_name='通知類型')),
+                ('rows_purged', models.PositiveIntegerField(default=0, verbose_name='刪除筆數')),
+                ('rows_archived', models.PositiveIntegerField(default=0, verbose_name='封存筆數')),
+                ('batches', models.PositiveIntegerField(default=0, verbose_name='批次數')),
+                ('archive_file', models.CharField(blank=True, max_length=500, verbose_name='封存檔案')),
+                ('started_at', models.DateTimeField(auto_now_add=True, verbose_name='開始時間')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='完成時間')),
+            ],
+            options={
+                'verbose_name': '通知清理記錄',
+                'verbose_name_plural': '通知清理記錄',
+                'ordering': ['-started_at'],
+            },
+        ),
+    ]
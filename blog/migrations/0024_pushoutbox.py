@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:44
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0023_notificationpurgelog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PushOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payload', models.JSONField(verbose_name='推播資料')),
+                ('status', models.CharField(choices=[('pending', '待發送'), ('sending', '發送中'), ('sent', '已發送'), ('failed', '發送失敗'), ('gone', '訂閱已失效')], default='pending', max_length=10, verbose_name='狀態')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='嘗試次數')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='下次嘗試時間')),
+                ('locked_at', models.DateTimeField(blank=True, null=True, verbose_name='取出時間')),
+                ('locked_by', models.CharField(blank=True, max_length=64, verbose_name='處理的 worker')),
+                ('last_status_code', models.IntegerField(blank=True, null=True, verbose_name='最後回應狀態碼')),
+                ('last_error', models.TextField(blank=True, verbose_name='最後錯誤訊息')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='建立時間')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='發送時間')),
+                ('send_latency_ms', models.FloatField(blank=True, null=True, verbose_name='推播服務回應時間（毫秒）')),
+                ('subscription', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='outbox_items', to='blog.pushsubscription', verbose_name='訂閱')),
+            ],
+            options={
+                'verbose_name': '推播佇列',
+                'verbose_name_plural': '推播佇列',
+                'ordering': ['next_attempt_at'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='blog_pushou_status_ce9f52_idx')],
+            },
+        ),
+    ]
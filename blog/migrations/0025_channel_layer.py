@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0024_pushoutbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChannelGroupMembership',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('group', models.CharField(max_length=100, verbose_name='群組名稱')),
+                ('channel', models.CharField(max_length=100, verbose_name='Channel 名稱')),
+                ('expires_at', models.DateTimeField(verbose_name='到期時間')),
+            ],
+            options={
+                'verbose_name': 'Channel 群組成員',
+                'verbose_name_plural': 'Channel 群組成員',
+                'indexes': [models.Index(fields=['expires_at'], name='blog_channe_expires_58857d_idx')],
+                'constraints': [models.UniqueConstraint(fields=('group', 'channel'), name='unique_channel_group_membership')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ChannelLayerMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('inbox', models.CharField(max_length=100, verbose_name='收件匣')),
+                ('payload', models.TextField(verbose_name='訊息內容')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='建立時間')),
+                ('expires_at', models.DateTimeField(verbose_name='到期時間')),
+            ],
+            options={
+                'verbose_name': 'Channel Layer 訊息',
+                'verbose_name_plural': 'Channel Layer 訊息',
+                'indexes': [models.Index(fields=['inbox', 'id'], name='blog_channe_inbox_997a3c_idx'), models.Index(fields=['expires_at'], name='blog_channe_expires_c3978f_idx')],
+            },
+        ),
+    ]
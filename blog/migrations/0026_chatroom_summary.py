@@ -0,0 +1,80 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def build_chat_room_summaries(apps, schema_editor):
+    """從既有的 ChatMessage 建立對話摘要（最後訊息與雙方未讀數）"""
+    ChatMessage = apps.get_model('blog', 'ChatMessage')
+    ChatRoom = apps.get_model('blog', 'ChatRoom')
+
+    summaries = {}
+    messages = ChatMessage.objects.order_by('created_at', 'id').values_list(
+        'id', 'sender_id', 'recipient_id', 'content', 'created_at', 'is_read'
+    )
+    for message_id, sender_id, recipient_id, content, created_at, is_read in messages.iterator(chunk_size=2000):
+        key = (min(sender_id, recipient_id), max(sender_id, recipient_id))
+        summary = summaries.setdefault(key, {'user1_unread_count': 0, 'user2_unread_count': 0})
+        summary.update({
+            'last_message_id': message_id,
+            'last_message_sender_id': sender_id,
+            'last_message_preview': content[:100],
+            'last_message_at': created_at,
+        })
+        if not is_read:
+            summary['user1_unread_count' if recipient_id == key[0] else 'user2_unread_count'] += 1
+
+    for (user1_id, user2_id), summary in summaries.items():
+        ChatRoom.objects.update_or_create(user1_id=user1_id, user2_id=user2_id, defaults=summary)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0025_channel_layer'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatroom',
+            name='last_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='blog.chatmessage', verbose_name='最後訊息'),
+        ),
+        migrations.AddField(
+            model_name='chatroom',
+            name='last_message_preview',
+            field=models.CharField(blank=True, max_length=100, verbose_name='最後訊息預覽'),
+        ),
+        migrations.AddField(
+            model_name='chatroom',
+            name='last_message_sender',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='最後訊息發送者'),
+        ),
+        migrations.AddField(
+            model_name='chatroom',
+            name='user1_unread_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='用戶1未讀數'),
+        ),
+        migrations.AddField(
+            model_name='chatroom',
+            name='user2_unread_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='用戶2未讀數'),
+        ),
+        migrations.AlterField(
+            model_name='chatroom',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='最後訊息時間'),
+        ),
+        migrations.AddIndex(
+            model_name='chatroom',
+            index=models.Index(fields=['user1', '-last_message_at'], name='blog_chatro_user1_i_192335_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatroom',
+            index=models.Index(fields=['user2', '-last_message_at'], name='blog_chatro_user2_i_09d228_idx'),
+        ),
+        migrations.RunPython(build_chat_room_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:01
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def set_created_at_to_first_message(apps, schema_editor):
+    """0026 建立的聊天室 created_at 為遷移時間，改為第一則訊息的時間（供依建立時間排序）"""
+    ChatMessage = apps.get_model('blog', 'ChatMessage')
+    ChatRoom = apps.get_model('blog', 'ChatRoom')
+
+    first_message_at = {}
+    rows = ChatMessage.objects.values('sender_id', 'recipient_id').annotate(first=Min('created_at')).order_by()
+    for row in rows:
+        key = (min(row['sender_id'], row['recipient_id']), max(row['sender_id'], row['recipient_id']))
+        if key not in first_message_at or row['first'] < first_message_at[key]:
+            first_message_at[key] = row['first']
+
+    for room in ChatRoom.objects.only('id', 'user1_id', 'user2_id').iterator():
+        first = first_message_at.get((room.user1_id, room.user2_id))
+        if first is not None:
+            ChatRoom.objects.filter(pk=room.pk).update(created_at=first)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0026_chatroom_summary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatroom',
+            index=models.Index(fields=['-last_message_at'], name='blog_chatro_last_me_c9aaa9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatroom',
+            index=models.Index(fields=['created_at'], name='blog_chatro_created_309c01_idx'),
+        ),
+        migrations.RunPython(set_created_at_to_first_message, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:02
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0027_chatroom_sort_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='chatmessage',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='發送時間'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:14
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0028_chatmessage_created_at_default'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='notification',
+            name='blog_notifi_user_id_e659d5_idx',
+        ),
+        migrations.AddIndex(
+            model_name='activity',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='blog_activi_user_id_9dbccc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['status', '-created_at', '-id'], name='blog_articl_status_f0814e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['-created_at', '-id'], name='blog_commen_created_db9f56_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['following', '-created_at', '-id'], name='blog_follow_followi_b64ed1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['follower', '-created_at', '-id'], name='blog_follow_followe_2241b6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ipblacklist',
+            index=models.Index(fields=['is_active', '-blocked_at', '-id'], name='blog_ipblac_is_acti_5f5b9c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loginattempt',
+            index=models.Index(fields=['-attempted_at', '-id'], name='blog_logina_attempt_5e1a91_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['recipient', 'recipient_deleted', '-created_at', '-id'], name='blog_messag_recipie_dd4f21_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['sender', 'sender_deleted', '-created_at', '-id'], name='blog_messag_sender__b9f187_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='blog_notifi_user_id_d94f4c_idx'),
+        ),
+    ]
@@ -0,0 +1,103 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def build_message_threads(apps, schema_editor):
+    """將既有的私人訊息依回覆關係（parent_message）歸入對話串，並建立對話摘要"""
+    Message = apps.get_model('blog', 'Message')
+    MessageThread = apps.get_model('blog', 'MessageThread')
+
+    roots = {}
+    threads = {}
+    messages = Message.objects.order_by('id').values_list(
+        'id', 'parent_message_id', 'sender_id', 'recipient_id', 'subject',
+        'created_at', 'is_read', 'recipient_deleted'
+    )
+    for message_id, parent_id, sender_id, recipient_id, subject, created_at, is_read, recipient_deleted in messages.iterator(chunk_size=2000):
+        root_id = roots.get(parent_id, message_id)
+        roots[message_id] = root_id
+        key = (min(sender_id, recipient_id), max(sender_id, recipient_id))
+        thread = threads.setdefault(root_id, {
+            'user1_id': key[0],
+            'user2_id': key[1],
+            'subject': subject,
+            'created_at': created_at,
+            'message_count': 0,
+            'user1_unread_count': 0,
+            'user2_unread_count': 0,
+            'message_ids': [],
+        })
+        thread['message_ids'].append(message_id)
+        thread['message_count'] += 1
+        if 'last_message_at' not in thread or (created_at, message_id) >= (thread['last_message_at'], thread['last_message_id']):
+            thread['last_message_id'] = message_id
+            thread['last_message_at'] = created_at
+        if not is_read and not recipient_deleted:
+            thread['user1_unread_count' if recipient_id == key[0] else 'user2_unread_count'] += 1
+
+    for thread in threads.values():
+        message_ids = thread.pop('message_ids')
+        created_at = thread.pop('created_at')
+        thread_obj = MessageThread.objects.create(**thread)
+        MessageThread.objects.filter(pk=thread_obj.pk).update(created_at=created_at)
+        Message.objects.filter(id__in=message_ids).update(thread_id=thread_obj.pk)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0029_keyset_pagination_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MessageThread',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(max_length=200, verbose_name='主旨')),
+                ('last_message_at', models.DateTimeField(blank=True, null=True, verbose_name='最後訊息時間')),
+                ('message_count', models.PositiveIntegerField(default=0, verbose_name='訊息數')),
+                ('user1_unread_count', models.PositiveIntegerField(default=0, verbose_name='用戶1未讀數')),
+                ('user2_unread_count', models.PositiveIntegerField(default=0, verbose_name='用戶2未讀數')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='建立時間')),
+                ('last_message', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='blog.message', verbose_name='最後訊息')),
+                ('user1', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='message_threads_as_user1', to=settings.AUTH_USER_MODEL, verbose_name='用戶1')),
+                ('user2', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='message_threads_as_user2', to=settings.AUTH_USER_MODEL, verbose_name='用戶2')),
+            ],
+            options={
+                'verbose_name': '訊息對話串',
+                'verbose_name_plural': '訊息對話串',
+                'ordering': ['-last_message_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='thread',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='blog.messagethread', verbose_name='對話串'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['thread', 'created_at', 'id'], name='blog_messag_thread__bf8c8c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(condition=models.Q(('is_read', False), ('recipient_deleted', False)), fields=['recipient'], name='message_unread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(condition=models.Q(('is_read', False), ('recipient_deleted', False)), fields=['thread', 'recipient'], name='message_thread_unread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='messagethread',
+            index=models.Index(fields=['user1', '-last_message_at', '-id'], name='blog_messag_user1_i_255e97_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='messagethread',
+            index=models.Index(fields=['user2', '-last_message_at', '-id'], name='blog_messag_user2_i_2904cf_idx'),
+        ),
+        migrations.RunPython(build_message_threads, migrations.RunPython.noop),
+    ]
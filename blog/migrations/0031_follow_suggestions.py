@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0030_message_threads'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FollowSuggestion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(default=0, verbose_name='分數')),
+                ('mutual_count', models.PositiveIntegerField(default=0, verbose_name='共同追蹤數')),
+                ('shared_tag_count', models.PositiveIntegerField(default=0, verbose_name='共同興趣標籤數')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='計算時間')),
+                ('suggested_user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='推薦用戶')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='follow_suggestions', to=settings.AUTH_USER_MODEL, verbose_name='用戶')),
+            ],
+            options={
+                'verbose_name': '推薦追蹤',
+                'verbose_name_plural': '推薦追蹤',
+                'ordering': ['-score'],
+                'indexes': [models.Index(fields=['user', '-score'], name='blog_follow_user_id_2154e7_idx')],
+                'unique_together': {('user', 'suggested_user')},
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:29
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0031_follow_suggestions'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(verbose_name='發布時間')),
+                ('article', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='blog.article', verbose_name='文章')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='作者')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to=settings.AUTH_USER_MODEL, verbose_name='用戶')),
+            ],
+            options={
+                'verbose_name': '追蹤時間軸',
+                'verbose_name_plural': '追蹤時間軸',
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['user', '-created_at', '-id'], name='blog_timeli_user_id_58e9ee_idx'), models.Index(fields=['user', 'author'], name='blog_timeli_user_id_1c1204_idx')],
+                'unique_together': {('user', 'article')},
+            },
+        ),
+    ]
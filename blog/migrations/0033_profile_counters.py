@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:32
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_profile_counters(apps, schema_editor):
+    """依既有的文章、留言、按讚與追蹤關係計算所有個人資料的統計計數"""
+    UserProfile = apps.get_model('blog', 'UserProfile')
+    Article = apps.get_model('blog', 'Article')
+    Comment = apps.get_model('blog', 'Comment')
+    Like = apps.get_model('blog', 'Like')
+    Follow = apps.get_model('blog', 'Follow')
+
+    def counted(queryset, user_field):
+        subquery = queryset.filter(**{user_field: OuterRef('user_id')}).order_by().values(user_field).annotate(
+            total=Count('id')
+        ).values('total')
+        return Coalesce(Subquery(subquery, output_field=IntegerField()), 0)
+
+    UserProfile.objects.update(
+        article_count=counted(Article.objects.all(), 'author_id'),
+        comment_count=counted(Comment.objects.all(), 'author_id'),
+        likes_received_count=counted(Like.objects.all(), 'article__author_id'),
+        follower_count=counted(Follow.objects.all(), 'following_id'),
+        following_count=counted(Follow.objects.all(), 'follower_id'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0032_timeline_entries'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='article_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='文章數'),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='留言數'),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='follower_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='追蹤者數'),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='追蹤中數'),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='likes_received_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='獲讚數'),
+        ),
+        migrations.RunPython(count_profile_counters, migrations.RunPython.noop),
+    ]
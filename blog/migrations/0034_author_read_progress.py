@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:35
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def build_author_read_progress(apps, schema_editor):
+    """依既有的文章與閱讀記錄計算作者的已發布文章數與用戶對各作者的已閱讀文章數"""
+    UserProfile = apps.get_model('blog', 'UserProfile')
+    Article = apps.get_model('blog', 'Article')
+    ArticleReadHistory = apps.get_model('blog', 'ArticleReadHistory')
+    AuthorReadProgress = apps.get_model('blog', 'AuthorReadProgress')
+
+    published = Article.objects.filter(
+        author_id=OuterRef('user_id'),
+        status='published'
+    ).order_by().values('author_id').annotate(total=Count('id')).values('total')
+    UserProfile.objects.update(
+        published_article_count=Coalesce(Subquery(published, output_field=IntegerField()), 0)
+    )
+
+    rows = ArticleReadHistory.objects.filter(
+        article__author__isnull=False
+    ).values_list('user_id', 'article__author_id').annotate(total=Count('id')).order_by()
+    batch = []
+    for user_id, author_id, total in rows.iterator(chunk_size=5000):
+        batch.append(AuthorReadProgress(user_id=user_id, author_id=author_id, read_count=total))
+        if len(batch) >= 1000:
+            AuthorReadProgress.objects.bulk_create(batch)
+            batch = []
+    AuthorReadProgress.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0033_profile_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='published_article_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='已發布文章數'),
+        ),
+        migrations.CreateModel(
+            name='AuthorReadProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('read_count', models.PositiveIntegerField(default=0, verbose_name='已閱讀文章數')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新時間')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='作者')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='author_read_progress', to=settings.AUTH_USER_MODEL, verbose_name='用戶')),
+            ],
+            options={
+                'verbose_name': '作者閱讀進度',
+                'verbose_name_plural': '作者閱讀進度',
+                'unique_together': {('user', 'author')},
+            },
+        ),
+        migrations.RunPython(build_author_read_progress, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0034_author_read_progress'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AchievementEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_type', models.CharField(choices=[('article', '發表文章'), ('comment', '發表留言'), ('follower', '獲得追蹤者'), ('like_given', '按讚'), ('like_received', '文章獲讚'), ('course', '完成課程'), ('profile', '更新個人資料')], max_length=20, verbose_name='事件類型')),
+                ('object_id', models.IntegerField(blank=True, null=True, verbose_name='相關物件ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='建立時間')),
+                ('locked_at', models.DateTimeField(blank=True, null=True, verbose_name='取出時間')),
+                ('locked_by', models.CharField(blank=True, max_length=64, verbose_name='處理的 worker')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='achievement_events', to=settings.AUTH_USER_MODEL, verbose_name='使用者')),
+            ],
+            options={
+                'verbose_name': '成就事件',
+                'verbose_name_plural': '成就事件',
+                'indexes': [models.Index(fields=['created_at'], name='blog_achiev_created_0c2772_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:48
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, Concat
+
+
+def fill_aggregation_key(apps, schema_editor):
+    """既有通知以關聯物件作為合併依據（與 create_notification 的預設相同）"""
+    Notification = apps.get_model('blog', 'Notification')
+    Notification.objects.filter(content_type__isnull=False, object_id__isnull=False).update(
+        aggregation_key=Concat(
+            Cast('content_type_id', CharField()), Value(':'), Cast('object_id', CharField()),
+            output_field=CharField()
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0035_achievement_events'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='notification',
+            name='blog_notifi_user_id_8a7a46_idx',
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='aggregation_key',
+            field=models.CharField(blank=True, default='', max_length=100, verbose_name='合併依據'),
+        ),
+        migrations.RunPython(fill_aggregation_key, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'notification_type', 'aggregation_key'], name='blog_notifi_user_id_709d9a_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:15
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def open_latest_aggregations(apps, schema_editor):
+    """每組（接收者、類型、合併依據）最新的一筆可合併通知設為合併中，部署後的事件繼續合併到該通知"""
+    Notification = apps.get_model('blog', 'Notification')
+    latest = Notification.objects.filter(
+        user_id=OuterRef('user_id'),
+        notification_type=OuterRef('notification_type'),
+        aggregation_key=OuterRef('aggregation_key'),
+    ).order_by('-created_at', '-id').values('id')[:1]
+    Notification.objects.filter(
+        notification_type__in=['like', 'share', 'comment'],
+        aggregation_key__gt='',
+        id=Subquery(latest),
+    ).update(is_aggregation_open=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0036_notification_aggregation_key'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='notification',
+            name='blog_notifi_user_id_709d9a_idx',
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='is_aggregation_open',
+            field=models.BooleanField(default=False, verbose_name='合併中'),
+        ),
+        migrations.RunPython(open_latest_aggregations, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_aggregation_open', True)), fields=('user', 'notification_type', 'aggregation_key'), name='unique_open_notification_aggregation'),
+        ),
+    ]
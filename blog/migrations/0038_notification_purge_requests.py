@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0037_notification_open_aggregation'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationpurgelog',
+            name='locked_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='處理中時間'),
+        ),
+        migrations.AddField(
+            model_name='notificationpurgelog',
+            name='notification_ids',
+            field=models.JSONField(blank=True, default=list, verbose_name='通知 ID'),
+        ),
+        migrations.AddField(
+            model_name='notificationpurgelog',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='用戶'),
+        ),
+    ]
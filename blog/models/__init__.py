@@ -4,7 +4,7 @@ Blog app 的 Models 模組
 """
 
 # 文章相關 models
-from .article import Tag, Article, ArticleReadHistory, Comment, Like, Bookmark, ArticleShare
+from .article import Tag, Article, ArticleReadHistory, AuthorReadProgress, Comment, Like, Bookmark, ArticleShare, TimelineEntry
 
 # 會員相關 models
 from .member import (
@@ -12,15 +12,18 @@ from .member import (
     Skill,
     Achievement,
     UserAchievement,
+    AchievementEvent,
     LearningCourse,
     UserCourseProgress,
     Activity,
     Follow,
+    FollowSuggestion,
     Message,
+    MessageThread,
 )
 
 # 通知相關 models
-from .notification import Notification, NotificationPreference
+from .notification import Notification, NotificationPreference, NotificationPurgeLog
 
 # 社群互動相關 models
 from .social import (
@@ -38,8 +41,11 @@ from .social import (
 # 即時聊天相關 models
 from .chat import ChatMessage, ChatRoom
 
+# Channel Layer 相關 models
+from .channel_layer import ChannelGroupMembership, ChannelLayerMessage
+
 # PWA 推播通知相關 models
-from .push_subscription import PushSubscription
+from .push_subscription import PushSubscription, PushOutbox
 
 # 搜尋相關 models
 from .search import SearchHistory
@@ -52,23 +58,29 @@ __all__ = [
     'Tag',
     'Article',
     'ArticleReadHistory',
+    'AuthorReadProgress',
     'Comment',
     'Like',
     'Bookmark',
     'ArticleShare',
+    'TimelineEntry',
     # 會員相關
     'UserProfile',
     'Skill',
     'Achievement',
     'UserAchievement',
+    'AchievementEvent',
     'LearningCourse',
     'UserCourseProgress',
     'Activity',
     'Follow',
+    'FollowSuggestion',
     'Message',
+    'MessageThread',
     # 通知相關
     'Notification',
     'NotificationPreference',
+    'NotificationPurgeLog',
     # 社群互動相關
     'Mention',
     'ArticleCollaborator',
@@ -82,8 +94,12 @@ __all__ = [
     # 即時聊天相關
     'ChatMessage',
     'ChatRoom',
+    # Channel Layer 相關
+    'ChannelGroupMembership',
+    'ChannelLayerMessage',
     # PWA 推播通知相關
     'PushSubscription',
+    'PushOutbox',
     # 搜尋相關
     'SearchHistory',
     # 安全相關
@@ -1,7 +1,8 @@
 """
 文章相關的 Models
 """
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.utils.text import slugify
@@ -121,14 +122,19 @@ class Article(models.Model):
             self.reading_time = max(1, round(word_count / 200))
 
         # 檢查是否為首次發布（從草稿或排程變為已發布）
+        # _newly_published 供 post_save 信號將文章推送到追蹤者的時間軸
+        self._newly_published = not self.pk
+        was_published = False
         if self.pk:  # 如果文章已存在（不是第一次創建）
             try:
                 old_article = Article.objects.get(pk=self.pk)
+                was_published = old_article.status == 'published'
                 # 如果從草稿或排程狀態變為發布狀態，更新 created_at 為當前時間
                 if old_article.status in ['draft', 'scheduled'] and self.status == 'published':
                     self.created_at = timezone.now()
+                    self._newly_published = True
             except Article.DoesNotExist:
-                pass
+                self._newly_published = True
 
         # 如果是排程文章，自動設定狀態
         if self.publish_at:
@@ -139,6 +145,9 @@ class Article(models.Model):
             if self.publish_at > timezone.now():
                 self.status = 'scheduled'
 
+        self._newly_published = self._newly_published and self.status == 'published'
+        # _published_delta 供 post_save 信號調整作者的已發布文章數（發布 +1、取消發布 -1）
+        self._published_delta = int(self.status == 'published') - int(was_published)
         super().save(*args, **kwargs)
 
     @property
@@ -223,6 +232,10 @@ class Article(models.Model):
         verbose_name = '文章'
         verbose_name_plural = '文章'
         ordering = ['-created_at']
+        indexes = [
+            # 文章列表（無限滾動）的 keyset 分頁
+            models.Index(fields=['status', '-created_at', '-id']),
+        ]
 
 
 class ArticleReadHistory(models.Model):
@@ -254,6 +267,50 @@ class ArticleReadHistory(models.Model):
         unique_together = ['user', 'article']  # 確保每個用戶對每篇文章只有一條記錄
 
 
+class AuthorReadProgress(models.Model):
+    """
+    用戶閱讀各作者文章的進度
+    新增／刪除閱讀記錄時由 signals 累加該作者的已閱讀文章數，
+    個人頁面的學習進度與作者的已發布文章數（UserProfile.published_article_count）相除即可，
+    不必讀取所有閱讀記錄再逐位作者計算文章數
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='author_read_progress',
+        verbose_name='用戶'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='作者'
+    )
+    read_count = models.PositiveIntegerField(default=0, verbose_name='已閱讀文章數')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='更新時間')
+
+    def __str__(self):
+        return f"{self.user.username} 已閱讀 {self.author.username} 的 {self.read_count} 篇文章"
+
+    class Meta:
+        verbose_name = '作者閱讀進度'
+        verbose_name_plural = '作者閱讀進度'
+        unique_together = ['user', 'author']
+
+    @classmethod
+    def record_read(cls, user_id, author_id):
+        """用戶首次閱讀作者的一篇文章時累加已閱讀文章數（沒有記錄時建立）"""
+        progress = cls.objects.filter(user_id=user_id, author_id=author_id)
+        if progress.update(read_count=F('read_count') + 1, updated_at=timezone.now()):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(user_id=user_id, author_id=author_id, read_count=1)
+        except IntegrityError:
+            # 同時有其他請求建立了記錄
+            progress.update(read_count=F('read_count') + 1, updated_at=timezone.now())
+
+
 class Comment(models.Model):
     """文章留言模型"""
     article = models.ForeignKey(
@@ -287,6 +344,10 @@ class Comment(models.Model):
         verbose_name = '留言'
         verbose_name_plural = '留言'
         ordering = ['-created_at']
+        indexes = [
+            # 後台留言列表的 keyset 分頁
+            models.Index(fields=['-created_at', '-id']),
+        ]
 
 
 class Like(models.Model):
@@ -342,6 +403,48 @@ class Bookmark(models.Model):
         ordering = ['-created_at']
 
 
+class TimelineEntry(models.Model):
+    """
+    追蹤時間軸
+    追蹤的作者發布文章時寫入每位追蹤者的時間軸（fan-out on write），
+    每位用戶最多保留 TIMELINE_MAX_ENTRIES 筆
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='用戶'
+    )
+    article = models.ForeignKey(
+        Article,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='文章'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='作者'
+    )
+    created_at = models.DateTimeField(verbose_name='發布時間')
+
+    def __str__(self):
+        return f"{self.user.username} ← {self.article.title}"
+
+    class Meta:
+        verbose_name = '追蹤時間軸'
+        verbose_name_plural = '追蹤時間軸'
+        ordering = ['-created_at', '-id']
+        unique_together = ['user', 'article']
+        indexes = [
+            # 時間軸依發布時間排序（保留筆數的修剪）
+            models.Index(fields=['user', '-created_at', '-id']),
+            # 取消追蹤時移除該作者的文章
+            models.Index(fields=['user', 'author']),
+        ]
+
+
 class ArticleShare(models.Model):
     """文章分享統計模型"""
     PLATFORM_CHOICES = [
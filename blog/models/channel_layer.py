@@ -0,0 +1,55 @@
+"""
+Channel Layer 相關的 Models
+提供 blog.channel_layers.DatabaseChannelLayer 跨行程共用群組與訊息
+"""
+
+from django.db import models
+
+
+class ChannelGroupMembership(models.Model):
+    """
+    Channel Layer 群組成員
+
+    每個 Daphne 行程的 WebSocket 連線加入群組時寫入一筆，
+    group_send 依此找出所有行程中屬於該群組的 channel
+    """
+    group = models.CharField(max_length=100, verbose_name='群組名稱')
+    channel = models.CharField(max_length=100, verbose_name='Channel 名稱')
+    expires_at = models.DateTimeField(verbose_name='到期時間')
+
+    class Meta:
+        verbose_name = 'Channel 群組成員'
+        verbose_name_plural = 'Channel 群組成員'
+        constraints = [
+            models.UniqueConstraint(fields=['group', 'channel'], name='unique_channel_group_membership'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at']),
+        ]
+
+    def __str__(self):
+        return f'{self.group} - {self.channel}'
+
+
+class ChannelLayerMessage(models.Model):
+    """
+    Channel Layer 待投遞訊息
+
+    SQLite 開發環境中，各行程輪詢自己的收件匣（inbox）取出訊息；
+    PostgreSQL 只有超過 NOTIFY 長度上限的訊息才會寫入此表
+    """
+    inbox = models.CharField(max_length=100, verbose_name='收件匣')
+    payload = models.TextField(verbose_name='訊息內容')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='建立時間')
+    expires_at = models.DateTimeField(verbose_name='到期時間')
+
+    class Meta:
+        verbose_name = 'Channel Layer 訊息'
+        verbose_name_plural = 'Channel Layer 訊息'
+        indexes = [
+            models.Index(fields=['inbox', 'id']),
+            models.Index(fields=['expires_at']),
+        ]
+
+    def __str__(self):
+        return f'{self.inbox} #{self.id}'
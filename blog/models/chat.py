@@ -3,8 +3,10 @@
 與傳統的私人訊息（Message）系統分離
 """
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, Count, F, Q, Value, When
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 
 class ChatMessage(models.Model):
@@ -25,7 +27,8 @@ class ChatMessage(models.Model):
         verbose_name='接收者'
     )
     content = models.TextField(verbose_name='訊息內容')
-    created_at = models.DateTimeField(auto_now_add=True, verbose_name='發送時間')
+    # 使用 default 而非 auto_now_add：批次寫入時保留訊息送出（廣播）當下的時間
+    created_at = models.DateTimeField(default=timezone.now, verbose_name='發送時間')
     is_read = models.BooleanField(default=False, verbose_name='是否已讀')
     read_at = models.DateTimeField(null=True, blank=True, verbose_name='已讀時間')
 
@@ -52,9 +55,13 @@ class ChatMessage(models.Model):
 
 class ChatRoom(models.Model):
     """
-    聊天室（可選）
-    用於追蹤兩個用戶之間的聊天狀態
+    聊天室（對話摘要）
+    記錄兩個用戶之間的最後一則訊息與雙方未讀數，
+    由 ChatConsumer 發送訊息與標記已讀時同步更新，聊天列表只需查詢這張表
     """
+    # 訊息預覽的最大長度
+    PREVIEW_LENGTH = 100
+
     user1 = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -68,7 +75,26 @@ class ChatRoom(models.Model):
         verbose_name='用戶2'
     )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='創建時間')
-    last_message_at = models.DateTimeField(auto_now=True, verbose_name='最後訊息時間')
+    last_message = models.ForeignKey(
+        ChatMessage,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='最後訊息'
+    )
+    last_message_sender = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='最後訊息發送者'
+    )
+    last_message_preview = models.CharField(max_length=PREVIEW_LENGTH, blank=True, verbose_name='最後訊息預覽')
+    last_message_at = models.DateTimeField(null=True, blank=True, verbose_name='最後訊息時間')
+    user1_unread_count = models.PositiveIntegerField(default=0, verbose_name='用戶1未讀數')
+    user2_unread_count = models.PositiveIntegerField(default=0, verbose_name='用戶2未讀數')
 
     class Meta:
         verbose_name = '聊天室'
@@ -81,10 +107,28 @@ class ChatRoom(models.Model):
                 name='unique_chat_room'
             )
         ]
+        indexes = [
+            # 聊天列表：某用戶的所有對話，依最後訊息時間排序
+            models.Index(fields=['user1', '-last_message_at']),
+            models.Index(fields=['user2', '-last_message_at']),
+            # 管理後台：所有對話依最後訊息或建立（第一則訊息）時間排序
+            models.Index(fields=['-last_message_at']),
+            models.Index(fields=['created_at']),
+        ]
 
     def __str__(self):
         return f'{self.user1.username} ↔ {self.user2.username}'
 
+    @property
+    def room_key(self):
+        """管理後台使用的聊天室識別字串（格式: "user1_id-user2_id"）"""
+        return f'{self.user1_id}-{self.user2_id}'
+
+    @staticmethod
+    def _ordered_ids(user_a_id, user_b_id):
+        """兩個用戶 ID 依大小排序（user1 為較小者）"""
+        return (user_a_id, user_b_id) if user_a_id <= user_b_id else (user_b_id, user_a_id)
+
     @classmethod
     def get_or_create_room(cls, user1, user2):
         """
@@ -100,10 +144,129 @@ class ChatRoom(models.Model):
         )
         return room
 
+    @classmethod
+    def for_users(cls, user_a_id, user_b_id):
+        """兩個用戶之間聊天室的 QuerySet（不論傳入順序）"""
+        user1_id, user2_id = cls._ordered_ids(user_a_id, user_b_id)
+        return cls.objects.filter(user1_id=user1_id, user2_id=user2_id)
+
+    @classmethod
+    def record_message(cls, message):
+        """新訊息寫入後更新對話摘要（應在與建立訊息相同的 transaction 中呼叫）"""
+        cls.record_messages([message])
+
+    @classmethod
+    def record_messages(cls, messages):
+        """
+        一批新訊息寫入後更新對話摘要（應在與建立訊息相同的 transaction 中呼叫）
+
+        每段對話以單一 UPDATE 原子地累加雙方未讀數；
+        最後訊息欄位只在此批最新的訊息比目前記錄的更新時才覆寫，避免並行寫入時被較舊的訊息蓋掉
+        """
+        conversations = {}
+        for message in messages:
+            key = cls._ordered_ids(message.sender_id, message.recipient_id)
+            conversation = conversations.setdefault(key, {'last': message, 'user1': 0, 'user2': 0})
+            if (message.created_at, message.id or 0) >= (conversation['last'].created_at, conversation['last'].id or 0):
+                conversation['last'] = message
+            conversation['user1' if message.recipient_id == key[0] else 'user2'] += 1
+
+        if not conversations:
+            return
+
+        cls.objects.bulk_create(
+            [cls(user1_id=user1_id, user2_id=user2_id) for user1_id, user2_id in conversations],
+            ignore_conflicts=True
+        )
+
+        for (user1_id, user2_id), conversation in conversations.items():
+            last = conversation['last']
+            is_newer = Q(last_message_at__isnull=True) | Q(last_message_at__lte=last.created_at)
+
+            def newer(value, field):
+                return Case(
+                    When(is_newer, then=Value(value)),
+                    default=F(field),
+                    output_field=cls._meta.get_field(field)
+                )
+
+            cls.objects.filter(user1_id=user1_id, user2_id=user2_id).update(
+                last_message_id=newer(last.id, 'last_message_id'),
+                last_message_sender_id=newer(last.sender_id, 'last_message_sender_id'),
+                last_message_preview=newer(last.content[:cls.PREVIEW_LENGTH], 'last_message_preview'),
+                last_message_at=newer(last.created_at, 'last_message_at'),
+                user1_unread_count=F('user1_unread_count') + conversation['user1'],
+                user2_unread_count=F('user2_unread_count') + conversation['user2'],
+            )
+
+    @classmethod
+    def mark_read(cls, reader, other_user):
+        """
+        將 other_user 發給 reader 的訊息全部標記為已讀，並歸零 reader 這一側的未讀數
+
+        先鎖定聊天室資料列再更新訊息：與 record_message 的 UPDATE 互斥，
+        確保未讀數與實際未讀訊息一致
+
+        Returns:
+            int: 標記為已讀的訊息數
+        """
+        user1_id, user2_id = cls._ordered_ids(reader.id, other_user.id)
+        unread_field = 'user1_unread_count' if reader.id == user1_id else 'user2_unread_count'
+
+        with transaction.atomic():
+            room_ids = list(cls.objects.select_for_update().filter(
+                user1_id=user1_id, user2_id=user2_id
+            ).values_list('id', flat=True))
+
+            updated = ChatMessage.objects.filter(
+                sender=other_user,
+                recipient=reader,
+                is_read=False
+            ).update(is_read=True, read_at=timezone.now())
+
+            if room_ids:
+                cls.objects.filter(id__in=room_ids).update(**{unread_field: 0})
+
+        return updated
+
+    @classmethod
+    def rebuild_summary(cls, user_a_id, user_b_id):
+        """
+        從 ChatMessage 重新計算兩人之間的對話摘要（刪除訊息後使用）
+        沒有任何訊息時刪除聊天室
+        """
+        user1_id, user2_id = cls._ordered_ids(user_a_id, user_b_id)
+        messages = ChatMessage.objects.filter(
+            Q(sender_id=user1_id, recipient_id=user2_id) |
+            Q(sender_id=user2_id, recipient_id=user1_id)
+        )
+        last_message = messages.order_by('-created_at', '-id').first()
+        if last_message is None:
+            cls.objects.filter(user1_id=user1_id, user2_id=user2_id).delete()
+            return None
+
+        unread = messages.filter(is_read=False).aggregate(
+            user1=Count('id', filter=Q(recipient_id=user1_id)),
+            user2=Count('id', filter=Q(recipient_id=user2_id)),
+        )
+        room, created = cls.objects.update_or_create(
+            user1_id=user1_id,
+            user2_id=user2_id,
+            defaults={
+                'last_message': last_message,
+                'last_message_sender_id': last_message.sender_id,
+                'last_message_preview': last_message.content[:cls.PREVIEW_LENGTH],
+                'last_message_at': last_message.created_at,
+                'user1_unread_count': unread['user1'],
+                'user2_unread_count': unread['user2'],
+            }
+        )
+        return room
+
+    def get_other_user(self, user):
+        """取得對話中的另一位用戶"""
+        return self.user2 if user.id == self.user1_id else self.user1
+
     def get_unread_count(self, user):
         """獲取未讀訊息數量"""
-        return ChatMessage.objects.filter(
-            sender=self.user1 if user == self.user2 else self.user2,
-            recipient=user,
-            is_read=False
-        ).count()
+        return self.user1_unread_count if user.id == self.user1_id else self.user2_unread_count
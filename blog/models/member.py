@@ -3,6 +3,10 @@
 """
 import os
 from django.db import models
+from django.db.models import Case, F, Value, When
+from django.db.models.fields.files import FieldFile
+from django.db.models.functions import Greatest
+from django.db.models.lookups import GreaterThanOrEqual
 from django.contrib.auth.models import User
 from django.db.models.signals import pre_save
 from django.dispatch import receiver
@@ -48,12 +52,143 @@ class UserProfile(models.Model):
     website = models.URLField(max_length=200, blank=True, verbose_name='個人網站')
     github = models.CharField(max_length=100, blank=True, verbose_name='GitHub')
 
+    # 統計計數（由 signals 在文章新增／發布／刪除、留言、按讚、追蹤時以 UPDATE 維護，
+    # 與實際資料的差異由 `python manage.py reconcile_profile_counters` 校正）
+    article_count = models.PositiveIntegerField(default=0, verbose_name='文章數')
+    published_article_count = models.PositiveIntegerField(default=0, verbose_name='已發布文章數')
+    comment_count = models.PositiveIntegerField(default=0, verbose_name='留言數')
+    likes_received_count = models.PositiveIntegerField(default=0, verbose_name='獲讚數')
+    follower_count = models.PositiveIntegerField(default=0, verbose_name='追蹤者數')
+    following_count = models.PositiveIntegerField(default=0, verbose_name='追蹤中數')
+
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='建立時間')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='更新時間')
 
+    # 積分門檻與對應等級（由高到低）
+    LEVEL_THRESHOLDS = (
+        (20000, 'Diamond'),
+        (10000, 'Platinum'),
+        (5000, 'Gold'),
+        (2500, 'Silver'),
+        (1000, 'Silver'),
+    )
+
+    COUNTER_FIELDS = (
+        'article_count',
+        'published_article_count',
+        'comment_count',
+        'likes_received_count',
+        'follower_count',
+        'following_count',
+    )
+
     def __str__(self):
         return f'{self.user.username} 的個人資料'
 
+    # 由 adjust_counter / award_points 以 UPDATE 累加的欄位，save() 預設不寫入
+    PROTECTED_FIELDS = COUNTER_FIELDS + ('points', 'level')
+
+    # 個人資料完整度成就檢查的個人資料欄位（其餘為用戶的姓名、Email 與技能）
+    COMPLETENESS_FIELDS = ('bio', 'school', 'grade', 'location', 'birthday', 'website', 'github', 'avatar')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_loaded(field_names)
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        self._remember_loaded(fields)
+
+    def _remember_loaded(self, field_names=None):
+        """
+        記錄讀取（或寫入）時的統計計數、積分、等級與完整度欄位，
+        供 save() 判斷受保護的欄位是否在記憶體中被修改、post_save 判斷完整度欄位是否改變
+        """
+        loaded = self.__dict__.setdefault('_loaded_values', {})
+        for name in self.PROTECTED_FIELDS + self.COMPLETENESS_FIELDS:
+            if (field_names is None or name in field_names) and name in self.__dict__:
+                loaded[name] = self._tracked_value(name)
+
+    def _tracked_value(self, name):
+        value = self.__dict__.get(name)
+        # 頭像以檔名比較（FieldFile 重新上傳時會就地修改）
+        return value.name if isinstance(value, FieldFile) else value
+
+    def _changed_fields(self, names):
+        loaded = self.__dict__.get('_loaded_values', {})
+        return [
+            name for name in names
+            if name in loaded and self._tracked_value(name) != loaded[name]
+        ]
+
+    def changed_protected_fields(self):
+        """讀取後在記憶體中被修改的統計計數、積分與等級"""
+        return self._changed_fields(self.PROTECTED_FIELDS)
+
+    def changed_completeness_fields(self):
+        """讀取（或上次儲存）後被修改的個人資料完整度欄位"""
+        return self._changed_fields(self.COMPLETENESS_FIELDS)
+
+    @classmethod
+    def editable_fields(cls):
+        """save() 預設寫入的欄位（統計計數、積分與等級以外的欄位）"""
+        return [
+            field.name for field in cls._meta.concrete_fields
+            if not field.primary_key and field.name not in cls.PROTECTED_FIELDS
+        ]
+
+    def save(self, *args, **kwargs):
+        """
+        更新既有資料時不寫入統計計數、積分與等級，
+        避免以較早讀取的值覆寫其他請求或成就佇列以 adjust_counter / award_points 累加的結果；
+        未指定 update_fields 卻修改了這些欄位時拋出 ValueError（需要直接寫入時請明確指定 update_fields）
+        """
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            changed = self.changed_protected_fields()
+            if changed:
+                raise ValueError(
+                    f'UserProfile.save() 不寫入 {", ".join(changed)}，'
+                    f'請改用 adjust_counter / award_points，或以 update_fields 明確指定'
+                )
+            kwargs['update_fields'] = self.editable_fields()
+        super().save(*args, **kwargs)
+        self._remember_loaded(kwargs.get('update_fields'))
+
+    @classmethod
+    def adjust_counter(cls, field, delta, **filters):
+        """
+        以單一 UPDATE 增減符合條件的個人資料的統計計數（減少時不低於 0）
+
+        Returns:
+            int: 更新的筆數
+        """
+        queryset = cls.objects.filter(**filters)
+        if delta < 0:
+            queryset = queryset.filter(**{f'{field}__gte': -delta})
+        return queryset.update(**{field: F(field) + delta})
+
+    @classmethod
+    def decrement_counters(cls, amounts, **filters):
+        """
+        以單一 UPDATE 同時減少符合條件的個人資料的多個統計計數（各自不低於 0），
+        刪除文章或用戶時一次扣除連帶刪除的讚、留言與追蹤
+
+        Args:
+            amounts: {計數欄位: 減少的數量或計算數量的子查詢}（數量為 0 的欄位不更新）
+
+        Returns:
+            int: 更新的筆數
+        """
+        changes = {
+            field: Greatest(F(field) - amount, Value(0))
+            for field, amount in amounts.items() if amount
+        }
+        if not changes:
+            return 0
+        return cls.objects.filter(**filters).update(**changes)
+
     def get_avatar_url(self):
         """
         獲取帶有版本參數的頭像 URL
@@ -99,25 +234,35 @@ class UserProfile(models.Model):
         return 20000
 
     def add_points(self, points):
-        """增加積分並自動升級"""
-        self.points += points
-        self._update_level()
-        self.save()
+        """增加積分並自動升級（以 award_points 的 UPDATE 累加，再讀回積分與等級）"""
+        self.award_points(self.user_id, points)
+        self.refresh_from_db(fields=['points', 'level'])
 
-    def _update_level(self):
-        """根據積分更新等級"""
-        if self.points >= 20000:
-            self.level = 'Diamond'
-        elif self.points >= 10000:
-            self.level = 'Platinum'
-        elif self.points >= 5000:
-            self.level = 'Gold'
-        elif self.points >= 2500:
-            self.level = 'Silver'
-        elif self.points >= 1000:
-            self.level = 'Silver'
-        else:
-            self.level = 'Bronze'
+    @classmethod
+    def award_points(cls, user_id, points):
+        """
+        以單一 UPDATE 增加積分並依增加後的積分更新等級（不讀取、不儲存整份個人資料）
+
+        Returns:
+            int: 更新的筆數
+        """
+        new_points = F('points') + points
+        return cls.objects.filter(user_id=user_id).update(
+            # 等級放在積分之前：依序套用 SET 的資料庫（MySQL）也會以原本的積分計算
+            level=Case(
+                *[When(GreaterThanOrEqual(new_points, threshold), then=Value(level)) for threshold, level in cls.LEVEL_THRESHOLDS],
+                default=Value('Bronze'),
+            ),
+            points=new_points,
+        )
+
+    @classmethod
+    def level_for_points(cls, points):
+        """積分對應的等級"""
+        for threshold, level in cls.LEVEL_THRESHOLDS:
+            if points >= threshold:
+                return level
+        return 'Bronze'
 
 
 class Skill(models.Model):
@@ -182,6 +327,50 @@ class UserAchievement(models.Model):
         ordering = ['-unlocked_at']
 
 
+class AchievementEvent(models.Model):
+    """
+    待處理的成就事件
+    發表文章、留言、按讚、追蹤等寫入時只新增一筆事件（與該寫入在同一個 transaction），
+    提交後交給行程內的成就佇列在背景處理；行程中斷而未處理的事件由佇列定期掃描或
+    `python manage.py process_achievement_events` 接手
+    """
+    EVENT_ARTICLE = 'article'
+    EVENT_COMMENT = 'comment'
+    EVENT_FOLLOWER = 'follower'
+    EVENT_LIKE_GIVEN = 'like_given'
+    EVENT_LIKE_RECEIVED = 'like_received'
+    EVENT_COURSE = 'course'
+    EVENT_PROFILE = 'profile'
+
+    EVENT_CHOICES = [
+        (EVENT_ARTICLE, '發表文章'),
+        (EVENT_COMMENT, '發表留言'),
+        (EVENT_FOLLOWER, '獲得追蹤者'),
+        (EVENT_LIKE_GIVEN, '按讚'),
+        (EVENT_LIKE_RECEIVED, '文章獲讚'),
+        (EVENT_COURSE, '完成課程'),
+        (EVENT_PROFILE, '更新個人資料'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='achievement_events', verbose_name='使用者')
+    event_type = models.CharField(max_length=20, choices=EVENT_CHOICES, verbose_name='事件類型')
+    object_id = models.IntegerField(null=True, blank=True, verbose_name='相關物件ID')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='建立時間')
+    locked_at = models.DateTimeField(null=True, blank=True, verbose_name='取出時間')
+    locked_by = models.CharField(max_length=64, blank=True, verbose_name='處理的 worker')
+
+    def __str__(self):
+        return f'{self.user_id} - {self.get_event_type_display()}'
+
+    class Meta:
+        verbose_name = '成就事件'
+        verbose_name_plural = '成就事件'
+        indexes = [
+            # 掃描未處理或處理中斷的事件
+            models.Index(fields=['created_at']),
+        ]
+
+
 class LearningCourse(models.Model):
     """學習課程"""
     name = models.CharField(max_length=100, verbose_name='課程名稱')
@@ -285,6 +474,10 @@ class Activity(models.Model):
         verbose_name = '使用者活動'
         verbose_name_plural = '使用者活動'
         ordering = ['-created_at']
+        indexes = [
+            # 活動記錄的 keyset 分頁
+            models.Index(fields=['user', '-created_at', '-id']),
+        ]
 
 
 class Follow(models.Model):
@@ -301,6 +494,44 @@ class Follow(models.Model):
         verbose_name_plural = '追蹤關係'
         unique_together = ['follower', 'following']
         ordering = ['-created_at']
+        indexes = [
+            # 追蹤者／追蹤中列表的 keyset 分頁
+            models.Index(fields=['following', '-created_at', '-id']),
+            models.Index(fields=['follower', '-created_at', '-id']),
+        ]
+
+
+class FollowSuggestion(models.Model):
+    """
+    推薦追蹤
+    由 `python manage.py build_follow_suggestions` 依共同追蹤（朋友的朋友）與共同興趣標籤定期批次計算
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='follow_suggestions', verbose_name='用戶')
+    suggested_user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+', verbose_name='推薦用戶')
+    score = models.FloatField(default=0, verbose_name='分數')
+    mutual_count = models.PositiveIntegerField(default=0, verbose_name='共同追蹤數')
+    shared_tag_count = models.PositiveIntegerField(default=0, verbose_name='共同興趣標籤數')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='計算時間')
+
+    class Meta:
+        verbose_name = '推薦追蹤'
+        verbose_name_plural = '推薦追蹤'
+        unique_together = ['user', 'suggested_user']
+        ordering = ['-score']
+        indexes = [
+            models.Index(fields=['user', '-score']),
+        ]
+
+    def __str__(self):
+        return f'{self.user.username} → {self.suggested_user.username} ({self.score:.1f})'
+
+    def get_reason(self):
+        """推薦原因"""
+        if self.mutual_count:
+            return f'你追蹤的 {self.mutual_count} 位用戶也追蹤了這位用戶'
+        if self.shared_tag_count:
+            return f'經常撰寫 {self.shared_tag_count} 個你感興趣的標籤'
+        return '推薦追蹤'
 
 
 class Message(models.Model):
@@ -311,6 +542,7 @@ class Message(models.Model):
     content = models.TextField(verbose_name='內容')
     is_read = models.BooleanField(default=False, verbose_name='已讀')
     parent_message = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='replies', verbose_name='回覆訊息')
+    thread = models.ForeignKey('MessageThread', on_delete=models.CASCADE, null=True, blank=True, related_name='messages', verbose_name='對話串')
 
     # 刪除標記（軟刪除）
     sender_deleted = models.BooleanField(default=False, verbose_name='寄件者已刪除')
@@ -330,6 +562,24 @@ class Message(models.Model):
         verbose_name = '私人訊息'
         verbose_name_plural = '私人訊息'
         ordering = ['-created_at']
+        indexes = [
+            # 收件匣／寄件匣的 keyset 分頁
+            models.Index(fields=['recipient', 'recipient_deleted', '-created_at', '-id']),
+            models.Index(fields=['sender', 'sender_deleted', '-created_at', '-id']),
+            # 對話串內的訊息依時間排列
+            models.Index(fields=['thread', 'created_at', 'id']),
+            # 未讀訊息數（部分索引：只包含未讀且收件者未刪除的訊息，大小與信箱總量無關）
+            models.Index(
+                fields=['recipient'],
+                condition=models.Q(is_read=False, recipient_deleted=False),
+                name='message_unread_idx'
+            ),
+            models.Index(
+                fields=['thread', 'recipient'],
+                condition=models.Q(is_read=False, recipient_deleted=False),
+                name='message_thread_unread_idx'
+            ),
+        ]
 
     def mark_as_read(self):
         """標記為已讀"""
@@ -338,6 +588,8 @@ class Message(models.Model):
             self.is_read = True
             self.read_at = timezone.now()
             self.save()
+            if self.thread_id:
+                MessageThread.refresh([self.thread_id])
 
     def can_recall(self, user):
         """檢查是否可以收回訊息"""
@@ -360,6 +612,191 @@ class Message(models.Model):
         self.save()
 
 
+class MessageThread(models.Model):
+    """
+    私人訊息對話串
+    新訊息開啟一個對話串，之後的回覆都歸入同一串；
+    記錄最後一則訊息、訊息數與雙方的未讀數，列出對話與計算未讀數時不必掃描整個信箱
+    """
+    user1 = models.ForeignKey(User, on_delete=models.CASCADE, related_name='message_threads_as_user1', verbose_name='用戶1')
+    user2 = models.ForeignKey(User, on_delete=models.CASCADE, related_name='message_threads_as_user2', verbose_name='用戶2')
+    subject = models.CharField(max_length=200, verbose_name='主旨')
+
+    # 對話摘要
+    last_message = models.ForeignKey(
+        Message,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='最後訊息'
+    )
+    last_message_at = models.DateTimeField(null=True, blank=True, verbose_name='最後訊息時間')
+    message_count = models.PositiveIntegerField(default=0, verbose_name='訊息數')
+    user1_unread_count = models.PositiveIntegerField(default=0, verbose_name='用戶1未讀數')
+    user2_unread_count = models.PositiveIntegerField(default=0, verbose_name='用戶2未讀數')
+
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='建立時間')
+
+    class Meta:
+        verbose_name = '訊息對話串'
+        verbose_name_plural = '訊息對話串'
+        ordering = ['-last_message_at']
+        indexes = [
+            # 某用戶的所有對話串，依最後訊息時間排序
+            models.Index(fields=['user1', '-last_message_at', '-id']),
+            models.Index(fields=['user2', '-last_message_at', '-id']),
+        ]
+
+    def __str__(self):
+        return f'{self.user1.username} ↔ {self.user2.username}: {self.subject}'
+
+    @staticmethod
+    def _ordered_ids(user_a_id, user_b_id):
+        """兩個用戶 ID 依大小排序（user1 為較小者）"""
+        return (user_a_id, user_b_id) if user_a_id <= user_b_id else (user_b_id, user_a_id)
+
+    @classmethod
+    def start(cls, sender, recipient, subject):
+        """為一則新訊息（非回覆）建立對話串"""
+        user1_id, user2_id = cls._ordered_ids(sender.id, recipient.id)
+        return cls.objects.create(user1_id=user1_id, user2_id=user2_id, subject=subject)
+
+    @classmethod
+    def record_message(cls, message):
+        """
+        新訊息寫入後更新對話摘要（應在與建立訊息相同的 transaction 中呼叫）
+
+        以單一 UPDATE 原子地累加訊息數與收件者的未讀數；
+        最後訊息欄位只在此訊息比目前記錄的更新時才覆寫，避免並行寫入時被較舊的訊息蓋掉
+        """
+        from django.db.models import Case, F, Q, Value, When
+
+        thread = cls.objects.filter(pk=message.thread_id)
+        unread_field = 'user1_unread_count' if message.recipient_id <= message.sender_id else 'user2_unread_count'
+        is_newer = Q(last_message_at__isnull=True) | Q(last_message_at__lte=message.created_at)
+
+        def newer(value, field):
+            return Case(
+                When(is_newer, then=Value(value)),
+                default=F(field),
+                output_field=cls._meta.get_field(field)
+            )
+
+        thread.update(**{
+            'last_message_id': newer(message.id, 'last_message_id'),
+            'last_message_at': newer(message.created_at, 'last_message_at'),
+            'message_count': F('message_count') + 1,
+            unread_field: F(unread_field) + 1,
+        })
+
+    @classmethod
+    def refresh(cls, thread_ids):
+        """
+        從 Message 重新計算對話串的摘要（閱讀或刪除訊息後使用）
+        每個欄位都是走索引的子查詢；訊息都已刪除的對話串會一併刪除
+        """
+        from django.db.models import Count, IntegerField, OuterRef, Subquery
+        from django.db.models.functions import Coalesce
+
+        thread_ids = {thread_id for thread_id in thread_ids if thread_id}
+        if not thread_ids:
+            return
+
+        messages = Message.objects.filter(thread=OuterRef('pk'))
+        latest = messages.order_by('-created_at', '-id')
+
+        def count(queryset):
+            counted = queryset.order_by().values('thread').annotate(n=Count('id')).values('n')
+            return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+        unread = messages.filter(is_read=False, recipient_deleted=False)
+        threads = list(cls.objects.filter(id__in=thread_ids).annotate(
+            latest_id=Subquery(latest.values('id')[:1]),
+            latest_at=Subquery(latest.values('created_at')[:1]),
+            total=count(messages),
+            user1_unread=count(unread.filter(recipient=OuterRef('user1'))),
+            user2_unread=count(unread.filter(recipient=OuterRef('user2'))),
+        ))
+
+        empty_ids = [thread.id for thread in threads if thread.latest_id is None]
+        if empty_ids:
+            cls.objects.filter(id__in=empty_ids).delete()
+
+        threads = [thread for thread in threads if thread.latest_id is not None]
+        for thread in threads:
+            thread.last_message_id = thread.latest_id
+            thread.last_message_at = thread.latest_at
+            thread.message_count = thread.total
+            thread.user1_unread_count = thread.user1_unread
+            thread.user2_unread_count = thread.user2_unread
+        cls.objects.bulk_update(threads, [
+            'last_message', 'last_message_at', 'message_count', 'user1_unread_count', 'user2_unread_count'
+        ])
+
+    @classmethod
+    def for_user(cls, user):
+        """用戶參與的對話串，附帶自己這一側的未讀數（my_unread_count）"""
+        from django.db.models import Case, F, Q, When
+
+        return cls.objects.filter(Q(user1=user) | Q(user2=user)).annotate(
+            my_unread_count=Case(
+                When(user1=user, then=F('user1_unread_count')),
+                default=F('user2_unread_count'),
+            )
+        )
+
+    @classmethod
+    def unread_total(cls, user):
+        """用戶所有對話串的未讀訊息數（加總對話串上的未讀數，不掃描訊息）"""
+        from django.db.models import Case, F, Q, Sum, When
+
+        return cls.objects.filter(Q(user1=user) | Q(user2=user)).aggregate(
+            total=Sum(Case(
+                When(user1=user, then=F('user1_unread_count')),
+                default=F('user2_unread_count'),
+            ))
+        )['total'] or 0
+
+    def mark_read(self, reader):
+        """
+        將對話串中發給 reader 的訊息全部標記為已讀，並歸零 reader 這一側的未讀數
+
+        先鎖定對話串資料列再更新訊息：與 record_message 的 UPDATE 互斥，
+        確保未讀數與實際未讀訊息一致
+
+        Returns:
+            int: 標記為已讀的訊息數
+        """
+        from django.db import transaction
+        from django.utils import timezone
+
+        unread_field = self._unread_field(reader)
+        threads = type(self).objects.filter(pk=self.pk)
+
+        with transaction.atomic():
+            list(threads.select_for_update().values_list('id', flat=True))
+            updated = self.messages.filter(recipient=reader, is_read=False).update(
+                is_read=True,
+                read_at=timezone.now()
+            )
+            threads.update(**{unread_field: 0})
+
+        setattr(self, unread_field, 0)
+        return updated
+
+    def _unread_field(self, user):
+        return 'user1_unread_count' if user.id == self.user1_id else 'user2_unread_count'
+
+    def get_other_user(self, user):
+        """取得對話串中的另一位用戶"""
+        return self.user2 if user.id == self.user1_id else self.user1
+
+    def get_unread_count(self, user):
+        """獲取用戶在此對話串的未讀訊息數"""
+        return getattr(self, self._unread_field(user))
+
+
 # ===== 信號處理器 =====
 
 @receiver(pre_save, sender=UserProfile)
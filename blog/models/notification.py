@@ -99,14 +99,45 @@ class Notification(models.Model):
         verbose_name='已讀時間'
     )
 
+    # 合併通知：觸發人數與最近的觸發者（例如「A 和其他 12 人讚了您的文章」）
+    actor_count = models.PositiveIntegerField(
+        default=1,
+        verbose_name='觸發人數'
+    )
+    recent_actors = models.JSONField(
+        default=list,
+        blank=True,
+        verbose_name='最近觸發者'
+    )
+    # 合併依據（例如留言通知的關聯物件是留言，但依所屬文章合併）
+    aggregation_key = models.CharField(
+        max_length=100,
+        blank=True,
+        default='',
+        verbose_name='合併依據'
+    )
+    # 是否為同一接收者、類型與合併依據目前開啟合併的通知（每組最多一筆，超過時間窗後由下一個事件關閉）
+    is_aggregation_open = models.BooleanField(
+        default=False,
+        verbose_name='合併中'
+    )
+
     class Meta:
         verbose_name = '通知'
         verbose_name_plural = '通知'
         ordering = ['-created_at']
         indexes = [
-            models.Index(fields=['user', '-created_at']),
+            models.Index(fields=['user', '-created_at', '-id']),  # 通知中心的 keyset 分頁
             models.Index(fields=['user', 'is_read']),
         ]
+        # 同時發生的第一個事件不會各自建立一筆合併通知（後建立的一方改為合併）
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'notification_type', 'aggregation_key'],
+                condition=models.Q(is_aggregation_open=True),
+                name='unique_open_notification_aggregation'
+            )
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.get_notification_type_display()}: {self.message[:50]}"
@@ -118,6 +149,20 @@ class Notification(models.Model):
             self.read_at = timezone.now()
             self.save()
 
+    @property
+    def is_aggregated(self):
+        """是否為合併後的通知"""
+        return self.actor_count > 1
+
+    @property
+    def other_actors_count(self):
+        """除了最新觸發者之外的人數"""
+        return max(self.actor_count - 1, 0)
+
+    def get_recent_actor_names(self):
+        """取得最近觸發者的用戶名稱列表（最新的在前）"""
+        return [actor.get('username', '') for actor in self.recent_actors or []]
+
     def get_icon(self):
         """取得通知圖示"""
         icons = {
@@ -234,3 +279,90 @@ class NotificationPreference(models.Model):
         """為用戶取得或建立通知偏好"""
         preference, created = cls.objects.get_or_create(user=user)
         return preference
+
+
+class NotificationPurgeLog(models.Model):
+    """
+    通知清理記錄
+    記錄每次分批清理通知的筆數、批次數與封存檔案，作為清理指標；
+    用戶或後台觸發、第一批之後還有剩餘的清理同時是待處理的工作（finished_at 為空），
+    記錄清理範圍（用戶或通知 ID），行程重啟後由 purge_notifications 命令接手
+    """
+
+    TRIGGER_CHOICES = [
+        ('retention', '保留政策'),
+        ('user', '用戶刪除已讀'),
+        ('admin', '後台批量刪除'),
+    ]
+
+    trigger = models.CharField(
+        max_length=20,
+        choices=TRIGGER_CHOICES,
+        verbose_name='觸發來源'
+    )
+    notification_type = models.CharField(
+        max_length=20,
+        blank=True,
+        verbose_name='通知類型'
+    )
+    rows_purged = models.PositiveIntegerField(
+        default=0,
+        verbose_name='刪除筆數'
+    )
+    rows_archived = models.PositiveIntegerField(
+        default=0,
+        verbose_name='封存筆數'
+    )
+    batches = models.PositiveIntegerField(
+        default=0,
+        verbose_name='批次數'
+    )
+    archive_file = models.CharField(
+        max_length=500,
+        blank=True,
+        verbose_name='封存檔案'
+    )
+    # 清理範圍：用戶刪除已讀時為該用戶，後台批量刪除時為選取的通知 ID
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='用戶'
+    )
+    notification_ids = models.JSONField(
+        default=list,
+        blank=True,
+        verbose_name='通知 ID'
+    )
+    # 背景清理取得工作的時間（每批更新，超過租期未更新視為中斷，可被重新取出）
+    locked_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='處理中時間'
+    )
+    started_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='開始時間'
+    )
+    finished_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='完成時間'
+    )
+
+    class Meta:
+        verbose_name = '通知清理記錄'
+        verbose_name_plural = '通知清理記錄'
+        ordering = ['-started_at']
+
+    def __str__(self):
+        return f"{self.get_trigger_display()} - 刪除 {self.rows_purged} 筆 ({self.started_at:%Y-%m-%d %H:%M})"
+
+    @property
+    def duration_seconds(self):
+        """清理耗時（秒）"""
+        if not self.finished_at:
+            return None
+        return (self.finished_at - self.started_at).total_seconds()
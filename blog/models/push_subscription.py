@@ -4,6 +4,7 @@ Web Push 訂閱相關的 Models
 
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 
 class PushSubscription(models.Model):
@@ -79,3 +80,71 @@ class PushSubscription(models.Model):
         self.last_failure_at = None
         self.is_active = True
         self.save(update_fields=['failure_count', 'last_failure_at', 'is_active'])
+
+
+class PushOutbox(models.Model):
+    """
+    待發送的推播（Outbox）
+
+    網頁請求只寫入此表，由 `python manage.py process_push_outbox` worker 取出發送，
+    失敗時以指數退避重試，推播服務變慢時不會拖慢網頁請求。
+    """
+
+    STATUS_PENDING = 'pending'
+    STATUS_SENDING = 'sending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_GONE = 'gone'
+
+    STATUS_CHOICES = [
+        (STATUS_PENDING, '待發送'),
+        (STATUS_SENDING, '發送中'),
+        (STATUS_SENT, '已發送'),
+        (STATUS_FAILED, '發送失敗'),
+        (STATUS_GONE, '訂閱已失效'),
+    ]
+
+    subscription = models.ForeignKey(
+        PushSubscription,
+        on_delete=models.CASCADE,
+        related_name='outbox_items',
+        verbose_name='訂閱'
+    )
+    payload = models.JSONField(verbose_name='推播資料')
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING,
+        verbose_name='狀態'
+    )
+
+    # 重試記錄
+    attempts = models.PositiveIntegerField(default=0, verbose_name='嘗試次數')
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name='下次嘗試時間')
+    locked_at = models.DateTimeField(null=True, blank=True, verbose_name='取出時間')
+    locked_by = models.CharField(max_length=64, blank=True, verbose_name='處理的 worker')
+    last_status_code = models.IntegerField(null=True, blank=True, verbose_name='最後回應狀態碼')
+    last_error = models.TextField(blank=True, verbose_name='最後錯誤訊息')
+
+    # 延遲記錄
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='建立時間')
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name='發送時間')
+    send_latency_ms = models.FloatField(null=True, blank=True, verbose_name='推播服務回應時間（毫秒）')
+
+    class Meta:
+        verbose_name = '推播佇列'
+        verbose_name_plural = '推播佇列'
+        ordering = ['next_attempt_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f'{self.subscription_id} - {self.get_status_display()} ({self.attempts})'
+
+    @property
+    def queue_latency(self):
+        """從寫入佇列到發送完成的秒數"""
+        if self.sent_at:
+            return (self.sent_at - self.created_at).total_seconds()
+        return None
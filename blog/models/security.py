@@ -91,6 +91,7 @@ class LoginAttempt(models.Model):
             models.Index(fields=['ip_address', '-attempted_at']),
             models.Index(fields=['username', '-attempted_at']),
             models.Index(fields=['attempt_type', '-attempted_at']),
+            models.Index(fields=['-attempted_at', '-id']),  # 後台登入記錄的 keyset 分頁
         ]
 
     def __str__(self):
@@ -257,6 +258,9 @@ class IPBlacklist(models.Model):
         verbose_name = 'IP 黑名單'
         verbose_name_plural = 'IP 黑名單'
         ordering = ['-blocked_at']
+        indexes = [
+            models.Index(fields=['is_active', '-blocked_at', '-id']),
+        ]
 
     def __str__(self):
         return f"{self.ip_address} - {self.reason}"
@@ -1,7 +1,26 @@
-from django.db.models.signals import post_save
+from django.db.models import Count, F, OuterRef, QuerySet, Subquery
+from django.db.models.signals import post_save, post_delete, pre_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import UserProfile, Activity, Article, Comment, Like, Follow, UserCourseProgress
+from .models import UserProfile, Achievement, AchievementEvent, Article, ArticleReadHistory, AuthorReadProgress, Comment, Like, Follow, UserCourseProgress, Notification, Message
+
+
+def _deleted_with(origin, model):
+    """
+    刪除是否由 model 的物件（或 QuerySet）發起；
+    由文章、用戶連帶刪除的讚、留言與追蹤，計數已在該物件的 pre_delete 一次扣除
+    """
+    if origin is None:
+        return False
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return issubclass(origin_model, model)
+
+
+def _count_by(queryset, field):
+    """每位用戶在 queryset 中的筆數（供 UPDATE 以 OuterRef('user_id') 關聯的子查詢）"""
+    return Subquery(
+        queryset.filter(**{field: OuterRef('user_id')}).values(field).annotate(total=Count('id')).values('total')
+    )
 
 
 @receiver(post_save, sender=User)
@@ -13,104 +32,257 @@ def create_user_profile(sender, instance, created, **kwargs):
 
 @receiver(post_save, sender=User)
 def save_user_profile(sender, instance, **kwargs):
-    """當使用者儲存時，確保 UserProfile 也存在"""
-    if hasattr(instance, 'profile'):
-        instance.profile.save()
-    else:
+    """當使用者儲存時，確保 UserProfile 也存在（不重新寫入既有的個人資料，登入等更新不觸發個人資料的 signals）"""
+    if not hasattr(instance, 'profile'):
         UserProfile.objects.create(user=instance)
 
 
+@receiver(post_save, sender=Article)
+def increment_article_count(sender, instance, created, **kwargs):
+    """新增文章時累加作者的文章數"""
+    if created and instance.author_id:
+        UserProfile.adjust_counter('article_count', 1, user_id=instance.author_id)
+
+
+@receiver(post_save, sender=Article)
+def adjust_published_article_count(sender, instance, **kwargs):
+    """文章發布或取消發布時調整作者的已發布文章數（由 Article.save 記錄狀態變化）"""
+    delta = getattr(instance, '_published_delta', 0)
+    instance._published_delta = 0
+    if delta and instance.author_id:
+        UserProfile.adjust_counter('published_article_count', delta, user_id=instance.author_id)
+
+
+@receiver(pre_delete, sender=Article)
+def decrement_counts_for_deleted_article(sender, instance, origin=None, **kwargs):
+    """
+    刪除文章前一次扣除連帶刪除的資料對應的計數：
+    作者的文章數、已發布文章數與獲讚數一個 UPDATE，所有留言者的留言數一個 UPDATE（以子查詢計算各自的留言數），
+    連帶刪除的讚與留言的 post_delete 不再逐筆調整；
+    刪除用戶連帶刪除其文章時作者的個人資料也會刪除，只扣除其他留言者的留言數。
+    計數若有偏差由 reconcile_profile_counters 校正
+    """
+    if instance.author_id and not _deleted_with(origin, User):
+        UserProfile.decrement_counters({
+            'article_count': 1,
+            'published_article_count': 1 if instance.status == 'published' else 0,
+            'likes_received_count': Like.objects.filter(article=instance).count(),
+        }, user_id=instance.author_id)
+
+    comments = Comment.objects.filter(article=instance)
+    UserProfile.decrement_counters(
+        {'comment_count': _count_by(comments, 'author_id')},
+        user_id__in=comments.values('author_id')
+    )
+
+
+@receiver(pre_delete, sender=User)
+def decrement_counts_for_deleted_user(sender, instance, **kwargs):
+    """
+    刪除用戶前一次扣除其他用戶受影響的計數：
+    被追蹤者的追蹤者數、追蹤者的追蹤中數各一個 UPDATE，
+    按讚過的文章作者的獲讚數一個 UPDATE（以子查詢計算各自被扣除的讚數），連帶刪除的追蹤與讚的 post_delete 不再逐筆調整。
+    計數若有偏差由 reconcile_profile_counters 校正
+    """
+    UserProfile.decrement_counters({'follower_count': 1}, user__followers__follower=instance)
+    UserProfile.decrement_counters({'following_count': 1}, user__following__following=instance)
+
+    likes = Like.objects.filter(user=instance).exclude(article__author=instance)
+    UserProfile.decrement_counters(
+        {'likes_received_count': _count_by(likes, 'article__author_id')},
+        user_id__in=likes.values('article__author_id')
+    )
+
+
+@receiver(post_save, sender=ArticleReadHistory)
+def increment_author_read_progress(sender, instance, created, **kwargs):
+    """首次閱讀文章時累加用戶對該文章作者的已閱讀文章數"""
+    if created:
+        author_id = instance.article.author_id
+        if author_id:
+            AuthorReadProgress.record_read(instance.user_id, author_id)
+
+
+@receiver(pre_delete, sender=Article)
+def decrement_read_progress_for_deleted_article(sender, instance, origin=None, **kwargs):
+    """
+    刪除文章前以一個 UPDATE 減少所有讀過該文章的用戶對作者的已閱讀文章數
+    （連帶刪除的閱讀記錄的 post_delete 不再逐筆調整）；
+    刪除用戶連帶刪除其文章時，以該用戶為作者的閱讀進度也會刪除，不需調整
+    """
+    if not instance.author_id or _deleted_with(origin, User):
+        return
+    AuthorReadProgress.objects.filter(
+        author_id=instance.author_id,
+        user_id__in=ArticleReadHistory.objects.filter(article=instance).values('user_id'),
+        read_count__gte=1
+    ).update(read_count=F('read_count') - 1)
+
+
+@receiver(post_delete, sender=ArticleReadHistory)
+def decrement_author_read_progress(sender, instance, origin=None, **kwargs):
+    """刪除閱讀記錄時減少已閱讀文章數（以文章 ID 關聯作者）；刪除文章或用戶連帶刪除的閱讀記錄不逐筆調整"""
+    if _deleted_with(origin, (Article, User)):
+        return
+    AuthorReadProgress.objects.filter(
+        user_id=instance.user_id,
+        author__articles=instance.article_id,
+        read_count__gte=1
+    ).update(read_count=F('read_count') - 1)
+
+
+@receiver(post_save, sender=Comment)
+def increment_comment_count(sender, instance, created, **kwargs):
+    """新增留言時累加留言者的留言數"""
+    if created and instance.author_id:
+        UserProfile.adjust_counter('comment_count', 1, user_id=instance.author_id)
+
+
+@receiver(post_delete, sender=Comment)
+def decrement_comment_count(sender, instance, origin=None, **kwargs):
+    """刪除留言（或連帶刪除其回覆）時減少留言者的留言數；刪除文章或用戶連帶刪除的留言已在 pre_delete 扣除"""
+    if _deleted_with(origin, (Article, User)):
+        return
+    if instance.author_id:
+        UserProfile.adjust_counter('comment_count', -1, user_id=instance.author_id)
+
+
+@receiver(post_save, sender=Like)
+def increment_likes_received(sender, instance, created, **kwargs):
+    """按讚時累加文章作者的獲讚數（以文章 ID 關聯作者，不另外讀取文章）"""
+    if created:
+        UserProfile.adjust_counter('likes_received_count', 1, user__articles=instance.article_id)
+
+
+@receiver(post_delete, sender=Like)
+def decrement_likes_received(sender, instance, origin=None, **kwargs):
+    """取消讚時減少文章作者的獲讚數；刪除文章或用戶連帶刪除的讚已在 pre_delete 扣除"""
+    if _deleted_with(origin, (Article, User)):
+        return
+    UserProfile.adjust_counter('likes_received_count', -1, user__articles=instance.article_id)
+
+
+@receiver(post_save, sender=Follow)
+def increment_follow_counts(sender, instance, created, **kwargs):
+    """追蹤時累加被追蹤者的追蹤者數與追蹤者的追蹤中數"""
+    if created:
+        UserProfile.adjust_counter('follower_count', 1, user_id=instance.following_id)
+        UserProfile.adjust_counter('following_count', 1, user_id=instance.follower_id)
+
+
+@receiver(post_delete, sender=Follow)
+def decrement_follow_counts(sender, instance, origin=None, **kwargs):
+    """取消追蹤時減少被追蹤者的追蹤者數與追蹤者的追蹤中數；刪除用戶連帶刪除的追蹤已在 pre_delete 扣除"""
+    if _deleted_with(origin, User):
+        return
+    UserProfile.adjust_counter('follower_count', -1, user_id=instance.following_id)
+    UserProfile.adjust_counter('following_count', -1, user_id=instance.follower_id)
+
+
 @receiver(post_save, sender=Article)
 def award_points_for_article(sender, instance, created, **kwargs):
-    """當使用者發表文章時，自動給予積分並記錄活動"""
-    if created and instance.author:
-        # 確保使用者有 profile
-        profile, profile_created = UserProfile.objects.get_or_create(user=instance.author)
-
-        # 給予 50 積分
-        points_awarded = 50
-        profile.add_points(points_awarded)
-
-        # 記錄活動
-        Activity.objects.create(
-            user=instance.author,
-            activity_type='post',
-            title=f'發表了文章《{instance.title}》',
-            description=f'獲得了 {points_awarded} 積分',
-            icon='📝',
-            related_object_id=instance.id
-        )
-
-        # 檢查並解鎖文章相關成就
-        from .utils.achievement_checker import check_article_achievements
-        newly_unlocked = check_article_achievements(instance.author)
-
-        # 可以在這裡添加成就解鎖通知
-        if newly_unlocked:
-            for achievement in newly_unlocked:
-                print(f'🎉 {instance.author.username} 解鎖了成就: {achievement.icon} {achievement.name}')
+    """當使用者發表文章時，加入成就事件（積分、活動記錄與文章成就由背景的成就佇列處理）"""
+    if created and instance.author_id:
+        from .utils.achievement_events import emit_achievement_event
+        emit_achievement_event(instance.author_id, AchievementEvent.EVENT_ARTICLE, instance.id)
+
+
+@receiver(post_save, sender=Article)
+def fan_out_published_article(sender, instance, **kwargs):
+    """文章首次發布時（transaction 提交後），寫入作者追蹤者的時間軸"""
+    if getattr(instance, '_newly_published', False):
+        from django.db import transaction
+        from .utils.timeline import fan_out_article
+        instance._newly_published = False
+        transaction.on_commit(lambda: fan_out_article(instance))
 
 
 @receiver(post_save, sender=Comment)
 def check_comment_achievements_signal(sender, instance, created, **kwargs):
-    """當使用者發表評論時，檢查評論相關成就"""
-    if created and instance.author:
-        from .utils.achievement_checker import check_comment_achievements
-        newly_unlocked = check_comment_achievements(instance.author)
-
-        if newly_unlocked:
-            for achievement in newly_unlocked:
-                print(f'🎉 {instance.author.username} 解鎖了成就: {achievement.icon} {achievement.name}')
+    """當使用者發表評論時，加入成就事件（評論相關成就由背景的成就佇列檢查）"""
+    if created and instance.author_id:
+        from .utils.achievement_events import emit_achievement_event
+        emit_achievement_event(instance.author_id, AchievementEvent.EVENT_COMMENT, instance.id)
 
 
 @receiver(post_save, sender=Follow)
 def check_follower_achievements_signal(sender, instance, created, **kwargs):
-    """當使用者獲得新追蹤者時，檢查追蹤者相關成就"""
+    """當使用者獲得新追蹤者時，為被追蹤者加入成就事件"""
     if created:
-        # 檢查被追蹤者（following）的成就
-        from .utils.achievement_checker import check_follower_achievements
-        newly_unlocked = check_follower_achievements(instance.following)
-
-        if newly_unlocked:
-            for achievement in newly_unlocked:
-                print(f'🎉 {instance.following.username} 解鎖了成就: {achievement.icon} {achievement.name}')
+        from .utils.achievement_events import emit_achievement_event
+        emit_achievement_event(instance.following_id, AchievementEvent.EVENT_FOLLOWER, instance.id)
 
 
 @receiver(post_save, sender=Like)
 def check_like_achievements_signal(sender, instance, created, **kwargs):
-    """當使用者按讚時，檢查按讚相關成就"""
+    """當使用者按讚時，為按讚者與文章作者加入成就事件（同一批的連續按讚只檢查一次）"""
     if created:
-        from .utils.achievement_checker import check_like_achievements
+        from .utils.achievement_events import emit_achievement_event
+        emit_achievement_event(instance.user_id, AchievementEvent.EVENT_LIKE_GIVEN, instance.article_id)
 
-        # 檢查按讚者的成就
-        newly_unlocked = check_like_achievements(instance.user, instance.article)
-
-        if newly_unlocked:
-            for achievement in newly_unlocked:
-                if achievement:
-                    print(f'🎉 解鎖了成就: {achievement.icon} {achievement.name}')
+        author_id = instance.article.author_id
+        if author_id:
+            emit_achievement_event(author_id, AchievementEvent.EVENT_LIKE_RECEIVED, instance.article_id)
 
 
 @receiver(post_save, sender=UserCourseProgress)
 def check_course_achievements_signal(sender, instance, created, **kwargs):
-    """當使用者更新課程進度時，檢查課程相關成就"""
+    """當使用者更新課程進度時，完成課程則加入成就事件"""
     # 檢查是否完成課程
     if instance.completed_lessons >= instance.course.total_lessons:
-        from .utils.achievement_checker import check_course_achievements
-        newly_unlocked = check_course_achievements(instance.user)
-
-        if newly_unlocked:
-            for achievement in newly_unlocked:
-                print(f'🎉 {instance.user.username} 解鎖了成就: {achievement.icon} {achievement.name}')
+        from .utils.achievement_events import emit_achievement_event
+        emit_achievement_event(instance.user_id, AchievementEvent.EVENT_COURSE, instance.course_id)
 
 
 @receiver(post_save, sender=UserProfile)
-def check_profile_achievements_signal(sender, instance, created, **kwargs):
-    """當使用者更新個人資料時，檢查個人資料完整度相關成就"""
-    if not created:  # 只在更新時檢查，不在創建時檢查
-        from .utils.achievement_checker import check_profile_achievements
-        newly_unlocked = check_profile_achievements(instance.user)
-
-        if newly_unlocked:
-            for achievement in newly_unlocked:
-                print(f'🎉 {instance.user.username} 解鎖了成就: {achievement.icon} {achievement.name}')
+def check_profile_achievements_signal(sender, instance, created, update_fields=None, **kwargs):
+    """
+    當使用者修改個人資料完整度的欄位時，加入成就事件（個人資料完整度相關成就由背景的成就佇列檢查）；
+    只更新其他欄位時不加入（姓名、Email 與技能的修改由 UserProfileForm 加入）
+    """
+    if created:  # 只在更新時檢查，不在創建時檢查
+        return
+    changed = instance.changed_completeness_fields()
+    if update_fields is not None:
+        changed = [name for name in changed if name in update_fields]
+    if changed:
+        from .utils.achievement_events import emit_achievement_event
+        emit_achievement_event(instance.user_id, AchievementEvent.EVENT_PROFILE)
+
+
+@receiver(post_save, sender=Notification)
+def invalidate_notification_snapshot(sender, instance, **kwargs):
+    """通知新增或更新（已讀、合併）時，使 WebSocket 連線用的通知快照失效"""
+    from .utils.notification_snapshot import invalidate_snapshot
+    invalidate_snapshot(instance.user_id)
+
+
+@receiver(post_save, sender=Message)
+def invalidate_message_snapshot(sender, instance, **kwargs):
+    """私人訊息新增或更新時，使收件者的通知快照（未讀訊息數）失效"""
+    from .utils.notification_snapshot import invalidate_snapshot
+    invalidate_snapshot(instance.recipient_id)
+
+
+@receiver(post_delete, sender=Notification)
+def invalidate_deleted_notification_snapshot(sender, instance, origin=None, **kwargs):
+    """通知刪除時（用戶、後台、保留政策清理或刪除用戶連帶刪除），使通知快照失效"""
+    from .utils.notification_snapshot import invalidate_snapshot_on_delete
+    invalidate_snapshot_on_delete(instance.user_id, origin)
+
+
+@receiver(post_delete, sender=Message)
+def invalidate_deleted_message_snapshot(sender, instance, origin=None, **kwargs):
+    """未讀的私人訊息刪除時，使收件者的通知快照（未讀訊息數）失效"""
+    if instance.is_read or instance.recipient_deleted:
+        return
+    from .utils.notification_snapshot import invalidate_snapshot_on_delete
+    invalidate_snapshot_on_delete(instance.recipient_id, origin)
+
+
+@receiver(post_save, sender=Achievement)
+@receiver(post_delete, sender=Achievement)
+def invalidate_achievement_definitions_signal(sender, **kwargs):
+    """新增、修改或刪除成就時，使成就檢查器快取的成就定義失效"""
+    from .utils.achievement_checker import invalidate_achievement_definitions
+    invalidate_achievement_definitions()
@@ -6,8 +6,8 @@
 (function() {
     'use strict';
 
-    // 狀態管理
-    let currentPage = 1;
+    // 狀態管理（nextCursor 為下一頁的游標，由伺服器產生）
+    let nextCursor = '';
     let isLoading = false;
     let hasMorePages = true;
     let isInfiniteScrollMode = true;
@@ -19,15 +19,6 @@
     const traditionalPagination = document.getElementById('traditional-pagination');
     const toggleButton = document.getElementById('toggle-pagination-mode');
 
-    // 獲取 URL 參數
-    function getUrlParams() {
-        const params = new URLSearchParams(window.location.search);
-        return {
-            q: params.get('q') || '',
-            search_type: params.get('search_type') || 'all'
-        };
-    }
-
     // 載入更多文章
     async function loadMoreArticles() {
         if (isLoading || !hasMorePages) {
@@ -41,12 +32,10 @@
         loadMoreContainer.classList.add('loading');
 
         try {
-            const params = getUrlParams();
-            const nextPage = currentPage + 1;
-
             // 構建 URL
             const url = new URL(window.location.href);
-            url.searchParams.set('page', nextPage);
+            url.searchParams.delete('page');
+            url.searchParams.set('cursor', nextCursor);
 
             // 創建超時控制器（10秒超時）
             const controller = new AbortController();
@@ -94,8 +83,8 @@
                 });
 
                 // 更新狀態
-                currentPage = data.current_page;
-                hasMorePages = data.has_next;
+                nextCursor = data.next_cursor || '';
+                hasMorePages = data.has_next && Boolean(nextCursor);
 
                 // 移除載入動畫類
                 loadMoreContainer.classList.remove('loading');
@@ -197,11 +186,12 @@
 
     // 初始化
     function init() {
-        // 從 URL 獲取當前頁碼
-        const params = new URLSearchParams(window.location.search);
-        const pageParam = params.get('page');
-        if (pageParam) {
-            currentPage = parseInt(pageParam) || 1;
+        // 從 DOM 取得下一頁的游標
+        if (loadMoreContainer) {
+            nextCursor = loadMoreContainer.dataset.nextCursor || '';
+        }
+        if (!nextCursor) {
+            hasMorePages = false;
         }
 
         // 檢查是否還有更多頁面（從 DOM 狀態判斷）
@@ -115,13 +115,19 @@ class InstantChatManager {
 
         if (data.type === 'chat_history') {
             // 載入歷史訊息
-            chatWindow.loadHistory(data.messages);
+            chatWindow.loadHistory(data.messages, data.next_before_id);
+        } else if (data.type === 'chat_history_page') {
+            // 更早的歷史訊息（向上捲動載入）
+            chatWindow.prependHistory(data.messages, data.next_before_id);
         } else if (data.type === 'chat_message') {
             // 新訊息
             chatWindow.addMessage(data.message);
         } else if (data.type === 'typing') {
             // 打字指示器
             chatWindow.showTyping(data.is_typing);
+        } else if (data.type === 'message_failed') {
+            // 訊息已顯示但未能儲存
+            alert(`訊息「${data.message.content}」未能儲存，請重新發送`);
         }
     }
 
@@ -137,6 +143,18 @@ class InstantChatManager {
         return false;
     }
 
+    requestHistory(username, beforeId) {
+        const socket = this.sockets.get(username);
+        if (socket && socket.readyState === WebSocket.OPEN) {
+            socket.send(JSON.stringify({
+                type: 'load_history',
+                before_id: beforeId
+            }));
+            return true;
+        }
+        return false;
+    }
+
     sendTyping(username, isTyping) {
         const socket = this.sockets.get(username);
         if (socket && socket.readyState === WebSocket.OPEN) {
@@ -157,7 +175,10 @@ class ChatWindow {
         this.manager = manager;
         this.isMinimized = false;
         this.typingTimeout = null;
+        this.typingSentAt = 0;  // 上次送出打字中狀態的時間
         this.isComposing = false;  // 追蹤中文輸入狀態
+        this.nextBeforeId = null;  // 載入更早訊息的游標（null 表示沒有更早的訊息）
+        this.isLoadingHistory = false;
         this.create();
     }
 
@@ -239,6 +260,14 @@ class ChatWindow {
         const sendBtn = this.element.querySelector('.chat-send-btn');
         const input = this.element.querySelector('.chat-input');
 
+        // 捲動到頂端時載入更早的訊息
+        const messagesDiv = this.element.querySelector('.chat-messages');
+        messagesDiv.addEventListener('scroll', () => {
+            if (messagesDiv.scrollTop < 40) {
+                this.loadOlderMessages();
+            }
+        });
+
         sendBtn.addEventListener('click', () => {
             this.sendMessage();
         });
@@ -315,26 +344,38 @@ class ChatWindow {
             // 這樣可以避免重複顯示
 
             // 停止打字指示器
-            this.manager.sendTyping(this.username, false);
+            this.stopTyping();
         } else {
             alert('訊息發送失敗，請檢查網路連接');
         }
     }
 
     handleTyping() {
-        // 發送打字中狀態
-        this.manager.sendTyping(this.username, true);
+        // 發送打字中狀態（每 2 秒最多一次，伺服器端逾時前會再次更新）
+        const now = Date.now();
+        if (now - this.typingSentAt > 2000) {
+            this.manager.sendTyping(this.username, true);
+            this.typingSentAt = now;
+        }
 
         // 3 秒後自動取消打字狀態
         clearTimeout(this.typingTimeout);
         this.typingTimeout = setTimeout(() => {
-            this.manager.sendTyping(this.username, false);
+            this.stopTyping();
         }, 3000);
     }
 
-    loadHistory(messages) {
+    stopTyping() {
+        clearTimeout(this.typingTimeout);
+        this.typingSentAt = 0;
+        this.manager.sendTyping(this.username, false);
+    }
+
+    loadHistory(messages, nextBeforeId = null) {
         const messagesDiv = this.element.querySelector('.chat-messages');
         messagesDiv.innerHTML = '';
+        this.nextBeforeId = nextBeforeId;
+        this.isLoadingHistory = false;
 
         if (messages.length === 0) {
             messagesDiv.innerHTML = `
@@ -359,6 +400,31 @@ class ChatWindow {
         }
     }
 
+    loadOlderMessages() {
+        if (!this.nextBeforeId || this.isLoadingHistory) return;
+
+        if (this.manager.requestHistory(this.username, this.nextBeforeId)) {
+            this.isLoadingHistory = true;
+        }
+    }
+
+    prependHistory(messages, nextBeforeId = null) {
+        const messagesDiv = this.element.querySelector('.chat-messages');
+        this.nextBeforeId = nextBeforeId;
+        this.isLoadingHistory = false;
+
+        if (messages.length === 0) return;
+
+        // 插入到最上方，並保持目前看到的訊息位置不跳動
+        const previousHeight = messagesDiv.scrollHeight;
+        const fragment = document.createDocumentFragment();
+        messages.forEach(msg => {
+            fragment.appendChild(this.createMessageElement(msg));
+        });
+        messagesDiv.insertBefore(fragment, messagesDiv.firstChild);
+        messagesDiv.scrollTop += messagesDiv.scrollHeight - previousHeight;
+    }
+
     addMessage(message, shouldScroll = true) {
         const messagesDiv = this.element.querySelector('.chat-messages');
 
@@ -368,6 +434,14 @@ class ChatWindow {
         if (loading) loading.remove();
         if (emptyState) emptyState.remove();
 
+        messagesDiv.appendChild(this.createMessageElement(message));
+
+        if (shouldScroll) {
+            this.scrollToBottom();
+        }
+    }
+
+    createMessageElement(message) {
         const messageDiv = document.createElement('div');
         messageDiv.className = `chat-message ${message.sender === 'me' ? 'sent' : 'received'}`;
 
@@ -379,11 +453,7 @@ class ChatWindow {
             <div class="message-time">${timeStr}</div>
         `;
 
-        messagesDiv.appendChild(messageDiv);
-
-        if (shouldScroll) {
-            this.scrollToBottom();
-        }
+        return messageDiv;
     }
 
     showTyping(isTyping) {
@@ -4,6 +4,40 @@
  */
 
 document.addEventListener('DOMContentLoaded', function() {
+    // 推薦追蹤卡片中的追蹤按鈕
+    document.querySelectorAll('.suggestion-follow-btn').forEach(button => {
+        button.addEventListener('click', function() {
+            this.disabled = true;
+
+            fetch(`/blog/member/${this.dataset.username}/follow/`, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'X-CSRFToken': getCookie('csrftoken'),
+                },
+            })
+            .then(response => response.json())
+            .then(data => {
+                if (data.success) {
+                    this.classList.toggle('following', data.is_following);
+                    this.querySelector('.follow-icon').textContent = data.is_following ? '✓' : '+';
+                    this.querySelector('.follow-text').textContent = data.is_following ? '已追蹤' : '追蹤';
+                    this.dataset.following = data.is_following ? 'true' : 'false';
+                    showMessage(data.message);
+                } else {
+                    showMessage(data.error, 'error');
+                }
+            })
+            .catch(error => {
+                console.error('Error:', error);
+                showMessage('操作失敗，請稍後再試', 'error');
+            })
+            .finally(() => {
+                this.disabled = false;
+            });
+        });
+    });
+
     const followBtn = document.getElementById('follow-btn');
 
     if (!followBtn) {
@@ -14,6 +14,7 @@ if (window.realTimeNotificationsInitialized) {
     let reconnectAttempts = 0;
     const MAX_RECONNECT_ATTEMPTS = 5;
     const RECONNECT_DELAY = 3000; // 3 seconds
+    const LAST_ID_KEY = 'rtNotificationsLastId'; // 最後看過的通知 ID（重新連線時補送錯過的通知）
 
     /**
      * 初始化
@@ -42,7 +43,9 @@ if (window.realTimeNotificationsInitialized) {
     function connectWebSocket() {
         // 確定 WebSocket URL
         const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-        const wsUrl = `${protocol}//${window.location.host}/ws/notifications/`;
+        const lastId = getLastNotificationId();
+        const query = lastId ? `?since_id=${lastId}` : '';
+        const wsUrl = `${protocol}//${window.location.host}/ws/notifications/${query}`;
 
         try {
             socket = new WebSocket(wsUrl);
@@ -89,11 +92,24 @@ if (window.realTimeNotificationsInitialized) {
                 // 初始數據：更新徽章
                 updateNotificationBadge(data.unread_count);
                 updateMessageBadge(data.unread_messages_count);
+                if (!getLastNotificationId() && data.recent_notifications.length > 0) {
+                    setLastNotificationId(data.recent_notifications[0].id);
+                }
                 break;
 
             case 'notification':
                 // 新通知：顯示 Toast
                 showNotificationToast(data.notification);
+                setLastNotificationId(data.notification.id);
+                break;
+
+            case 'missed_notifications':
+                // 離線期間錯過的通知：只顯示最新一則
+                if (data.notifications.length > 0) {
+                    const latest = data.notifications[data.notifications.length - 1];
+                    showNotificationToast(latest);
+                    setLastNotificationId(latest.id);
+                }
                 break;
 
             case 'count_update':
@@ -111,6 +127,25 @@ if (window.realTimeNotificationsInitialized) {
         }
     }
 
+    /**
+     * 最後看過的通知 ID（同一分頁的頁面切換之間保留）
+     */
+    function getLastNotificationId() {
+        try {
+            return sessionStorage.getItem(LAST_ID_KEY);
+        } catch (e) {
+            return null;
+        }
+    }
+
+    function setLastNotificationId(id) {
+        try {
+            sessionStorage.setItem(LAST_ID_KEY, id);
+        } catch (e) {
+            // sessionStorage 不可用時不補送
+        }
+    }
+
     /**
      * 更新通知徽章
      */
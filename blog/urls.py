@@ -101,10 +101,14 @@ social_patterns = [
 
     # 用戶 API
     path('api/user/<str:username>/', views.get_user_api, name='get_user_api'),
+    path('api/follow-suggestions/', views.follow_suggestions_api, name='follow_suggestions_api'),
 
     # 即時聊天 API
     path('api/chat/list/', views.get_chat_list_api, name='get_chat_list_api'),
 
+    # 在線狀態 API
+    path('api/presence/', views.get_presence_api, name='get_presence_api'),
+
     # Web Push 推播通知 API
     path('api/push/subscribe/', views.subscribe_push, name='subscribe_push'),
     path('api/push/unsubscribe/', views.unsubscribe_push, name='unsubscribe_push'),
@@ -154,6 +158,9 @@ recommendation_patterns = [
     # 個人化推薦頁面
     path('recommendations/', views.personalized_feed, name='personalized_feed'),
 
+    # 追蹤動態
+    path('following/', views.following_feed, name='following_feed'),
+
     # 推薦系統 API
     path('api/article/<int:id>/similar/', views.get_similar_articles_api, name='get_similar_articles_api'),
     path('api/recommendations/personalized/', views.get_personalized_recommendations_api, name='get_personalized_recommendations_api'),
@@ -1,403 +1,284 @@
 """
 成就解鎖檢查器
 自動檢查使用者是否符合成就條件，並自動解鎖
+
+每次檢查：
+- 成就定義從快取讀取（ACHIEVEMENT_DEFINITIONS_TTL 秒，新增、修改、刪除成就時失效）
+- 一個查詢取得使用者已解鎖的成就 ID，只檢查尚未解鎖的成就
+- 每個指標（文章數、獲讚數、個人資料完整度…）在同一次檢查中最多計算一次，
+  同類的指標以一個條件聚合（conditional aggregation）查詢一起計算
+- 新解鎖的成就以 bulk_create 寫入 UserAchievement 與 Activity，積分與等級以一個 UPDATE 更新
 """
-from django.utils import timezone
-from django.db.models import Count, Max, F
-from django.db import models
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count, Exists, F, OuterRef, Q
 from ..models import Achievement, UserAchievement, Activity, UserProfile
 
+ACHIEVEMENT_DEFINITIONS_KEY = 'achievements:definitions'
+
+LEVEL_ORDER = ['Bronze', 'Silver', 'Gold', 'Platinum', 'Diamond']
+
+# 成就條件類型對應的指標（同一指標的條件類型共用一次計算）
+CONDITION_METRICS = {
+    'article_count': 'article_count',
+    'comment_count': 'comment_count',
+    'total_comments': 'comment_count',
+    'follower_count': 'follower_count',
+    'followers_count': 'follower_count',
+    'total_likes': 'likes_received',
+    'article_likes': 'max_article_likes',
+    'post_likes': 'max_article_likes',
+    'like_given': 'likes_given',
+    'course_completed': 'completed_courses',
+    'completed_courses': 'completed_courses',
+    'profile_complete': 'profile_completeness',
+    'early_member': 'member_rank',
+}
+
+# 個人資料完整度檢查的欄位
+PROFILE_COMPLETENESS_FIELDS = 10
+
+
+def get_achievement_cache():
+    return caches[getattr(settings, 'ACHIEVEMENT_CACHE_ALIAS', 'default')]
+
+
+def get_achievement_definitions():
+    """所有成就定義（快取 ACHIEVEMENT_DEFINITIONS_TTL 秒）"""
+    cache = get_achievement_cache()
+    definitions = cache.get(ACHIEVEMENT_DEFINITIONS_KEY)
+    if definitions is None:
+        definitions = list(Achievement.objects.all())
+        cache.set(ACHIEVEMENT_DEFINITIONS_KEY, definitions, getattr(settings, 'ACHIEVEMENT_DEFINITIONS_TTL', 300))
+    return definitions
+
+
+def invalidate_achievement_definitions():
+    """新增、修改或刪除成就後使快取的成就定義失效"""
+    get_achievement_cache().delete(ACHIEVEMENT_DEFINITIONS_KEY)
+
 
 class AchievementChecker:
     """成就檢查器類別"""
 
     def __init__(self, user):
         self.user = user
+        self._metrics = {}
+        self._early_post_hours = set()
 
     def check_all(self):
         """檢查所有成就"""
-        newly_unlocked = []
-
-        # 獲取所有成就
-        all_achievements = Achievement.objects.all()
-
-        for achievement in all_achievements:
-            # 檢查是否已解鎖
-            if UserAchievement.objects.filter(user=self.user, achievement=achievement).exists():
-                continue
-
-            # 根據條件類型檢查
-            if self._check_condition(achievement):
-                # 解鎖成就
-                user_achievement = UserAchievement.objects.create(
-                    user=self.user,
-                    achievement=achievement
-                )
-                newly_unlocked.append(achievement)
-
-                # 增加積分
-                profile = UserProfile.objects.get(user=self.user)
-                profile.add_points(achievement.points)
-
-                # 記錄活動
-                Activity.objects.create(
-                    user=self.user,
-                    activity_type='achievement',
-                    title=f'獲得成就: {achievement.name}',
-                    description=achievement.description,
-                    icon='🏆',
-                    related_object_id=achievement.id
-                )
+        return self.evaluate()
+
+    def evaluate(self, condition_types=None):
+        """
+        檢查尚未解鎖的成就並發放達成的成就
+
+        Args:
+            condition_types: 只檢查這些條件類型的成就（預設為全部）
+
+        Returns:
+            list: 新解鎖的 Achievement 列表
+        """
+        definitions = get_achievement_definitions()
+        if condition_types is not None:
+            definitions = [a for a in definitions if a.condition_type in condition_types]
+        if not definitions:
+            return []
+
+        with transaction.atomic():
+            # 鎖定個人資料，同一使用者同時進行的檢查依序執行，不會重複發放
+            points = UserProfile.objects.select_for_update().filter(
+                user=self.user
+            ).values_list('points', flat=True).first()
+            if points is None:
+                return []
+
+            unlocked_ids = set(UserAchievement.objects.filter(
+                user=self.user,
+                achievement_id__in=[a.id for a in definitions]
+            ).values_list('achievement_id', flat=True))
+            pending = [a for a in definitions if a.id not in unlocked_ids]
+            self._early_post_hours = {a.condition_value for a in pending if a.condition_type == 'early_post'}
+
+            newly_unlocked = [a for a in pending if a.condition_type != 'level' and self._is_met(a)]
+
+            # 等級成就依發放其他成就後的積分判斷，發放等級成就的積分可能再解鎖更高的等級成就
+            level_pending = [a for a in pending if a.condition_type == 'level']
+            while level_pending:
+                total = points + sum(a.points for a in newly_unlocked)
+                level_index = LEVEL_ORDER.index(UserProfile.level_for_points(total)) + 1
+                reached = [a for a in level_pending if level_index >= a.condition_value]
+                if not reached:
+                    break
+                newly_unlocked += reached
+                level_pending = [a for a in level_pending if a not in reached]
+
+            self._award(newly_unlocked)
 
         return newly_unlocked
 
-    def _check_condition(self, achievement):
-        """檢查單個成就的條件是否達成"""
+    def _is_met(self, achievement):
+        """單個成就的條件是否達成"""
         condition_type = achievement.condition_type
         condition_value = achievement.condition_value
 
-        try:
-            if condition_type == 'article_count':
-                return self.user.articles.count() >= condition_value
-
-            elif condition_type == 'login_count':
-                # 需要在登入時記錄
-                return True  # 簡化處理
-
-            elif condition_type == 'consecutive_login':
-                # 需要專門的登入記錄系統
-                return False  # 暫不實作
-
-            elif condition_type == 'total_login':
-                # 需要專門的登入記錄系統
-                return False  # 暫不實作
-
-            elif condition_type == 'course_completed':
-                from ..models import UserCourseProgress
-                from django.db import models as db_models
-                completed_courses = UserCourseProgress.objects.filter(
-                    user=self.user,
-                    completed_lessons__gte=db_models.F('course__total_lessons')
-                ).count()
-                return completed_courses >= condition_value
-
-            elif condition_type == 'follower_count' or condition_type == 'followers_count':
-                return self.user.followers.count() >= condition_value
-
-            elif condition_type == 'comment_count':
-                # 檢查評論數量
-                from ..models import Comment
-                comment_count = Comment.objects.filter(author=self.user).count()
-                return comment_count >= condition_value
-
-            elif condition_type == 'total_comments':
-                # 檢查總評論數（與 comment_count 相同）
-                from ..models import Comment
-                comment_count = Comment.objects.filter(author=self.user).count()
-                return comment_count >= condition_value
-
-            elif condition_type == 'like_given':
-                # 檢查給予的讚數
-                try:
-                    from ..models import Like
-                    likes_given = Like.objects.filter(user=self.user).count()
-                    return likes_given >= condition_value
-                except:
-                    return False
-
-            elif condition_type == 'article_likes':
-                # 檢查單篇文章獲得的讚數
-                try:
-                    from ..models import Like
-                    # 找出獲讚最多的文章
-                    max_likes = self.user.articles.annotate(
-                        like_count=Count('likes')
-                    ).aggregate(Max('like_count'))['like_count__max'] or 0
-                    return max_likes >= condition_value
-                except:
-                    return False
-
-            elif condition_type == 'post_likes':
-                # 檢查單篇文章獲得的讚數（與 article_likes 相同）
-                try:
-                    from ..models import Like
-                    # 找出獲讚最多的文章
-                    max_likes = self.user.articles.annotate(
-                        like_count=Count('likes')
-                    ).aggregate(Max('like_count'))['like_count__max'] or 0
-                    return max_likes >= condition_value
-                except:
-                    return False
-
-            elif condition_type == 'total_likes':
-                # 檢查所有文章總共獲得的讚數
-                try:
-                    from ..models import Like
-                    total_likes = Like.objects.filter(article__author=self.user).count()
-                    return total_likes >= condition_value
-                except:
-                    return False
-
-            elif condition_type == 'profile_complete':
-                return self._check_profile_completeness() >= condition_value
-
-            elif condition_type == 'early_post':
-                # 檢查是否有早上發表的文章
-                early_articles = self.user.articles.filter(
-                    created_at__hour__lt=condition_value
-                )
-                return early_articles.exists()
-
-            elif condition_type == 'late_post':
-                # 檢查是否有午夜後發表的文章
-                late_articles = self.user.articles.filter(
-                    created_at__hour__gte=23
-                )
-                return late_articles.exists()
-
-            elif condition_type == 'level':
-                profile = UserProfile.objects.get(user=self.user)
-                level_order = ['Bronze', 'Silver', 'Gold', 'Platinum', 'Diamond']
-                current_level_index = level_order.index(profile.level) + 1
-                return current_level_index >= condition_value
-
-            elif condition_type == 'early_member':
-                # 檢查是否為前N位會員
-                from django.contrib.auth.models import User
-                user_rank = User.objects.filter(
-                    date_joined__lt=self.user.date_joined
-                ).count() + 1
-                return user_rank <= condition_value
-
-        except Exception as e:
-            print(f"檢查成就條件時發生錯誤: {e}")
-            return False
+        if condition_type in CONDITION_METRICS:
+            value = self._metric(CONDITION_METRICS[condition_type])
+            if condition_type == 'early_member':
+                # 前 N 位會員
+                return value <= condition_value
+            return value >= condition_value
+
+        if condition_type == 'early_post':
+            # 有早上 condition_value 點前發表的文章
+            return self._metric('article_times')[f'early_{condition_value}'] > 0
+
+        if condition_type == 'late_post':
+            # 有午夜前後（23 點後）發表的文章
+            return self._metric('article_times')['late'] > 0
 
+        if condition_type == 'login_count':
+            # 需要在登入時記錄
+            return True  # 簡化處理
+
+        # consecutive_login、total_login 需要專門的登入記錄系統，暫不實作
         return False
 
+    def _metric(self, name):
+        """計算（或取得本次檢查已計算的）指標"""
+        if name not in self._metrics:
+            if name in ('article_count', 'comment_count', 'follower_count', 'likes_received', 'profile_completeness'):
+                self._metrics.update(self._profile_metrics())
+            else:
+                self._metrics[name] = getattr(self, f'_compute_{name}')()
+        return self._metrics[name]
+
+    def _profile_metrics(self):
+        """個人資料上的統計計數與個人資料完整度（一個查詢）"""
+        from ..models import Skill
+        row = UserProfile.objects.filter(user=self.user).annotate(
+            has_skills=Exists(Skill.users.through.objects.filter(user_id=OuterRef('user_id')))
+        ).values(
+            'article_count', 'comment_count', 'follower_count', 'likes_received_count',
+            'bio', 'school', 'grade', 'location', 'birthday', 'website', 'github', 'avatar',
+            'has_skills', 'user__first_name', 'user__email',
+        ).first() or {}
+
+        filled_fields = sum(1 for filled in (
+            row.get('user__first_name'),
+            row.get('user__email'),
+            row.get('bio'),
+            row.get('school'),
+            row.get('grade'),
+            row.get('location'),
+            row.get('birthday'),
+            row.get('website') or row.get('github'),
+            row.get('has_skills'),
+            row.get('avatar'),
+        ) if filled)
+
+        return {
+            'article_count': row.get('article_count', 0),
+            'comment_count': row.get('comment_count', 0),
+            'follower_count': row.get('follower_count', 0),
+            'likes_received': row.get('likes_received_count', 0),
+            'profile_completeness': int((filled_fields / PROFILE_COMPLETENESS_FIELDS) * 100),
+        }
+
+    def _compute_article_times(self):
+        """各個早起時段與深夜發表的文章數（一個條件聚合查詢）"""
+        aggregates = {
+            f'early_{hour}': Count('id', filter=Q(created_at__hour__lt=hour))
+            for hour in self._early_post_hours
+        }
+        aggregates['late'] = Count('id', filter=Q(created_at__hour__gte=23))
+        return self.user.articles.aggregate(**aggregates)
+
+    def _compute_max_article_likes(self):
+        """單篇文章獲得的最多讚數"""
+        return self.user.articles.annotate(
+            like_count=Count('likes')
+        ).order_by('-like_count').values_list('like_count', flat=True).first() or 0
+
+    def _compute_likes_given(self):
+        """給予的讚數"""
+        from ..models import Like
+        return Like.objects.filter(user=self.user).count()
+
+    def _compute_completed_courses(self):
+        """完成的課程數"""
+        from ..models import UserCourseProgress
+        return UserCourseProgress.objects.filter(
+            user=self.user,
+            completed_lessons__gte=F('course__total_lessons')
+        ).count()
+
+    def _compute_member_rank(self):
+        """第幾位註冊的會員"""
+        from django.contrib.auth.models import User
+        return User.objects.filter(date_joined__lt=self.user.date_joined).count() + 1
+
     def _check_profile_completeness(self):
         """檢查個人資料完整度（百分比）"""
-        try:
-            profile = UserProfile.objects.get(user=self.user)
-        except UserProfile.DoesNotExist:
-            return 0
-
-        total_fields = 10
-        filled_fields = 0
-
-        # 檢查各個欄位
-        if self.user.first_name:
-            filled_fields += 1
-        if self.user.email:
-            filled_fields += 1
-        if profile.bio:
-            filled_fields += 1
-        if profile.school:
-            filled_fields += 1
-        if profile.grade:
-            filled_fields += 1
-        if profile.location:
-            filled_fields += 1
-        if profile.birthday:
-            filled_fields += 1
-        if profile.website or profile.github:
-            filled_fields += 1
-        if self.user.skills.exists():
-            filled_fields += 1
-        if profile.avatar:
-            filled_fields += 1
-
-        return int((filled_fields / total_fields) * 100)
+        return self._metric('profile_completeness')
+
+    def _award(self, achievements):
+        """發放成就：批次寫入成就記錄與活動，並以一個 UPDATE 增加積分"""
+        if not achievements:
+            return
+
+        UserAchievement.objects.bulk_create([
+            UserAchievement(user=self.user, achievement=achievement)
+            for achievement in achievements
+        ])
+        Activity.objects.bulk_create([
+            Activity(
+                user=self.user,
+                activity_type='achievement',
+                title=f'獲得成就: {achievement.name}',
+                description=achievement.description,
+                icon='🏆',
+                related_object_id=achievement.id
+            )
+            for achievement in achievements
+        ])
+
+        points = sum(achievement.points for achievement in achievements)
+        if points:
+            UserProfile.award_points(self.user.id, points)
 
     def check_article_achievements(self):
         """專門檢查文章相關成就（在發表文章後調用）"""
-        article_achievements = Achievement.objects.filter(
-            condition_type='article_count'
-        )
-
-        newly_unlocked = []
-        article_count = self.user.articles.count()
-
-        for achievement in article_achievements:
-            # 檢查是否已解鎖
-            if UserAchievement.objects.filter(user=self.user, achievement=achievement).exists():
-                continue
-
-            # 檢查是否達成條件
-            if article_count >= achievement.condition_value:
-                UserAchievement.objects.create(
-                    user=self.user,
-                    achievement=achievement
-                )
-                newly_unlocked.append(achievement)
-
-                # 增加積分
-                profile = UserProfile.objects.get(user=self.user)
-                profile.add_points(achievement.points)
-
-                # 記錄活動
-                Activity.objects.create(
-                    user=self.user,
-                    activity_type='achievement',
-                    title=f'獲得成就: {achievement.name}',
-                    description=achievement.description,
-                    icon='🏆',
-                    related_object_id=achievement.id
-                )
-
-        return newly_unlocked
+        return self.evaluate(['article_count'])
 
     def check_comment_achievements(self):
         """專門檢查評論相關成就（在發表評論後調用）"""
-        comment_achievements = Achievement.objects.filter(
-            condition_type__in=['comment_count', 'total_comments']
-        )
-
-        newly_unlocked = []
-        from ..models import Comment
-        comment_count = Comment.objects.filter(author=self.user).count()
-
-        for achievement in comment_achievements:
-            # 檢查是否已解鎖
-            if UserAchievement.objects.filter(user=self.user, achievement=achievement).exists():
-                continue
-
-            # 檢查是否達成條件
-            if comment_count >= achievement.condition_value:
-                newly_unlocked.append(self._unlock_achievement(achievement))
-
-        return [a for a in newly_unlocked if a]
+        return self.evaluate(['comment_count', 'total_comments'])
 
     def check_follower_achievements(self):
         """專門檢查追蹤者相關成就（在獲得追蹤者後調用）"""
-        follower_achievements = Achievement.objects.filter(
-            condition_type__in=['follower_count', 'followers_count']
-        )
-
-        newly_unlocked = []
-        follower_count = self.user.followers.count()
-
-        for achievement in follower_achievements:
-            # 檢查是否已解鎖
-            if UserAchievement.objects.filter(user=self.user, achievement=achievement).exists():
-                continue
-
-            # 檢查是否達成條件
-            if follower_count >= achievement.condition_value:
-                newly_unlocked.append(self._unlock_achievement(achievement))
-
-        return [a for a in newly_unlocked if a]
+        return self.evaluate(['follower_count', 'followers_count'])
 
     def check_like_achievements(self, article=None):
         """專門檢查按讚相關成就（在按讚後調用）"""
-        newly_unlocked = []
-
-        try:
-            from ..models import Like
-
-            # 檢查給予讚數相關成就
-            like_given_achievements = Achievement.objects.filter(condition_type='like_given')
-            likes_given = Like.objects.filter(user=self.user).count()
-
-            for achievement in like_given_achievements:
-                if UserAchievement.objects.filter(user=self.user, achievement=achievement).exists():
-                    continue
-                if likes_given >= achievement.condition_value:
-                    newly_unlocked.append(self._unlock_achievement(achievement))
-
-            # 如果提供了文章，檢查該文章作者的成就
-            if article and article.author:
-                checker = AchievementChecker(article.author)
-
-                # 檢查單篇文章獲讚成就
-                article_like_achievements = Achievement.objects.filter(
-                    condition_type__in=['article_likes', 'post_likes']
-                )
-                article_likes = Like.objects.filter(article=article).count()
-
-                for achievement in article_like_achievements:
-                    if UserAchievement.objects.filter(user=article.author, achievement=achievement).exists():
-                        continue
-                    if article_likes >= achievement.condition_value:
-                        newly_unlocked.append(checker._unlock_achievement(achievement))
+        newly_unlocked = self.evaluate(['like_given'])
 
-                # 檢查總獲讚成就
-                total_like_achievements = Achievement.objects.filter(condition_type='total_likes')
-                total_likes = Like.objects.filter(article__author=article.author).count()
+        # 如果提供了文章，檢查該文章作者的獲讚成就
+        if article and article.author:
+            checker = AchievementChecker(article.author)
+            newly_unlocked += checker.evaluate(['article_likes', 'post_likes', 'total_likes'])
 
-                for achievement in total_like_achievements:
-                    if UserAchievement.objects.filter(user=article.author, achievement=achievement).exists():
-                        continue
-                    if total_likes >= achievement.condition_value:
-                        newly_unlocked.append(checker._unlock_achievement(achievement))
-
-        except ImportError:
-            pass
-
-        return [a for a in newly_unlocked if a]
+        return newly_unlocked
 
     def check_course_achievements(self):
         """專門檢查課程相關成就（在完成課程後調用）"""
-        course_achievements = Achievement.objects.filter(
-            condition_type__in=['course_completed', 'completed_courses']
-        )
-
-        newly_unlocked = []
-        from ..models import UserCourseProgress
-        completed_courses = UserCourseProgress.objects.filter(
-            user=self.user,
-            completed_lessons__gte=F('course__total_lessons')
-        ).count()
-
-        for achievement in course_achievements:
-            if UserAchievement.objects.filter(user=self.user, achievement=achievement).exists():
-                continue
-            if completed_courses >= achievement.condition_value:
-                newly_unlocked.append(self._unlock_achievement(achievement))
-
-        return [a for a in newly_unlocked if a]
+        return self.evaluate(['course_completed', 'completed_courses'])
 
     def check_profile_achievements(self):
         """專門檢查個人資料相關成就（在更新個人資料後調用）"""
-        profile_achievements = Achievement.objects.filter(condition_type='profile_complete')
-
-        newly_unlocked = []
-        completeness = self._check_profile_completeness()
-
-        for achievement in profile_achievements:
-            if UserAchievement.objects.filter(user=self.user, achievement=achievement).exists():
-                continue
-            if completeness >= achievement.condition_value:
-                newly_unlocked.append(self._unlock_achievement(achievement))
-
-        return [a for a in newly_unlocked if a]
-
-    def _unlock_achievement(self, achievement):
-        """解鎖單個成就的輔助函數"""
-        try:
-            user_achievement = UserAchievement.objects.create(
-                user=self.user,
-                achievement=achievement
-            )
-
-            # 增加積分
-            profile = UserProfile.objects.get(user=self.user)
-            profile.add_points(achievement.points)
-
-            # 記錄活動
-            Activity.objects.create(
-                user=self.user,
-                activity_type='achievement',
-                title=f'獲得成就: {achievement.name}',
-                description=achievement.description,
-                icon='🏆',
-                related_object_id=achievement.id
-            )
-
-            return achievement
-        except Exception as e:
-            print(f"解鎖成就時發生錯誤: {e}")
-            return None
+        return self.evaluate(['profile_complete'])
 
 
 def check_and_unlock_achievements(user):
@@ -0,0 +1,282 @@
+"""
+成就事件佇列
+發表文章、留言、按讚、追蹤等寫入的 signals 只新增一筆 AchievementEvent（與該寫入在同一個 transaction），
+提交後將事件 ID 放入行程內的佇列；背景執行緒累積 ACHIEVEMENT_QUEUE_BATCH_DELAY_MS 毫秒後一次取出，
+同一位使用者的事件合併處理：發文積分與活動記錄批次寫入、成就只檢查一次，
+連續按讚等大量事件只觸發一次成就檢查，網頁請求不再等待成就檢查與積分計算。
+
+事件以條件式 UPDATE 取出（locked_at / locked_by），處理完成後刪除；
+行程中斷時事件仍留在資料庫，超過 ACHIEVEMENT_EVENT_LEASE_SECONDS 秒未處理（或處理未完成）的事件
+由各行程的佇列每 ACHIEVEMENT_EVENT_SWEEP_INTERVAL 秒掃描接手，
+或由 `python manage.py process_achievement_events` 處理；
+行程正常結束前（atexit）最多等待 ACHIEVEMENT_QUEUE_SHUTDOWN_TIMEOUT 秒讓佇列處理完成，
+逾時或被強制終止而留下的事件由 cron 定期執行的 `process_achievement_events --stale-only --once` 接手
+"""
+import atexit
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from blog.models import AchievementEvent, Activity, Article, UserProfile
+from .achievement_checker import AchievementChecker
+
+logger = logging.getLogger(__name__)
+
+# 發表文章獲得的積分
+ARTICLE_POINTS = 50
+
+# 事件類型對應需要檢查的成就條件類型
+EVENT_CONDITIONS = {
+    AchievementEvent.EVENT_ARTICLE: ['article_count'],
+    AchievementEvent.EVENT_COMMENT: ['comment_count', 'total_comments'],
+    AchievementEvent.EVENT_FOLLOWER: ['follower_count', 'followers_count'],
+    AchievementEvent.EVENT_LIKE_GIVEN: ['like_given'],
+    AchievementEvent.EVENT_LIKE_RECEIVED: ['article_likes', 'post_likes', 'total_likes'],
+    AchievementEvent.EVENT_COURSE: ['course_completed', 'completed_courses'],
+    AchievementEvent.EVENT_PROFILE: ['profile_complete'],
+}
+
+
+def get_batch_delay():
+    """收到第一個事件後等待多久才處理（秒）"""
+    return getattr(settings, 'ACHIEVEMENT_QUEUE_BATCH_DELAY_MS', 500) / 1000
+
+
+def get_batch_size():
+    """每批最多處理的事件數"""
+    return getattr(settings, 'ACHIEVEMENT_QUEUE_BATCH_SIZE', 500)
+
+
+def get_lease_seconds():
+    """超過此秒數仍未處理完成的事件視為行程已中斷，可被重新取出"""
+    return getattr(settings, 'ACHIEVEMENT_EVENT_LEASE_SECONDS', 300)
+
+
+def get_sweep_interval():
+    """行程內佇列掃描中斷事件的間隔（秒）"""
+    return getattr(settings, 'ACHIEVEMENT_EVENT_SWEEP_INTERVAL', 60)
+
+
+def get_shutdown_timeout():
+    """行程結束前最多等待佇列處理完成的秒數"""
+    return getattr(settings, 'ACHIEVEMENT_QUEUE_SHUTDOWN_TIMEOUT', 10)
+
+
+def default_worker_id():
+    """產生 worker 識別碼（主機名稱-PID-亂數）"""
+    return f'{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}'[:64]
+
+
+def emit_achievement_event(user_id, event_type, object_id=None):
+    """
+    新增一筆成就事件，transaction 提交後交給行程內的佇列處理
+
+    Returns:
+        AchievementEvent: 新增的事件
+    """
+    event = AchievementEvent.objects.create(user_id=user_id, event_type=event_type, object_id=object_id)
+    transaction.on_commit(lambda: get_achievement_queue().submit(event.id))
+    return event
+
+
+def claim_events(worker_id, ids=None, batch_size=None, stale_only=False, now=None):
+    """
+    取出一批事件並標記為處理中（條件式 UPDATE，同一筆事件不會被兩個 worker 同時取得）
+
+    Args:
+        ids: 只取出這些事件（行程內佇列使用）；預設為所有可處理的事件
+        stale_only: 只取出建立或取出後超過租期仍未處理完成的事件
+
+    Returns:
+        list: 已取出的 AchievementEvent
+    """
+    now = now or timezone.now()
+    expired = now - timedelta(seconds=get_lease_seconds())
+    ready = Q(locked_at__lt=expired)
+    ready |= Q(locked_at__isnull=True, created_at__lt=expired) if stale_only else Q(locked_at__isnull=True)
+
+    candidates = AchievementEvent.objects.filter(ready)
+    if ids is not None:
+        candidates = candidates.filter(id__in=ids)
+    else:
+        candidates = candidates.filter(
+            id__in=list(candidates.order_by('id').values_list('id', flat=True)[:batch_size or get_batch_size()])
+        )
+
+    if not candidates.update(locked_at=now, locked_by=worker_id):
+        return []
+    return list(AchievementEvent.objects.filter(
+        locked_by=worker_id,
+        locked_at=now
+    ).select_related('user').order_by('id'))
+
+
+def process_events(events):
+    """
+    處理一批事件：依使用者合併，每位使用者寫入發文積分與活動記錄後只檢查一次成就，完成後刪除事件
+    某位使用者處理失敗時保留其事件，租期過後重新處理
+
+    Returns:
+        dict: {'events': 處理的事件數, 'users': 使用者數, 'unlocked': 解鎖的成就數, 'failed': 失敗的使用者數}
+    """
+    stats = {'events': 0, 'users': 0, 'unlocked': 0, 'failed': 0}
+    by_user = defaultdict(list)
+    for event in events:
+        by_user[event.user_id].append(event)
+
+    article_ids = [event.object_id for event in events if event.event_type == AchievementEvent.EVENT_ARTICLE]
+    titles = dict(Article.objects.filter(id__in=article_ids).values_list('id', 'title')) if article_ids else {}
+
+    for user_id, user_events in by_user.items():
+        try:
+            with transaction.atomic():
+                posted = [
+                    event.object_id for event in user_events
+                    if event.event_type == AchievementEvent.EVENT_ARTICLE and event.object_id in titles
+                ]
+                if posted:
+                    _award_article_points(user_id, posted, titles)
+
+                condition_types = set()
+                for event in user_events:
+                    condition_types.update(EVENT_CONDITIONS.get(event.event_type, ()))
+
+                user = user_events[0].user
+                newly_unlocked = AchievementChecker(user).evaluate(condition_types)
+                AchievementEvent.objects.filter(id__in=[event.id for event in user_events]).delete()
+        except Exception:
+            logger.exception('處理使用者 %s 的 %s 個成就事件失敗', user_id, len(user_events))
+            stats['failed'] += 1
+            continue
+
+        for achievement in newly_unlocked:
+            logger.info('%s 解鎖了成就: %s %s', user.username, achievement.icon, achievement.name)
+        stats['events'] += len(user_events)
+        stats['users'] += 1
+        stats['unlocked'] += len(newly_unlocked)
+
+    return stats
+
+
+def _award_article_points(user_id, article_ids, titles):
+    """發表文章的積分（一次 UPDATE）與活動記錄（一次 bulk_create）"""
+    UserProfile.award_points(user_id, ARTICLE_POINTS * len(article_ids))
+    Activity.objects.bulk_create([
+        Activity(
+            user_id=user_id,
+            activity_type='post',
+            title=f'發表了文章《{titles[article_id]}》',
+            description=f'獲得了 {ARTICLE_POINTS} 積分',
+            icon='📝',
+            related_object_id=article_id
+        )
+        for article_id in article_ids
+    ])
+
+
+class AchievementEventQueue:
+    """行程內的成就事件佇列（背景執行緒處理，每個行程一份）"""
+
+    def __init__(self, worker_id=None):
+        self.worker_id = worker_id or default_worker_id()
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+
+    def submit(self, event_id):
+        """加入一個已提交的事件 ID"""
+        self._queue.put(event_id)
+        self._ensure_worker()
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='achievement-events', daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        """等待第一個事件，再累積 ACHIEVEMENT_QUEUE_BATCH_DELAY_MS 毫秒或達到批次上限"""
+        try:
+            event_ids = [self._queue.get(timeout=get_sweep_interval())]
+        except queue.Empty:
+            return []
+
+        deadline = time.monotonic() + get_batch_delay()
+        batch_size = get_batch_size()
+        while len(event_ids) < batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                event_ids.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return event_ids
+
+    def _run(self):
+        while True:
+            event_ids = self._collect()
+            try:
+                close_old_connections()
+                if event_ids:
+                    process_events(claim_events(self.worker_id, ids=event_ids))
+                if time.monotonic() - self._last_sweep >= get_sweep_interval():
+                    self._last_sweep = time.monotonic()
+                    self.sweep()
+            except Exception:
+                logger.exception('處理 %s 個成就事件失敗，租期過後重新處理', len(event_ids))
+            finally:
+                close_old_connections()
+                for _ in event_ids:
+                    self._queue.task_done()
+
+    def sweep(self):
+        """接手其他行程中斷而未處理完成的事件"""
+        while True:
+            events = claim_events(self.worker_id, stale_only=True)
+            if not events:
+                return
+            process_events(events)
+
+    def drain(self, timeout=None):
+        """
+        等待佇列中的事件處理完成（測試與關閉行程時使用）
+
+        Returns:
+            bool: 是否在 timeout 秒內處理完成
+        """
+        with self._queue.all_tasks_done:
+            return self._queue.all_tasks_done.wait_for(lambda: not self._queue.unfinished_tasks, timeout)
+
+
+_queue_lock = threading.Lock()
+_achievement_queue = None
+
+
+def get_achievement_queue():
+    """取得目前行程的成就事件佇列"""
+    global _achievement_queue
+    if _achievement_queue is None:
+        with _queue_lock:
+            if _achievement_queue is None:
+                _achievement_queue = AchievementEventQueue()
+                atexit.register(_drain_on_exit, _achievement_queue)
+    return _achievement_queue
+
+
+def _drain_on_exit(achievement_queue):
+    """行程結束前等待已提交的事件處理完成（背景執行緒為 daemon，不等待就會直接中斷）"""
+    if not achievement_queue.drain(timeout=get_shutdown_timeout()):
+        logger.warning('行程結束時仍有成就事件未處理完成，將由 process_achievement_events --stale-only 接手')
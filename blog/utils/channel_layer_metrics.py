@@ -0,0 +1,251 @@
+"""
+Channel Layer 監控指標
+由 blog.channel_layers.InstrumentedChannelLayer 記錄，供管理後台頁面與 JSON 端點讀取
+
+指標皆為單一行程內的統計（每個 Daphne 行程各自一份），
+使用 DatabaseChannelLayer 時另外從資料庫彙整所有行程的群組成員數
+"""
+import os
+import threading
+import time
+from collections import deque
+
+from django.db.models import Count
+from django.utils import timezone
+
+# 延遲直方圖的區間上限（毫秒）
+LATENCY_BUCKETS_MS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500]
+
+# 計算發送速率的時間窗（秒）
+RATE_WINDOW_SECONDS = 60
+
+
+def get_group_family(group):
+    """群組類別（notifications_12 → notifications、chat_3_5 → chat）"""
+    return group.split('_', 1)[0]
+
+
+class LatencyHistogram:
+    """固定區間的延遲直方圖"""
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms):
+        for index, upper in enumerate(LATENCY_BUCKETS_MS):
+            if ms <= upper:
+                self.counts[index] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, ratio):
+        """以區間上限估計百分位數（毫秒）"""
+        if not self.count:
+            return None
+        target = self.count * ratio
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def snapshot(self):
+        labels = [f'<={upper}ms' for upper in LATENCY_BUCKETS_MS] + [f'>{LATENCY_BUCKETS_MS[-1]}ms']
+        return {
+            'count': self.count,
+            'avg_ms': round(self.total_ms / self.count, 3) if self.count else None,
+            'max_ms': round(self.max_ms, 3),
+            'p50_ms': self.percentile(0.5),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99),
+            'buckets': dict(zip(labels, self.counts)),
+        }
+
+
+class RateCounter:
+    """以每秒一格計數的滑動時間窗，記憶體用量固定"""
+
+    def __init__(self, window=RATE_WINDOW_SECONDS):
+        self.window = window
+        self.slots = deque()
+        self.total = 0
+
+    def _trim(self, now):
+        while self.slots and self.slots[0][0] <= now - self.window:
+            self.slots.popleft()
+
+    def add(self, amount=1):
+        now = int(time.time())
+        if self.slots and self.slots[-1][0] == now:
+            self.slots[-1][1] += amount
+        else:
+            self.slots.append([now, amount])
+        self._trim(now)
+        self.total += amount
+
+    def per_minute(self):
+        self._trim(int(time.time()))
+        return sum(count for _, count in self.slots) * 60 / self.window
+
+
+class ChannelLayerMetrics:
+    """單一行程的 Channel Layer 指標"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.started_at = timezone.now()
+        self._lock = threading.Lock()
+        self.groups = {}
+        self.counters = {
+            'send': 0,
+            'group_send': 0,
+            'receive': 0,
+            'dropped_full': 0,
+            'dropped_expired': 0,
+        }
+        self.latency = {
+            'send': LatencyHistogram(),
+            'group_send': LatencyHistogram(),
+        }
+        self.family_latency = {}
+        self.family_rates = {}
+
+    def record_group_add(self, group, channel):
+        with self._lock:
+            self.groups.setdefault(group, set()).add(channel)
+
+    def record_group_discard(self, group, channel):
+        with self._lock:
+            channels = self.groups.get(group)
+            if channels is not None:
+                channels.discard(channel)
+                if not channels:
+                    self.groups.pop(group, None)
+
+    def group_channels(self, group):
+        with self._lock:
+            return list(self.groups.get(group, ()))
+
+    def record_send(self, elapsed):
+        with self._lock:
+            self.counters['send'] += 1
+            self.latency['send'].observe(elapsed * 1000)
+
+    def record_group_send(self, group, elapsed):
+        family = get_group_family(group)
+        with self._lock:
+            self.counters['group_send'] += 1
+            self.latency['group_send'].observe(elapsed * 1000)
+            self.family_latency.setdefault(family, LatencyHistogram()).observe(elapsed * 1000)
+            self.family_rates.setdefault(family, RateCounter()).add()
+
+    def record_receive(self):
+        with self._lock:
+            self.counters['receive'] += 1
+
+    def record_drop(self, channel, reason, count=1):
+        """記錄被丟棄的訊息（reason: full 佇列已滿、expired 過期未被接收）"""
+        with self._lock:
+            self.counters[f'dropped_{reason}'] += count
+
+    def snapshot(self, queues=None, top=20):
+        """
+        產生可序列化為 JSON 的指標快照
+
+        Args:
+            queues: {channel: 佇列長度}（由 channel layer 提供）
+            top: 列出成員數最多的群組與最長佇列的數量
+        """
+        queues = queues or {}
+        with self._lock:
+            group_sizes = {group: len(channels) for group, channels in self.groups.items()}
+            counters = dict(self.counters)
+            latency = {name: histogram.snapshot() for name, histogram in self.latency.items()}
+            families = sorted(set(self.family_rates) | {get_group_family(group) for group in group_sizes})
+            family_stats = {}
+            for family in families:
+                sizes = [size for group, size in group_sizes.items() if get_group_family(group) == family]
+                rate = self.family_rates.get(family)
+                histogram = self.family_latency.get(family)
+                family_stats[family] = {
+                    'groups': len(sizes),
+                    'members': sum(sizes),
+                    'group_sends': rate.total if rate else 0,
+                    'group_sends_per_minute': round(rate.per_minute(), 2) if rate else 0,
+                    'latency': histogram.snapshot() if histogram else None,
+                }
+
+        depths = [depth for depth in queues.values()]
+        top_groups = sorted(group_sizes.items(), key=lambda item: item[1], reverse=True)[:top]
+        top_queues = sorted(queues.items(), key=lambda item: item[1], reverse=True)[:top]
+
+        return {
+            'pid': os.getpid(),
+            'backend': self.backend,
+            'started_at': self.started_at.isoformat(),
+            'uptime_seconds': int((timezone.now() - self.started_at).total_seconds()),
+            'counters': counters,
+            'latency': latency,
+            'families': family_stats,
+            'groups': {
+                'count': len(group_sizes),
+                'members': sum(group_sizes.values()),
+                'top': [{'group': group, 'members': size} for group, size in top_groups],
+            },
+            'queues': {
+                'channels': len(depths),
+                'messages': sum(depths),
+                'max_depth': max(depths) if depths else 0,
+                'top': [{'channel': channel, 'depth': depth} for channel, depth in top_queues],
+            },
+        }
+
+
+def get_database_group_stats(top=20):
+    """
+    從資料庫彙整所有行程的群組成員數（僅 DatabaseChannelLayer）
+
+    Returns:
+        dict: {'count', 'members', 'families', 'top'}
+    """
+    from blog.models import ChannelGroupMembership
+
+    rows = list(ChannelGroupMembership.objects.filter(
+        expires_at__gt=timezone.now()
+    ).values('group').annotate(members=Count('id')).order_by('-members'))
+
+    families = {}
+    for row in rows:
+        family = families.setdefault(get_group_family(row['group']), {'groups': 0, 'members': 0})
+        family['groups'] += 1
+        family['members'] += row['members']
+
+    return {
+        'count': len(rows),
+        'members': sum(row['members'] for row in rows),
+        'families': families,
+        'top': rows[:top],
+    }
+
+
+def get_channel_layer_metrics():
+    """
+    取得目前行程的 Channel Layer 指標
+
+    Returns:
+        dict 或 None（未使用 InstrumentedChannelLayer 時）
+    """
+    from channels.layers import get_channel_layer
+
+    layer = get_channel_layer()
+    if layer is None or not hasattr(layer, 'get_metrics'):
+        return None
+    return layer.get_metrics()
@@ -0,0 +1,464 @@
+"""
+即時聊天訊息批次寫入佇列
+ChatConsumer 收到訊息後立即取得 ID 與時間並廣播，訊息先放入行程內的佇列，
+累積數毫秒（或達到批次上限）後以一次 bulk_create 寫入，
+同一批中給同一位接收者的「新即時訊息」通知合併為一則
+
+寫入失敗的訊息保留在佇列中，以遞增的間隔重試；嘗試 CHAT_WRITE_MAX_ATTEMPTS 次仍失敗，
+或行程結束前 CHAT_WRITE_SHUTDOWN_TIMEOUT 秒內仍無法寫入的訊息，寫入 CHAT_WRITE_SPOOL_DIR 的暫存檔（NDJSON），
+之後任一次寫入成功時由同一目錄的行程補寫；連暫存檔都無法寫入時才放棄，並通知發送者
+"""
+import asyncio
+import atexit
+import json
+import logging
+import os
+import time
+import uuid
+import weakref
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PendingChatMessage:
+    """尚未寫入資料庫的聊天訊息"""
+    id: Optional[int]
+    sender_id: int
+    recipient_id: int
+    content: str
+    created_at: object
+    attempts: int = 0
+    # 寫入失敗時通知發送者的群組（ChatConsumer 的聊天室群組）
+    reply_group: Optional[str] = None
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'content': self.content,
+            'timestamp': self.created_at.isoformat(),
+        }
+
+
+def get_batch_delay():
+    """收到第一則訊息後等待多久才寫入（秒）"""
+    return getattr(settings, 'CHAT_WRITE_BATCH_DELAY_MS', 5) / 1000
+
+
+def get_batch_size():
+    """累積到此數量時立即寫入"""
+    return getattr(settings, 'CHAT_WRITE_BATCH_SIZE', 200)
+
+
+def get_max_attempts():
+    """寫入失敗時在佇列中重試的次數，超過後寫入暫存檔"""
+    return getattr(settings, 'CHAT_WRITE_MAX_ATTEMPTS', 3)
+
+
+def get_retry_delay(attempts):
+    """第 attempts 次寫入失敗後等待多久重試（秒，每次加倍）"""
+    return getattr(settings, 'CHAT_WRITE_RETRY_DELAY_MS', 500) / 1000 * 2 ** (attempts - 1)
+
+
+def get_shutdown_timeout():
+    """行程結束前最多花多少秒寫入佇列中剩餘的訊息"""
+    return getattr(settings, 'CHAT_WRITE_SHUTDOWN_TIMEOUT', 10)
+
+
+def split_failed_messages(batch):
+    """
+    寫入失敗後依嘗試次數分成稍後重試與寫入暫存檔兩組
+
+    Returns:
+        tuple: (retry, failed)
+    """
+    retry, failed = [], []
+    for message in batch:
+        message.attempts += 1
+        if message.attempts >= get_max_attempts():
+            failed.append(message)
+        else:
+            retry.append(message)
+    return retry, failed
+
+
+def get_spool_dir():
+    """寫入失敗的訊息暫存目錄"""
+    return Path(getattr(settings, 'CHAT_WRITE_SPOOL_DIR', Path(settings.BASE_DIR) / 'chat_spool'))
+
+
+class ChatMessageIdAllocator:
+    """
+    預先保留 ChatMessage 的主鍵
+
+    PostgreSQL 一次從序列取出一整段 ID（每段只需一次查詢），訊息在寫入前就能有正式 ID；
+    其他資料庫無法預先保留，ID 於寫入時才由資料庫產生（廣播的 id 為 None）
+    """
+
+    def __init__(self, block_size=None):
+        self.block_size = block_size or getattr(settings, 'CHAT_WRITE_ID_BLOCK_SIZE', 100)
+        self._ids: List[int] = []
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def is_supported():
+        return connection.vendor == 'postgresql'
+
+    @staticmethod
+    def _reserve(count):
+        from blog.models import ChatMessage
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)',
+                [ChatMessage._meta.db_table, 'id', count]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    async def allocate(self):
+        if not self.is_supported():
+            return None
+
+        async with self._lock:
+            if not self._ids:
+                self._ids = await database_sync_to_async(self._reserve)(self.block_size)
+            return self._ids.pop(0)
+
+
+class ChatWriteQueue:
+    """單一 event loop（Daphne 行程）內的聊天訊息寫入佇列"""
+
+    def __init__(self):
+        self.pending: List[PendingChatMessage] = []
+        self.allocator = ChatMessageIdAllocator()
+        self._timer = None
+        self._flush_lock = asyncio.Lock()
+        self._tasks = set()
+        # 正在寫入的批次 {id(batch): batch}，寫入成功後由寫入的執行緒移除；
+        # 行程結束時 event loop 已停止，仍留在這裡的批次由 write_remaining() 重新寫入
+        self._writing: Dict[int, List[PendingChatMessage]] = {}
+        # 是否可能有待補寫的暫存檔：啟動時檢查一次先前行程留下的檔案，之後只在本行程寫入暫存檔時設定，
+        # 避免每次寫入都在 event loop 上讀取目錄
+        self._spooled = True
+
+    async def submit(self, sender, recipient, content, reply_group=None):
+        """
+        加入一則訊息並立即回傳其 ID 與時間（寫入在背景批次進行）
+
+        Args:
+            reply_group: 最終寫入失敗時通知發送者的群組
+
+        Returns:
+            dict: {'id', 'content', 'timestamp'}
+        """
+        message = PendingChatMessage(
+            id=await self.allocator.allocate(),
+            sender_id=sender.id,
+            recipient_id=recipient.id,
+            content=content,
+            created_at=timezone.now(),
+            reply_group=reply_group,
+        )
+        self.pending.append(message)
+
+        if len(self.pending) >= get_batch_size():
+            self._schedule_flush(0)
+        else:
+            self._schedule_flush(get_batch_delay())
+
+        return message.to_dict()
+
+    def _schedule_flush(self, delay):
+        loop = asyncio.get_running_loop()
+        if delay == 0:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(delay, self._start_flush)
+
+    def _start_flush(self):
+        self._timer = None
+        task = asyncio.ensure_future(self.flush())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def flush(self):
+        """寫入目前佇列中的所有訊息"""
+        async with self._flush_lock:
+            batch, self.pending = self.pending, []
+            if not batch:
+                return
+
+            self._writing[id(batch)] = batch
+            try:
+                await database_sync_to_async(self._persist)(batch)
+            except Exception:
+                self._writing.pop(id(batch), None)
+                retry, failed = split_failed_messages(batch)
+                logger.exception(
+                    '寫入 %s 則聊天訊息失敗，%s 則稍後重試、%s 則寫入暫存檔',
+                    len(batch), len(retry), len(failed)
+                )
+                if failed:
+                    await self._spill(failed)
+                if retry:
+                    self.pending = retry + self.pending
+                    self._schedule_flush(get_retry_delay(max(message.attempts for message in retry)))
+                return
+
+            # 資料庫恢復後補寫暫存檔中的訊息
+            if self._spooled:
+                try:
+                    await database_sync_to_async(replay_spooled_messages)()
+                    self._spooled = False
+                except Exception:
+                    logger.exception('補寫暫存的聊天訊息失敗')
+
+    async def _spill(self, messages):
+        """將訊息寫入暫存檔；暫存檔也無法寫入時放棄並通知發送者"""
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, spool_chat_messages, messages)
+            self._spooled = True
+        except Exception:
+            logger.exception('%s 則聊天訊息無法寫入暫存檔，已放棄', len(messages))
+            await notify_failed_messages(messages)
+
+    def _persist(self, batch):
+        persist_chat_messages(batch)
+        self._writing.pop(id(batch), None)
+
+    async def drain(self, timeout=None):
+        """
+        等待佇列清空（測試與效能測試使用），寫入失敗的訊息照常依間隔重試
+
+        Returns:
+            bool: 是否在 timeout 秒內清空
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (get_shutdown_timeout() if timeout is None else timeout)
+        while self.pending or self._tasks:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+            if self._tasks:
+                await asyncio.wait(list(self._tasks), timeout=remaining)
+            elif self._timer is None:
+                self._start_flush()
+            else:
+                # 等待批次或重試的計時器
+                await asyncio.sleep(min(remaining, get_batch_delay()))
+        return True
+
+    def write_remaining(self, timeout):
+        """
+        同步寫入佇列中剩餘與寫入中斷的訊息（行程結束、event loop 已停止時使用）
+
+        失敗時照常依間隔重試，達到嘗試次數或超過 timeout 秒的訊息寫入暫存檔
+
+        Returns:
+            int: 寫入資料庫的訊息數
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch = [message for writing in self._writing.values() for message in writing] + self.pending
+        self._writing, self.pending = {}, []
+
+        deadline = time.monotonic() + timeout
+        while batch:
+            try:
+                persist_chat_messages(batch)
+                return len(batch)
+            except Exception:
+                batch, failed = split_failed_messages(batch)
+                logger.exception(
+                    '行程結束時寫入聊天訊息失敗，%s 則稍後重試、%s 則寫入暫存檔', len(batch), len(failed)
+                )
+                if batch:
+                    delay = get_retry_delay(max(message.attempts for message in batch))
+                    if time.monotonic() + delay > deadline:
+                        failed, batch = failed + batch, []
+                    else:
+                        time.sleep(delay)
+                if failed:
+                    try:
+                        spool_chat_messages(failed)
+                    except Exception:
+                        logger.exception('%s 則聊天訊息無法寫入暫存檔，已放棄', len(failed))
+        return 0
+
+
+def persist_chat_messages(batch):
+    """
+    以一次 bulk_create 寫入一批訊息並更新對話摘要，提交後送出合併的通知
+
+    Returns:
+        list: 寫入的 ChatMessage
+    """
+    from blog.models import ChatMessage, ChatRoom
+
+    messages = [
+        ChatMessage(
+            id=pending.id,
+            sender_id=pending.sender_id,
+            recipient_id=pending.recipient_id,
+            content=pending.content,
+            created_at=pending.created_at,
+        )
+        for pending in batch
+    ]
+
+    with transaction.atomic():
+        ChatMessage.objects.bulk_create(messages)
+        ChatRoom.record_messages(messages)
+
+    # 訊息已寫入，通知失敗不可讓整批訊息被重試（會重複寫入）
+    try:
+        send_coalesced_chat_notifications(messages)
+    except Exception:
+        logger.exception('送出 %s 則聊天訊息的通知失敗', len(messages))
+    return messages
+
+
+def send_coalesced_chat_notifications(messages):
+    """同一批訊息中給同一位接收者的通知合併為一則"""
+    from django.contrib.auth.models import User
+    from .notifications import create_notification
+
+    bursts: Dict[int, Dict[int, int]] = {}
+    for message in messages:
+        if message.sender_id == message.recipient_id:
+            continue
+        senders = bursts.setdefault(message.recipient_id, {})
+        # 依最後出現順序排列，最後一位為最新的發送者
+        senders[message.sender_id] = senders.pop(message.sender_id, 0) + 1
+
+    if not bursts:
+        return
+
+    user_ids = set(bursts)
+    for senders in bursts.values():
+        user_ids.update(senders)
+    users = User.objects.in_bulk(user_ids)
+
+    for recipient_id, senders in bursts.items():
+        recipient = users.get(recipient_id)
+        sender = users.get(next(reversed(senders)))
+        if recipient is None or sender is None:
+            continue
+
+        # Get display name (first_name or username)
+        display_name = sender.first_name if sender.first_name else sender.username
+        if len(senders) > 1:
+            message = f'{display_name} 和其他 {len(senders) - 1} 人向您發送了即時訊息'
+        elif senders[sender.id] > 1:
+            message = f'{display_name} 向您發送了 {senders[sender.id]} 則即時訊息'
+        else:
+            message = f'{display_name} 向您發送了即時訊息'
+
+        create_notification(
+            user=recipient,
+            notification_type='message',
+            message=message,
+            link=f'/blog/member/{sender.username}/'  # 連結到最新發送者的個人頁面
+        )
+
+
+def spool_chat_messages(messages):
+    """將無法寫入資料庫的訊息寫入暫存檔（每批一個檔案，先寫入暫存名稱再改名，不會留下寫到一半的檔案）"""
+    spool_dir = get_spool_dir()
+    spool_dir.mkdir(parents=True, exist_ok=True)
+    name = f'chat_{timezone.now():%Y%m%d_%H%M%S_%f}_{uuid.uuid4().hex[:8]}'
+    tmp_path = spool_dir / f'{name}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as spool_file:
+        for message in messages:
+            row = asdict(message)
+            row['created_at'] = message.created_at.isoformat()
+            spool_file.write(json.dumps(row, ensure_ascii=False) + '\n')
+        spool_file.flush()
+        os.fsync(spool_file.fileno())
+    os.replace(tmp_path, spool_dir / f'{name}.ndjson')
+
+
+def replay_spooled_messages():
+    """
+    補寫暫存檔中的訊息
+
+    每個檔案先改名取得（多個行程共用目錄時不會重複補寫），寫入成功後刪除，失敗時改回原名
+
+    Returns:
+        int: 補寫的訊息數
+    """
+    replayed = 0
+    for path in sorted(get_spool_dir().glob('*.ndjson')):
+        claimed = path.with_suffix(f'.{os.getpid()}.replaying')
+        try:
+            os.replace(path, claimed)
+        except FileNotFoundError:
+            continue
+
+        try:
+            with open(claimed, encoding='utf-8') as spool_file:
+                batch = []
+                for line in spool_file:
+                    row = json.loads(line)
+                    row['created_at'] = datetime.fromisoformat(row['created_at'])
+                    batch.append(PendingChatMessage(**row))
+            persist_chat_messages(batch)
+        except Exception:
+            os.replace(claimed, path)
+            raise
+
+        claimed.unlink()
+        replayed += len(batch)
+        logger.info('已補寫暫存檔 %s 中的 %s 則聊天訊息', path.name, len(batch))
+    return replayed
+
+
+async def notify_failed_messages(messages):
+    """通知發送者訊息未能儲存"""
+    from channels.layers import get_channel_layer
+
+    channel_layer = get_channel_layer()
+    for message in messages:
+        if not message.reply_group:
+            continue
+        try:
+            await channel_layer.group_send(message.reply_group, {
+                'type': 'chat_message_failed',
+                'sender_id': message.sender_id,
+                'message': message.to_dict(),
+            })
+        except Exception:
+            logger.exception('無法通知發送者訊息寫入失敗')
+
+
+_queues = weakref.WeakKeyDictionary()
+
+
+def get_chat_write_queue():
+    """取得目前 event loop 的寫入佇列（每個 Daphne 行程一份）"""
+    loop = asyncio.get_running_loop()
+    queue = _queues.get(loop)
+    if queue is None:
+        queue = _queues[loop] = ChatWriteQueue()
+    return queue
+
+
+@atexit.register
+def _write_remaining_on_exit():
+    """行程結束前寫入各佇列中尚未寫入的訊息（Daphne 結束時不一定會對每個連線呼叫 disconnect）"""
+    for queue in list(_queues.values()):
+        if queue.pending or queue._writing:
+            queue.write_remaining(get_shutdown_timeout())
@@ -0,0 +1,84 @@
+"""
+本機假推播服務
+模擬 FCM / Mozilla Push 等推播服務的端點，用於推播吞吐量測試，不會真的送出通知
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakePushHandler(BaseHTTPRequestHandler):
+    """
+    接收推播請求並回應固定狀態碼
+
+    路徑以 /gone 結尾的端點回應 410（模擬失效訂閱），其餘回應 201
+    """
+    protocol_version = 'HTTP/1.1'  # 支援 keep-alive，讓連線池可以重複使用連線
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        status = 410 if self.path.rstrip('/').endswith('/gone') else 201
+        self.server.record_request(self.headers.get('Authorization', ''))
+
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        """不輸出每個請求的日誌"""
+        pass
+
+
+class FakePushServer(ThreadingHTTPServer):
+    """
+    在背景執行緒中執行的假推播服務
+
+    用法:
+        with FakePushServer(latency=0.05) as server:
+            endpoint = server.endpoint('abc')
+    """
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0):
+        super().__init__((host, port), FakePushHandler)
+        self.latency = latency
+        self.request_count = 0
+        self.authorization_headers = set()
+        self._count_lock = threading.Lock()
+        self._thread = None
+
+    def record_request(self, authorization):
+        """記錄收到的請求數與不同的 VAPID Authorization 標頭"""
+        with self._count_lock:
+            self.request_count += 1
+            self.authorization_headers.add(authorization)
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def endpoint(self, name, gone=False):
+        """產生指向假推播服務的訂閱端點"""
+        suffix = '/gone' if gone else ''
+        return f'{self.base_url}/push/{name}{suffix}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,106 @@
+"""
+追蹤關係查詢
+每位用戶的追蹤中／追蹤者 ID 以排序好的 array('q') 快取在共用快取（FOLLOW_GRAPH_CACHE_ALIAS），
+追蹤、取消追蹤時由 follow_user 使雙方的記錄失效。
+
+列表頁、個人頁面與 API 需要知道目前用戶是否追蹤了一批用戶時，
+從目前用戶的追蹤中 ID 以二分搜尋判斷，快取命中時不需要查詢資料庫
+"""
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import caches
+
+from blog.models import Follow
+
+FOLLOW_GRAPH_KEY_PREFIX = 'follow_graph:'
+FOLLOWING = 'following'
+FOLLOWERS = 'followers'
+
+
+def get_follow_graph_cache():
+    return caches[getattr(settings, 'FOLLOW_GRAPH_CACHE_ALIAS', 'default')]
+
+
+def get_cache_ttl():
+    """追蹤關係快取的最長保留秒數"""
+    return getattr(settings, 'FOLLOW_GRAPH_CACHE_TTL', 3600)
+
+
+def _key(kind, user_id):
+    return f'{FOLLOW_GRAPH_KEY_PREFIX}{kind}:{user_id}'
+
+
+def _load_ids(kind, user_id):
+    """從資料庫讀取用戶的追蹤中／追蹤者 ID，排序後存成 array"""
+    if kind == FOLLOWING:
+        queryset = Follow.objects.filter(follower_id=user_id).values_list('following_id', flat=True).order_by()
+    else:
+        queryset = Follow.objects.filter(following_id=user_id).values_list('follower_id', flat=True).order_by()
+    return array('q', sorted(queryset))
+
+
+def _get_ids(kind, user_id):
+    cache = get_follow_graph_cache()
+    key = _key(kind, user_id)
+    cached = cache.get(key)
+    if cached is not None:
+        ids = array('q')
+        ids.frombytes(cached)
+        return ids
+
+    ids = _load_ids(kind, user_id)
+    cache.set(key, ids.tobytes(), get_cache_ttl())
+    return ids
+
+
+def get_following_ids(user_id):
+    """用戶追蹤中的用戶 ID（排序好的 array）"""
+    return _get_ids(FOLLOWING, user_id)
+
+
+def get_follower_ids(user_id):
+    """追蹤該用戶的用戶 ID（排序好的 array）"""
+    return _get_ids(FOLLOWERS, user_id)
+
+
+def contains(sorted_ids, user_id):
+    """在排序好的 ID 中二分搜尋"""
+    index = bisect_left(sorted_ids, user_id)
+    return index < len(sorted_ids) and sorted_ids[index] == user_id
+
+
+def invalidate_follow_graph(follower_id, following_id):
+    """追蹤或取消追蹤後，使追蹤者的追蹤中記錄與被追蹤者的追蹤者記錄失效"""
+    get_follow_graph_cache().delete_many([
+        _key(FOLLOWING, follower_id),
+        _key(FOLLOWERS, following_id),
+    ])
+
+
+def get_following_status(viewer, user_ids):
+    """
+    目前用戶是否追蹤了每一位用戶
+
+    Args:
+        viewer: 目前用戶（未登入時回傳空 dict）
+        user_ids: 要查詢的用戶 ID（用戶本人會被略過）
+
+    Returns:
+        dict: {用戶 ID: 是否已追蹤}
+    """
+    if viewer is None or not viewer.is_authenticated:
+        return {}
+
+    user_ids = {user_id for user_id in user_ids if user_id != viewer.id}
+    if not user_ids:
+        return {}
+
+    following_ids = get_following_ids(viewer.id)
+    return {user_id: contains(following_ids, user_id) for user_id in user_ids}
+
+
+def get_is_following(viewer, user):
+    """目前用戶是否追蹤了 user（未登入或本人時為 False）"""
+    return get_following_status(viewer, [user.id]).get(user.id, False)
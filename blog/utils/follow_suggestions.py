@@ -0,0 +1,211 @@
+"""
+推薦追蹤（Who to follow）
+由 `python manage.py build_follow_suggestions` 定期批次計算，結果存入 FollowSuggestion，
+API 與個人頁面只讀取計算好的結果，不在請求中走訪追蹤關係。
+
+兩種來源：
+- 朋友的朋友：我追蹤的用戶所追蹤的用戶，依共同追蹤數計分
+- 共同興趣：經常撰寫我所閱讀、按讚文章的標籤的作者
+
+追蹤關係一次依 (follower, following) 順序讀入，每位用戶的追蹤中 ID 存成排序好的 array('q')；
+每位用戶最多展開 FOLLOW_SUGGESTION_MAX_FANOUT 位追蹤中用戶、每位再取最多同樣數量的追蹤中用戶，
+總計算量與追蹤關係（邊）的數量成正比。用戶依 ID 分批計算與寫入，每批一個 transaction
+"""
+import heapq
+import logging
+from array import array
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count
+
+from blog.models import Article, ArticleReadHistory, Follow, FollowSuggestion, Like
+from .follow_graph import contains, get_following_ids
+
+logger = logging.getLogger(__name__)
+
+# 計分權重：一位共同追蹤與一個共同興趣標籤的分數
+MUTUAL_WEIGHT = 2.0
+SHARED_TAG_WEIGHT = 1.0
+
+# 每位用戶最多採用的興趣標籤數
+MAX_INTEREST_TAGS = 10
+
+
+def get_suggestion_limit():
+    """每位用戶保留的推薦數"""
+    return getattr(settings, 'FOLLOW_SUGGESTION_LIMIT', 20)
+
+
+def get_max_fanout():
+    """每位用戶最多展開的追蹤中用戶數，以及每個標籤最多採用的作者數"""
+    return getattr(settings, 'FOLLOW_SUGGESTION_MAX_FANOUT', 200)
+
+
+def get_chunk_size():
+    """每批計算與寫入的用戶數"""
+    return getattr(settings, 'FOLLOW_SUGGESTION_CHUNK_SIZE', 500)
+
+
+def load_following_graph():
+    """
+    讀取所有追蹤關係
+
+    Returns:
+        dict: {用戶 ID: 追蹤中的用戶 ID（排序好的 array('q')）}
+    """
+    graph = {}
+    current_id = None
+    current = None
+    edges = Follow.objects.order_by('follower_id', 'following_id').values_list('follower_id', 'following_id')
+    for follower_id, following_id in edges.iterator(chunk_size=5000):
+        if follower_id != current_id:
+            current_id = follower_id
+            current = graph[follower_id] = array('q')
+        current.append(following_id)
+    return graph
+
+
+def load_interest_tags():
+    """
+    每位用戶感興趣的標籤（閱讀過、按讚過的文章的標籤）
+
+    Returns:
+        dict: {用戶 ID: [標籤 ID, ...]}（依次數遞減，最多 MAX_INTEREST_TAGS 個）
+    """
+    counters = defaultdict(Counter)
+    for model in (ArticleReadHistory, Like):
+        rows = model.objects.filter(article__tags__isnull=False).values_list('user_id', 'article__tags')
+        for user_id, tag_id in rows.order_by().iterator(chunk_size=5000):
+            counters[user_id][tag_id] += 1
+    return {
+        user_id: [tag_id for tag_id, _ in counter.most_common(MAX_INTEREST_TAGS)]
+        for user_id, counter in counters.items()
+    }
+
+
+def load_tag_authors(max_authors):
+    """
+    每個標籤的主要作者（依已發表文章數遞減）
+
+    Returns:
+        dict: {標籤 ID: [作者 ID, ...]}（每個標籤最多 max_authors 位）
+    """
+    counts = defaultdict(list)
+    rows = Article.objects.filter(
+        status='published',
+        tags__isnull=False
+    ).values('tags', 'author_id').annotate(articles=Count('id')).order_by()
+    for row in rows.iterator(chunk_size=5000):
+        counts[row['tags']].append((row['articles'], row['author_id']))
+    return {
+        tag_id: [author_id for _, author_id in heapq.nlargest(max_authors, authors)]
+        for tag_id, authors in counts.items()
+    }
+
+
+def compute_suggestions(user_id, graph, interest_tags, tag_authors, limit, max_fanout):
+    """
+    計算一位用戶的推薦追蹤
+
+    Returns:
+        list: [(推薦用戶 ID, 分數, 共同追蹤數, 共同興趣標籤數), ...]（依分數遞減）
+    """
+    following = graph.get(user_id, array('q'))
+
+    def excluded(candidate_id):
+        return candidate_id == user_id or contains(following, candidate_id)
+
+    mutual = Counter()
+    for friend_id in following[:max_fanout]:
+        for candidate_id in graph.get(friend_id, array('q'))[:max_fanout]:
+            if not excluded(candidate_id):
+                mutual[candidate_id] += 1
+
+    shared_tags = Counter()
+    for tag_id in interest_tags.get(user_id, ()):
+        for author_id in tag_authors.get(tag_id, ()):
+            if not excluded(author_id):
+                shared_tags[author_id] += 1
+
+    scored = [
+        (
+            candidate_id,
+            mutual[candidate_id] * MUTUAL_WEIGHT + shared_tags[candidate_id] * SHARED_TAG_WEIGHT,
+            mutual[candidate_id],
+            shared_tags[candidate_id],
+        )
+        for candidate_id in mutual.keys() | shared_tags.keys()
+    ]
+    return heapq.nlargest(limit, scored, key=lambda item: (item[1], -item[0]))
+
+
+def build_follow_suggestions(chunk_size=None, limit=None, max_fanout=None):
+    """
+    重新計算所有啟用用戶的推薦追蹤
+
+    Returns:
+        dict: {'users': 處理的用戶數, 'suggestions': 寫入的推薦數, 'chunks': 批次數}
+    """
+    chunk_size = chunk_size or get_chunk_size()
+    limit = limit or get_suggestion_limit()
+    max_fanout = max_fanout or get_max_fanout()
+
+    graph = load_following_graph()
+    interest_tags = load_interest_tags()
+    tag_authors = load_tag_authors(max_fanout)
+    active_ids = set(User.objects.filter(is_active=True).values_list('id', flat=True))
+
+    stats = {'users': 0, 'suggestions': 0, 'chunks': 0}
+    user_ids = sorted(active_ids)
+    for start in range(0, len(user_ids), chunk_size):
+        chunk = user_ids[start:start + chunk_size]
+        suggestions = []
+        for user_id in chunk:
+            for suggested_id, score, mutual_count, shared_tag_count in compute_suggestions(
+                user_id, graph, interest_tags, tag_authors, limit, max_fanout
+            ):
+                if suggested_id not in active_ids:
+                    continue
+                suggestions.append(FollowSuggestion(
+                    user_id=user_id,
+                    suggested_user_id=suggested_id,
+                    score=score,
+                    mutual_count=mutual_count,
+                    shared_tag_count=shared_tag_count,
+                ))
+
+        with transaction.atomic():
+            FollowSuggestion.objects.filter(user_id__in=chunk).delete()
+            FollowSuggestion.objects.bulk_create(suggestions, batch_size=1000)
+
+        stats['users'] += len(chunk)
+        stats['suggestions'] += len(suggestions)
+        stats['chunks'] += 1
+
+    # 已停用的用戶不再保留推薦
+    FollowSuggestion.objects.filter(user__is_active=False).delete()
+
+    logger.info(
+        f'Built {stats["suggestions"]} follow suggestions for {stats["users"]} users in {stats["chunks"]} chunks'
+    )
+    return stats
+
+
+def get_follow_suggestions(user, limit=10):
+    """
+    用戶的推薦追蹤（略過計算後才追蹤的用戶）
+
+    Returns:
+        list: FollowSuggestion 列表（已預載推薦用戶與個人資料）
+    """
+    following_ids = get_following_ids(user.id)
+    suggestions = FollowSuggestion.objects.filter(user=user).select_related(
+        'suggested_user', 'suggested_user__profile'
+    ).order_by('-score', 'suggested_user_id')[:limit * 2]
+    return [
+        suggestion for suggestion in suggestions
+        if not contains(following_ids, suggestion.suggested_user_id)
+    ][:limit]
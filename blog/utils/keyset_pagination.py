@@ -0,0 +1,320 @@
+"""
+Keyset（游標）分頁
+以上一頁最後一筆的排序欄位值（例如 (created_at, id)）作為游標，
+下一頁以 WHERE (created_at, id) < (…) 取得，不使用 OFFSET：
+不論翻到第幾頁都只讀取一頁的資料列，也不需要每次都執行 COUNT(*)
+
+游標是不透明的 URL-safe 字串，包含方向（下一頁／上一頁）與排序欄位值；
+排序最後一定包含主鍵，確保順序唯一。可為 NULL 的欄位一律排在最後
+"""
+import base64
+import binascii
+import datetime
+import decimal
+import hashlib
+import json
+import uuid
+from collections.abc import Sequence
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import models
+from django.db.models import F, Q
+from django.utils.functional import cached_property
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+class InvalidCursor(ValueError):
+    """無法解析或與目前排序不符的游標"""
+
+
+def get_count_limit():
+    """概略總數最多計算的筆數（超過時顯示為「N+」）"""
+    return getattr(settings, 'KEYSET_COUNT_LIMIT', 1000)
+
+
+def _encode_value(value):
+    if isinstance(value, models.Model):
+        value = value.pk
+    if isinstance(value, datetime.datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {'d': value.isoformat()}
+    if isinstance(value, decimal.Decimal):
+        return {'dec': str(value)}
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if 'dt' in value:
+            return datetime.datetime.fromisoformat(value['dt'])
+        if 'd' in value:
+            return datetime.date.fromisoformat(value['d'])
+        if 'dec' in value:
+            return decimal.Decimal(value['dec'])
+        raise InvalidCursor('無法解析的游標值')
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    raise InvalidCursor('無法解析的游標值')
+
+
+class KeysetPage(Sequence):
+    """一頁資料，介面與 django.core.paginator.Page 相近（沒有頁碼）"""
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return f'<KeysetPage: {len(self)} 筆>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @cached_property
+    def next_cursor(self):
+        if not self._has_next or not self.object_list:
+            return None
+        return self.paginator.encode_cursor(self.object_list[-1], NEXT)
+
+    @cached_property
+    def previous_cursor(self):
+        if not self._has_previous or not self.object_list:
+            return None
+        return self.paginator.encode_cursor(self.object_list[0], PREVIOUS)
+
+    @property
+    def total(self):
+        """符合條件的總筆數（超過 count_limit 時為 count_limit）"""
+        return self.paginator.count
+
+    @property
+    def total_is_exact(self):
+        return self.paginator.count_is_exact
+
+    @property
+    def total_display(self):
+        """顯示用的總數，例如「35」或「1000+」"""
+        return f'{self.total}' if self.total_is_exact else f'{self.total}+'
+
+
+class KeysetPaginator:
+    """
+    Keyset 分頁器
+
+    用法：
+        paginator = KeysetPaginator(queryset, 20, ordering=('-created_at', '-id'))
+        page_obj = paginator.get_page(request.GET.get('cursor'))
+
+    Args:
+        queryset: 要分頁的 QuerySet
+        per_page: 每頁筆數
+        ordering: 排序欄位（可含關聯欄位與 annotate 的欄位），預設沿用 queryset 的排序；
+            最後未包含主鍵時自動補上
+        count_limit: 概略總數最多計算的筆數，None 表示使用 KEYSET_COUNT_LIMIT 設定，0 表示計算精確總數
+    """
+
+    def __init__(self, queryset, per_page, ordering=None, count_limit=None):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.count_limit = get_count_limit() if count_limit is None else count_limit
+
+        if ordering is None:
+            ordering = queryset.query.order_by or queryset.model._meta.ordering
+        self.fields = self._parse_ordering(ordering)
+        self.fingerprint = hashlib.sha256(repr(self.fields).encode()).hexdigest()[:8]
+
+    def _parse_ordering(self, ordering):
+        """將排序轉為 [(欄位, 是否遞減, 是否可為 NULL)]"""
+        pk_name = self.queryset.model._meta.pk.name
+        fields = []
+        for item in ordering:
+            if not isinstance(item, str) or item == '?':
+                raise ValueError('Keyset 分頁只支援以欄位名稱排序')
+            descending = item.startswith('-')
+            name = item.lstrip('-+')
+            fields.append((name, descending, self._is_nullable(name)))
+            if name in ('pk', pk_name):
+                break
+        else:
+            fields.append(('pk', fields[-1][1] if fields else True, False))
+        return fields
+
+    def _is_nullable(self, name):
+        """欄位是否可能為 NULL（annotate 的欄位視為不可為 NULL）"""
+        if name in self.queryset.query.annotations:
+            return False
+        model = self.queryset.model
+        nullable = False
+        for part in name.split('__'):
+            if part == 'pk':
+                return nullable
+            try:
+                field = model._meta.get_field(part)
+            except FieldDoesNotExist:
+                return nullable
+            nullable = nullable or field.null
+            if field.is_relation and field.related_model is not None:
+                if not (field.many_to_one or field.one_to_one) or field.auto_created:
+                    nullable = True  # 反向或多對多關聯
+                model = field.related_model
+        return nullable
+
+    def _ordered(self, reverse=False):
+        order_by = []
+        for name, descending, nullable in self.fields:
+            descending = descending != reverse
+            if nullable:
+                # NULL 在正向排序時排在最後，反向時排在最前
+                expression = F(name).desc if descending else F(name).asc
+                order_by.append(expression(nulls_first=True) if reverse else expression(nulls_last=True))
+            else:
+                order_by.append(f'-{name}' if descending else name)
+        return self.queryset.order_by(*order_by)
+
+    def _beyond(self, values, reverse=False):
+        """
+        排在游標之後（reverse 時為之前）的資料列條件：
+        (a > x) OR (a = x AND b > y) OR …
+        """
+        condition = None
+        equal = Q()
+        for (name, descending, nullable), value in zip(self.fields, values):
+            if value is None:
+                # NULL 排在最後：之後沒有其他值，之前是所有非 NULL 的值
+                step = Q(**{f'{name}__isnull': False}) if reverse else None
+                same = Q(**{f'{name}__isnull': True})
+            else:
+                lookup = 'gt' if descending == reverse else 'lt'
+                step = Q(**{f'{name}__{lookup}': value})
+                if nullable and not reverse:
+                    step |= Q(**{f'{name}__isnull': True})
+                same = Q(**{name: value})
+
+            if step is not None:
+                branch = equal & step
+                condition = branch if condition is None else condition | branch
+            equal &= same
+
+        if condition is None:
+            return Q(pk__in=[])
+
+        # 另以第一個排序欄位加上範圍條件（a >= x），讓資料庫可以直接從索引的游標位置開始掃描，
+        # 不必從頭讀過 OR 條件不符的資料列
+        name, descending, nullable = self.fields[0]
+        if values[0] is not None and not nullable:
+            lookup = 'gte' if descending == reverse else 'lte'
+            condition &= Q(**{f'{name}__{lookup}': values[0]})
+        return condition
+
+    def _value(self, obj, name):
+        value = obj
+        for part in name.split('__'):
+            if value is None:
+                break
+            value = value.pk if part == 'pk' else getattr(value, part)
+        return value
+
+    def encode_cursor(self, obj, direction):
+        data = {
+            'o': self.fingerprint,
+            'd': direction,
+            'v': [_encode_value(self._value(obj, name)) for name, _, _ in self.fields],
+        }
+        raw = json.dumps(data, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        """
+        解析游標
+
+        Returns:
+            (str, list): 方向（NEXT / PREVIOUS）與排序欄位值
+
+        Raises:
+            InvalidCursor: 游標格式錯誤或與目前的排序不符
+        """
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            data = json.loads(raw)
+            direction, values = data['d'], data['v']
+            fingerprint = data['o']
+        except (binascii.Error, ValueError, TypeError, KeyError):
+            raise InvalidCursor('無法解析的游標')
+
+        if fingerprint != self.fingerprint or direction not in (NEXT, PREVIOUS):
+            raise InvalidCursor('游標與目前的排序不符')
+        if not isinstance(values, list) or len(values) != len(self.fields):
+            raise InvalidCursor('游標欄位數量不符')
+        return direction, [_decode_value(value) for value in values]
+
+    def get_page(self, cursor=None):
+        """
+        取得游標所指的頁面；沒有游標或游標無效時回傳第一頁
+        """
+        if cursor:
+            try:
+                direction, values = self.decode_cursor(cursor)
+                if direction == PREVIOUS:
+                    page = self._previous_page(values)
+                    if page is not None:
+                        return page
+                else:
+                    return self._next_page(values)
+            except (InvalidCursor, ValidationError, ValueError, TypeError):
+                pass
+        return self._first_page()
+
+    def _first_page(self):
+        rows = list(self._ordered()[:self.per_page + 1])
+        return KeysetPage(rows[:self.per_page], self, len(rows) > self.per_page, False)
+
+    def _next_page(self, values):
+        rows = list(self._ordered().filter(self._beyond(values))[:self.per_page + 1])
+        return KeysetPage(rows[:self.per_page], self, len(rows) > self.per_page, True)
+
+    def _previous_page(self, values):
+        rows = list(self._ordered(reverse=True).filter(self._beyond(values, reverse=True))[:self.per_page + 1])
+        if len(rows) <= self.per_page:
+            # 已回到開頭：直接回傳完整的第一頁
+            return None
+        rows = rows[:self.per_page]
+        rows.reverse()
+        return KeysetPage(rows, self, True, True)
+
+    @cached_property
+    def _bounded_count(self):
+        queryset = self.queryset.order_by()
+        if not self.count_limit:
+            return queryset.count(), True
+        # 以子查詢限制筆數：SELECT COUNT(*) FROM (SELECT … LIMIT n)
+        count = queryset[:self.count_limit + 1].count()
+        return min(count, self.count_limit), count <= self.count_limit
+
+    @property
+    def count(self):
+        """總筆數（超過 count_limit 時為 count_limit）"""
+        return self._bounded_count[0]
+
+    @property
+    def count_is_exact(self):
+        return self._bounded_count[1]
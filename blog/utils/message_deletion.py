@@ -0,0 +1,121 @@
+"""
+私人訊息的刪除
+收件者／寄件者刪除訊息時只設定自己這一邊的刪除標記（軟刪除），雙方都刪除後才真正刪除資料列。
+
+以集合操作完成：每批一個 UPDATE 設定刪除標記、一個 DELETE 刪除雙方都已刪除的訊息，
+不逐筆 save() / delete()；大量選取時依 MESSAGE_DELETE_CHUNK_SIZE 分批，每批一個 transaction。
+兩位用戶同時刪除同一則訊息時可能都沒有看到對方的標記而留下資料列，由 purge_deleted_messages 定期清理
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+from blog.models import Message, MessageThread
+from .notification_snapshot import invalidate_snapshot
+
+logger = logging.getLogger(__name__)
+
+# 刪除的一方：(擁有者欄位, 刪除標記欄位)
+SIDES = {
+    'recipient': ('recipient', 'recipient_deleted'),
+    'sender': ('sender', 'sender_deleted'),
+}
+
+
+def get_chunk_size():
+    """一次 UPDATE / DELETE 處理的訊息數"""
+    return getattr(settings, 'MESSAGE_DELETE_CHUNK_SIZE', 500)
+
+
+def _parse_ids(message_ids):
+    """忽略無效的 ID，去除重複並排序"""
+    ids = set()
+    for message_id in message_ids:
+        try:
+            ids.add(int(message_id))
+        except (TypeError, ValueError):
+            continue
+    return sorted(ids)
+
+
+def soft_delete_messages(user, message_ids, side):
+    """
+    將用戶的訊息標記為已刪除，並刪除雙方都已刪除的訊息
+
+    Args:
+        user: 刪除訊息的用戶
+        message_ids: 訊息 ID 列表（不屬於該用戶或已刪除的會被略過）
+        side: 'recipient'（收件匣）或 'sender'（寄件匣）
+
+    Returns:
+        (int, int): 標記為已刪除的訊息數、永久刪除的訊息數
+    """
+    owner_field, flag = SIDES[side]
+    ids = _parse_ids(message_ids)
+    chunk_size = get_chunk_size()
+    deleted = 0
+    purged = 0
+
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start:start + chunk_size]
+        owned = Message.objects.filter(id__in=chunk, **{owner_field: user})
+        with transaction.atomic():
+            thread_ids = set(owned.filter(**{flag: False}).values_list('thread_id', flat=True))
+            deleted += owned.filter(**{flag: False}).update(**{flag: True})
+            purged += owned.filter(sender_deleted=True, recipient_deleted=True).delete()[0]
+            # 未讀數、訊息數與最後訊息可能改變
+            MessageThread.refresh(thread_ids)
+
+    # 收件者刪除的訊息不再計入未讀訊息數
+    if deleted and side == 'recipient':
+        invalidate_snapshot(user.id)
+
+    return deleted, purged
+
+
+def get_purge_batch_size():
+    """清理時每批刪除的筆數"""
+    return getattr(settings, 'MESSAGE_PURGE_BATCH_SIZE', 500)
+
+
+def get_purge_sleep_seconds():
+    """清理批次之間的暫停秒數"""
+    return getattr(settings, 'MESSAGE_PURGE_SLEEP_SECONDS', 0.1)
+
+
+def purge_deleted_messages(batch_size=None, sleep_seconds=None):
+    """
+    依主鍵分批刪除雙方都已刪除的訊息
+
+    Returns:
+        dict: {'purged': 刪除筆數, 'batches': 批次數}
+    """
+    batch_size = batch_size or get_purge_batch_size()
+    sleep_seconds = get_purge_sleep_seconds() if sleep_seconds is None else sleep_seconds
+
+    queryset = Message.objects.filter(sender_deleted=True, recipient_deleted=True)
+    stats = {'purged': 0, 'batches': 0}
+    last_pk = 0
+
+    while True:
+        pks = list(queryset.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            break
+
+        with transaction.atomic():
+            thread_ids = set(queryset.filter(pk__in=pks).values_list('thread_id', flat=True))
+            stats['purged'] += queryset.filter(pk__in=pks).delete()[0]
+            MessageThread.refresh(thread_ids)
+        stats['batches'] += 1
+        last_pk = pks[-1]
+
+        if len(pks) < batch_size:
+            break
+
+        if sleep_seconds:
+            time.sleep(sleep_seconds)
+
+    logger.info(f'Purged {stats["purged"]} deleted messages in {stats["batches"]} batches')
+    return stats
@@ -0,0 +1,339 @@
+"""
+通知保留政策與分批清理工具
+依主鍵分批刪除通知（可選擇先封存為壓縮的 NDJSON 檔），避免單一大型 DELETE 長時間鎖表
+
+用戶或後台觸發的清理第一批在請求中同步刪除，還有剩餘時寫入待處理的 NotificationPurgeLog
+（清理範圍與租期 locked_at），再交給行程內的背景 worker；
+行程重啟或中斷而未完成的清理由 `python manage.py purge_notifications` 接手
+"""
+import gzip
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from blog.models import Notification, NotificationPurgeLog
+
+logger = logging.getLogger(__name__)
+
+# 封存時保留的欄位
+ARCHIVE_FIELDS = [
+    'id', 'user_id', 'sender_id', 'notification_type', 'message',
+    'content_type_id', 'object_id', 'link', 'is_read', 'created_at',
+    'read_at', 'actor_count', 'recent_actors',
+]
+
+# 記錄到 NotificationPurgeLog 的觸發來源（用戶自行清除已讀通知只在有剩餘、需要背景處理時記錄）
+LOGGED_TRIGGERS = ('retention', 'admin')
+
+# 未完成時由背景 worker 或 purge_notifications 接手的觸發來源（保留政策每次執行時重新計算範圍）
+RESUMABLE_TRIGGERS = ('user', 'admin')
+
+# 背景清理使用單一 worker，避免多個清理同時競爭同一張表
+# （只是讓剩餘部分儘快刪除；工作記錄在 NotificationPurgeLog，行程重啟時不會遺失）
+_purge_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='notification-purge')
+
+
+def get_batch_size():
+    """每批刪除的筆數"""
+    return getattr(settings, 'NOTIFICATION_PURGE_BATCH_SIZE', 500)
+
+
+def get_sleep_seconds():
+    """批次之間的暫停秒數"""
+    return getattr(settings, 'NOTIFICATION_PURGE_SLEEP_SECONDS', 0.1)
+
+
+def get_lease_seconds():
+    """背景清理超過此秒數未完成一批視為中斷，可被重新取出"""
+    return getattr(settings, 'NOTIFICATION_PURGE_LEASE_SECONDS', 300)
+
+
+def get_retention_querysets(now=None):
+    """
+    依保留政策產生待清理的查詢
+
+    Returns:
+        list[(str, QuerySet)]: (通知類型或 'default', 查詢) 列表
+    """
+    now = now or timezone.now()
+    retention_days = dict(getattr(settings, 'NOTIFICATION_RETENTION_DAYS', {'default': 90}))
+    default_days = retention_days.pop('default', None)
+
+    querysets = []
+
+    # 有個別設定的通知類型
+    for notification_type, days in retention_days.items():
+        if days is None:
+            continue
+        querysets.append((notification_type, Notification.objects.filter(
+            notification_type=notification_type,
+            is_read=True,
+            created_at__lt=now - timedelta(days=days),
+        )))
+
+    # 其他通知類型使用預設天數
+    if default_days is not None:
+        querysets.append(('default', Notification.objects.filter(
+            is_read=True,
+            created_at__lt=now - timedelta(days=default_days),
+        ).exclude(notification_type__in=list(retention_days.keys()))))
+
+    # 未讀通知（可選）
+    unread_days = getattr(settings, 'NOTIFICATION_UNREAD_RETENTION_DAYS', None)
+    if unread_days is not None:
+        querysets.append(('unread', Notification.objects.filter(
+            is_read=False,
+            created_at__lt=now - timedelta(days=unread_days),
+        )))
+
+    return querysets
+
+
+def purge_queryset(queryset, trigger, notification_type='', batch_size=None,
+                   sleep_seconds=None, archive_dir=None, max_batches=None, log=None):
+    """
+    依主鍵分批刪除查詢中的通知
+
+    每批只查詢一段主鍵範圍，再以 id__in 刪除，讓每個 DELETE 只鎖定少量資料列；
+    指定 archive_dir 時會先將該批資料寫入 gzip 壓縮的 NDJSON 檔。
+    只有 LOGGED_TRIGGERS 的清理（或指定 log）會寫入 NotificationPurgeLog，每批完成後累加到同一筆記錄；
+    因 max_batches 而提前結束時記錄保持未完成，由背景 worker 繼續。
+
+    Args:
+        queryset: 待刪除的 Notification 查詢
+        trigger: 觸發來源（retention, user, admin）
+        notification_type: 記錄用的通知類型
+        batch_size: 每批筆數
+        sleep_seconds: 批次之間的暫停秒數
+        archive_dir: 封存目錄（None 表示不封存）
+        max_batches: 最多處理的批次數（None 表示全部）
+        log: 累加統計的 NotificationPurgeLog（None 時依 trigger 決定是否建立）
+
+    Returns:
+        dict: {'purged': 刪除筆數, 'archived': 封存筆數, 'batches': 批次數, 'has_more': 是否還有剩餘}
+    """
+    batch_size = batch_size or get_batch_size()
+    sleep_seconds = get_sleep_seconds() if sleep_seconds is None else sleep_seconds
+
+    if log is None and trigger in LOGGED_TRIGGERS:
+        log = NotificationPurgeLog.objects.create(trigger=trigger, notification_type=notification_type)
+    archive_file = None
+    stats = {'purged': 0, 'archived': 0, 'batches': 0, 'has_more': False}
+    last_pk = 0
+
+    try:
+        while True:
+            if max_batches is not None and stats['batches'] >= max_batches:
+                stats['has_more'] = queryset.filter(pk__gt=last_pk).exists()
+                break
+
+            batch = queryset.filter(pk__gt=last_pk).order_by('pk')
+
+            if archive_dir:
+                rows = list(batch.values(*ARCHIVE_FIELDS)[:batch_size])
+                pks = [row['id'] for row in rows]
+            else:
+                rows = None
+                pks = list(batch.values_list('pk', flat=True)[:batch_size])
+
+            if not pks:
+                break
+
+            if rows:
+                if archive_file is None:
+                    archive_file = _open_archive(archive_dir, trigger)
+                for row in rows:
+                    archive_file.write(json.dumps(row, default=str, ensure_ascii=False) + '\n')
+                archive_file.flush()
+                stats['archived'] += len(rows)
+
+            # 通知快照由 post_delete signal 在每批提交後一次失效
+            purged = Notification.objects.filter(pk__in=pks).delete()[0]
+            stats['purged'] += purged
+            stats['batches'] += 1
+            last_pk = pks[-1]
+            if log is not None:
+                _record_batch(log, purged, len(rows or ()), archive_file)
+
+            if len(pks) < batch_size:
+                break
+
+            if sleep_seconds:
+                time.sleep(sleep_seconds)
+    finally:
+        if archive_file is not None:
+            archive_file.close()
+
+    # 失敗時不標記完成，用戶、後台的清理由 purge_notifications 接手
+    if log is not None and not stats['has_more']:
+        log.finished_at = timezone.now()
+        log.save(update_fields=['finished_at'])
+
+    logger.info(
+        f'Purged {stats["purged"]} notifications in {stats["batches"]} batches '
+        f'(trigger={trigger}, type={notification_type or "-"}, archived={stats["archived"]})'
+    )
+
+    return stats
+
+
+def purge_expired_notifications(batch_size=None, sleep_seconds=None, archive_dir=None, now=None):
+    """
+    依保留政策清理所有過期通知
+
+    Returns:
+        dict: {通知類型: 清理統計}
+    """
+    results = {}
+    for notification_type, queryset in get_retention_querysets(now):
+        results[notification_type] = purge_queryset(
+            queryset,
+            trigger='retention',
+            notification_type=notification_type,
+            batch_size=batch_size,
+            sleep_seconds=sleep_seconds,
+            archive_dir=archive_dir,
+        )
+    return results
+
+
+def purge_in_background(trigger, user=None, notification_ids=None):
+    """
+    清除用戶的已讀通知（trigger='user'）或後台選取的通知（trigger='admin'）
+
+    第一批在目前請求中同步刪除（一般用戶的已讀通知通常一批即可清完）；
+    還有剩餘時寫入待處理的 NotificationPurgeLog，提交後交由背景 worker 依相同的分批流程處理，
+    行程重啟或中斷而未完成的由 purge_notifications 命令接手。
+
+    Returns:
+        dict: 第一批的清理統計，has_more 為 True 表示剩餘部分已排入背景
+    """
+    log = None
+    if trigger in LOGGED_TRIGGERS:
+        log = NotificationPurgeLog.objects.create(
+            trigger=trigger,
+            user=user,
+            notification_ids=list(notification_ids or [])
+        )
+    requested_at = log.started_at if log is not None else timezone.now()
+    queryset = _requested_queryset(user.id if user else None, notification_ids, requested_at)
+
+    stats = purge_queryset(queryset, trigger, max_batches=1, log=log)
+
+    if stats['has_more']:
+        if log is None:
+            log = NotificationPurgeLog.objects.create(
+                trigger=trigger,
+                user=user,
+                notification_ids=list(notification_ids or []),
+                rows_purged=stats['purged'],
+                batches=stats['batches'],
+            )
+        log_id = log.id
+        transaction.on_commit(lambda: _purge_executor.submit(_run_background_purge, log_id))
+
+    return stats
+
+
+def _requested_queryset(user_id, notification_ids, requested_at):
+    """用戶或後台觸發的清理範圍（用戶清除時只包含觸發前已讀的通知）"""
+    if user_id is not None:
+        return Notification.objects.filter(user_id=user_id, is_read=True).filter(
+            Q(read_at__isnull=True) | Q(read_at__lte=requested_at)
+        )
+    return Notification.objects.filter(id__in=notification_ids or [])
+
+
+def _record_batch(log, purged, archived, archive_file):
+    """將一批的清理結果累加到清理記錄（背景處理中的記錄同時延長租期）"""
+    log.rows_purged += purged
+    log.rows_archived += archived
+    log.batches += 1
+    update_fields = ['rows_purged', 'rows_archived', 'batches']
+    if archive_file is not None and not log.archive_file:
+        log.archive_file = archive_file.name
+        update_fields.append('archive_file')
+    if log.locked_at is not None:
+        log.locked_at = timezone.now()
+        update_fields.append('locked_at')
+    log.save(update_fields=update_fields)
+
+
+def claim_pending_purge(log_id, now=None):
+    """
+    取出一筆待處理的清理（條件式 UPDATE，同一筆不會被兩個 worker 同時處理）
+
+    Returns:
+        NotificationPurgeLog: 取得的清理記錄，已完成或由其他 worker 處理中時為 None
+    """
+    now = now or timezone.now()
+    claimed = NotificationPurgeLog.objects.filter(
+        Q(locked_at__isnull=True) | Q(locked_at__lt=now - timedelta(seconds=get_lease_seconds())),
+        pk=log_id,
+        trigger__in=RESUMABLE_TRIGGERS,
+        finished_at__isnull=True,
+    ).update(locked_at=now)
+    if not claimed:
+        return None
+    return NotificationPurgeLog.objects.get(pk=log_id)
+
+
+def run_pending_purge(log_id, batch_size=None, sleep_seconds=None):
+    """
+    繼續處理一筆待處理的清理
+
+    Returns:
+        dict: 清理統計（未取得時為 None）
+    """
+    log = claim_pending_purge(log_id)
+    if log is None:
+        return None
+    queryset = _requested_queryset(log.user_id, log.notification_ids, log.started_at)
+    return purge_queryset(queryset, log.trigger, batch_size=batch_size, sleep_seconds=sleep_seconds, log=log)
+
+
+def process_pending_purges(batch_size=None, sleep_seconds=None):
+    """
+    處理所有未完成的用戶、後台清理（未取得或背景 worker 處理中的略過）
+
+    Returns:
+        list[dict]: 每筆處理的清理統計
+    """
+    pending_ids = NotificationPurgeLog.objects.filter(
+        trigger__in=RESUMABLE_TRIGGERS,
+        finished_at__isnull=True,
+    ).order_by('id').values_list('id', flat=True)
+
+    results = []
+    for log_id in list(pending_ids):
+        stats = run_pending_purge(log_id, batch_size=batch_size, sleep_seconds=sleep_seconds)
+        if stats is not None:
+            results.append(stats)
+    return results
+
+
+def _run_background_purge(log_id):
+    """背景 worker 執行的清理工作（失敗時記錄保持未完成，租期過後由 purge_notifications 接手）"""
+    close_old_connections()
+    try:
+        run_pending_purge(log_id)
+    except Exception as e:
+        logger.error(f'Background notification purge failed: {e}')
+    finally:
+        close_old_connections()
+
+
+def _open_archive(archive_dir, trigger):
+    """建立封存檔案（gzip 壓縮的 NDJSON）"""
+    archive_dir = Path(archive_dir)
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    filename = f'notifications_{trigger}_{timezone.now():%Y%m%d_%H%M%S_%f}.ndjson.gz'
+    return gzip.open(archive_dir / filename, 'wt', encoding='utf-8')
@@ -0,0 +1,163 @@
+"""
+NotificationConsumer 的通知快照
+每位用戶的未讀數與最近 5 則通知預先序列化為 JSON 存在共用快取中，
+WebSocket 連線與 refresh 時直接送出，不必每次都執行兩個 COUNT 與一個查詢
+
+快照附帶版本：通知或私人訊息新增、已讀、刪除時更新版本（transaction 提交後），
+讀取時版本不符即重建，避免與並行的重建互相覆蓋而留下過期的快照
+"""
+import json
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Q
+
+SNAPSHOT_KEY_PREFIX = 'notification_snapshot:'
+VERSION_KEY_PREFIX = 'notification_snapshot_version:'
+
+
+def get_snapshot_cache():
+    return caches[getattr(settings, 'NOTIFICATION_SNAPSHOT_CACHE_ALIAS', 'default')]
+
+
+def build_snapshot(user_id):
+    """從資料庫建立通知快照"""
+    from blog.models import Message, Notification
+
+    unread_notifications = Notification.objects.filter(
+        user_id=user_id,
+        is_read=False
+    ).count()
+
+    unread_messages = Message.objects.filter(
+        recipient_id=user_id,
+        is_read=False,
+        recipient_deleted=False
+    ).count()
+
+    # Get recent notifications
+    recent_notifications = list(
+        Notification.objects.filter(
+            user_id=user_id
+        ).order_by('-created_at')[:5].values(
+            'id', 'message', 'notification_type', 'is_read', 'created_at'
+        )
+    )
+
+    # Convert datetime to string
+    for notif in recent_notifications:
+        notif['created_at'] = notif['created_at'].isoformat()
+
+    return {
+        'type': 'initial',
+        'unread_count': unread_notifications,
+        'unread_messages_count': unread_messages,
+        'recent_notifications': recent_notifications
+    }
+
+
+def get_snapshot_json(user_id):
+    """
+    取得用戶的通知快照（已序列化的 JSON 字串）
+
+    快取命中時只需一次快取讀取
+    """
+    cache = get_snapshot_cache()
+    snapshot_key = f'{SNAPSHOT_KEY_PREFIX}{user_id}'
+    version_key = f'{VERSION_KEY_PREFIX}{user_id}'
+
+    cached = cache.get_many([snapshot_key, version_key])
+    version = cached.get(version_key)
+    snapshot = cached.get(snapshot_key)
+    if snapshot is not None and snapshot[0] == version:
+        return snapshot[1]
+
+    data = json.dumps(build_snapshot(user_id))
+    cache.set(snapshot_key, (version, data), getattr(settings, 'NOTIFICATION_SNAPSHOT_TTL', 300))
+    return data
+
+
+def invalidate_snapshots(user_ids):
+    """
+    使用戶的通知快照失效
+
+    在 transaction 中呼叫時，等提交後才更新版本，避免在提交前被重建為舊資料
+    """
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if not user_ids:
+        return
+
+    transaction.on_commit(lambda: _bump_versions(user_ids))
+
+
+def invalidate_snapshot(user_id):
+    """使單一用戶的通知快照失效"""
+    invalidate_snapshots([user_id])
+
+
+def invalidate_snapshot_on_delete(user_id, origin):
+    """
+    通知或私人訊息刪除時使快照失效（post_delete 使用）
+
+    同一次刪除（origin 為呼叫 delete() 的物件或 QuerySet）的所有資料列在提交後合併為一次快取寫入，
+    批次刪除或刪除用戶連帶刪除大量通知時不會每筆寫一次快取
+    """
+    if user_id is None:
+        return
+    pending = getattr(origin, '_pending_snapshot_invalidations', None)
+    if pending is None:
+        pending = set()
+
+        def flush():
+            if origin is not None:
+                origin.__dict__.pop('_pending_snapshot_invalidations', None)
+            _bump_versions(pending)
+
+        if origin is not None:
+            origin._pending_snapshot_invalidations = pending
+        transaction.on_commit(flush)
+    pending.add(user_id)
+
+
+def _bump_versions(user_ids):
+    version = uuid.uuid4().hex
+    get_snapshot_cache().set_many(
+        {f'{VERSION_KEY_PREFIX}{user_id}': version for user_id in user_ids},
+        timeout=None
+    )
+
+
+def get_missed_notifications(user_id, since_id, limit=None):
+    """
+    取得用戶在 since_id 之後錯過的通知（重新連線時補送）
+
+    除了 ID 較新的通知，也包含 since_id 之後被合併更新（created_at 被推進）的既有通知
+
+    Returns:
+        dict: {'type': 'missed_notifications', 'notifications': 由舊到新, 'has_more'}
+    """
+    from blog.models import Notification
+    from .notifications import serialize_notification
+
+    limit = limit or getattr(settings, 'NOTIFICATION_RESUME_LIMIT', 50)
+    since = Notification.objects.filter(user_id=user_id, id=since_id).values_list('created_at', flat=True).first()
+
+    missed = Q(id__gt=since_id)
+    if since is not None:
+        missed |= Q(created_at__gt=since)
+
+    notifications = list(
+        Notification.objects.filter(missed, user_id=user_id).exclude(id=since_id)
+        .order_by('-created_at', '-id')[:limit + 1]
+    )
+    has_more = len(notifications) > limit
+    notifications = notifications[:limit]
+    notifications.reverse()
+
+    return {
+        'type': 'missed_notifications',
+        'notifications': [serialize_notification(notification) for notification in notifications],
+        'has_more': has_more,
+    }
@@ -2,17 +2,33 @@
 通知系統工具函數
 用於在各種事件發生時創建通知
 """
+from datetime import timedelta
+from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
+from django.db import IntegrityError, transaction
 from blog.models import Notification, NotificationPreference
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 from django.utils import timezone
 
 
-def create_notification(user, notification_type, message, sender=None, link='', content_object=None):
+# 合併通知的訊息格式（actor: 最新觸發者, others: 其他人數, title: 物件標題）
+AGGREGATED_MESSAGE_TEMPLATES = {
+    'like': '{actor} 和其他 {others} 人讚了您的文章「{title}」',
+    'share': '{actor} 和其他 {others} 人分享了您的文章「{title}」',
+    'comment': '{actor} 和其他 {others} 人在您的文章「{title}」中留言',
+}
+
+
+def create_notification(user, notification_type, message, sender=None, link='', content_object=None,
+                        aggregate_on=None):
     """
     創建通知的統一接口
 
+    可合併的類型（NOTIFICATION_AGGREGATION_TYPES）在時間窗內遇到
+    同一接收者、同一合併依據的既有通知時，會直接更新該通知而不是新增一筆；
+    每組最多一筆合併中的通知（唯一約束），同時發生的第一個事件中後建立的一方改為合併
+
     Args:
         user: 接收通知的用戶
         notification_type: 通知類型 (comment, like, follower, message, share)
@@ -20,6 +36,7 @@ def create_notification(user, notification_type, message, sender=None, link='',
         sender: 觸發通知的用戶 (可選)
         link: 相關連結 (可選)
         content_object: 相關物件 (可選，使用 GenericForeignKey)
+        aggregate_on: 合併依據的物件 (可選，預設為 content_object)
 
     Returns:
         Notification 物件或 None (如果用戶停用了該類型通知)
@@ -34,6 +51,10 @@ def create_notification(user, notification_type, message, sender=None, link='',
     if sender and sender == user:
         return None
 
+    aggregate_on = aggregate_on or content_object
+    aggregation_key = _aggregation_key(aggregate_on) if aggregate_on else ''
+    aggregatable = bool(aggregation_key and sender and notification_type in _get_aggregation_types())
+
     # 創建通知
     notification_data = {
         'user': user,
@@ -41,6 +62,8 @@ def create_notification(user, notification_type, message, sender=None, link='',
         'notification_type': notification_type,
         'message': message,
         'link': link,
+        'aggregation_key': aggregation_key,
+        'is_aggregation_open': aggregatable,
     }
 
     # 如果有相關物件，設置 GenericForeignKey
@@ -48,7 +71,28 @@ def create_notification(user, notification_type, message, sender=None, link='',
         notification_data['content_type'] = ContentType.objects.get_for_model(content_object)
         notification_data['object_id'] = content_object.id
 
-    notification = Notification.objects.create(**notification_data)
+    if sender:
+        notification_data['recent_actors'] = [_actor_data(sender)]
+
+    for attempt in range(2):
+        # 嘗試合併到時間窗內的既有通知
+        if aggregatable:
+            notification, was_unread = _aggregate_notification(
+                user, notification_type, message, sender, link, content_object, aggregate_on, aggregation_key
+            )
+            if notification:
+                # 原本就是未讀時未讀數不變，不需要重新推送計數
+                send_realtime_notification(user, notification, send_count=not was_unread)
+                return notification
+
+        try:
+            with transaction.atomic():
+                notification = Notification.objects.create(**notification_data)
+            break
+        except IntegrityError:
+            # 同時有其他請求建立了同一組的合併通知（unique_open_notification_aggregation），改為合併到該通知
+            if not aggregatable or attempt:
+                raise
 
     # Send real-time notification via WebSocket
     send_realtime_notification(user, notification)
@@ -56,37 +100,135 @@ def create_notification(user, notification_type, message, sender=None, link='',
     return notification
 
 
-def send_realtime_notification(user, notification):
+def _get_aggregation_types():
+    """取得可合併的通知類型（僅限有合併訊息格式的類型）"""
+    return [
+        notification_type
+        for notification_type in getattr(settings, 'NOTIFICATION_AGGREGATION_TYPES', [])
+        if notification_type in AGGREGATED_MESSAGE_TEMPLATES
+    ]
+
+
+def _aggregation_key(obj):
+    """合併依據（內容類型 ID:物件 ID）"""
+    return f'{ContentType.objects.get_for_model(obj).id}:{obj.pk}'
+
+
+def _actor_data(user):
+    """合併通知中記錄的觸發者資料"""
+    return {'id': user.id, 'username': user.username}
+
+
+def _aggregate_notification(user, notification_type, message, sender, link, content_object, aggregate_on,
+                            aggregation_key):
     """
-    Send real-time notification to user via WebSocket
+    將新事件合併到時間窗內的既有通知（關聯物件與連結改為最新的事件）
 
-    Args:
-        user: The user to send notification to
-        notification: The notification object
+    Returns:
+        (Notification, bool): 被更新的通知（沒有可合併的通知時為 None），
+        以及該通知在合併前是否為未讀
     """
-    channel_layer = get_channel_layer()
+    window = getattr(settings, 'NOTIFICATION_AGGREGATION_WINDOW', 3600)
+    max_actors = getattr(settings, 'NOTIFICATION_AGGREGATION_MAX_ACTORS', 5)
+    now = timezone.now()
+
+    with transaction.atomic():
+        notification = Notification.objects.select_for_update().filter(
+            user=user,
+            notification_type=notification_type,
+            aggregation_key=aggregation_key,
+            is_aggregation_open=True,
+        ).first()
+
+        if notification is None:
+            return None, False
+
+        if notification.created_at < now - timedelta(seconds=window):
+            # 超過時間窗：關閉這一筆的合併，由呼叫端建立新的通知
+            Notification.objects.filter(pk=notification.pk).update(is_aggregation_open=False)
+            return None, False
+
+        was_unread = not notification.is_read
+        recent_actors = [
+            actor for actor in (notification.recent_actors or [])
+            if actor.get('id') != sender.id
+        ]
+
+        # 最近觸發者中的同一人重複觸發（例如取消後再按讚）不重複計數
+        # 只保留最近 N 位觸發者，因此人數是近似值
+        if len(recent_actors) == len(notification.recent_actors or []):
+            notification.actor_count += 1
+
+        notification.recent_actors = [_actor_data(sender)] + recent_actors[:max_actors - 1]
+        notification.sender = sender
+        notification.link = link
+        notification.content_object = content_object
+        if notification.actor_count > 1:
+            notification.message = _build_aggregated_message(notification, aggregate_on)
+        else:
+            # 只有同一位觸發者，沿用單筆通知的訊息
+            notification.message = message
+        notification.is_read = False
+        notification.read_at = None
+        # 更新時間讓合併後的通知重新排到最前面
+        notification.created_at = now
+        notification.save(update_fields=[
+            'actor_count', 'recent_actors', 'sender', 'link', 'content_type', 'object_id', 'message',
+            'is_read', 'read_at', 'created_at',
+        ])
+
+    return notification, was_unread
+
+
+def _build_aggregated_message(notification, aggregate_on):
+    """產生合併通知的訊息"""
+    return AGGREGATED_MESSAGE_TEMPLATES[notification.notification_type].format(
+        actor=notification.sender.username,
+        others=notification.other_actors_count,
+        title=getattr(aggregate_on, 'title', str(aggregate_on)),
+    )
 
-    # Get notification type icon
-    notification_icons = {
-        'comment': '💬',
-        'like': '❤️',
-        'follower': '👤',
-        'message': '✉️',
-        'share': '🔗',
-        'mention': '@',
-    }
 
-    # Prepare notification data
-    notification_data = {
+# 通知類型的圖示
+NOTIFICATION_ICONS = {
+    'comment': '💬',
+    'like': '❤️',
+    'follower': '👤',
+    'message': '✉️',
+    'share': '🔗',
+    'mention': '@',
+}
+
+
+def serialize_notification(notification):
+    """即時推送（WebSocket）使用的通知資料"""
+    return {
         'id': notification.id,
         'message': notification.message,
         'notification_type': notification.notification_type,
         'link': notification.link,
-        'icon': notification_icons.get(notification.notification_type, '🔔'),
+        'icon': NOTIFICATION_ICONS.get(notification.notification_type, '🔔'),
         'time_since': notification.get_time_since(),
         'created_at': notification.created_at.isoformat(),
+        'actor_count': notification.actor_count,
+        'recent_actors': notification.get_recent_actor_names(),
     }
 
+
+def send_realtime_notification(user, notification, send_count=True):
+    """
+    Send real-time notification to user via WebSocket
+
+    Args:
+        user: The user to send notification to
+        notification: The notification object
+        send_count: Whether to also push the updated unread counts
+    """
+    channel_layer = get_channel_layer()
+
+    # Prepare notification data
+    notification_data = serialize_notification(notification)
+
     # Send to user's notification group
     group_name = f'notifications_{user.id}'
 
@@ -99,6 +241,9 @@ def send_realtime_notification(user, notification):
             }
         )
 
+        if not send_count:
+            return
+
         # Also send updated count
         unread_count = Notification.objects.filter(user=user, is_read=False).count()
 
@@ -134,13 +279,15 @@ def notify_comment(article, comment):
         message = f"{comment.author.username} 在您的文章「{article.title}」中留言"
         link = f"/blog/article/{article.id}/#comment-{comment.id}"
 
+        # 關聯物件為留言，依所屬文章合併同一篇文章的留言通知
         create_notification(
             user=article.author,
             notification_type='comment',
             message=message,
             sender=comment.author,
             link=link,
-            content_object=comment
+            content_object=comment,
+            aggregate_on=article
         )
 
 
@@ -0,0 +1,226 @@
+"""
+在線狀態（Presence）
+由 NotificationConsumer 在連線、斷線與 ping（心跳）時更新
+
+每個行程以 dict 記錄本機的連線數，連線、斷線與心跳都只更新記憶體（O(1)），
+變動每 PRESENCE_SYNC_INTERVAL 秒以一次 get_many / set_many 批次寫入共用快取（PRESENCE_CACHE_ALIAS），
+記錄附帶到期時間：行程異常結束時，其記錄在 PRESENCE_TTL 秒後自然失效。
+查詢一批用戶是否在線只需一次快取 get_many
+"""
+import asyncio
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Dict, Iterable, Set
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+PRESENCE_KEY_PREFIX = 'presence:'
+
+
+def get_ttl():
+    """沒有更新多久後視為離線（秒）"""
+    return getattr(settings, 'PRESENCE_TTL', 90)
+
+
+def get_refresh_interval():
+    """仍在線用戶的共用記錄多久重新寫入一次（秒），必須小於 PRESENCE_TTL"""
+    return getattr(settings, 'PRESENCE_REFRESH_INTERVAL', 25)
+
+
+def get_sync_interval():
+    """本機變動批次寫入共用快取的間隔（秒）"""
+    return getattr(settings, 'PRESENCE_SYNC_INTERVAL', 1)
+
+
+def get_presence_cache():
+    return caches[getattr(settings, 'PRESENCE_CACHE_ALIAS', 'default')]
+
+
+def _presence_key(user_id):
+    return f'{PRESENCE_KEY_PREFIX}{user_id}'
+
+
+def _live_entries(entry, now):
+    """去除已到期（行程已停止更新）的記錄"""
+    return {instance: expires for instance, expires in (entry or {}).items() if expires > now}
+
+
+class PresenceRegistry:
+    """
+    單一行程的在線狀態登錄
+
+    共用快取中每位在線用戶一筆：{行程識別碼: 到期時間}，
+    同一用戶連到多個行程時各自維護自己的那一項
+    """
+
+    def __init__(self, instance_id=None):
+        self.instance_id = instance_id or f'{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}'
+        self.connections: Dict[int, int] = {}
+        self.dirty: Set[int] = set()
+        self.withdrawn: Set[int] = set()
+        # (寫入時間, 用戶 ID)，依時間排序，用來找出需要重新寫入的用戶
+        self.refresh_queue = deque()
+        self._lock = threading.Lock()
+        self._sync_timer = None
+        self._sync_loop = None
+
+    def connect(self, user_id):
+        """新增一個連線"""
+        with self._lock:
+            self.connections[user_id] = self.connections.get(user_id, 0) + 1
+            if self.connections[user_id] == 1:
+                self.dirty.add(user_id)
+                self.withdrawn.discard(user_id)
+
+    def heartbeat(self, user_id):
+        """連線仍存在（ping）；用戶不在本機登錄中時（例如斷線事件遺失）重新登錄"""
+        with self._lock:
+            if user_id not in self.connections:
+                self.connections[user_id] = 1
+                self.dirty.add(user_id)
+                self.withdrawn.discard(user_id)
+
+    def disconnect(self, user_id):
+        """移除一個連線；此行程上已沒有該用戶的連線時，將從共用快取移除此行程的記錄"""
+        with self._lock:
+            count = self.connections.get(user_id, 0) - 1
+            if count > 0:
+                self.connections[user_id] = count
+                return
+            self.connections.pop(user_id, None)
+            self.dirty.discard(user_id)
+            self.withdrawn.add(user_id)
+
+    def is_local(self, user_id):
+        return user_id in self.connections
+
+    @property
+    def has_pending(self):
+        return bool(self.dirty or self.withdrawn)
+
+    def sync(self):
+        """
+        將本機變動寫入共用快取
+
+        Returns:
+            (int, int): 寫入與移除的用戶數
+        """
+        now = time.time()
+        ttl = get_ttl()
+        refresh_before = now - get_refresh_interval()
+
+        with self._lock:
+            # 找出上次寫入已超過更新間隔、仍在線的用戶
+            while self.refresh_queue and self.refresh_queue[0][0] <= refresh_before:
+                _, user_id = self.refresh_queue.popleft()
+                if user_id in self.connections:
+                    self.dirty.add(user_id)
+            publish, self.dirty = self.dirty, set()
+            withdraw, self.withdrawn = self.withdrawn, set()
+
+        if not publish and not withdraw:
+            return 0, 0
+
+        cache = get_presence_cache()
+        keys = [_presence_key(user_id) for user_id in publish | withdraw]
+        entries = cache.get_many(keys)
+
+        to_set = {}
+        to_delete = []
+        for user_id in publish:
+            key = _presence_key(user_id)
+            entry = _live_entries(entries.get(key), now)
+            entry[self.instance_id] = now + ttl
+            to_set[key] = entry
+        for user_id in withdraw:
+            key = _presence_key(user_id)
+            entry = _live_entries(entries.get(key), now)
+            entry.pop(self.instance_id, None)
+            if entry:
+                to_set[key] = entry
+            else:
+                to_delete.append(key)
+
+        if to_set:
+            cache.set_many(to_set, ttl)
+        if to_delete:
+            cache.delete_many(to_delete)
+
+        with self._lock:
+            self.refresh_queue.extend((now, user_id) for user_id in publish)
+
+        return len(publish), len(withdraw)
+
+    def schedule_sync(self):
+        """在目前的 event loop 排程批次寫入（已排程時不重複排程）"""
+        loop = asyncio.get_running_loop()
+        if self._sync_timer is not None and self._sync_loop is loop:
+            return
+        self._sync_loop = loop
+        self._sync_timer = loop.call_later(get_sync_interval(), self._start_sync)
+
+    def _start_sync(self):
+        asyncio.ensure_future(self._run_sync())
+
+    async def _run_sync(self):
+        try:
+            await database_sync_to_async(self.sync)()
+        except Exception:
+            logger.exception('寫入在線狀態失敗')
+        finally:
+            self._sync_timer = None
+            # 仍有連線時持續排程，以定期更新在線記錄
+            if self.connections or self.has_pending:
+                self.schedule_sync()
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_presence_registry() -> PresenceRegistry:
+    """取得目前行程的在線狀態登錄"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = PresenceRegistry()
+        return _registry
+
+
+def get_online_user_ids(user_ids: Iterable[int]) -> Set[int]:
+    """
+    批次查詢哪些用戶在線
+
+    本行程有連線的用戶直接判定在線，其餘以一次快取 get_many 查詢
+
+    Returns:
+        set: 在線的用戶 ID
+    """
+    registry = get_presence_registry()
+    user_ids = set(user_ids)
+    online = {user_id for user_id in user_ids if registry.is_local(user_id)}
+
+    remaining = user_ids - online
+    if remaining:
+        now = time.time()
+        entries = get_presence_cache().get_many([_presence_key(user_id) for user_id in remaining])
+        online.update(
+            user_id for user_id in remaining
+            if _live_entries(entries.get(_presence_key(user_id)), now)
+        )
+
+    return online
+
+
+def is_user_online(user_id) -> bool:
+    """查詢單一用戶是否在線"""
+    return user_id in get_online_user_ids([user_id])
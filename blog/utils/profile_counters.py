@@ -0,0 +1,102 @@
+"""
+個人資料統計計數
+UserProfile 的文章數、已發布文章數、留言數、獲讚數、追蹤者數與追蹤中數由 signals 在新增／發布／刪除時累加，
+個人頁面、成就檢查與後台用戶列表直接讀取，不在請求中執行 COUNT。
+
+bulk_create、QuerySet.update 等不觸發 signals 的寫入可能讓計數與實際資料不符，
+由 `python manage.py reconcile_profile_counters` 依用戶 ID 分批以 GROUP BY 重新計算並校正
+（同時校正各用戶的作者閱讀進度 AuthorReadProgress）
+"""
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+
+from blog.models import Article, Comment, Follow, Like, UserProfile
+from .reading_progress import reconcile_author_read_progress
+
+logger = logging.getLogger(__name__)
+
+
+def get_chunk_size():
+    """每批校正的個人資料數"""
+    return getattr(settings, 'PROFILE_COUNTER_CHUNK_SIZE', 1000)
+
+
+def count_by_user(user_ids):
+    """
+    依實際資料計算一批用戶的統計計數（每個計數一個 GROUP BY 查詢）
+
+    Returns:
+        dict: {計數欄位: {用戶 ID: 數量}}（數量為 0 的用戶不在其中）
+    """
+    queries = {
+        'article_count': Article.objects.filter(author_id__in=user_ids).values_list('author_id'),
+        'published_article_count': Article.objects.filter(
+            author_id__in=user_ids,
+            status='published'
+        ).values_list('author_id'),
+        'comment_count': Comment.objects.filter(author_id__in=user_ids).values_list('author_id'),
+        'likes_received_count': Like.objects.filter(
+            article__author_id__in=user_ids
+        ).values_list('article__author_id'),
+        'follower_count': Follow.objects.filter(following_id__in=user_ids).values_list('following_id'),
+        'following_count': Follow.objects.filter(follower_id__in=user_ids).values_list('follower_id'),
+    }
+    return {
+        field: dict(queryset.annotate(total=Count('id')).order_by())
+        for field, queryset in queries.items()
+    }
+
+
+def reconcile_profile_counters(chunk_size=None, user_ids=None):
+    """
+    重新計算統計計數並寫回與實際資料不符的個人資料
+
+    Args:
+        chunk_size: 每批校正的個人資料數（預設為 PROFILE_COUNTER_CHUNK_SIZE）
+        user_ids: 只校正這些用戶（預設為全部）
+
+    Returns:
+        dict: {'profiles': 檢查的個人資料數, 'updated': 校正的個人資料數,
+               'read_progress': 校正的作者閱讀進度數, 'chunks': 批次數}
+    """
+    chunk_size = chunk_size or get_chunk_size()
+    profiles = UserProfile.objects.order_by('id').only('id', 'user_id', *UserProfile.COUNTER_FIELDS)
+    if user_ids is not None:
+        profiles = profiles.filter(user_id__in=user_ids)
+
+    stats = {'profiles': 0, 'updated': 0, 'read_progress': 0, 'chunks': 0}
+    last_id = 0
+    while True:
+        chunk = list(profiles.filter(id__gt=last_id)[:chunk_size])
+        if not chunk:
+            break
+        last_id = chunk[-1].id
+
+        user_ids_in_chunk = [profile.user_id for profile in chunk]
+        with transaction.atomic():
+            counts = count_by_user(user_ids_in_chunk)
+            changed = []
+            for profile in chunk:
+                dirty = False
+                for field in UserProfile.COUNTER_FIELDS:
+                    actual = counts[field].get(profile.user_id, 0)
+                    if getattr(profile, field) != actual:
+                        setattr(profile, field, actual)
+                        dirty = True
+                if dirty:
+                    changed.append(profile)
+            UserProfile.objects.bulk_update(changed, UserProfile.COUNTER_FIELDS)
+            stats['read_progress'] += reconcile_author_read_progress(user_ids_in_chunk)
+
+        stats['profiles'] += len(chunk)
+        stats['updated'] += len(changed)
+        stats['chunks'] += 1
+
+    logger.info(
+        f'Reconciled profile counters: {stats["updated"]} of {stats["profiles"]} profiles updated, '
+        f'{stats["read_progress"]} reading progress rows fixed in {stats["chunks"]} chunks'
+    )
+    return stats
@@ -4,12 +4,237 @@ Web Push 推播通知工具函數
 
 import json
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from typing import Optional, Dict, List
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
 from django.conf import settings
+from django.utils import timezone
 from pywebpush import webpush, WebPushException
 
+from .vapid_signer import get_vapid_signer
+
 logger = logging.getLogger(__name__)
 
+# 連續失敗超過此次數即停用訂閱（與 PushSubscription.mark_as_failed 一致；只計算不可重試的失敗）
+MAX_SUBSCRIPTION_FAILURES = 3
+
+# 可重試的狀態碼：逾時、流量限制與推播服務端錯誤（None 表示連線失敗或逾時）
+RETRYABLE_STATUS_CODES = {None, 408, 429, 500, 502, 503, 504}
+
+
+@dataclass
+class PushResult:
+    """單一訂閱的推播結果"""
+    subscription: object
+    success: bool
+    status_code: Optional[int] = None
+    gone: bool = False  # 410/404：訂閱已失效
+    latency: float = 0.0
+    error: str = ''
+
+    @property
+    def retryable(self):
+        """推播服務暫時無法處理（不代表訂閱有問題）"""
+        return not self.success and not self.gone and self.status_code in RETRYABLE_STATUS_CODES
+
+
+class PushDispatcher:
+    """
+    並行推播發送器
+
+    以執行緒池同時發送給多個訂閱，並為每個推播服務主機（FCM、Mozilla 等）
+    建立獨立、有連線上限的 requests.Session，讓 TLS 連線可以重複使用，
+    同時避免對單一主機開啟過多連線。
+    """
+
+    def __init__(self, max_workers=None, pool_size_per_host=None, timeout=None):
+        self.max_workers = max_workers or getattr(settings, 'WEB_PUSH_MAX_WORKERS', 8)
+        self.pool_size_per_host = pool_size_per_host or getattr(settings, 'WEB_PUSH_POOL_SIZE_PER_HOST', 4)
+        self.timeout = timeout or getattr(settings, 'WEB_PUSH_TIMEOUT', 10)
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix='web-push'
+        )
+        self._sessions = {}
+        self._host_limits = {}
+        self._lock = threading.Lock()
+
+    def send(self, subscriptions, notification_data: Dict) -> List[PushResult]:
+        """
+        並行發送推播給多個訂閱，並等待全部完成
+
+        Args:
+            subscriptions: PushSubscription 物件列表
+            notification_data: 通知資料
+
+        Returns:
+            List[PushResult]: 每個訂閱的發送結果
+        """
+        payload = json.dumps(notification_data)
+        return self.send_payloads([(subscription, payload) for subscription in subscriptions])
+
+    def send_payloads(self, items) -> List[PushResult]:
+        """
+        並行發送各自不同的推播內容，並等待全部完成
+
+        Args:
+            items: (PushSubscription, 已序列化的通知資料) 列表
+
+        Returns:
+            List[PushResult]: 與 items 順序相同的發送結果
+        """
+        futures = [
+            self._executor.submit(self._deliver, subscription, payload)
+            for subscription, payload in items
+        ]
+        return [future.result() for future in futures]
+
+    def _deliver(self, subscription, payload: str) -> PushResult:
+        """在 worker 執行緒中發送單一推播"""
+        host = urlparse(subscription.endpoint).netloc
+        session, host_limit = self._get_host_session(host)
+
+        with host_limit:
+            started = time.monotonic()
+            result = _send_to_subscription(subscription, payload, session=session, timeout=self.timeout)
+            result.latency = time.monotonic() - started
+        return result
+
+    def _get_host_session(self, host):
+        """取得推播服務主機專用的 Session 與同時連線數上限"""
+        with self._lock:
+            if host not in self._sessions:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=self.pool_size_per_host,
+                )
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self._sessions[host] = session
+                self._host_limits[host] = threading.BoundedSemaphore(self.pool_size_per_host)
+            return self._sessions[host], self._host_limits[host]
+
+    def shutdown(self):
+        """關閉執行緒池與所有連線"""
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+            self._host_limits.clear()
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_push_dispatcher() -> PushDispatcher:
+    """取得全域共用的推播發送器"""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = PushDispatcher()
+        return _dispatcher
+
+
+def apply_push_results(results: List[PushResult]):
+    """
+    將推播結果套用到訂閱並以 bulk_update 一次寫回
+
+    成功：更新 last_used_at 並重置失敗計數
+    收到 410/404：停用訂閱
+    其他不可重試的失敗（400、403、413 等）：累加失敗次數，超過上限時停用訂閱
+    可重試的失敗（逾時、429、5xx）：只記錄失敗時間，推播服務短暫中斷不會停用訂閱
+    """
+    from ..models import PushSubscription
+
+    if not results:
+        return
+
+    now = timezone.now()
+    subscriptions = []
+
+    for result in results:
+        subscription = result.subscription
+        if result.success:
+            subscription.last_used_at = now
+            subscription.failure_count = 0
+            subscription.last_failure_at = None
+            subscription.is_active = True
+        else:
+            subscription.last_failure_at = now
+            if result.gone:
+                subscription.is_active = False
+            elif not result.retryable:
+                subscription.failure_count += 1
+                if subscription.failure_count >= MAX_SUBSCRIPTION_FAILURES:
+                    subscription.is_active = False
+        subscriptions.append(subscription)
+
+    PushSubscription.objects.bulk_update(
+        subscriptions,
+        ['last_used_at', 'failure_count', 'last_failure_at', 'is_active']
+    )
+
+
+def build_notification_data(
+    title: str,
+    body: str,
+    url: str = '/blog/notifications/',
+    icon: str = '/static/blog/images/icons/icon-192x192.png',
+    badge: str = '/static/blog/images/icons/badge-72x72.png',
+    tag: Optional[str] = None,
+    require_interaction: bool = False,
+    actions: Optional[List[Dict]] = None
+) -> Dict:
+    """準備推播資料"""
+    notification_data = {
+        'title': title,
+        'body': body,
+        'icon': icon,
+        'badge': badge,
+        'tag': tag or 'notification',
+        'requireInteraction': require_interaction,
+        'data': {
+            'url': url
+        }
+    }
+
+    # 添加操作按鈕
+    if actions:
+        notification_data['actions'] = actions
+
+    return notification_data
+
+
+def dispatch_push(subscriptions, notification_data: Dict) -> Dict[str, int]:
+    """
+    並行發送推播給多個訂閱並批次寫回訂閱狀態
+
+    Returns:
+        Dict[str, int]: {'success': 成功數, 'failed': 失敗數}
+    """
+    subscriptions = list(subscriptions)
+    if not subscriptions:
+        return {'success': 0, 'failed': 0}
+
+    results = get_push_dispatcher().send(subscriptions, notification_data)
+    apply_push_results(results)
+
+    success_count = sum(1 for result in results if result.success)
+    return {
+        'success': success_count,
+        'failed': len(results) - success_count
+    }
+
 
 def send_push_notification(
     user,
@@ -42,58 +267,26 @@ def send_push_notification(
     from ..models import PushSubscription
 
     # 獲取用戶的所有啟用訂閱
-    subscriptions = PushSubscription.objects.filter(
+    subscriptions = list(PushSubscription.objects.filter(
         user=user,
         is_active=True
-    )
+    ))
 
-    if not subscriptions.exists():
+    if not subscriptions:
         logger.info(f'User {user.username} has no active push subscriptions')
         return {'success': 0, 'failed': 0}
 
     # 準備推播資料
-    notification_data = {
-        'title': title,
-        'body': body,
-        'icon': icon,
-        'badge': badge,
-        'tag': tag or 'notification',
-        'requireInteraction': require_interaction,
-        'data': {
-            'url': url
-        }
-    }
+    notification_data = build_notification_data(
+        title, body, url, icon, badge, tag, require_interaction, actions
+    )
 
-    # 添加操作按鈕
-    if actions:
-        notification_data['actions'] = actions
+    # 並行發送給每個訂閱，結果以 bulk_update 一次寫回
+    result = dispatch_push(subscriptions, notification_data)
 
-    # 統計結果
-    success_count = 0
-    failed_count = 0
-
-    # 發送給每個訂閱
-    for subscription in subscriptions:
-        try:
-            result = _send_to_subscription(subscription, notification_data)
-            if result:
-                success_count += 1
-                subscription.mark_as_used()
-                subscription.reset_failures()
-            else:
-                failed_count += 1
-                subscription.mark_as_failed()
-        except Exception as e:
-            logger.error(f'Failed to send push to subscription {subscription.id}: {e}')
-            failed_count += 1
-            subscription.mark_as_failed()
-
-    logger.info(f'Push notification sent to {user.username}: {success_count} success, {failed_count} failed')
+    logger.info(f'Push notification sent to {user.username}: {result["success"]} success, {result["failed"]} failed')
 
-    return {
-        'success': success_count,
-        'failed': failed_count
-    }
+    return result
 
 
 def send_push_to_multiple_users(
@@ -116,30 +309,32 @@ def send_push_to_multiple_users(
     Returns:
         Dict[str, int]: {'success': 總成功數, 'failed': 總失敗數}
     """
-    total_success = 0
-    total_failed = 0
+    from ..models import PushSubscription
 
-    for user in users:
-        result = send_push_notification(user, title, body, url, **kwargs)
-        total_success += result['success']
-        total_failed += result['failed']
+    # 一次查詢所有用戶的訂閱，並行發送
+    subscriptions = PushSubscription.objects.filter(
+        user__in=users,
+        is_active=True
+    )
+    notification_data = build_notification_data(title, body, url, **kwargs)
 
-    return {
-        'success': total_success,
-        'failed': total_failed
-    }
+    return dispatch_push(subscriptions, notification_data)
 
 
-def _send_to_subscription(subscription, notification_data: Dict) -> bool:
+def _send_to_subscription(subscription, payload: str, session=None, timeout=None) -> PushResult:
     """
     發送推播到單一訂閱
 
+    不直接寫入資料庫，由 apply_push_results 統一以 bulk_update 寫回
+
     Args:
         subscription: PushSubscription 物件
-        notification_data: 通知資料
+        payload: 已序列化的通知資料
+        session: 推播服務主機專用的 requests.Session
+        timeout: 請求逾時秒數
 
     Returns:
-        bool: 是否成功
+        PushResult: 發送結果
     """
     try:
         # 準備訂閱資訊
@@ -151,34 +346,40 @@ def _send_to_subscription(subscription, notification_data: Dict) -> bool:
             }
         }
 
-        # 準備 VAPID Claims
-        vapid_claims = {
-            "sub": settings.VAPID_CLAIMS.get('sub', 'mailto:admin@example.com')
-        }
+        # 使用依推播服務快取的 VAPID 簽章，不必每則推播重新解析私鑰與簽署
+        vapid_headers = get_vapid_signer().get_headers(subscription.endpoint)
 
         # 發送推播
         response = webpush(
             subscription_info=subscription_info,
-            data=json.dumps(notification_data),
-            vapid_private_key=settings.VAPID_PRIVATE_KEY,
-            vapid_claims=vapid_claims
+            data=payload,
+            headers=vapid_headers,
+            timeout=timeout,
+            requests_session=session
         )
 
-        return response.status_code in [200, 201]
+        return PushResult(
+            subscription=subscription,
+            success=response.status_code in [200, 201, 202],
+            status_code=response.status_code
+        )
 
     except WebPushException as e:
         logger.error(f'WebPush exception: {e}')
 
         # 410 Gone 或 404 Not Found 表示訂閱已失效
-        if e.response and e.response.status_code in [410, 404]:
-            subscription.is_active = False
-            subscription.save()
-
-        return False
+        status_code = e.response.status_code if e.response is not None else None
+        return PushResult(
+            subscription=subscription,
+            success=False,
+            status_code=status_code,
+            gone=status_code in [410, 404],
+            error=str(e)
+        )
 
     except Exception as e:
-        logger.error(f'Error sending push: {e}')
-        return False
+        logger.error(f'Error sending push to subscription {subscription.id}: {e}')
+        return PushResult(subscription=subscription, success=False, error=str(e))
 
 
 def create_notification_with_push(
@@ -189,7 +390,7 @@ def create_notification_with_push(
     **push_kwargs
 ):
     """
-    創建通知並發送推播
+    創建通知並將推播寫入推播佇列
     整合現有的通知系統
 
     Args:
@@ -200,6 +401,7 @@ def create_notification_with_push(
         **push_kwargs: 額外的推播參數
     """
     from ..utils.notifications import create_notification
+    from ..utils.push_outbox import enqueue_push_notification
     from ..models import NotificationPreference
 
     # 創建資料庫通知
@@ -210,10 +412,14 @@ def create_notification_with_push(
         link=link
     )
 
-    # 檢查用戶是否啟用推播通知
+    # 用戶停用了該類型通知（create_notification 已檢查偏好設定）
+    if notification is None:
+        return None
+
+    # 檢查用戶是否啟用推播通知（未提供個別推播開關時沿用通知設定）
     try:
         preference = NotificationPreference.objects.get(user=user)
-        push_enabled = getattr(preference, f'{notification_type}_push_enabled', False)
+        push_enabled = getattr(preference, f'{notification_type}_push_enabled', True)
     except NotificationPreference.DoesNotExist:
         push_enabled = True  # 預設啟用
 
@@ -228,9 +434,10 @@ def create_notification_with_push(
             'share': '文章被分享',
             'mention': '提到你',
         }
-        title = push_kwargs.get('title', title_map.get(notification_type, '新通知'))
+        title = push_kwargs.pop('title', title_map.get(notification_type, '新通知'))
 
-        send_push_notification(
+        # 只寫入推播佇列，由 process_push_outbox worker 發送，不阻塞目前請求
+        enqueue_push_notification(
             user=user,
             title=title,
             body=message,
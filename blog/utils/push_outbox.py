@@ -0,0 +1,245 @@
+"""
+推播 Outbox 工具
+網頁請求只寫入 PushOutbox，由 worker 分批取出、並行發送，失敗時以指數退避重試
+"""
+import json
+import logging
+import os
+import random
+import socket
+import uuid
+from datetime import timedelta
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from blog.models import PushOutbox, PushSubscription
+from .push_notifications import apply_push_results, build_notification_data, get_push_dispatcher
+
+logger = logging.getLogger(__name__)
+
+
+def get_batch_size():
+    """每批取出的筆數"""
+    return getattr(settings, 'PUSH_OUTBOX_BATCH_SIZE', 100)
+
+
+def get_max_attempts():
+    """最多嘗試次數"""
+    return getattr(settings, 'PUSH_OUTBOX_MAX_ATTEMPTS', 5)
+
+
+def get_lease_seconds():
+    """取出後未完成的資料列，超過此秒數視為 worker 已中斷，可被重新取出"""
+    return getattr(settings, 'PUSH_OUTBOX_LEASE_SECONDS', 300)
+
+
+def default_worker_id():
+    """產生 worker 識別碼（主機名稱-PID-亂數）"""
+    return f'{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}'[:64]
+
+
+def compute_backoff(attempts):
+    """
+    計算第 attempts 次失敗後的重試延遲（指數退避 + 隨機抖動）
+
+    Returns:
+        timedelta: 重試延遲
+    """
+    base = getattr(settings, 'PUSH_OUTBOX_BACKOFF_BASE', 30)
+    maximum = getattr(settings, 'PUSH_OUTBOX_BACKOFF_MAX', 3600)
+    delay = min(maximum, base * (2 ** max(attempts - 1, 0)))
+    # 加入 ±20% 抖動，避免大量失敗的推播在同一時間一起重試
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def enqueue_push_notification(
+    user,
+    title: str,
+    body: str,
+    url: str = '/blog/notifications/',
+    **kwargs
+) -> int:
+    """
+    將推播寫入 Outbox（每個啟用的訂閱一筆），不在目前請求中發送
+
+    Args:
+        user: Django User 物件
+        title: 通知標題
+        body: 通知內容
+        url: 點擊通知後導向的 URL
+        **kwargs: 其他推播參數（icon, badge, tag, require_interaction, actions）
+
+    Returns:
+        int: 寫入的筆數
+    """
+    subscription_ids = list(PushSubscription.objects.filter(
+        user=user,
+        is_active=True
+    ).values_list('id', flat=True))
+
+    if not subscription_ids:
+        return 0
+
+    payload = build_notification_data(title, body, url, **kwargs)
+    PushOutbox.objects.bulk_create([
+        PushOutbox(subscription_id=subscription_id, payload=payload)
+        for subscription_id in subscription_ids
+    ])
+    return len(subscription_ids)
+
+
+def claim_batch(worker_id: str, batch_size: Optional[int] = None, now=None) -> List[PushOutbox]:
+    """
+    取出一批可發送的推播並標記為發送中
+
+    PostgreSQL 使用 SELECT ... FOR UPDATE SKIP LOCKED，多個 worker 會各自取得不同的資料列；
+    SQLite 不支援資料列鎖定，改以條件式 UPDATE 搶佔，只有狀態仍符合條件的資料列會被標記，
+    同一筆推播不會被兩個 worker 同時取得。
+
+    Returns:
+        List[PushOutbox]: 已取出的推播（含 subscription）
+    """
+    batch_size = batch_size or get_batch_size()
+    now = now or timezone.now()
+    max_attempts = get_max_attempts()
+    expired = Q(status=PushOutbox.STATUS_SENDING, locked_at__lt=now - timedelta(seconds=get_lease_seconds()))
+
+    # 待發送且已到重試時間，或取出後超過租期仍未完成（worker 中斷）且還有嘗試次數
+    ready = Q(status=PushOutbox.STATUS_PENDING, next_attempt_at__lte=now) | (
+        expired & Q(attempts__lt=max_attempts)
+    )
+
+    with transaction.atomic():
+        # 每次發送都讓 worker 中斷的推播（例如資料導致 worker 當掉）不再無限重新取出
+        PushOutbox.objects.filter(expired, attempts__gte=max_attempts).update(
+            status=PushOutbox.STATUS_FAILED,
+            locked_at=None,
+            locked_by='',
+            last_error='超過最多嘗試次數（worker 處理中斷）',
+        )
+
+        candidates = PushOutbox.objects.filter(ready).order_by('next_attempt_at')
+        if connection.features.has_select_for_update_skip_locked:
+            candidates = candidates.select_for_update(skip_locked=True)
+        ids = list(candidates.values_list('id', flat=True)[:batch_size])
+
+        if not ids:
+            return []
+
+        PushOutbox.objects.filter(ready, id__in=ids).update(
+            status=PushOutbox.STATUS_SENDING,
+            locked_at=now,
+            locked_by=worker_id,
+            attempts=F('attempts') + 1,
+        )
+
+    return list(PushOutbox.objects.filter(
+        id__in=ids,
+        status=PushOutbox.STATUS_SENDING,
+        locked_by=worker_id,
+        locked_at=now,
+    ).select_related('subscription'))
+
+
+def process_batch(items: List[PushOutbox], dispatcher=None) -> Dict:
+    """
+    並行發送一批推播並寫回結果
+
+    成功：標記已發送並記錄推播服務回應時間
+    410/404：標記訂閱已失效（訂閱本身由 apply_push_results 停用）
+    可重試的錯誤：依嘗試次數指數退避，超過上限標記失敗
+    其他錯誤（400、403、413 等）：直接標記失敗
+
+    Returns:
+        dict: {'sent', 'retried', 'failed', 'gone', 'latencies'}
+    """
+    stats = {'sent': 0, 'retried': 0, 'failed': 0, 'gone': 0, 'latencies': []}
+    if not items:
+        return stats
+
+    now = timezone.now()
+    max_attempts = get_max_attempts()
+
+    # 訂閱在排入佇列後已被停用（例如同批次另一則推播收到 410），不再發送
+    deliverable = []
+    for item in items:
+        if item.subscription.is_active:
+            deliverable.append(item)
+        else:
+            item.status = PushOutbox.STATUS_GONE
+            item.last_error = '訂閱已停用'
+            stats['gone'] += 1
+
+    dispatcher = dispatcher or get_push_dispatcher()
+    results = dispatcher.send_payloads([
+        (item.subscription, json.dumps(item.payload))
+        for item in deliverable
+    ])
+    apply_push_results(results)
+
+    for item, result in zip(deliverable, results):
+        item.last_status_code = result.status_code
+        item.send_latency_ms = result.latency * 1000
+
+        if result.success:
+            item.status = PushOutbox.STATUS_SENT
+            item.sent_at = now
+            item.last_error = ''
+            stats['sent'] += 1
+            stats['latencies'].append(result.latency)
+        elif result.gone:
+            item.status = PushOutbox.STATUS_GONE
+            item.last_error = result.error
+            stats['gone'] += 1
+        elif result.retryable and item.attempts < max_attempts:
+            item.status = PushOutbox.STATUS_PENDING
+            item.next_attempt_at = now + compute_backoff(item.attempts)
+            item.last_error = result.error
+            stats['retried'] += 1
+        else:
+            item.status = PushOutbox.STATUS_FAILED
+            item.last_error = result.error
+            stats['failed'] += 1
+
+    for item in items:
+        item.locked_at = None
+        item.locked_by = ''
+
+    PushOutbox.objects.bulk_update(items, [
+        'status', 'next_attempt_at', 'locked_at', 'locked_by', 'last_status_code',
+        'last_error', 'sent_at', 'send_latency_ms',
+    ])
+
+    logger.info(
+        f'Push outbox batch: {stats["sent"]} sent, {stats["retried"]} retried, '
+        f'{stats["failed"]} failed, {stats["gone"]} gone'
+    )
+
+    return stats
+
+
+def purge_finished_outbox(days=None, batch_size=1000) -> int:
+    """
+    依主鍵分批刪除已完成（已發送、失敗、訂閱失效）且超過保留天數的推播
+
+    Returns:
+        int: 刪除筆數
+    """
+    days = getattr(settings, 'PUSH_OUTBOX_RETENTION_DAYS', 7) if days is None else days
+    finished = PushOutbox.objects.filter(
+        status__in=[PushOutbox.STATUS_SENT, PushOutbox.STATUS_FAILED, PushOutbox.STATUS_GONE],
+        created_at__lt=timezone.now() - timedelta(days=days),
+    )
+
+    deleted = 0
+    while True:
+        ids = list(finished.order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+        deleted += PushOutbox.objects.filter(id__in=ids).delete()[0]
+
+    return deleted
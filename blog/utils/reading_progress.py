@@ -0,0 +1,79 @@
+"""
+作者閱讀進度（個人頁面的學習進度）
+用戶對每位作者的已閱讀文章數存在 AuthorReadProgress、作者的已發布文章數存在
+UserProfile.published_article_count，都由 signals 在閱讀、發布時累加；
+個人頁面只需兩個以索引查詢的小查詢，不必讀取所有閱讀記錄再逐位作者 COUNT
+"""
+from django.db.models import Count
+
+from blog.models import ArticleReadHistory, AuthorReadProgress, UserProfile
+
+PROGRESS_COLOR = '#667eea'
+COMPLETED_COLOR = '#48bb78'
+
+
+def get_author_reading_progress(user, limit=3):
+    """
+    用戶閱讀各作者文章的進度（依進度遞減）
+
+    Returns:
+        list: [{'course': 顯示名稱, 'progress': 百分比, 'color': 進度條顏色}, ...]（最多 limit 筆）
+    """
+    read_counts = dict(
+        AuthorReadProgress.objects.filter(user=user, read_count__gt=0).values_list('author_id', 'read_count')
+    )
+    if not read_counts:
+        return []
+
+    authors = UserProfile.objects.filter(
+        user_id__in=read_counts.keys(),
+        published_article_count__gt=0
+    ).values_list('user_id', 'published_article_count', 'user__first_name', 'user__username')
+
+    learning_progress = []
+    for author_id, total, first_name, username in authors:
+        # 閱讀後才取消發布的文章仍算已閱讀，進度最多 100%
+        progress = min(100, int((read_counts[author_id] / total) * 100))
+        learning_progress.append({
+            'course': f"{first_name or username} 的文章",
+            'progress': progress,
+            'color': PROGRESS_COLOR if progress < 100 else COMPLETED_COLOR,
+        })
+
+    return sorted(learning_progress, key=lambda x: x['progress'], reverse=True)[:limit]
+
+
+def reconcile_author_read_progress(user_ids):
+    """
+    依閱讀記錄重新計算一批用戶的作者閱讀進度，只寫入不符的記錄
+
+    Returns:
+        int: 新增、更新或刪除的記錄數
+    """
+    actual = {
+        (user_id, author_id): total
+        for user_id, author_id, total in ArticleReadHistory.objects.filter(
+            user_id__in=user_ids,
+            article__author__isnull=False
+        ).values_list('user_id', 'article__author_id').annotate(total=Count('id')).order_by()
+    }
+
+    stale_ids = []
+    changed = []
+    for progress in AuthorReadProgress.objects.filter(user_id__in=user_ids):
+        total = actual.pop((progress.user_id, progress.author_id), 0)
+        if not total:
+            stale_ids.append(progress.id)
+        elif progress.read_count != total:
+            progress.read_count = total
+            changed.append(progress)
+
+    created = [
+        AuthorReadProgress(user_id=user_id, author_id=author_id, read_count=total)
+        for (user_id, author_id), total in actual.items()
+    ]
+
+    AuthorReadProgress.objects.filter(id__in=stale_ids).delete()
+    AuthorReadProgress.objects.bulk_update(changed, ['read_count'])
+    AuthorReadProgress.objects.bulk_create(created, ignore_conflicts=True)
+    return len(stale_ids) + len(changed) + len(created)
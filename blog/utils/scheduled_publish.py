@@ -0,0 +1,39 @@
+"""
+排程文章發布
+文章列表、標籤頁在請求中將已到排程時間的文章以一個 UPDATE 改為已發布；
+UPDATE 不觸發 Article.save 與 signals，因此由這裡補上發布時的副作用：
+作者的已發布文章數（UserProfile.published_article_count）與追蹤者的時間軸
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.utils import timezone
+
+from blog.models import Article, UserProfile
+from .timeline import fan_out_article
+
+
+def publish_due_articles():
+    """
+    將已到排程時間的文章改為已發布
+
+    Returns:
+        int: 發布的文章數
+    """
+    with transaction.atomic():
+        # 鎖定到期的文章，避免同時進行的請求重複發布與重複累加
+        due = list(Article.objects.select_for_update().filter(
+            status='scheduled',
+            publish_at__lte=timezone.now()
+        ).values_list('id', 'author_id'))
+        if not due:
+            return 0
+
+        due_ids = [article_id for article_id, _ in due]
+        Article.objects.filter(id__in=due_ids).update(status='published')
+        for author_id, published in Counter(author_id for _, author_id in due if author_id).items():
+            UserProfile.adjust_counter('published_article_count', published, user_id=author_id)
+
+    for article in Article.objects.filter(id__in=due_ids, status='published'):
+        fan_out_article(article)
+    return len(due_ids)
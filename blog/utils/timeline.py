@@ -0,0 +1,193 @@
+"""
+追蹤時間軸（Following feed）
+作者發布文章時將文章寫入每位追蹤者的 TimelineEntry（fan-out on write），
+讀取時只需查詢自己的時間軸，不必在請求中以 author__in=追蹤中的作者 掃描所有文章。
+
+追蹤者超過 TIMELINE_FANOUT_MAX_FOLLOWERS 的作者發文時不寫入時間軸（寫入量太大），
+改為讀取時直接查詢這些作者的文章（fan-out on read），兩者合併後以 keyset 分頁。
+
+每位用戶的時間軸最多保留 TIMELINE_MAX_ENTRIES 筆；
+追蹤時補入該作者最近的文章、取消追蹤時移除，完整重建與修剪由
+`python manage.py rebuild_timelines` 執行，既有文章由 `python manage.py backfill_timelines` 補寫
+"""
+import logging
+from array import array
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+
+from blog.models import Article, Follow, TimelineEntry
+from .follow_graph import contains, get_follow_graph_cache, get_follower_ids, get_following_ids
+
+logger = logging.getLogger(__name__)
+
+PULL_AUTHORS_KEY = 'timeline:pull_authors'
+
+
+def get_max_entries():
+    """每位用戶時間軸保留的筆數"""
+    return getattr(settings, 'TIMELINE_MAX_ENTRIES', 800)
+
+
+def get_fanout_max_followers():
+    """追蹤者超過此數的作者改為讀取時查詢"""
+    return getattr(settings, 'TIMELINE_FANOUT_MAX_FOLLOWERS', 5000)
+
+
+def get_fanout_batch_size():
+    """寫入時間軸時每次 bulk_create 的筆數"""
+    return getattr(settings, 'TIMELINE_FANOUT_BATCH_SIZE', 1000)
+
+
+def get_backfill_size():
+    """新追蹤作者時補入時間軸的文章數"""
+    return getattr(settings, 'TIMELINE_BACKFILL_SIZE', 50)
+
+
+def get_pull_authors_ttl():
+    """讀取時查詢的作者清單快取秒數"""
+    return getattr(settings, 'TIMELINE_PULL_AUTHORS_TTL', 600)
+
+
+def get_pull_author_ids(refresh=False):
+    """
+    追蹤者超過 TIMELINE_FANOUT_MAX_FOLLOWERS 的作者（排序好的 array），快取 TIMELINE_PULL_AUTHORS_TTL 秒
+    """
+    cache = get_follow_graph_cache()
+    cached = None if refresh else cache.get(PULL_AUTHORS_KEY)
+    if cached is not None:
+        author_ids = array('q')
+        author_ids.frombytes(cached)
+        return author_ids
+
+    author_ids = array('q', sorted(
+        Follow.objects.order_by().values('following_id').annotate(
+            followers=Count('id')
+        ).filter(
+            followers__gt=get_fanout_max_followers()
+        ).values_list('following_id', flat=True)
+    ))
+    cache.set(PULL_AUTHORS_KEY, author_ids.tobytes(), get_pull_authors_ttl())
+    return author_ids
+
+
+def _bulk_insert(entries):
+    batch_size = get_fanout_batch_size()
+    for start in range(0, len(entries), batch_size):
+        TimelineEntry.objects.bulk_create(entries[start:start + batch_size], ignore_conflicts=True)
+
+
+def fan_out_article(article):
+    """
+    將已發布的文章寫入作者所有追蹤者的時間軸
+
+    Returns:
+        int: 寫入的追蹤者數（改為讀取時查詢的作者回傳 0）
+    """
+    if article.author_id is None or article.status != 'published':
+        return 0
+
+    follower_ids = get_follower_ids(article.author_id)
+    if len(follower_ids) > get_fanout_max_followers():
+        return 0
+
+    _bulk_insert([
+        TimelineEntry(
+            user_id=follower_id,
+            article_id=article.id,
+            author_id=article.author_id,
+            created_at=article.created_at,
+        )
+        for follower_id in follower_ids
+    ])
+    return len(follower_ids)
+
+
+def backfill_follow(follower_id, author_id):
+    """新追蹤作者時，將該作者最近的文章補入追蹤者的時間軸"""
+    if contains(get_pull_author_ids(), author_id):
+        return 0
+
+    articles = Article.objects.filter(
+        author_id=author_id,
+        status='published'
+    ).order_by('-created_at', '-id').values_list('id', 'created_at')[:get_backfill_size()]
+    entries = [
+        TimelineEntry(user_id=follower_id, article_id=article_id, author_id=author_id, created_at=created_at)
+        for article_id, created_at in articles
+    ]
+    _bulk_insert(entries)
+    return len(entries)
+
+
+def remove_follow(follower_id, author_id):
+    """取消追蹤作者時，從追蹤者的時間軸移除該作者的文章"""
+    return TimelineEntry.objects.filter(user_id=follower_id, author_id=author_id).delete()[0]
+
+
+def rebuild_timeline(user_id):
+    """
+    從追蹤關係重新建立用戶的時間軸（最多 TIMELINE_MAX_ENTRIES 筆）
+
+    Returns:
+        int: 寫入的筆數
+    """
+    pull_author_ids = get_pull_author_ids()
+    author_ids = [
+        author_id for author_id in get_following_ids(user_id)
+        if not contains(pull_author_ids, author_id)
+    ]
+    articles = Article.objects.filter(
+        author_id__in=author_ids,
+        status='published'
+    ).order_by('-created_at', '-id').values_list('id', 'author_id', 'created_at')[:get_max_entries()]
+    entries = [
+        TimelineEntry(user_id=user_id, article_id=article_id, author_id=author_id, created_at=created_at)
+        for article_id, author_id, created_at in articles
+    ]
+
+    with transaction.atomic():
+        TimelineEntry.objects.filter(user_id=user_id).delete()
+        _bulk_insert(entries)
+    return len(entries)
+
+
+def trim_timeline(user_id):
+    """
+    刪除超過 TIMELINE_MAX_ENTRIES 筆的較舊項目
+
+    Returns:
+        int: 刪除的筆數
+    """
+    entries = TimelineEntry.objects.filter(user_id=user_id)
+    boundary = entries.order_by('-created_at', '-id').values_list('created_at', 'id')[get_max_entries():][:1]
+    boundary = list(boundary)
+    if not boundary:
+        return 0
+
+    created_at, entry_id = boundary[0]
+    return entries.filter(
+        Q(created_at__lt=created_at) | Q(created_at=created_at, id__lte=entry_id)
+    ).delete()[0]
+
+
+def get_following_feed(user):
+    """
+    用戶的追蹤時間軸（已發布的文章 QuerySet，依發布時間排序）
+    時間軸中的文章與追蹤中、改為讀取時查詢的作者的文章合併
+    """
+    pull_author_ids = get_pull_author_ids()
+    pulled_ids = [
+        author_id for author_id in get_following_ids(user.id)
+        if contains(pull_author_ids, author_id)
+    ]
+
+    condition = Q(id__in=TimelineEntry.objects.filter(user=user).values('article_id'))
+    if pulled_ids:
+        condition |= Q(author_id__in=pulled_ids)
+
+    return Article.objects.filter(
+        condition,
+        status='published'
+    ).select_related('author').prefetch_related('tags').order_by('-created_at', '-id')
@@ -0,0 +1,97 @@
+"""
+VAPID 簽章快取
+VAPID 私鑰只載入一次，並依推播服務來源（audience）快取簽好的 Authorization 標頭，
+在到期前重複使用，不必每則推播都重新解析私鑰與簽署 JWT
+"""
+import os
+import threading
+import time
+from typing import Dict, Tuple
+from urllib.parse import urlparse
+
+from django.conf import settings
+from py_vapid import Vapid
+
+
+class VapidSigner:
+    """
+    依 audience 快取 VAPID Authorization 標頭
+
+    JWT 的 claims 只有 aud（推播服務的 scheme://host）會隨訂閱不同，
+    同一推播服務（FCM、Mozilla 等）的所有推播可以共用同一個簽章直到接近到期。
+    """
+
+    def __init__(self, private_key: str, subject: str, ttl: int = None, refresh_margin: int = None):
+        self.private_key = private_key
+        self.subject = subject
+        # RFC 8292 規定 exp 不可超過 24 小時
+        self.ttl = ttl or getattr(settings, 'VAPID_TOKEN_TTL', 12 * 60 * 60)
+        self.refresh_margin = refresh_margin or getattr(settings, 'VAPID_TOKEN_REFRESH_MARGIN', 10 * 60)
+
+        self._vapid = None
+        self._cache: Dict[str, Tuple[Dict[str, str], int]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_audience(endpoint: str) -> str:
+        """取得推播端點的 audience（scheme://host）"""
+        url = urlparse(endpoint)
+        return f'{url.scheme}://{url.netloc}'
+
+    def _load_key(self):
+        """載入 VAPID 私鑰（支援檔案路徑或 raw / DER 的 base64url 字串）"""
+        if os.path.isfile(self.private_key):
+            return Vapid.from_file(private_key_file=self.private_key)
+        return Vapid.from_string(private_key=self.private_key)
+
+    def get_headers(self, endpoint: str) -> Dict[str, str]:
+        """
+        取得推播端點使用的 VAPID 標頭
+
+        Returns:
+            Dict[str, str]: 含 Authorization 的標頭（呼叫端可自由修改，不影響快取）
+        """
+        audience = self.get_audience(endpoint)
+        now = int(time.time())
+
+        with self._lock:
+            cached = self._cache.get(audience)
+            if cached and cached[1] - self.refresh_margin > now:
+                return dict(cached[0])
+
+            if self._vapid is None:
+                self._vapid = self._load_key()
+
+            expires_at = now + self.ttl
+            headers = self._vapid.sign({
+                'sub': self.subject,
+                'aud': audience,
+                'exp': expires_at,
+            })
+            self._cache[audience] = (headers, expires_at)
+            return dict(headers)
+
+    def clear(self):
+        """清除已快取的簽章"""
+        with self._lock:
+            self._cache.clear()
+
+
+_signer = None
+_signer_lock = threading.Lock()
+
+
+def get_vapid_signer() -> VapidSigner:
+    """
+    取得全域共用的 VAPID 簽章器
+
+    VAPID 私鑰或 sub 設定變更時（例如測試中 override_settings）會重新建立
+    """
+    global _signer
+    private_key = settings.VAPID_PRIVATE_KEY
+    subject = settings.VAPID_CLAIMS.get('sub', 'mailto:admin@example.com')
+
+    with _signer_lock:
+        if _signer is None or _signer.private_key != private_key or _signer.subject != subject:
+            _signer = VapidSigner(private_key, subject)
+        return _signer
@@ -30,6 +30,7 @@ from .article_views import (
     get_personalized_recommendations_api,
     get_recommended_articles_api,
     personalized_feed,
+    following_feed,
     get_search_history,
     clear_search_history,
     delete_search_item,
@@ -54,8 +55,10 @@ from .member_views import (
     follow_user,
     followers_list,
     following_list,
+    follow_suggestions_api,
     get_user_api,
     get_chat_list_api,
+    get_presence_api,
     subscribe_push,
     unsubscribe_push,
     test_push_notification_view
@@ -142,6 +145,7 @@ __all__ = [
     'get_personalized_recommendations_api',
     'get_recommended_articles_api',
     'personalized_feed',
+    'following_feed',
     'get_search_history',
     'clear_search_history',
     'delete_search_item',
@@ -163,8 +167,10 @@ __all__ = [
     'follow_user',
     'followers_list',
     'following_list',
+    'follow_suggestions_api',
     'get_user_api',
     'get_chat_list_api',
+    'get_presence_api',
     'subscribe_push',
     'unsubscribe_push',
     'test_push_notification_view',
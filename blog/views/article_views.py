@@ -16,6 +16,9 @@ from ..utils.notifications import notify_comment, notify_like, notify_share, not
 from ..utils.mention_parser import parse_mentions
 from ..utils.seo import generate_meta_description, generate_keywords, extract_first_image_from_markdown
 from ..utils.recommendations import get_recommended_articles, get_similar_articles, get_personalized_feed
+from ..utils.keyset_pagination import KeysetPaginator
+from ..utils.timeline import get_following_feed
+from ..utils.scheduled_publish import publish_due_articles
 from django.contrib.auth.models import User
 
 
@@ -26,15 +29,12 @@ def home(request):
     支援進階搜尋功能：
     - q: 搜尋關鍵字（標題或內容）
     - search_type: 搜尋類型（all/content/author）
-    每頁顯示 6 篇文章
+    每頁顯示 6 篇文章，以 keyset 游標（cursor 參數）分頁
     支援 AJAX 請求返回 JSON 格式數據（用於無限滾動）
     """
     # 自動更新已到期的排程文章為已發布狀態
-    # 使用 update() 批次更新，避免逐筆 save() 造成效能問題
-    Article.objects.filter(
-        status='scheduled',
-        publish_at__lte=timezone.now()
-    ).update(status='published')
+    # 使用 update() 批次更新，避免逐筆 save() 造成效能問題；發布後更新作者的已發布文章數並寫入追蹤者的時間軸
+    publish_due_articles()
 
     # 取得搜尋參數
     search_query = request.GET.get('q', '')
@@ -66,10 +66,9 @@ def home(request):
                 Q(author__first_name__icontains=search_query)
             ).distinct()
 
-    # 分頁功能：每頁顯示 6 篇文章
-    paginator = Paginator(articles, 6)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # 分頁功能：每頁顯示 6 篇文章（keyset 分頁，不使用 OFFSET）
+    paginator = KeysetPaginator(articles, 6, ordering=('-created_at', '-id'))
+    page_obj = paginator.get_page(request.GET.get('cursor'))
 
     # 如果是 AJAX 請求，返回 JSON 格式數據
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -89,8 +88,7 @@ def home(request):
             'success': True,
             'html': articles_html,
             'has_next': page_obj.has_next(),
-            'current_page': page_obj.number,
-            'total_pages': paginator.num_pages,
+            'next_cursor': page_obj.next_cursor,
         })
 
     context = {
@@ -771,10 +769,7 @@ def tag_articles(request, slug):
     """
     # 自動更新已到期的排程文章為已發布狀態
     # 使用 update() 批次更新，避免逐筆 save() 造成效能問題
-    Article.objects.filter(
-        status='scheduled',
-        publish_at__lte=timezone.now()
-    ).update(status='published')
+    publish_due_articles()
 
     tag = get_object_or_404(Tag, slug=slug)
     # 只顯示已發布的文章
@@ -1352,6 +1347,26 @@ def personalized_feed(request):
     return render(request, 'blog/recommendations/personalized_feed.html', context)
 
 
+@login_required
+def following_feed(request):
+    """
+    追蹤動態
+    顯示追蹤中作者發布的文章（從追蹤時間軸讀取），以 keyset 游標分頁
+    """
+    articles = get_following_feed(request.user)
+
+    paginator = KeysetPaginator(articles, 10, ordering=('-created_at', '-id'))
+    page_obj = paginator.get_page(request.GET.get('cursor'))
+
+    context = {
+        'articles': page_obj,
+        'page_obj': page_obj,
+        'search_query': '',
+        'following_count': request.user.following.count(),
+    }
+    return render(request, 'blog/recommendations/following_feed.html', context)
+
+
 def get_search_history(request):
     """
     獲取搜尋歷史 API
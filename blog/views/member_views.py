@@ -6,6 +6,7 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, logout, authenticate, update_session_auth_hash
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
+from django.conf import settings
 from django.contrib.auth.forms import PasswordChangeForm
 from django.contrib import messages
 from django.db.models import Count, Sum
@@ -13,8 +14,13 @@ from django.utils import timezone
 from datetime import timedelta
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from ..forms import CustomUserCreationForm, CustomAuthenticationForm, UserProfileForm
-from ..models import UserProfile, Activity, UserAchievement, UserCourseProgress, Follow, ArticleReadHistory, Article, Comment, Like
+from ..models import UserProfile, Activity, UserAchievement, UserCourseProgress, Follow, ArticleReadHistory, Article, Comment
 from ..utils.notifications import notify_follower
+from ..utils.keyset_pagination import KeysetPaginator
+from ..utils.follow_graph import get_following_status, get_is_following, invalidate_follow_graph
+from ..utils.follow_suggestions import get_follow_suggestions
+from ..utils.reading_progress import get_author_reading_progress
+from ..utils.timeline import backfill_follow, remove_follow
 
 
 @login_required
@@ -38,16 +44,13 @@ def member_profile(request, username):
     # 判斷是否為本人
     is_own_profile = request.user.is_authenticated and request.user == target_user
 
-    # 計算統計數據
-    # 計算用戶所有文章收到的讚數總和
-    likes_received = Like.objects.filter(article__author=target_user).count()
-
+    # 統計數據（讀取個人資料上由 signals 維護的計數）
     stats = {
-        'posts': target_user.articles.count(),
-        'comments': target_user.comments.count(),  # 計算實際留言數
-        'likes_received': likes_received,
-        'followers': target_user.followers.count(),
-        'following': target_user.following.count(),
+        'posts': profile.article_count,
+        'comments': profile.comment_count,
+        'likes_received': profile.likes_received_count,
+        'followers': profile.follower_count,
+        'following': profile.following_count,
     }
 
     # 取得最近活動（只有本人能看到）
@@ -62,40 +65,10 @@ def member_profile(request, username):
     user_achievements = UserAchievement.objects.filter(user=target_user).select_related('achievement').order_by('-unlocked_at')[:4]
 
     # 取得學習進度（只有本人能看到）
-    # 基於閱讀記錄統計，按作者分類
+    # 各作者的已閱讀文章數與已發布文章數都已預先累加，取進度最高的 3 位作者
     learning_progress = []
     if is_own_profile:
-        # 獲取用戶的所有閱讀記錄
-        read_articles = ArticleReadHistory.objects.filter(user=target_user).select_related('article', 'article__author')
-
-        # 統計各作者的文章總數和已閱讀數
-        author_stats = {}
-        for record in read_articles:
-            author = record.article.author
-            if author:
-                author_name = author.first_name or author.username
-                if author_name not in author_stats:
-                    # 計算該作者的總文章數
-                    total_articles = Article.objects.filter(author=author).count()
-                    author_stats[author_name] = {
-                        'read': 0,
-                        'total': total_articles,
-                        'author': author_name,
-                    }
-                author_stats[author_name]['read'] += 1
-
-        # 轉換為列表格式並計算進度百分比
-        for author_name, author_stat in author_stats.items():
-            if author_stat['total'] > 0:
-                progress = int((author_stat['read'] / author_stat['total']) * 100)
-                learning_progress.append({
-                    'course': f"{author_name} 的文章",
-                    'progress': progress,
-                    'color': '#667eea' if progress < 100 else '#48bb78',
-                })
-
-        # 按進度排序，取前3個
-        learning_progress = sorted(learning_progress, key=lambda x: x['progress'], reverse=True)[:3]
+        learning_progress = get_author_reading_progress(target_user, limit=3)
 
     # 取得最近發表的文章（公開，所有人都能看到）
     recent_articles = target_user.articles.order_by('-created_at')[:5]
@@ -126,15 +99,17 @@ def member_profile(request, username):
     }
 
     # 追蹤狀態
-    is_following = False
-    if request.user.is_authenticated and not is_own_profile:
-        is_following = Follow.objects.filter(follower=request.user, following=target_user).exists()
+    is_following = get_is_following(request.user, target_user)
+
+    # 推薦追蹤（只有本人能看到）
+    follow_suggestions = get_follow_suggestions(request.user, 5) if is_own_profile else []
 
     context = {
         'member': member_data,
         'profile': profile,  # 添加 profile 物件以便使用 avatar_url filter
         'is_own_profile': is_own_profile,
         'is_following': is_following,
+        'follow_suggestions': follow_suggestions,
     }
     return render(request, 'blog/members/profile.html', context)
 
@@ -352,12 +327,11 @@ def member_activities(request, username):
         return redirect('member_profile', username=username)
 
     # 取得所有活動記錄
-    activities_list = Activity.objects.filter(user=target_user).order_by('-created_at')
+    activities_list = Activity.objects.filter(user=target_user)
 
-    # 分頁設定（與部落格列表一致）
-    paginator = Paginator(activities_list, 10)  # 每頁顯示 10 筆
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # 分頁設定（keyset 游標），每頁顯示 10 筆
+    paginator = KeysetPaginator(activities_list, 10, ordering=('-created_at', '-id'))
+    page_obj = paginator.get_page(request.GET.get('cursor'))
 
     # 準備會員資料
     member_data = {
@@ -533,23 +507,14 @@ def followers_list(request, username):
     is_own_profile = request.user.is_authenticated and request.user == target_user
 
     # 取得追蹤者列表
-    followers = Follow.objects.filter(following=target_user).select_related('follower', 'follower__profile').order_by('-created_at')
+    followers = Follow.objects.filter(following=target_user).select_related('follower', 'follower__profile')
 
-    # 分頁
-    paginator = Paginator(followers, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # 分頁（keyset 游標）
+    paginator = KeysetPaginator(followers, 20, ordering=('-created_at', '-id'))
+    page_obj = paginator.get_page(request.GET.get('cursor'))
 
-    # 如果當前用戶已登入，檢查是否追蹤了列表中的用戶
-    following_status = {}
-    if request.user.is_authenticated:
-        for follow in page_obj:
-            follower = follow.follower
-            if follower != request.user:
-                following_status[follower.id] = Follow.objects.filter(
-                    follower=request.user,
-                    following=follower
-                ).exists()
+    # 如果當前用戶已登入，一次查詢是否追蹤了列表中的用戶
+    following_status = get_following_status(request.user, [follow.follower_id for follow in page_obj])
 
     context = {
         'member': target_user,
@@ -557,7 +522,7 @@ def followers_list(request, username):
         'page_obj': page_obj,
         'following_status': following_status,
         'list_type': 'followers',
-        'total_count': followers.count(),
+        'total_count': page_obj.total_display,
     }
 
     return render(request, 'blog/members/follow_list.html', context)
@@ -571,23 +536,14 @@ def following_list(request, username):
     is_own_profile = request.user.is_authenticated and request.user == target_user
 
     # 取得追蹤中列表
-    following = Follow.objects.filter(follower=target_user).select_related('following', 'following__profile').order_by('-created_at')
+    following = Follow.objects.filter(follower=target_user).select_related('following', 'following__profile')
 
-    # 分頁
-    paginator = Paginator(following, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # 分頁（keyset 游標）
+    paginator = KeysetPaginator(following, 20, ordering=('-created_at', '-id'))
+    page_obj = paginator.get_page(request.GET.get('cursor'))
 
-    # 如果當前用戶已登入，檢查是否追蹤了列表中的用戶
-    following_status = {}
-    if request.user.is_authenticated:
-        for follow in page_obj:
-            following_user = follow.following
-            if following_user != request.user:
-                following_status[following_user.id] = Follow.objects.filter(
-                    follower=request.user,
-                    following=following_user
-                ).exists()
+    # 如果當前用戶已登入，一次查詢是否追蹤了列表中的用戶
+    following_status = get_following_status(request.user, [follow.following_id for follow in page_obj])
 
     context = {
         'member': target_user,
@@ -595,7 +551,7 @@ def following_list(request, username):
         'page_obj': page_obj,
         'following_status': following_status,
         'list_type': 'following',
-        'total_count': following.count(),
+        'total_count': page_obj.total_display,
     }
 
     return render(request, 'blog/members/follow_list.html', context)
@@ -630,20 +586,25 @@ def follow_user(request, username):
     if follow_exists:
         # 取消追蹤
         follow_exists.delete()
+        remove_follow(request.user.id, target_user.id)
         is_following = False
         message = '已取消追蹤'
     else:
         # 新增追蹤
         Follow.objects.create(follower=request.user, following=target_user)
+        backfill_follow(request.user.id, target_user.id)
         is_following = True
         message = '追蹤成功'
 
         # 發送通知給被追蹤的用戶
         notify_follower(target_user, request.user)
 
-    # 獲取最新的追蹤數量
-    followers_count = target_user.followers.count()
-    following_count = target_user.following.count()
+    invalidate_follow_graph(request.user.id, target_user.id)
+
+    # 獲取最新的追蹤數量（個人資料上的計數）
+    followers_count, following_count = UserProfile.objects.filter(
+        user=target_user
+    ).values_list('follower_count', 'following_count').first() or (0, 0)
 
     return JsonResponse({
         'success': True,
@@ -725,6 +686,7 @@ def get_user_api(request, username):
     API: 獲取用戶基本資訊（用於即時聊天）
     """
     from django.http import JsonResponse
+    from ..utils.presence import is_user_online
 
     try:
         user = User.objects.get(username=username)
@@ -746,7 +708,9 @@ def get_user_api(request, username):
                 'id': user.id,
                 'username': user.username,
                 'display_name': display_name,
-                'avatar_url': request.build_absolute_uri(avatar_url) if avatar_url else None
+                'avatar_url': request.build_absolute_uri(avatar_url) if avatar_url else None,
+                'is_online': is_user_online(user.id),
+                'is_following': get_is_following(request.user, user),
             }
         })
     except User.DoesNotExist:
@@ -756,6 +720,38 @@ def get_user_api(request, username):
         }, status=404)
 
 
+@login_required
+def follow_suggestions_api(request):
+    """
+    API: 推薦追蹤
+    讀取 build_follow_suggestions 批次計算好的結果
+    """
+    from django.http import JsonResponse
+    from django.templatetags.static import static
+
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), 50)
+    except (TypeError, ValueError):
+        limit = 10
+
+    suggestions = []
+    for suggestion in get_follow_suggestions(request.user, limit):
+        user = suggestion.suggested_user
+        profile = getattr(user, 'profile', None)
+        avatar_url = profile.get_avatar_url() if profile and profile.avatar else static('blog/images/大頭綠.JPG')
+        suggestions.append({
+            'id': user.id,
+            'username': user.username,
+            'display_name': user.first_name or user.username,
+            'avatar_url': request.build_absolute_uri(avatar_url),
+            'reason': suggestion.get_reason(),
+            'mutual_count': suggestion.mutual_count,
+            'shared_tag_count': suggestion.shared_tag_count,
+        })
+
+    return JsonResponse({'success': True, 'suggestions': suggestions})
+
+
 @login_required
 def get_chat_list_api(request):
     """
@@ -763,55 +759,41 @@ def get_chat_list_api(request):
     返回所有聊天對話，包含最後訊息、未讀數等資訊
     """
     from django.http import JsonResponse
-    from django.db.models import Q, Max, Count, Case, When, IntegerField
-    from ..models import ChatMessage
-
-    # 獲取所有與當前用戶相關的聊天訊息
-    # 找出所有與用戶有聊天記錄的其他用戶
-    chat_users = ChatMessage.objects.filter(
-        Q(sender=request.user) | Q(recipient=request.user)
-    ).values_list('sender', 'recipient').distinct()
-
-    # 提取所有唯一的對話用戶 ID
-    user_ids = set()
-    for sender_id, recipient_id in chat_users:
-        if sender_id != request.user.id:
-            user_ids.add(sender_id)
-        if recipient_id != request.user.id:
-            user_ids.add(recipient_id)
-
-    # 獲取每個用戶的聊天資訊
+    from django.db.models import Q
+    from django.templatetags.static import static
+    from ..models import ChatRoom
+    from ..utils.presence import get_online_user_ids
+
+    # 對話摘要由 ChatConsumer 維護，單一查詢即可取得所有對話
+    rooms = ChatRoom.objects.filter(
+        Q(user1=request.user) | Q(user2=request.user),
+        last_message_at__isnull=False
+    ).select_related(
+        'user1', 'user1__profile', 'user2', 'user2__profile'
+    ).order_by('-last_message_at')
+
+    rooms = list(rooms)
+    default_avatar_url = static('blog/images/大頭綠.JPG')
+
+    # 一次查詢所有對話對象的在線狀態
+    online_ids = get_online_user_ids(
+        room.user2_id if room.user1_id == request.user.id else room.user1_id
+        for room in rooms
+    )
+
     chat_list = []
-    for user_id in user_ids:
-        other_user = User.objects.get(id=user_id)
-
-        # 獲取最後一則訊息
-        last_message = ChatMessage.objects.filter(
-            Q(sender=request.user, recipient=other_user) |
-            Q(sender=other_user, recipient=request.user)
-        ).order_by('-created_at').first()
-
-        # 獲取未讀訊息數
-        unread_count = ChatMessage.objects.filter(
-            sender=other_user,
-            recipient=request.user,
-            is_read=False
-        ).count()
+    for room in rooms:
+        other_user = room.get_other_user(request.user)
 
         # 獲取顯示名稱
         display_name = other_user.first_name if other_user.first_name else other_user.username
 
         # 獲取頭像 URL
-        try:
-            profile = other_user.profile
-            if profile.avatar:
-                avatar_url = profile.get_avatar_url()
-            else:
-                from django.templatetags.static import static
-                avatar_url = static('blog/images/大頭綠.JPG')
-        except:
-            from django.templatetags.static import static
-            avatar_url = static('blog/images/大頭綠.JPG')
+        profile = getattr(other_user, 'profile', None)
+        if profile and profile.avatar:
+            avatar_url = profile.get_avatar_url()
+        else:
+            avatar_url = default_avatar_url
 
         chat_list.append({
             'user_id': other_user.id,
@@ -819,16 +801,14 @@ def get_chat_list_api(request):
             'display_name': display_name,
             'avatar_url': request.build_absolute_uri(avatar_url) if avatar_url else None,
             'last_message': {
-                'content': last_message.content if last_message else '',
-                'timestamp': last_message.created_at.isoformat() if last_message else None,
-                'is_from_me': last_message.sender == request.user if last_message else False
+                'content': room.last_message_preview,
+                'timestamp': room.last_message_at.isoformat(),
+                'is_from_me': room.last_message_sender_id == request.user.id
             },
-            'unread_count': unread_count
+            'unread_count': room.get_unread_count(request.user),
+            'is_online': other_user.id in online_ids
         })
 
-    # 按最後訊息時間排序（最新的在前面）
-    chat_list.sort(key=lambda x: x['last_message']['timestamp'] or '', reverse=True)
-
     return JsonResponse({
         'success': True,
         'chats': chat_list,
@@ -836,6 +816,33 @@ def get_chat_list_api(request):
     })
 
 
+@login_required
+def get_presence_api(request):
+    """
+    API: 批次查詢用戶是否在線
+    GET ?ids=1,2,3（最多 PRESENCE_LOOKUP_LIMIT 個）
+    """
+    from django.http import JsonResponse
+    from ..utils.presence import get_online_user_ids
+
+    limit = getattr(settings, 'PRESENCE_LOOKUP_LIMIT', 200)
+    try:
+        user_ids = {int(value) for value in request.GET.get('ids', '').split(',') if value.strip()}
+    except ValueError:
+        return JsonResponse({'success': False, 'error': '無效的用戶 ID'}, status=400)
+
+    if len(user_ids) > limit:
+        return JsonResponse({'success': False, 'error': f'一次最多查詢 {limit} 位用戶'}, status=400)
+
+    online_ids = get_online_user_ids(user_ids)
+
+    return JsonResponse({
+        'success': True,
+        'online': sorted(online_ids),
+        'statuses': {str(user_id): user_id in online_ids for user_id in sorted(user_ids)}
+    })
+
+
 @login_required
 def subscribe_push(request):
     """
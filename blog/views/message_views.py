@@ -5,42 +5,55 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.contrib import messages
-from django.db.models import Q
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-from ..models import Message
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q, Subquery
+from django.utils import timezone
+from ..models import Message, MessageThread
 from ..forms.member import MessageForm, MessageReplyForm
 from ..utils.notifications import notify_message
+from ..utils.keyset_pagination import KeysetPaginator
+from ..utils.message_deletion import soft_delete_messages
+from ..utils.notification_snapshot import invalidate_snapshot
+
+
+def _box_threads(user, owner_field, flag):
+    """
+    收件匣／寄件匣的對話串：含有用戶在此信箱中未刪除的訊息的對話串，
+    附帶信箱中最新一則訊息的 ID（latest_message_id）
+    """
+    box = Message.objects.filter(thread=OuterRef('pk'), **{owner_field: user, flag: False})
+    return MessageThread.for_user(user).filter(Exists(box)).annotate(
+        latest_message_id=Subquery(box.order_by('-created_at', '-id').values('id')[:1])
+    ).select_related('user1', 'user2')
+
+
+def _attach_latest_messages(threads, user):
+    """為一頁對話串附上對方用戶與信箱中最新的訊息（一個查詢）"""
+    latest = Message.objects.in_bulk([thread.latest_message_id for thread in threads])
+    for thread in threads:
+        thread.other_user = thread.get_other_user(user)
+        thread.latest_message = latest.get(thread.latest_message_id)
 
 
 @login_required
 def inbox(request):
     """
-    收件匣 - 顯示收到的訊息
+    收件匣 - 依最後訊息時間列出收到訊息的對話串
     """
-    # 獲取所有收到且未被收件者刪除的訊息
-    received_messages = Message.objects.filter(
-        recipient=request.user,
-        recipient_deleted=False
-    ).select_related('sender').order_by('-created_at')
-
-    # 計算未讀數量
-    unread_count = received_messages.filter(is_read=False).count()
+    threads = _box_threads(request.user, 'recipient', 'recipient_deleted')
 
-    # 分頁處理，每頁顯示 20 則訊息
-    paginator = Paginator(received_messages, 20)
-    page = request.GET.get('page', 1)
+    # 未讀數加總自對話串上的未讀計數
+    unread_count = MessageThread.unread_total(request.user)
 
-    try:
-        messages_list = paginator.page(page)
-    except PageNotAnInteger:
-        messages_list = paginator.page(1)
-    except EmptyPage:
-        messages_list = paginator.page(paginator.num_pages)
+    # 分頁處理（keyset 游標），每頁顯示 20 個對話串
+    paginator = KeysetPaginator(threads, 20, ordering=('-last_message_at', '-id'))
+    threads_page = paginator.get_page(request.GET.get('cursor'))
+    _attach_latest_messages(threads_page, request.user)
 
     context = {
-        'messages_list': messages_list,
+        'threads': threads_page,
         'unread_count': unread_count,
-        'total_count': paginator.count,
+        'total_count': threads_page.total_display,
         'active_tab': 'inbox',
     }
     return render(request, 'blog/messages/inbox.html', context)
@@ -49,28 +62,18 @@ def inbox(request):
 @login_required
 def outbox(request):
     """
-    寄件匣 - 顯示已發送的訊息
+    寄件匣 - 依最後訊息時間列出發送過訊息的對話串
     """
-    # 獲取所有發送且未被寄件者刪除的訊息
-    sent_messages = Message.objects.filter(
-        sender=request.user,
-        sender_deleted=False
-    ).select_related('recipient').order_by('-created_at')
-
-    # 分頁處理，每頁顯示 20 則訊息
-    paginator = Paginator(sent_messages, 20)
-    page = request.GET.get('page', 1)
-
-    try:
-        messages_list = paginator.page(page)
-    except PageNotAnInteger:
-        messages_list = paginator.page(1)
-    except EmptyPage:
-        messages_list = paginator.page(paginator.num_pages)
+    threads = _box_threads(request.user, 'sender', 'sender_deleted')
+
+    # 分頁處理（keyset 游標），每頁顯示 20 個對話串
+    paginator = KeysetPaginator(threads, 20, ordering=('-last_message_at', '-id'))
+    threads_page = paginator.get_page(request.GET.get('cursor'))
+    _attach_latest_messages(threads_page, request.user)
 
     context = {
-        'messages_list': messages_list,
-        'total_count': paginator.count,
+        'threads': threads_page,
+        'total_count': threads_page.total_display,
         'active_tab': 'outbox',
     }
     return render(request, 'blog/messages/outbox.html', context)
@@ -98,13 +101,17 @@ def message_compose(request, username=None):
             recipient_username = form.cleaned_data['recipient_username']
             recipient_user = User.objects.get(username=recipient_username)
 
-            # 建立訊息
-            message = Message.objects.create(
-                sender=request.user,
-                recipient=recipient_user,
-                subject=form.cleaned_data['subject'],
-                content=form.cleaned_data['content']
-            )
+            # 建立訊息，並開啟新的對話串
+            with transaction.atomic():
+                thread = MessageThread.start(request.user, recipient_user, form.cleaned_data['subject'])
+                message = Message.objects.create(
+                    sender=request.user,
+                    recipient=recipient_user,
+                    subject=form.cleaned_data['subject'],
+                    content=form.cleaned_data['content'],
+                    thread=thread
+                )
+                MessageThread.record_message(message)
 
             # 發送通知給收件者
             notify_message(recipient_user, request.user, message)
@@ -129,7 +136,7 @@ def message_detail(request, message_id):
     顯示訊息內容並可以回覆
     """
     # 獲取訊息
-    message = get_object_or_404(Message, id=message_id)
+    message = get_object_or_404(Message.objects.select_related('sender', 'recipient', 'thread'), id=message_id)
 
     # 檢查權限：只有寄件者或收件者可以查看
     if message.sender != request.user and message.recipient != request.user:
@@ -144,14 +151,25 @@ def message_detail(request, message_id):
         messages.error(request, '❌ 此訊息已被刪除！')
         return redirect('inbox')
 
-    # 如果是收件者且訊息未讀，標記為已讀
-    if message.recipient == request.user and not message.is_read:
+    thread = message.thread
+
+    # 開啟對話串時，將對話串中發給自己的未讀訊息都標記為已讀
+    if thread is not None and thread.get_unread_count(request.user):
+        thread.mark_read(request.user)
+        invalidate_snapshot(request.user.id)
+        message.refresh_from_db(fields=['is_read', 'read_at'])
+    elif message.recipient == request.user and not message.is_read:
         message.mark_as_read()
 
-    # 獲取所有回覆
-    replies = Message.objects.filter(
-        parent_message=message
-    ).select_related('sender', 'recipient').order_by('created_at')
+    # 對話串中的其他訊息（依時間排列，略過自己已刪除的）
+    if thread is not None:
+        replies = thread.messages.exclude(id=message.id).exclude(
+            Q(sender=request.user, sender_deleted=True) |
+            Q(recipient=request.user, recipient_deleted=True)
+        )
+    else:
+        replies = Message.objects.filter(parent_message=message)
+    replies = replies.select_related('sender', 'recipient').order_by('created_at', 'id')
 
     # 處理回覆表單
     if request.method == 'POST':
@@ -169,13 +187,21 @@ def message_detail(request, message_id):
             if not reply_subject.startswith('Re: '):
                 reply_subject = f'Re: {reply_subject}'
 
-            reply = Message.objects.create(
-                sender=request.user,
-                recipient=reply_recipient,
-                subject=reply_subject,
-                content=reply_form.cleaned_data['content'],
-                parent_message=message
-            )
+            # 回覆歸入原訊息的對話串（舊資料沒有對話串時補建）
+            with transaction.atomic():
+                if thread is None:
+                    thread = MessageThread.start(message.sender, message.recipient, message.subject)
+                    Message.objects.filter(pk=message.pk).update(thread=thread)
+                    MessageThread.refresh([thread.id])
+                reply = Message.objects.create(
+                    sender=request.user,
+                    recipient=reply_recipient,
+                    subject=reply_subject,
+                    content=reply_form.cleaned_data['content'],
+                    parent_message=message,
+                    thread=thread
+                )
+                MessageThread.record_message(reply)
 
             messages.success(request, '✅ 回覆已發送！')
             return redirect('message_detail', message_id=message.id)
@@ -205,19 +231,17 @@ def message_delete(request, message_id):
         messages.error(request, '❌ 您沒有權限刪除此訊息！')
         return redirect('inbox')
 
-    # 軟刪除：根據用戶角色設置刪除標記
+    # 軟刪除：根據用戶角色設置刪除標記（雙方都刪除時真正刪除訊息）
     if message.sender == request.user:
-        message.sender_deleted = True
+        side = 'sender'
         redirect_url = 'outbox'
     else:
-        message.recipient_deleted = True
+        side = 'recipient'
         redirect_url = 'inbox'
 
-    message.save()
+    _, purged = soft_delete_messages(request.user, [message.id], side)
 
-    # 如果雙方都刪除，則真正刪除訊息
-    if message.sender_deleted and message.recipient_deleted:
-        message.delete()
+    if purged:
         messages.success(request, '✅ 訊息已永久刪除！')
     else:
         messages.success(request, '✅ 訊息已刪除！')
@@ -235,6 +259,9 @@ def mark_all_read(request):
         is_read=False,
         recipient_deleted=False
     ).update(is_read=True)
+    MessageThread.objects.filter(user1=request.user, user1_unread_count__gt=0).update(user1_unread_count=0)
+    MessageThread.objects.filter(user2=request.user, user2_unread_count__gt=0).update(user2_unread_count=0)
+    invalidate_snapshot(request.user.id)
 
     messages.success(request, '✅ 所有訊息已標記為已讀！')
     return redirect('inbox')
@@ -266,24 +293,28 @@ def message_recall(request, message_id):
     return redirect('outbox')
 
 
+def _selected_thread_messages(request, owner_field, flag):
+    """批次操作選取的對話串中，用戶在此信箱未刪除的訊息"""
+    thread_ids = [thread_id for thread_id in request.POST.getlist('thread_ids') if thread_id.isdigit()]
+    return Message.objects.filter(thread_id__in=thread_ids, **{owner_field: request.user, flag: False})
+
+
 @login_required
 def bulk_mark_read(request):
     """
-    批次標記為已讀
+    批次標記對話串為已讀
     """
     if request.method == 'POST':
-        message_ids = request.POST.getlist('message_ids')
-
-        if not message_ids:
-            messages.error(request, '❌ 請選擇要標記的訊息！')
+        if not request.POST.getlist('thread_ids'):
+            messages.error(request, '❌ 請選擇要標記的對話！')
             return redirect('inbox')
 
-        # 更新訊息為已讀
-        updated_count = Message.objects.filter(
-            id__in=message_ids,
-            recipient=request.user,
-            recipient_deleted=False
-        ).update(is_read=True)
+        # 更新訊息為已讀，並重新計算相關對話串的未讀數
+        unread = _selected_thread_messages(request, 'recipient', 'recipient_deleted').filter(is_read=False)
+        thread_ids = set(unread.values_list('thread_id', flat=True))
+        updated_count = unread.update(is_read=True, read_at=timezone.now())
+        MessageThread.refresh(thread_ids)
+        invalidate_snapshot(request.user.id)
 
         if updated_count > 0:
             messages.success(request, f'✅ 已成功標記 {updated_count} 則訊息為已讀！')
@@ -296,32 +327,16 @@ def bulk_mark_read(request):
 @login_required
 def bulk_delete(request):
     """
-    批次刪除訊息（收件匣）
+    批次刪除對話串中收到的訊息（收件匣）
     """
     if request.method == 'POST':
-        message_ids = request.POST.getlist('message_ids')
-
-        if not message_ids:
-            messages.error(request, '❌ 請選擇要刪除的訊息！')
+        if not request.POST.getlist('thread_ids'):
+            messages.error(request, '❌ 請選擇要刪除的對話！')
             return redirect('inbox')
 
-        # 軟刪除：標記為已刪除
-        deleted_messages = Message.objects.filter(
-            id__in=message_ids,
-            recipient=request.user,
-            recipient_deleted=False
-        )
-
-        deleted_count = 0
-        for message in deleted_messages:
-            message.recipient_deleted = True
-            message.save()
-
-            # 如果雙方都刪除，則真正刪除訊息
-            if message.sender_deleted:
-                message.delete()
-
-            deleted_count += 1
+        # 軟刪除：以一個 UPDATE 標記為已刪除，雙方都刪除的訊息以一個 DELETE 真正刪除
+        message_ids = _selected_thread_messages(request, 'recipient', 'recipient_deleted').values_list('id', flat=True)
+        deleted_count, _ = soft_delete_messages(request.user, list(message_ids), 'recipient')
 
         if deleted_count > 0:
             messages.success(request, f'✅ 已成功刪除 {deleted_count} 則訊息！')
@@ -334,32 +349,16 @@ def bulk_delete(request):
 @login_required
 def outbox_bulk_delete(request):
     """
-    批次刪除訊息（寄件匣）
+    批次刪除對話串中發送的訊息（寄件匣）
     """
     if request.method == 'POST':
-        message_ids = request.POST.getlist('message_ids')
-
-        if not message_ids:
-            messages.error(request, '❌ 請選擇要刪除的訊息！')
+        if not request.POST.getlist('thread_ids'):
+            messages.error(request, '❌ 請選擇要刪除的對話！')
             return redirect('outbox')
 
-        # 軟刪除：標記為已刪除
-        deleted_messages = Message.objects.filter(
-            id__in=message_ids,
-            sender=request.user,
-            sender_deleted=False
-        )
-
-        deleted_count = 0
-        for message in deleted_messages:
-            message.sender_deleted = True
-            message.save()
-
-            # 如果雙方都刪除，則真正刪除訊息
-            if message.recipient_deleted:
-                message.delete()
-
-            deleted_count += 1
+        # 軟刪除：以一個 UPDATE 標記為已刪除，雙方都刪除的訊息以一個 DELETE 真正刪除
+        message_ids = _selected_thread_messages(request, 'sender', 'sender_deleted').values_list('id', flat=True)
+        deleted_count, _ = soft_delete_messages(request.user, list(message_ids), 'sender')
 
         if deleted_count > 0:
             messages.success(request, f'✅ 已成功刪除 {deleted_count} 則訊息！')
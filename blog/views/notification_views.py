@@ -4,11 +4,12 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
-from django.core.paginator import Paginator
 from django.db.models import Q
 from django.utils import timezone
 
 from blog.models import Notification, NotificationPreference
+from blog.utils.keyset_pagination import KeysetPaginator
+from blog.utils.notification_snapshot import invalidate_snapshot
 
 
 @login_required
@@ -22,7 +23,7 @@ def notifications_center(request):
     notification_type = request.GET.get('type', 'all')  # all, comment, like, follower, message, share
 
     # 基本查詢
-    notifications = Notification.objects.filter(user=request.user)
+    notifications = Notification.objects.filter(user=request.user).select_related('sender')
 
     # 篩選狀態
     if filter_type == 'unread':
@@ -34,10 +35,9 @@ def notifications_center(request):
     if notification_type != 'all':
         notifications = notifications.filter(notification_type=notification_type)
 
-    # 分頁
-    paginator = Paginator(notifications, 20)
-    page_number = request.GET.get('page', 1)
-    page_obj = paginator.get_page(page_number)
+    # 分頁（keyset 游標）
+    paginator = KeysetPaginator(notifications, 20, ordering=('-created_at', '-id'))
+    page_obj = paginator.get_page(request.GET.get('cursor'))
 
     # 統計數據
     unread_count = Notification.objects.filter(user=request.user, is_read=False).count()
@@ -83,6 +83,7 @@ def notification_mark_all_read(request):
             user=request.user,
             is_read=False
         ).update(is_read=True, read_at=timezone.now())
+        invalidate_snapshot(request.user.id)
 
         # 如果是 AJAX 請求，返回 JSON
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -126,17 +127,23 @@ def notification_delete_all_read(request):
     刪除所有已讀通知
     """
     if request.method == 'POST':
-        deleted_count = Notification.objects.filter(
-            user=request.user,
-            is_read=True
-        ).delete()[0]
+        from blog.utils.notification_retention import purge_in_background
+
+        # 分批刪除：第一批立即刪除，剩餘的交由背景 worker 處理
+        stats = purge_in_background('user', user=request.user)
+        deleted_count = stats['purged']
+
+        message = f'已刪除 {deleted_count} 則已讀通知'
+        if stats['has_more']:
+            message += '，其餘已讀通知將在背景陸續刪除'
 
         # 如果是 AJAX 請求，返回 JSON
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
             return JsonResponse({
                 'success': True,
-                'message': f'已刪除 {deleted_count} 則已讀通知',
-                'deleted_count': deleted_count
+                'message': message,
+                'deleted_count': deleted_count,
+                'queued': stats['has_more']
             })
 
         return redirect('notifications_center')
@@ -17,6 +17,7 @@ from ..models import (
     Event, EventParticipant, Announcement,
     Article
 )
+from ..utils.follow_graph import get_following_status
 
 
 # ============ @提及功能 ============
@@ -80,6 +81,10 @@ def search_users_for_mention(request):
             id=request.user.id  # 排除自己
         ).values('id', 'username', 'first_name')[:10]
 
+    # 一次查詢是否追蹤了搜尋結果中的用戶
+    users = list(users)
+    following_status = get_following_status(request.user, [user['id'] for user in users])
+
     # 格式化結果
     user_list = []
     for user in users:
@@ -88,7 +93,8 @@ def search_users_for_mention(request):
             'id': user['id'],
             'username': user['username'],
             'display_name': display_name,
-            'label': f"@{user['username']}"
+            'label': f"@{user['username']}",
+            'is_following': following_status.get(user['id'], False),
         })
 
     return JsonResponse({'users': user_list})
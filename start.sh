@@ -8,6 +8,10 @@ set -e
 echo "Running database migrations..."
 python manage.py migrate --noinput
 
+# Create cache tables (presence cache)
+echo "Creating cache tables..."
+python manage.py createcachetable
+
 # Create superuser if not exists
 echo "Creating superuser if not exists..."
 python manage.py create_superuser
@@ -0,0 +1,8 @@
+#!/bin/bash
+set -e
+
+# Activate virtual environment
+. /app/.venv/bin/activate
+
+# Run a management command (background workers)
+exec python manage.py "$@"